@@ -0,0 +1,86 @@
+"""
+archive.py — фоновый перенос старой истории в холодный архив.
+
+Раз в ARCHIVE_INTERVAL секунд переносит закрытые сделки и памп/дамп
+сигналы с исходом старше database.ARCHIVE_AFTER_DAYS в архивную SQLite
+(database.archive_path()). Переносит пачками по database.ARCHIVE_BATCH
+строк с паузой ARCHIVE_PAUSE между ними: каждая пачка — две короткие
+транзакции, write-lock не держится долго и event loop не блокируется.
+
+Чтение истории прозрачно — см. trades_all / pd_history_all в database.py.
+Ручной запуск и состояние — /archive у администратора.
+
+Архив — только локальный файл: в Turso он не синхронизируется, копию
+делает лишь bot._backup_db при старте (см. «ХОЛОДНЫЙ АРХИВ» в database.py).
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import database as db
+
+log = logging.getLogger("CHM.Archive")
+
+ARCHIVE_INTERVAL = int(os.getenv("ARCHIVE_INTERVAL", "21600"))   # раз в 6 ч
+ARCHIVE_PAUSE    = float(os.getenv("ARCHIVE_PAUSE", "0.2"))      # между пачками, с
+
+_run_lock: asyncio.Lock | None = None
+_stats = {"runs": 0, "last_run": 0.0, "last_s": 0.0,
+          "moved": {k: 0 for k in db.ARCHIVE_KINDS}, "last_moved": {}}
+
+
+async def run_once(now: float | None = None) -> dict[str, int]:
+    """
+    Один проход по всем таблицам. Возвращает {таблица: перенесено строк}.
+    Параллельный вызов (/archive run во время фонового прохода) ждёт его.
+    """
+    global _run_lock
+    if _run_lock is None:
+        _run_lock = asyncio.Lock()
+    if db.ARCHIVE_AFTER_DAYS <= 0 or not db.archive_path():
+        return {}
+    cutoff = (now or time.time()) - db.ARCHIVE_AFTER_DAYS * 86400
+    async with _run_lock:
+        t0 = time.monotonic()
+        moved = {}
+        for kind in db.ARCHIVE_KINDS:
+            n, after = 0, None
+            while True:
+                k, after = await db.db_archive_batch(kind, cutoff, after)
+                n += k
+                if after is None:
+                    break
+                await asyncio.sleep(ARCHIVE_PAUSE)
+            moved[kind] = n
+            _stats["moved"][kind] += n
+        _stats["runs"] += 1
+        _stats["last_run"] = time.time()
+        _stats["last_s"] = round(time.monotonic() - t0, 2)
+        _stats["last_moved"] = moved
+    if any(moved.values()):
+        log.info(f"🗄 Архив: {moved} за {_stats['last_s']}с → {db.archive_path()}")
+    return moved
+
+
+def stats() -> dict:
+    return {**_stats, "after_days": db.ARCHIVE_AFTER_DAYS, "path": db.archive_path()}
+
+
+async def archive_loop():
+    """Фоновая задача: run_once каждые ARCHIVE_INTERVAL секунд."""
+    if db.ARCHIVE_AFTER_DAYS <= 0:
+        log.info("🗄 Архивация выключена (ARCHIVE_AFTER_DAYS=0)")
+        return
+    log.info(f"🗄 Архивация: старше {db.ARCHIVE_AFTER_DAYS:g} дн., "
+             f"интервал {ARCHIVE_INTERVAL}с → {db.archive_path() or '—'}")
+    log.warning("🗄 Архив истории хранится только на локальном диске (в Turso не уходит): "
+                "без постоянного тома задайте DB_ARCHIVE_PATH или ARCHIVE_AFTER_DAYS=0")
+    await asyncio.sleep(600)   # не мешаем старту: прогрев кэшей, первый скан
+    while True:
+        try:
+            await run_once()
+        except Exception as e:
+            log.warning(f"Архивация: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL)
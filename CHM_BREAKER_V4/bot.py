@@ -18,11 +18,18 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.types import ErrorEvent
 
 import database
+import archive
 import cache
 import turso_sync
 import cache_gc
 import wallet_service
 import poly_scheduler
+import sharding
+import shadow
+import market_regime
+import outbound
+import broadcast
+import tickers
 from config import Config
 from user_manager import UserManager
 from scanner_mid import MidScanner
@@ -52,10 +59,10 @@ def _code_hash() -> str:
     return h.hexdigest()
 
 
-def _backup_db(db_path: str):
+def _backup_db(db_path: str, keep: int = 5):
     """Создаёт резервную копию БД при каждом запуске бота.
 
-    Хранит последние 5 копий: chm_bot.db.bak1 … .bak5
+    Хранит последние keep копий: chm_bot.db.bak1 … .bak5
     Это защищает от потери данных при случайном удалении файла.
     """
     if not os.path.exists(db_path):
@@ -63,7 +70,7 @@ def _backup_db(db_path: str):
     bak_dir  = os.path.dirname(db_path) or "."
     bak_base = db_path + ".bak"
     # Сдвигаем старые бэкапы: bak4→bak5, bak3→bak4 …
-    for n in range(4, 0, -1):
+    for n in range(keep - 1, 0, -1):
         src = bak_base + str(n)
         dst = bak_base + str(n + 1)
         if os.path.exists(src):
@@ -114,6 +121,13 @@ async def notify_restart(bot: Bot, admin_ids: list):
 
 
 async def main():
+    if sharding.enabled() and not sharding.is_owner():
+        raise SystemExit("bot.py — это shard 0; воркеры запускаются через scan_worker.py")
+    if shadow.SHADOW_MODE:
+        # Теневой прогон сканеров: без polling, бэкапа, Turso и отправки
+        await shadow.main()
+        return
+
     config = Config()
 
     import os as _os
@@ -124,9 +138,15 @@ async def main():
     log.info(f"   Воркеров:    {config.SCAN_WORKERS}")
     log.info(f"   API conc.:   {config.API_CONCURRENCY}")
     log.info(f"   Кэш монет:   {config.CACHE_MAX_SYMBOLS} символов")
+    if sharding.enabled():
+        log.info(f"   Шардов:      {sharding.SHARD_COUNT} (этот процесс — shard 0)")
 
     # ─── ШАГ 1: Бэкап локального SQLite (до любых изменений) ────────────────
     _backup_db(config.DB_PATH)
+    # Холодный архив истории — только на локальном диске, в Turso его нет;
+    # он большой, поэтому копий меньше
+    if database.ARCHIVE_AFTER_DAYS > 0:
+        _backup_db(database.archive_file_for(config.DB_PATH), keep=2)
 
     # ─── ШАГ 2: Инициализация SQLite — создаём правильную схему (типы!) ─────
     # ВАЖНО: init_db ПЕРЕД restore, иначе restore создаёт таблицы с col TEXT
@@ -138,6 +158,18 @@ async def main():
     # Если Turso пустой — оставляем локальную БД как есть.
     # После вызова _restore_attempted=True → turso_push разблокируется.
     turso_had_data = await turso_sync.restore_from_turso_if_needed(config.DB_PATH)
+    if turso_had_data and turso_sync.restore_replaced("trades"):
+        # trades залиты целиком (локальная БД была пустой) — триггеры считали
+        # серии в порядке вставки, агрегаты статистики строим заново
+        # (вместе с локальным архивом: он в Turso не синхронизируется)
+        await database.db_user_stats_rebuild()
+    elif turso_had_data:
+        # restore слил только отличающиеся строки, user_stats вели триггеры —
+        # дешёвая сверка, полная пересборка только при расхождении
+        check = await database.db_user_stats_check()
+        if not check["ok"]:
+            log.warning(f"⚠️ user_stats разошлись с trades после restore: {check} — пересобираем")
+            await database.db_user_stats_rebuild()
 
     # ─── ШАГ 4: Всегда пушим при старте ─────────────────────────────────────
     # turso_push защищён флагом _restore_attempted — не выполнится до restore.
@@ -352,19 +384,33 @@ async def main():
         except Exception:
             log.critical(f"💀 Задача '{name}' завершилась с необработанным исключением!", exc_info=True)
 
+    extra_tasks = []
+    if sharding.enabled():
+        extra_tasks.append(_guarded("shard_outbox", sharding.outbox_loop(bot, um)))
+
     try:
         await asyncio.gather(
+            *extra_tasks,
             _guarded("polling",          dp.start_polling(bot, allowed_updates=["message", "callback_query"])),
             _guarded("scanner",          scanner.run_forever()),
+            _guarded("tickers",          tickers.refresh_loop(scanner.fetcher)),
+            _guarded("market_regime",    market_regime.regime_loop(scanner.fetcher)),
             _guarded("pd_runner",        pd_runner.run_forever()),
             _guarded("turso_sync",       turso_sync.turso_sync_loop(config.DB_PATH)),
             _guarded("subs_backup",      _subs_backup_loop()),
             _guarded("cache_gc",         cache_gc.gc_loop()),
+            _guarded("archive",          archive.archive_loop()),
+            _guarded("counters",         database.counters_loop()),
             _guarded("poly_digest",      poly_scheduler.digest_loop(bot, poly, um)),
             _guarded("poly_alerts",      poly_scheduler.alerts_loop(bot, poly)),
             _guarded("gerchik_scanner",  gerchik_scanner.run_forever()),
+            _guarded("broadcast_resume", broadcast.resume_all(bot)),
         )
     finally:
+        log.info("🛑 Завершение — досылаем очередь сообщений...")
+        if not await outbound.drain(timeout=10):
+            log.warning(f"Не доставлено при остановке: {outbound.stats()}")
+        await database.flush_writes()
         log.info("🛑 Завершение — отменяем фоновые задачи...")
         current = asyncio.current_task()
         pending = [t for t in asyncio.all_tasks() if t is not current and not t.done()]
@@ -380,6 +426,7 @@ async def main():
         # ─── Финальное сохранение перед выходом ──────────────────────────────
         await _save_subs_backup_once()
         await turso_sync.turso_push(config.DB_PATH)
+        await database.close_db()
 
 
 def _ensure_single_instance():
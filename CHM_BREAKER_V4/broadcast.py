@@ -0,0 +1,174 @@
+"""
+broadcast.py — рассылки админа как задания в SQLite.
+
+/broadcast раньше слал всем подряд в одном хендлере: тысячи получателей —
+минуты ожидания, а рестарт посередине терял информацию, кому уже ушло.
+Теперь:
+
+  • задание и статус каждого получателя — в broadcast_jobs /
+    broadcast_recipients (database.py)
+  • пачки по BROADCAST_BATCH получателей отправляются параллельно через
+    outbound (PRIO_DIGEST — сигналы идут вперёд, темп и 429 — там же)
+  • перед отправкой пачка помечается 'sending'; если бот упал посреди
+    пачки, после рестарта эти строки становятся 'unknown' и повторно
+    не шлются — дублей нет
+  • прогресс раз в BROADCAST_PROGRESS_EVERY секунд — правкой сообщения
+    у админа
+  • заблокировавшие бота и удалённые аккаунты пишутся в blocked_chats,
+    следующие рассылки их пропускают (до нового /start)
+
+API:
+  await start(bot, admin_id, chat_id, msg_id, text, user_ids) -> job_id
+  await resume_all(bot)     — продолжить незавершённые (при старте бота)
+  await cancel(job_id)      — остановить; оставшиеся получатели не получат,
+                              в том числе уже стоящие в очереди outbound
+                              (отмена send убирает их оттуда)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+import database as db
+import outbound
+
+log = logging.getLogger("CHM.Broadcast")
+
+BROADCAST_BATCH          = 25     # получателей в полёте одновременно
+BROADCAST_PROGRESS_EVERY = 3.0    # сек между правками сообщения с прогрессом
+BROADCAST_PREFIX         = "📢 "
+
+# BadRequest с такими текстами — чат недоступен навсегда
+_GONE = ("chat not found", "user is deactivated", "bot was blocked")
+
+_tasks: dict[int, asyncio.Task] = {}
+
+
+async def start(bot: Bot, admin_id: int, chat_id: int, msg_id: int,
+                text: str, user_ids: list[int]) -> int:
+    """Сохранить задание и запустить его в фоне."""
+    job_id = await db.db_bc_create(admin_id, text, user_ids, chat_id, msg_id)
+    _spawn(bot, job_id)
+    return job_id
+
+
+async def resume_all(bot: Bot):
+    """Продолжить рассылки, прерванные рестартом; ждёт их завершения."""
+    jobs = await db.db_bc_running()
+    for job in jobs:
+        lost = await db.db_bc_recover(job["id"])
+        log.info(f"📢 Рассылка #{job['id']}: продолжаем после рестарта"
+                 + (f" ({lost} в неизвестном статусе)" if lost else ""))
+        _spawn(bot, job["id"])
+    if _tasks:
+        await asyncio.gather(*list(_tasks.values()), return_exceptions=True)
+
+
+async def cancel(job_id: int) -> bool:
+    task = _tasks.get(job_id)
+    job  = await db.db_bc_get(job_id)
+    if job is None or job["status"] != "running":
+        return False
+    await db.db_bc_finish(job_id, "cancelled")
+    if task is not None:
+        task.cancel()
+    return True
+
+
+def _spawn(bot: Bot, job_id: int):
+    if job_id in _tasks and not _tasks[job_id].done():
+        return
+    task = asyncio.create_task(_run(bot, job_id))
+    _tasks[job_id] = task
+    task.add_done_callback(lambda _t: _tasks.pop(job_id, None))
+
+
+async def _send_one(bot: Bot, uid: int, text: str) -> tuple:
+    try:
+        await outbound.send(bot, uid, BROADCAST_PREFIX + text,
+                            prio=outbound.PRIO_DIGEST)
+        return uid, "sent", ""
+    except TelegramForbiddenError as e:
+        return uid, "blocked", str(e)[:200]
+    except TelegramBadRequest as e:
+        err = str(e)
+        status = "blocked" if any(g in err.lower() for g in _GONE) else "failed"
+        return uid, status, err[:200]
+    except outbound.QueueFull:
+        # Очередь забита сигналами — вернём в pending и попробуем позже
+        return uid, "pending", ""
+    except Exception as e:
+        log.warning("broadcast uid=%s: %s", uid, e)
+        return uid, "failed", str(e)[:200]
+
+
+def _progress_text(job: dict, counts: dict, final: Optional[str] = None) -> str:
+    total   = job["total"]
+    sent    = counts.get("sent", 0)
+    blocked = counts.get("blocked", 0)
+    failed  = counts.get("failed", 0)
+    unknown = counts.get("unknown", 0)
+    done    = sent + blocked + failed + unknown
+    pct     = done / total * 100 if total else 100.0
+    head = {
+        None:        f"📢 <b>Рассылка #{job['id']}</b> — {pct:.0f}%",
+        "done":      f"📢 <b>Рассылка #{job['id']} завершена</b>",
+        "cancelled": f"📢 <b>Рассылка #{job['id']} остановлена</b>",
+    }[final]
+    return (
+        head + "\n\n"
+        f"Обработано: <b>{done}</b> / {total}\n"
+        f"✅ {sent}   🚫 {blocked}   ❌ {failed}"
+        + (f"   ❔ {unknown}" if unknown else "")
+    )
+
+
+async def _report(bot: Bot, job: dict, final: Optional[str] = None):
+    if not job.get("progress_msg"):
+        return
+    counts = await db.db_bc_counts(job["id"])
+    try:
+        await bot.edit_message_text(
+            _progress_text(job, counts, final),
+            chat_id=job["progress_chat"], message_id=job["progress_msg"],
+            parse_mode="HTML",
+        )
+    except TelegramBadRequest:
+        pass   # «message is not modified» или сообщение удалено
+    except Exception as e:
+        log.debug(f"broadcast progress #{job['id']}: {e}")
+
+
+async def _run(bot: Bot, job_id: int):
+    job = await db.db_bc_get(job_id)
+    if job is None:
+        return
+    text = job["text"]
+    t0 = time.monotonic()
+    last_report = 0.0
+    try:
+        while True:
+            ids = await db.db_bc_claim(job_id, BROADCAST_BATCH)
+            if not ids:
+                break
+            results = await asyncio.gather(*[_send_one(bot, uid, text) for uid in ids])
+            await db.db_bc_mark(job_id, results)
+            if all(st == "pending" for _, st, _ in results):
+                await asyncio.sleep(5)
+            if time.monotonic() - last_report >= BROADCAST_PROGRESS_EVERY:
+                last_report = time.monotonic()
+                await _report(bot, job)
+    except asyncio.CancelledError:
+        job = await db.db_bc_get(job_id) or job
+        if job["status"] == "cancelled":
+            await db.db_bc_recover(job_id)
+            await _report(bot, job, "cancelled")
+        raise
+    await db.db_bc_finish(job_id, "done")
+    await _report(bot, job, "done")
+    counts = await db.db_bc_counts(job_id)
+    log.info(f"📢 Рассылка #{job_id} завершена за {time.monotonic() - t0:.0f}с: {counts}")
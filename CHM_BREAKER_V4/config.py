@@ -122,13 +122,29 @@ class Config:
     # Воркеров анализа (для 50-500 юзеров хватает 6)
     SCAN_WORKERS    = 6
 
+    # Макс. воркеров на один TF — остальные остаются для других TF
+    SCAN_TF_CONCURRENCY = 4
+
+    # Макс. заданий в очереди сканера; лишние ждут следующего цикла
+    SCAN_QUEUE_MAX  = 2000
+
     # Монет за один батч запросов
     CHUNK_SIZE      = 8
 
     # Пауза между батчами (защита от rate limit)
     CHUNK_SLEEP     = 0.07
 
-    # Пауза главного цикла после каждого прохода
+    # Планировщик сканера: "bar" — просыпается к закрытию свечей активных TF
+    # и сканирует только закрывшиеся TF; "poll" — старый опрос раз в SCAN_LOOP_SLEEP
+    SCAN_SCHEDULE    = os.getenv("SCAN_SCHEDULE", "bar")
+
+    # Через сколько секунд после закрытия свечи сканировать (OKX успевает её закрыть)
+    SCAN_CLOSE_GRACE = float(os.getenv("SCAN_CLOSE_GRACE", "3"))
+
+    # TF «холостого» пробуждения: подхватывает новых пользователей и новые TF
+    SCAN_IDLE_TF     = "15m"
+
+    # Пауза главного цикла после каждого прохода (SCAN_SCHEDULE=poll)
     SCAN_LOOP_SLEEP = 20
 
     # ════════════════════════════════════════════════
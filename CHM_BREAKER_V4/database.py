@@ -9,6 +9,8 @@ import asyncio
 import logging
 import os
 import time
+from collections import deque
+from contextlib import asynccontextmanager
 from typing import Optional
 
 log = logging.getLogger("CHM.DB")
@@ -32,6 +34,290 @@ def _get_lock() -> asyncio.Lock:
         _lock = asyncio.Lock()
     return _lock
 
+
+# ─── Пул соединений ────────────────────────────────────────────────────────
+# Раньше каждая функция открывала своё соединение (новый поток aiosqlite +
+# новый sqlite3) и PRAGMA из init_db на них не действовали. Теперь:
+#   _read()  — одно из DB_POOL_READERS соединений для SELECT
+#   _write() — единственное соединение-писатель под write-lock
+# PRAGMA применяются к каждому соединению при открытии. Закрытие — close_db().
+
+DB_POOL_READERS = int(os.getenv("DB_POOL_READERS", "4"))
+# mmap по умолчанию выключен — безопаснее в контейнерах (overlay/NFS)
+DB_MMAP_SIZE    = int(os.getenv("DB_MMAP_SIZE", "0"))
+_POOL_WAIT_WINDOW = 2000
+
+_CONN_PRAGMAS = (
+    "PRAGMA busy_timeout=5000",   # ждать 5с вместо мгновенного disk I/O error
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=10000",
+    "PRAGMA temp_store=MEMORY",
+    f"PRAGMA mmap_size={DB_MMAP_SIZE}",
+)
+
+_writer:    Optional[aiosqlite.Connection] = None
+_readers:   Optional[asyncio.Queue] = None
+_pool_conns: list = []
+_pool_lock: Optional[asyncio.Lock] = None
+_pool_wait = {"read": deque(maxlen=_POOL_WAIT_WINDOW),
+              "write": deque(maxlen=_POOL_WAIT_WINDOW)}
+_pool_acq  = {"read": 0, "write": 0}
+
+
+async def _open_conn() -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(_db_path, timeout=30)
+    for pragma in _CONN_PRAGMAS:
+        await conn.execute(pragma)
+    await _attach_archive(conn)   # arch.* + trades_all / pd_history_all
+    return conn
+
+
+async def _ensure_pool():
+    global _writer, _readers, _pool_lock
+    if _readers is not None:
+        return
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _readers is not None:
+            return
+        _writer = await _open_conn()
+        _pool_conns.append(_writer)
+        readers = asyncio.Queue()
+        for _ in range(max(1, DB_POOL_READERS)):
+            conn = await _open_conn()
+            _pool_conns.append(conn)
+            readers.put_nowait(conn)
+        _readers = readers
+        log.info(f"SQLite пул: 1 writer + {readers.qsize()} readers ({_db_path})")
+
+
+def _note_wait(kind: str, t0: float):
+    _pool_acq[kind] += 1
+    _pool_wait[kind].append(time.monotonic() - t0)
+
+
+@asynccontextmanager
+async def _read():
+    """Соединение для чтения из пула."""
+    await _ensure_pool()
+    t0 = time.monotonic()
+    conn = await _readers.get()
+    _note_wait("read", t0)
+    try:
+        yield conn
+    finally:
+        conn.row_factory = None
+        _readers.put_nowait(conn)
+
+
+@asynccontextmanager
+async def _write():
+    """Соединение-писатель; write-lock держится на всё время блока."""
+    await _ensure_pool()
+    t0 = time.monotonic()
+    async with _get_lock():
+        _note_wait("write", t0)
+        try:
+            yield _writer
+        finally:
+            _writer.row_factory = None
+            # Как при закрытии отдельного соединения: незакоммиченное — откат
+            if _writer.in_transaction:
+                await _writer.rollback()
+
+
+# ─── Групповой коммит (write-behind) ──────────────────────────────────────
+# Частые одиночные INSERT/UPDATE (сделки, настройки, PD, ставки, outbox)
+# раньше брали write-lock и коммитили каждый сам — весь бот ждал fsync по
+# очереди. Теперь они копятся в очереди и пишутся одной транзакцией раз в
+# DB_GROUP_MS мс или по DB_GROUP_ROWS строк (пока пишется одна пачка,
+# копится следующая). Порядок — FIFO (значит, и per
+# user). await _grouped(...) возвращается после коммита (lastrowid);
+# wait=False — без ожидания, для аналитики. Остановка: flush_writes().
+
+DB_GROUP_MS   = int(os.getenv("DB_GROUP_MS", "20"))
+DB_GROUP_ROWS = int(os.getenv("DB_GROUP_ROWS", "500"))
+
+_wb:      deque = deque()            # (sql, params, future | None, want_id)
+_wb_wake: Optional[asyncio.Event] = None   # очередь не пуста
+_wb_full: Optional[asyncio.Event] = None   # набралось DB_GROUP_ROWS
+_wb_task: Optional[asyncio.Task]  = None
+_wb_stats = {"rows": 0, "batches": 0, "max_batch": 0, "errors": 0}
+
+
+def _grouped(sql: str, params=(), wait: bool = True, want_id: bool = False):
+    """
+    Поставить запись в групповой коммит.
+    wait=True    — awaitable, завершается после коммита (или исключением)
+    wait=False   — None; ошибка только в лог
+    want_id=True — результат awaitable = lastrowid (иначе None: одинаковые
+                   запросы подряд идут одним executemany)
+    """
+    global _wb_task, _wb_wake, _wb_full
+    if _wb_task is None or _wb_task.done():
+        _wb_wake, _wb_full = asyncio.Event(), asyncio.Event()
+        _wb_task = asyncio.create_task(_wb_loop())
+    fut = asyncio.get_running_loop().create_future() if wait else None
+    _wb.append((sql, params, fut, want_id))
+    _wb_wake.set()
+    if len(_wb) >= DB_GROUP_ROWS:
+        _wb_full.set()
+    return fut
+
+
+async def _wb_loop():
+    while True:
+        await _wb_wake.wait()
+        # Даём группе набраться, пока очередь растёт: до DB_GROUP_MS или
+        # DB_GROUP_ROWS строк. Перестала расти за 1 мс — пишем сразу, чтобы
+        # последовательные await и ждущие коммита писатели не простаивали
+        deadline = time.monotonic() + DB_GROUP_MS / 1000
+        n = len(_wb)
+        while n < DB_GROUP_ROWS and time.monotonic() < deadline:
+            _wb_full.clear()
+            try:
+                await asyncio.wait_for(_wb_full.wait(), 0.001)
+            except asyncio.TimeoutError:
+                pass
+            if len(_wb) == n:
+                break
+            n = len(_wb)
+        try:
+            await _flush_batch()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.warning(f"group commit: {e}")
+            await asyncio.sleep(0.5)
+        if not _wb:
+            _wb_wake.clear()
+
+
+async def _flush_batch():
+    batch = [_wb.popleft() for _ in range(min(len(_wb), DB_GROUP_ROWS))]
+    if not batch:
+        return
+    results = []
+    try:
+        async with _write() as db:
+            # Вся пачка — одна транзакция с одним commit(). Без явного BEGIN
+            # SAVEPOINT из _exec_many в autocommit сам становится транзакцией
+            # и RELEASE коммитит его отдельно от остальной пачки.
+            if not db.in_transaction:
+                await db.execute("BEGIN IMMEDIATE")
+            i = 0
+            while i < len(batch):
+                # Подряд идущие одинаковые запросы без lastrowid — одним executemany
+                sql, want_id = batch[i][0], batch[i][3]
+                j = i + 1
+                if not want_id:
+                    while j < len(batch) and batch[j][0] == sql and not batch[j][3]:
+                        j += 1
+                if j - i > 1 and await _exec_many(db, sql, batch[i:j]):
+                    results.extend((w[2], None, None) for w in batch[i:j])
+                else:
+                    for w in batch[i:j]:
+                        try:
+                            cur = await db.execute(w[0], w[1])
+                            results.append((w[2], cur.lastrowid, None))
+                        except aiosqlite.Error as e:
+                            # Ошибка одного запроса (constraint и т.п.) не валит группу
+                            results.append((w[2], None, e))
+                i = j
+            await db.commit()
+    except asyncio.CancelledError:
+        # Транзакция откатится в _write() — вернём пачку в голову очереди
+        _wb.extendleft(reversed(batch))
+        raise
+    except Exception as e:
+        _wb_stats["errors"] += len(batch)
+        for _, _, fut, _ in batch:
+            if fut is not None and not fut.done():
+                fut.set_exception(e)
+        if all(w[2] is None for w in batch):
+            log.warning(f"group commit: пачка {len(batch)} потеряна: {e}")
+        return
+    _wb_stats["rows"]     += len(batch)
+    _wb_stats["batches"]  += 1
+    _wb_stats["max_batch"] = max(_wb_stats["max_batch"], len(batch))
+    for fut, rowid, exc in results:
+        if exc is not None:
+            _wb_stats["errors"] += 1
+        if fut is None:
+            if exc is not None:
+                log.warning(f"group commit: {exc}")
+        elif not fut.done():
+            if exc is None:
+                fut.set_result(rowid)
+            else:
+                fut.set_exception(exc)
+
+
+async def _exec_many(db, sql: str, run: list) -> bool:
+    """
+    executemany под savepoint внутри транзакции пачки (_flush_batch);
+    False — ошибка, откатили до savepoint, писать по одному.
+    """
+    await db.execute("SAVEPOINT wb_many")
+    try:
+        await db.executemany(sql, [w[1] for w in run])
+    except aiosqlite.Error:
+        await db.execute("ROLLBACK TO wb_many")
+        await db.execute("RELEASE wb_many")
+        return False
+    await db.execute("RELEASE wb_many")
+    return True
+
+
+async def flush_writes():
+    """Записать всё накопленное (остановка, тесты)."""
+    while _wb:
+        await _flush_batch()
+
+
+def group_commit_stats() -> dict:
+    b = _wb_stats["batches"]
+    return {
+        **_wb_stats,
+        "queued":    len(_wb),
+        "avg_batch": round(_wb_stats["rows"] / b, 1) if b else 0.0,
+    }
+
+
+async def close_db():
+    """Дописать очередь и закрыть все соединения пула (остановка бота / воркера)."""
+    global _writer, _readers, _wb_task
+    if _readers is not None:
+        await flush_writes()
+    if _wb_task is not None:
+        _wb_task.cancel()
+        _wb_task = None
+    conns = list(_pool_conns)
+    _pool_conns.clear()
+    _writer, _readers = None, None
+    for conn in conns:
+        try:
+            await conn.close()
+        except Exception as e:
+            log.debug(f"close_db: {e}")
+
+
+def pool_stats() -> dict:
+    """Ожидание соединения из пула, мс."""
+    out = {"readers": DB_POOL_READERS, "open": len(_pool_conns)}
+    for kind, waits in _pool_wait.items():
+        w = sorted(waits)
+        out[kind] = {
+            "acquired": _pool_acq[kind],
+            "p50_ms":   round(w[len(w) // 2] * 1000, 2) if w else 0.0,
+            "p95_ms":   round(w[min(len(w) - 1, int(len(w) * 0.95))] * 1000, 2) if w else 0.0,
+            "max_ms":   round(w[-1] * 1000, 2) if w else 0.0,
+        }
+    if _readers is not None:
+        out["idle_readers"] = _readers.qsize()
+    return out
+
 # ─── Шифрование Bybit API-ключей (Fernet AES-128-CBC + HMAC) ──────────────
 # Устанавливает переменная окружения BYBIT_FERNET_KEY.
 # Генерация нового ключа (один раз): python3 -c "from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())"
@@ -192,9 +478,16 @@ CREATE TABLE IF NOT EXISTS trades (
     created_at    REAL    DEFAULT 0
 );
 
-CREATE INDEX IF NOT EXISTS idx_trades_user ON trades(user_id);
+-- (user_id, result, created_at): открытые сделки пользователя (result=''),
+-- история с сортировкой по времени и счётчики авто-трейда — поиск по
+-- префиксу вместо скана всех сделок. Заменяет idx_trades_user(user_id).
+CREATE INDEX IF NOT EXISTS idx_trades_user_result ON trades(user_id, result, created_at);
 CREATE INDEX IF NOT EXISTS idx_users_active ON users(active, sub_status, sub_expires);
 CREATE INDEX IF NOT EXISTS idx_users_tf ON users(timeframe);
+-- db_get_active_users: sub_status IN (...) AND sub_expires > ?
+CREATE INDEX IF NOT EXISTS idx_users_sub ON users(sub_status, sub_expires);
+-- Дельта-синхронизация кэша пользователей (user_manager)
+CREATE INDEX IF NOT EXISTS idx_users_updated ON users(updated_at);
 
 -- Постоянная таблица использованных пробных периодов.
 -- Никогда не сбрасывается при миграциях — гарантирует однократность триала.
@@ -240,6 +533,9 @@ CREATE TABLE IF NOT EXISTS ref_rewards (
     given_at   REAL    NOT NULL
 );
 
+CREATE INDEX IF NOT EXISTS idx_referrals_referrer ON referrals(referrer_id, converted);
+CREATE INDEX IF NOT EXISTS idx_ref_rewards_user ON ref_rewards(user_id);
+
 -- ═══════════════════════════════════════════════════════════════
 --  ПАМП/ДАМП ДЕТЕКТОР (BingX)
 -- ═══════════════════════════════════════════════════════════════
@@ -271,6 +567,12 @@ CREATE TABLE IF NOT EXISTS pd_outcomes (
     ts            REAL    NOT NULL
 );
 
+-- Дозаписывание исходов (LEFT JOIN по signal_id, фильтр по ts),
+-- статистика точности за день/неделю и «последние сигналы»
+CREATE INDEX IF NOT EXISTS idx_pd_signals_ts ON pd_signals(ts);
+CREATE INDEX IF NOT EXISTS idx_pd_outcomes_signal ON pd_outcomes(signal_id);
+CREATE INDEX IF NOT EXISTS idx_pd_outcomes_ts ON pd_outcomes(ts);
+
 CREATE TABLE IF NOT EXISTS pd_train_data (
     id            INTEGER PRIMARY KEY AUTOINCREMENT,
     signal_id     INTEGER NOT NULL,
@@ -309,7 +611,7 @@ CREATE TABLE IF NOT EXISTS poly_bets (
     created_at    REAL    DEFAULT 0
 );
 
-CREATE INDEX IF NOT EXISTS idx_poly_bets_user ON poly_bets(user_id);
+CREATE INDEX IF NOT EXISTS idx_poly_bets_user_ts ON poly_bets(user_id, created_at);
 
 -- Кастодиальные кошельки пользователей (Polygon)
 CREATE TABLE IF NOT EXISTS poly_wallets (
@@ -332,6 +634,8 @@ CREATE TABLE IF NOT EXISTS poly_alerts (
 );
 
 CREATE INDEX IF NOT EXISTS idx_poly_alerts_user ON poly_alerts(user_id, active);
+-- Проверка алертов каждые N минут берёт только активные
+CREATE INDEX IF NOT EXISTS idx_poly_alerts_active ON poly_alerts(active);
 
 -- Список наблюдения (избранные маркеты)
 CREATE TABLE IF NOT EXISTS poly_watchlist (
@@ -351,11 +655,202 @@ CREATE TABLE IF NOT EXISTS poly_digest_log (
     date    TEXT    NOT NULL,   -- формат YYYY-MM-DD
     PRIMARY KEY (user_id, date)
 );
+
+-- ═══════════════════════════════════════════════════════════════
+--  ШАРДИРОВАНИЕ (sharding.py)
+-- ═══════════════════════════════════════════════════════════════
+
+-- Сообщения от scan_worker.py, ожидающие отправки процессом с Telegram
+CREATE TABLE IF NOT EXISTS shard_outbox (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    shard      INTEGER NOT NULL,
+    chat_id    INTEGER NOT NULL,
+    payload    TEXT    NOT NULL,   -- JSON: text, kwargs, reply_markup
+    created_at REAL    NOT NULL
+);
+
+-- ═══════════════════════════════════════════════════════════════
+--  РАССЫЛКИ АДМИНА (broadcast.py)
+-- ═══════════════════════════════════════════════════════════════
+
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    admin_id      INTEGER NOT NULL,
+    text          TEXT    NOT NULL,
+    status        TEXT    DEFAULT 'running',   -- running / done / cancelled
+    total         INTEGER DEFAULT 0,
+    progress_chat INTEGER DEFAULT 0,           -- сообщение с прогрессом у админа
+    progress_msg  INTEGER DEFAULT 0,
+    created_at    REAL    NOT NULL,
+    finished_at   REAL    DEFAULT 0
+);
+
+-- pending → sending → sent / blocked / failed; sending после рестарта → unknown
+CREATE TABLE IF NOT EXISTS broadcast_recipients (
+    job_id     INTEGER NOT NULL,
+    user_id    INTEGER NOT NULL,
+    status     TEXT    DEFAULT 'pending',
+    error      TEXT    DEFAULT '',
+    updated_at REAL    DEFAULT 0,
+    PRIMARY KEY (job_id, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_bc_recipients_status ON broadcast_recipients(job_id, status);
+
+-- Чаты, где бот заблокирован или аккаунт удалён — рассылки их пропускают
+CREATE TABLE IF NOT EXISTS blocked_chats (
+    user_id    INTEGER PRIMARY KEY,
+    reason     TEXT    DEFAULT '',
+    blocked_at REAL    NOT NULL
+);
+
+-- ═══════════════════════════════════════════════════════════════
+--  СТАТИСТИКА СДЕЛОК (материализованная, ведётся триггерами)
+-- ═══════════════════════════════════════════════════════════════
+
+-- strategy: ALL / LEVELS / SMC / GERCHIK
+-- period:   'all' | 'd:2026-10-19' | 'w:2026-42' | 'm:2026-10' (UTC, по закрытию)
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id   INTEGER NOT NULL,
+    strategy  TEXT    NOT NULL,
+    period    TEXT    NOT NULL,
+    total     INTEGER DEFAULT 0,
+    wins      INTEGER DEFAULT 0,
+    losses    INTEGER DEFAULT 0,
+    be_cnt    INTEGER DEFAULT 0,
+    tp1_cnt   INTEGER DEFAULT 0,
+    tp2_cnt   INTEGER DEFAULT 0,
+    tp3_cnt   INTEGER DEFAULT 0,
+    longs     INTEGER DEFAULT 0,
+    longs_w   INTEGER DEFAULT 0,
+    shorts    INTEGER DEFAULT 0,
+    shorts_w  INTEGER DEFAULT 0,
+    total_rr  REAL    DEFAULT 0,
+    cur_w     INTEGER DEFAULT 0,   -- текущая серия побед / не-побед
+    cur_l     INTEGER DEFAULT 0,
+    streak_w  INTEGER DEFAULT 0,   -- максимальные серии
+    streak_l  INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, strategy, period)
+);
+
+CREATE TABLE IF NOT EXISTS user_stats_symbols (
+    user_id  INTEGER NOT NULL,
+    symbol   TEXT    NOT NULL,
+    total    INTEGER DEFAULT 0,
+    wins     INTEGER DEFAULT 0,
+    PRIMARY KEY (user_id, symbol)
+);
+
+-- Счётчики админ-панели ('users:total', 'users:trial', 'trades:open', ...),
+-- ведутся триггерами (_counters_triggers_sql), сверяются counters_loop
+CREATE TABLE IF NOT EXISTS counters (
+    name   TEXT    PRIMARY KEY,
+    value  INTEGER DEFAULT 0
+);
 """
 
 
+# Счётчики user_stats в порядке колонок таблицы
+_STATS_COLS = (
+    "total", "wins", "losses", "be_cnt", "tp1_cnt", "tp2_cnt", "tp3_cnt",
+    "longs", "longs_w", "shorts", "shorts_w", "total_rr",
+    "cur_w", "cur_l", "streak_w", "streak_l",
+)
+_STATS_COUNTED = "NOT IN ('', 'SKIP')"   # те же сделки, что db_get_user_trades
+
+
+def _stats_triggers_sql() -> str:
+    """
+    Триггеры на trades, которые ведут user_stats / user_stats_symbols.
+
+    Сделка попадает в статистику, когда её result становится «закрытым»
+    (не '' и не SKIP), и вычитается, если закрытый результат переписали.
+    Работают в той же транзакции, что и запись сделки, поэтому совместимы
+    с групповым коммитом (_grouped) без отдельного read-modify-write.
+    Серии считаются в порядке закрытия; при перезаписи уже закрытого
+    результата серии не откатываются — их выравнивает db_user_stats_rebuild.
+    """
+    def strategy(x):
+        return (f"CASE {x}.breakout_type WHEN 'SMC' THEN 'SMC' "
+                f"WHEN 'ГЕРЧИК' THEN 'GERCHIK' ELSE 'LEVELS' END")
+
+    def periods(x):
+        ts = f"COALESCE(NULLIF({x}.closed_at, 0), {x}.created_at, 0)"
+        return [
+            "'all'",
+            f"'d:' || strftime('%Y-%m-%d', {ts}, 'unixepoch')",
+            f"'w:' || strftime('%Y-%W', {ts}, 'unixepoch')",
+            f"'m:' || strftime('%Y-%m', {ts}, 'unixepoch')",
+        ]
+
+    def deltas(x):
+        win = f"({x}.result IN ('TP1','TP2','TP3'))"
+        return {
+            "total":    "1",
+            "wins":     win,
+            "losses":   f"({x}.result = 'SL')",
+            "be_cnt":   f"({x}.result = 'BE')",
+            "tp1_cnt":  f"({x}.result = 'TP1')",
+            "tp2_cnt":  f"({x}.result = 'TP2')",
+            "tp3_cnt":  f"({x}.result = 'TP3')",
+            "longs":    f"({x}.direction = 'LONG')",
+            "longs_w":  f"({x}.direction = 'LONG' AND {win})",
+            "shorts":   f"({x}.direction = 'SHORT')",
+            "shorts_w": f"({x}.direction = 'SHORT' AND {win})",
+            "total_rr": f"COALESCE({x}.result_rr, 0)",
+        }
+
+    def add(x):
+        d = deltas(x)
+        cols = list(d) + ["cur_w", "cur_l", "streak_w", "streak_l"]
+        vals = list(d.values()) + [d["wins"], f"1 - {d['wins']}"] * 2
+        upd = [f"{c} = {c} + excluded.{c}" for c in d]
+        upd += [
+            "cur_w = CASE WHEN excluded.wins THEN cur_w + 1 ELSE 0 END",
+            "cur_l = CASE WHEN excluded.wins THEN 0 ELSE cur_l + 1 END",
+            "streak_w = MAX(streak_w, CASE WHEN excluded.wins THEN cur_w + 1 ELSE 0 END)",
+            "streak_l = MAX(streak_l, CASE WHEN excluded.wins THEN 0 ELSE cur_l + 1 END)",
+        ]
+        per = " UNION ALL ".join(f"SELECT {p}" for p in periods(x)[1:])
+        return (
+            f"INSERT INTO user_stats (user_id, strategy, period, {', '.join(cols)})\n"
+            f"  SELECT {x}.user_id, s.strategy, p.period, {', '.join(vals)}\n"
+            f"  FROM (SELECT 'ALL' AS strategy UNION ALL SELECT {strategy(x)}) s,\n"
+            f"       (SELECT 'all' AS period UNION ALL {per}) p\n"
+            f"  WHERE 1\n"
+            f"  ON CONFLICT(user_id, strategy, period) DO UPDATE SET\n    "
+            + ",\n    ".join(upd) + ";\n"
+            f"INSERT INTO user_stats_symbols (user_id, symbol, total, wins)\n"
+            f"  VALUES ({x}.user_id, {x}.symbol, 1, {d['wins']})\n"
+            f"  ON CONFLICT(user_id, symbol) DO UPDATE SET\n"
+            f"    total = total + 1, wins = wins + excluded.wins;"
+        )
+
+    def sub(x):
+        d = deltas(x)
+        upd = ", ".join(f"{c} = {c} - {v}" for c, v in d.items())
+        return (
+            f"UPDATE user_stats SET {upd}\n"
+            f"  WHERE user_id = {x}.user_id AND strategy IN ('ALL', {strategy(x)})\n"
+            f"    AND period IN ({', '.join(periods(x))});\n"
+            f"UPDATE user_stats_symbols SET total = total - 1, wins = wins - {d['wins']}\n"
+            f"  WHERE user_id = {x}.user_id AND symbol = {x}.symbol;"
+        )
+
+    changed = "OLD.result IS NOT NEW.result"
+    return (
+        "CREATE TRIGGER IF NOT EXISTS trg_user_stats_ins AFTER INSERT ON trades\n"
+        f"WHEN NEW.result {_STATS_COUNTED}\nBEGIN\n{add('NEW')}\nEND;\n"
+        "CREATE TRIGGER IF NOT EXISTS trg_user_stats_unset AFTER UPDATE OF result ON trades\n"
+        f"WHEN {changed} AND OLD.result {_STATS_COUNTED}\nBEGIN\n{sub('OLD')}\nEND;\n"
+        "CREATE TRIGGER IF NOT EXISTS trg_user_stats_set AFTER UPDATE OF result ON trades\n"
+        f"WHEN {changed} AND NEW.result {_STATS_COUNTED}\nBEGIN\n{add('NEW')}\nEND;\n"
+    )
+
+
 async def init_db(path: str):
     global _db_path, _lock
+    await close_db()   # повторная инициализация (другой путь) — пул заново
     _db_path = path
     _lock = asyncio.Lock()   # создаём lock внутри запущенного event loop
     _init_fernet()  # инициализируем шифрование ключей один раз при старте
@@ -381,11 +876,8 @@ async def init_db(path: str):
                 await db.execute("PRAGMA journal_mode=DELETE")
             except Exception:
                 pass
-        await db.execute("PRAGMA busy_timeout=5000")  # ждать 5с вместо мгновенного disk I/O error
-        await db.execute("PRAGMA synchronous=NORMAL")
-        await db.execute("PRAGMA cache_size=10000")
-        await db.execute("PRAGMA temp_store=MEMORY")
-        await db.execute("PRAGMA mmap_size=0")   # отключаем mmap — безопаснее в контейнерах
+        for pragma in _CONN_PRAGMAS:
+            await db.execute(pragma)
         # commit перед executescript: он делает неявный COMMIT, лучше явный
         await db.commit()
         await db.executescript(SCHEMA)
@@ -422,6 +914,7 @@ async def init_db(path: str):
             "ALTER TABLE trades ADD COLUMN be_set INTEGER DEFAULT 0",
             "ALTER TABLE trades ADD COLUMN pos_idx INTEGER DEFAULT 0",
             "ALTER TABLE trades ADD COLUMN order_id TEXT DEFAULT ''",
+            "ALTER TABLE trades ADD COLUMN closed_at REAL DEFAULT 0",
             # Снижаем порог существующих пользователей с дефолтного 70 → 50
             # чтобы они начали получать сигналы (MIN_SIGNAL_SCORE теперь 40%)
             "UPDATE pd_users SET pd_threshold=50 WHERE pd_threshold=70",
@@ -437,7 +930,7 @@ async def init_db(path: str):
                 amount_usdc REAL DEFAULT 0, shares REAL DEFAULT 0, price REAL DEFAULT 0,
                 order_id TEXT DEFAULT '', status TEXT DEFAULT 'filled', created_at REAL DEFAULT 0
             )""",
-            "CREATE INDEX IF NOT EXISTS idx_poly_bets_user ON poly_bets(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_poly_bets_user_ts ON poly_bets(user_id, created_at)",
             """CREATE TABLE IF NOT EXISTS poly_wallets (
                 user_id INTEGER PRIMARY KEY, address TEXT NOT NULL UNIQUE,
                 encrypted_key TEXT NOT NULL, created_at REAL DEFAULT 0
@@ -462,6 +955,10 @@ async def init_db(path: str):
             "CREATE INDEX IF NOT EXISTS idx_poly_watchlist_user ON poly_watchlist(user_id)",
             # Стратегия Герчика
             "ALTER TABLE users ADD COLUMN gerchik_active INTEGER DEFAULT 0",
+            # Индексы, которые перекрыты составными (см. SCHEMA) — только
+            # замедляют запись. Проверка планов: loadtest/check_query_plans.py
+            "DROP INDEX IF EXISTS idx_trades_user",
+            "DROP INDEX IF EXISTS idx_poly_bets_user",
         ]
         for sql in migrations:
             try:
@@ -469,6 +966,28 @@ async def init_db(path: str):
             except Exception:
                 pass  # колонка уже существует
         await db.commit()
+        # Архив — после миграций: его схема повторяет колонки main
+        await _archive_init(db)
+        # Триггеры статистики — после миграций (нужна колонка closed_at).
+        # Первый запуск с историей сделок: заполняем user_stats с нуля.
+        await db.executescript(_stats_triggers_sql())
+        async with db.execute("SELECT EXISTS(SELECT 1 FROM user_stats)") as cur:
+            has_stats = (await cur.fetchone())[0]
+        if not has_stats:
+            res = await _user_stats_rebuild(db)
+            if res["trades"]:
+                log.info(f"📊 user_stats построена: {res['trades']} сделок, {res['rows']} строк")
+        await db.executescript(_counters_triggers_sql())
+        async with db.execute("SELECT EXISTS(SELECT 1 FROM counters)") as cur:
+            has_counters = (await cur.fetchone())[0]
+        if not has_counters:
+            await _counters_reconcile(db)
+        # Статистика для планировщика по новым индексам (дёшево: SQLite
+        # анализирует только таблицы, где она устарела или отсутствует)
+        try:
+            await db.execute("PRAGMA optimize")
+        except Exception as e:
+            log.debug(f"PRAGMA optimize: {e}")
     log.info(f"✅ SQLite инициализирована: {path}")
 
 
@@ -480,7 +999,7 @@ def _row_to_dict(description, row) -> dict:
 
 async def db_is_trial_used(user_id: int) -> bool:
     """Проверяет, использовал ли пользователь пробный период когда-либо."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT 1 FROM trial_ids WHERE user_id=?", (user_id,)
         ) as cur:
@@ -489,19 +1008,18 @@ async def db_is_trial_used(user_id: int) -> bool:
 
 async def db_mark_trial_used(user_id: int):
     """Помечает пользователя как использовавшего пробный период."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT OR IGNORE INTO trial_ids (user_id, used_at) VALUES (?, ?)",
-                (user_id, time.time()),
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO trial_ids (user_id, used_at) VALUES (?, ?)",
+            (user_id, time.time()),
+        )
+        await db.commit()
 
 
 # ── Пользователи ────────────────────────────────────
 
 async def db_get_user(user_id: int) -> Optional[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("SELECT * FROM users WHERE user_id=?", (user_id,)) as cur:
             row = await cur.fetchone()
@@ -551,10 +1069,7 @@ async def db_upsert_user(data: dict):
         f"INSERT INTO users ({col_names}) VALUES ({placeholders}) "
         f"ON CONFLICT(user_id) DO UPDATE SET {updates}"
     )
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(sql, vals)
-            await db.commit()
+    await _grouped(sql, vals)
     _request_turso_push()
 
 
@@ -562,7 +1077,7 @@ async def db_get_active_users() -> list[dict]:
     now = time.time()
     for attempt in range(3):
         try:
-            async with aiosqlite.connect(_db_path, timeout=30) as db:
+            async with _read() as db:
                 db.row_factory = aiosqlite.Row
                 async with db.execute(
                     """SELECT * FROM users
@@ -582,27 +1097,174 @@ async def db_get_active_users() -> list[dict]:
 
 
 async def db_get_all_users() -> list[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute("SELECT * FROM users ORDER BY created_at DESC") as cur:
             rows = await cur.fetchall()
             return [dict(r) for r in rows]
 
 
+async def db_get_users_since(since: Optional[float]) -> list[dict]:
+    """
+    Пользователи с updated_at > since (since=None — все) для кэша
+    user_manager; API-ключи расшифрованы, как в db_get_user.
+    """
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        if since is None:
+            sql, args = "SELECT * FROM users ORDER BY created_at DESC", ()
+        else:
+            sql, args = "SELECT * FROM users WHERE updated_at > ?", (since,)
+        async with db.execute(sql, args) as cur:
+            rows = [dict(r) for r in await cur.fetchall()]
+    for d in rows:
+        d["bybit_api_key"]    = _decrypt_key(d.get("bybit_api_key", "") or "")
+        d["bybit_api_secret"] = _decrypt_key(d.get("bybit_api_secret", "") or "")
+    return rows
+
+
+# ── Счётчики админ-панели ───────────────────────
+# Раньше db_stats_summary делал шесть COUNT(*) по users на каждое открытие
+# /admin. Теперь счётчики лежат в counters и меняются триггерами в той же
+# транзакции, что и запись строки. Описание ниже — общее для триггеров и
+# для сверки (_counters_reconcile): таблица → выражения, дающие имя
+# счётчика для строки {x} (NULL — строка не считается), и колонки, при
+# изменении которых строка может перейти в другой счётчик.
+
+_COUNTERS = {
+    "users": ((
+        "'users:total'",
+        "'users:' || {x}.sub_status",
+        "CASE WHEN {x}.active = 1 THEN 'users:scanning' END",
+    ), ("sub_status", "active")),
+    "trades": ((
+        "CASE {x}.result WHEN '' THEN 'trades:open' WHEN 'SKIP' THEN 'trades:skip'"
+        " ELSE 'trades:closed' END",
+    ), ("result",)),
+    "pd_users": ((
+        "CASE WHEN {x}.pd_subscribed = 1 THEN 'pd:subscribers' END",
+    ), ("pd_subscribed",)),
+    "poly_bets": ((
+        "'poly:bets'",
+    ), ()),
+}
+# Сделки, перенесённые в архив: увеличивает db_archive_batch в транзакции
+# удаления (триггер DELETE на trades при этом уменьшает trades:closed/skip)
+_ARCHIVED_COUNTER = "trades:archived"
+
+COUNTERS_RECONCILE_INTERVAL = int(os.getenv("COUNTERS_RECONCILE_INTERVAL", "3600"))
+_counters_check = {"checked_at": 0.0, "drift": {}, "runs": 0}
+
+
+def _counters_triggers_sql() -> str:
+    def inc(expr):
+        return (f"INSERT INTO counters (name, value) SELECT k, 1 FROM (SELECT {expr} AS k)"
+                f" WHERE k IS NOT NULL ON CONFLICT(name) DO UPDATE SET value = value + 1;")
+
+    def dec(expr):
+        return f"UPDATE counters SET value = value - 1 WHERE name = {expr};"
+
+    out = []
+    for table, (keys, watched) in _COUNTERS.items():
+        new = [k.format(x="NEW") for k in keys]
+        old = [k.format(x="OLD") for k in keys]
+        out.append(f"CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_ins AFTER INSERT ON {table}\n"
+                   "BEGIN\n" + "\n".join(map(inc, new)) + "\nEND;")
+        out.append(f"CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_del AFTER DELETE ON {table}\n"
+                   "BEGIN\n" + "\n".join(map(dec, old)) + "\nEND;")
+        if watched:
+            changed = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in watched)
+            out.append(
+                f"CREATE TRIGGER IF NOT EXISTS trg_counters_{table}_upd"
+                f" AFTER UPDATE OF {', '.join(watched)} ON {table}\n"
+                f"WHEN {changed}\nBEGIN\n"
+                + "\n".join(map(dec, old)) + "\n" + "\n".join(map(inc, new)) + "\nEND;")
+    return "\n".join(out) + "\n"
+
+
+async def _counters_reconcile(db, apply: bool = True) -> dict:
+    """
+    Пересчитать counters через COUNT(*) на соединении db (вызывающий держит
+    write-доступ — иначе между подсчётом и сверкой пролезет запись).
+    Возвращает расхождения {имя: (было, стало)}; apply=True — исправляет.
+    """
+    want: dict = {}
+    for table, (keys, _) in _COUNTERS.items():
+        for key in keys:
+            async with db.execute(
+                f"SELECT {key.format(x=table)} AS k, COUNT(*) FROM main.{table} GROUP BY k"
+            ) as cur:
+                for name, n in await cur.fetchall():
+                    if name is not None:
+                        want[name] = n
+    archived = None
+    try:
+        async with db.execute("SELECT COUNT(*) FROM arch.trades") as cur:
+            archived = (await cur.fetchone())[0]
+    except Exception:
+        pass   # архив не подключён — этот счётчик не сверяем
+    if archived is not None:
+        want[_ARCHIVED_COUNTER] = archived
+    async with db.execute("SELECT name, value FROM counters") as cur:
+        have = dict(await cur.fetchall())
+    if archived is None:
+        have.pop(_ARCHIVED_COUNTER, None)
+    drift = {k: (have.get(k, 0), want.get(k, 0))
+             for k in have.keys() | want.keys() if have.get(k, 0) != want.get(k, 0)}
+    if apply and (drift or not have):
+        await db.executemany(
+            "INSERT INTO counters (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            [(k, want.get(k, 0)) for k in (drift or want)],
+        )
+        await db.commit()
+    return drift
+
+
+async def db_counters_reconcile(apply: bool = True) -> dict:
+    """Сверить counters с таблицами; расхождения логируются и (apply) исправляются."""
+    async with _write() as db:
+        drift = await _counters_reconcile(db, apply=apply)
+    _counters_check.update(checked_at=time.time(), drift=drift,
+                           runs=_counters_check["runs"] + 1)
+    if drift:
+        log.warning(f"⚠️ Счётчики разошлись с таблицами (было, стало): {drift}")
+    return drift
+
+
+def counters_check_stats() -> dict:
+    """Последняя сверка: {"checked_at", "drift", "runs"}."""
+    return dict(_counters_check)
+
+
+async def counters_loop():
+    """Фоновая сверка counters раз в COUNTERS_RECONCILE_INTERVAL секунд."""
+    while True:
+        await asyncio.sleep(COUNTERS_RECONCILE_INTERVAL)
+        try:
+            await db_counters_reconcile()
+        except Exception as e:
+            log.warning(f"Сверка счётчиков: {e}")
+
+
 async def db_stats_summary() -> dict:
-    async with aiosqlite.connect(_db_path) as db:
-        async def count(where=""):
-            sql = f"SELECT COUNT(*) FROM users{' WHERE ' + where if where else ''}"
-            async with db.execute(sql) as cur:
-                return (await cur.fetchone())[0]
-        return {
-            "total":    await count(),
-            "trial":    await count("sub_status='trial'"),
-            "active":   await count("sub_status='active'"),
-            "expired":  await count("sub_status='expired'"),
-            "banned":   await count("sub_status='banned'"),
-            "scanning": await count("active=1"),
-        }
+    """Сводка для /admin из counters — одно чтение вместо COUNT(*) по таблицам."""
+    async with _read() as db:
+        async with db.execute("SELECT name, value FROM counters") as cur:
+            c = dict(await cur.fetchall())
+    return {
+        "total":    c.get("users:total", 0),
+        "trial":    c.get("users:trial", 0),
+        "active":   c.get("users:active", 0),
+        "expired":  c.get("users:expired", 0),
+        "banned":   c.get("users:banned", 0),
+        "scanning": c.get("users:scanning", 0),
+        "trades_open":     c.get("trades:open", 0),
+        "trades_closed":   c.get("trades:closed", 0),
+        "trades_archived": c.get(_ARCHIVED_COUNTER, 0),
+        "pd_subscribers":  c.get("pd:subscribers", 0),
+        "poly_bets":       c.get("poly:bets", 0),
+    }
 
 
 # ── Сделки ──────────────────────────────────────────
@@ -613,36 +1275,33 @@ async def db_add_trade(data: dict):
     placeholders = ", ".join("?" * len(vals))
     col_names    = ", ".join(cols)
     sql = f"INSERT OR IGNORE INTO trades ({col_names}) VALUES ({placeholders})"
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(sql, vals)
-            await db.commit()
+    await _grouped(sql, vals)
 
 
 async def db_get_trade(trade_id: str) -> Optional[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM trades WHERE trade_id=?", (trade_id,)) as cur:
+        async with db.execute("SELECT * FROM trades_all WHERE trade_id=? LIMIT 1", (trade_id,)) as cur:
             row = await cur.fetchone()
-            return dict(row) if row else None
+    if not row:
+        return None
+    return dict(row)
 
 
 async def db_set_trade_result(trade_id: str, result: str, result_rr: float) -> Optional[dict]:
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "UPDATE trades SET result=?, result_rr=? WHERE trade_id=?",
-                (result, result_rr, trade_id)
-            )
-            await db.commit()
+    # user_stats обновляют триггеры в той же транзакции
+    await _grouped(
+        "UPDATE trades SET result=?, result_rr=?, closed_at=? WHERE trade_id=?",
+        (result, result_rr, time.time(), trade_id)
+    )
     return await db_get_trade(trade_id)
 
 
 async def db_get_user_trades(user_id: int) -> list[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
-            "SELECT * FROM trades WHERE user_id=? AND result != '' AND result != 'SKIP' ORDER BY created_at",
+            "SELECT * FROM trades_all WHERE user_id=? AND result != '' AND result != 'SKIP' ORDER BY created_at, trade_id",
             (user_id,)
         ) as cur:
             rows = await cur.fetchall()
@@ -651,7 +1310,7 @@ async def db_get_user_trades(user_id: int) -> list[dict]:
 
 async def db_get_open_trades_for_be(user_id: int) -> list[dict]:
     """Возвращает незакрытые сделки у которых BE ещё не выставлен."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM trades WHERE user_id=? AND result='' AND be_set=0",
@@ -663,7 +1322,7 @@ async def db_get_open_trades_for_be(user_id: int) -> list[dict]:
 
 async def db_get_all_open_trades(user_id: int) -> list[dict]:
     """Возвращает все незакрытые сделки пользователя."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM trades WHERE user_id=? AND result=''",
@@ -675,40 +1334,29 @@ async def db_get_all_open_trades(user_id: int) -> list[dict]:
 
 async def db_update_trade_pos_idx(trade_id: str, pos_idx: int):
     """Обновляет pos_idx сделки после подтверждения открытия на бирже."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "UPDATE trades SET pos_idx=? WHERE trade_id=?",
-                (pos_idx, trade_id)
-            )
-            await db.commit()
+    await _grouped(
+        "UPDATE trades SET pos_idx=? WHERE trade_id=?",
+        (pos_idx, trade_id)
+    )
 
 
 async def db_update_trade_bybit(trade_id: str, order_id: str, pos_idx: int):
     """Сохраняет order_id и pos_idx после успешного открытия позиции на Bybit."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "UPDATE trades SET order_id=?, pos_idx=? WHERE trade_id=?",
-                (order_id, pos_idx, trade_id)
-            )
-            await db.commit()
+    await _grouped(
+        "UPDATE trades SET order_id=?, pos_idx=? WHERE trade_id=?",
+        (order_id, pos_idx, trade_id)
+    )
 
 
 async def db_set_trade_be(trade_id: str):
     """Помечает что безубыток по сделке уже выставлен."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "UPDATE trades SET be_set=1 WHERE trade_id=?", (trade_id,)
-            )
-            await db.commit()
+    await _grouped("UPDATE trades SET be_set=1 WHERE trade_id=?", (trade_id,))
 
 
 async def db_count_open_trades(user_id: int, window_hours: int = 24) -> int:
     """Количество ИСПОЛНЕННЫХ (order_id != '') открытых сделок за последние window_hours часов."""
     since = time.time() - window_hours * 3600
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT COUNT(*) FROM trades WHERE user_id=? AND result='' AND order_id != '' AND created_at>=?",
             (user_id, since),
@@ -730,7 +1378,7 @@ async def db_get_auto_stats(user_id: int) -> dict:
         total_rr    — суммарный P&L в R
     """
     since_24h = time.time() - 86400
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             """
             SELECT
@@ -766,7 +1414,7 @@ async def db_has_open_trade_for_symbol(user_id: int, symbol: str) -> bool:
     на Bybit по данному символу (order_id != '' - значит ордер отправлен на биржу).
     Записи без order_id - это сигналы до исполнения, не блокируют новые сделки.
     """
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT 1 FROM trades WHERE user_id=? AND symbol=? AND result='' AND order_id != '' LIMIT 1",
             (user_id, symbol),
@@ -776,81 +1424,61 @@ async def db_has_open_trade_for_symbol(user_id: int, symbol: str) -> bool:
 
 
 async def db_get_user_stats(user_id: int) -> dict:
-    trades = await db_get_user_trades(user_id)
-    if not trades:
-        return {}
-
-    wins   = [t for t in trades if t["result"] in ("TP1", "TP2", "TP3")]
-    losses = [t for t in trades if t["result"] == "SL"]
-    total  = len(trades)
-
-    winrate  = len(wins) / total * 100 if total else 0
-    avg_rr   = sum(t["result_rr"] for t in trades) / total if total else 0
-    total_rr = sum(t["result_rr"] for t in trades)
-
-    # По монетам
-    sym: dict = {}
-    for t in trades:
-        s = t["symbol"]
-        sym.setdefault(s, {"wins": 0, "total": 0})
-        sym[s]["total"] += 1
-        if t["result"] in ("TP1", "TP2", "TP3"):
-            sym[s]["wins"] += 1
-    best = sorted(
-        sym.items(),
-        key=lambda x: x[1]["wins"] / x[1]["total"] if x[1]["total"] >= 2 else 0,
-        reverse=True
-    )[:5]
-
-    # Серии
-    sw = sl = cw = cl = 0
-    for t in trades:
-        if t["result"] in ("TP1", "TP2", "TP3"):
-            cw += 1; cl = 0
-        else:
-            cl += 1; cw = 0
-        sw = max(sw, cw); sl = max(sl, cl)
-
-    longs  = [t for t in trades if t["direction"] == "LONG"]
-    shorts = [t for t in trades if t["direction"] == "SHORT"]
-    lw = sum(1 for t in longs  if t["result"] in ("TP1","TP2","TP3"))
-    sw2= sum(1 for t in shorts if t["result"] in ("TP1","TP2","TP3"))
+    """Общая статистика для /stats — чтение готовых агрегатов из user_stats."""
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM user_stats WHERE user_id=? AND strategy='ALL'"
+            " AND period IN ('all', ?, ?, ?)",
+            (user_id, *_stats_periods(time.time())[1:]),
+        ) as cur:
+            rows = {r["period"]: dict(r) for r in await cur.fetchall()}
+        a = rows.get("all")
+        if not a or a["total"] <= 0:
+            return {}
+        async with db.execute(
+            "SELECT symbol, wins, total FROM user_stats_symbols WHERE user_id=?"
+            " ORDER BY CASE WHEN total >= 2 THEN CAST(wins AS REAL) / total ELSE 0 END DESC"
+            " LIMIT 5",
+            (user_id,),
+        ) as cur:
+            best = [(r["symbol"], {"wins": r["wins"], "total": r["total"]})
+                    for r in await cur.fetchall()]
 
+    total = a["total"]
     return {
-        "total": total, "wins": len(wins), "losses": len(losses),
-        "winrate": winrate, "avg_rr": avg_rr, "total_rr": total_rr,
-        "streak_w": sw, "streak_l": sl, "best_symbols": best,
-        "longs_total": len(longs),   "longs_wins": lw,
-        "shorts_total": len(shorts), "shorts_wins": sw2,
-        "tp1_cnt": sum(1 for t in wins if t["result"] == "TP1"),
-        "tp2_cnt": sum(1 for t in wins if t["result"] == "TP2"),
-        "tp3_cnt": sum(1 for t in wins if t["result"] == "TP3"),
+        "total": total, "wins": a["wins"], "losses": a["losses"],
+        "winrate": a["wins"] / total * 100, "avg_rr": a["total_rr"] / total,
+        "total_rr": a["total_rr"],
+        "streak_w": a["streak_w"], "streak_l": a["streak_l"], "best_symbols": best,
+        "longs_total": a["longs"],   "longs_wins": a["longs_w"],
+        "shorts_total": a["shorts"], "shorts_wins": a["shorts_w"],
+        "tp1_cnt": a["tp1_cnt"], "tp2_cnt": a["tp2_cnt"], "tp3_cnt": a["tp3_cnt"],
+        # текущие день / неделя / месяц (UTC)
+        "periods": {p[0]: _strategy_stats(rows[p]) for p in rows if p != "all"},
     }
 
 
-def _strategy_stats(trades: list[dict]) -> dict:
-    """Вычисляет статистику для набора сделок одной стратегии."""
-    if not trades:
+def _strategy_stats(row: Optional[dict]) -> dict:
+    """Строка user_stats → формат статистики стратегии (пустой dict если сделок нет)."""
+    if not row or row["total"] <= 0:
         return {}
-    wins   = [t for t in trades if t["result"] in ("TP1", "TP2", "TP3")]
-    losses = [t for t in trades if t["result"] == "SL"]
-    total  = len(trades)
-    total_rr = sum(t["result_rr"] for t in trades)
+    total = row["total"]
     return {
         "total":    total,
-        "wins":     len(wins),
-        "losses":   len(losses),
-        "be_cnt":   sum(1 for t in trades if t["result"] == "BE"),
-        "winrate":  len(wins) / total * 100 if total else 0.0,
-        "avg_rr":   total_rr / total if total else 0.0,
-        "total_rr": total_rr,
-        "tp1_cnt":  sum(1 for t in wins if t["result"] == "TP1"),
-        "tp2_cnt":  sum(1 for t in wins if t["result"] == "TP2"),
-        "tp3_cnt":  sum(1 for t in wins if t["result"] == "TP3"),
-        "longs":    sum(1 for t in trades if t["direction"] == "LONG"),
-        "shorts":   sum(1 for t in trades if t["direction"] == "SHORT"),
-        "longs_w":  sum(1 for t in trades if t["direction"] == "LONG"  and t["result"] in ("TP1","TP2","TP3")),
-        "shorts_w": sum(1 for t in trades if t["direction"] == "SHORT" and t["result"] in ("TP1","TP2","TP3")),
+        "wins":     row["wins"],
+        "losses":   row["losses"],
+        "be_cnt":   row["be_cnt"],
+        "winrate":  row["wins"] / total * 100,
+        "avg_rr":   row["total_rr"] / total,
+        "total_rr": row["total_rr"],
+        "tp1_cnt":  row["tp1_cnt"],
+        "tp2_cnt":  row["tp2_cnt"],
+        "tp3_cnt":  row["tp3_cnt"],
+        "longs":    row["longs"],
+        "shorts":   row["shorts"],
+        "longs_w":  row["longs_w"],
+        "shorts_w": row["shorts_w"],
     }
 
 
@@ -864,18 +1492,161 @@ async def db_get_user_stats_by_strategy(user_id: int) -> dict:
       GERCHIK → breakout_type = 'ГЕРЧИК'
       LEVELS  → всё остальное
     """
-    trades = await db_get_user_trades(user_id)
-    smc     = [t for t in trades if t.get("breakout_type") == "SMC"]
-    gerchik = [t for t in trades if t.get("breakout_type") == "ГЕРЧИК"]
-    levels  = [t for t in trades if t.get("breakout_type") not in ("SMC", "ГЕРЧИК")]
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM user_stats WHERE user_id=? AND period='all'", (user_id,)
+        ) as cur:
+            rows = {r["strategy"]: dict(r) for r in await cur.fetchall()}
+    return {k: _strategy_stats(rows.get(k)) for k in ("LEVELS", "SMC", "GERCHIK", "ALL")}
+
+
+async def db_get_user_stats_buckets(user_id: int, kind: str = "d", limit: int = 30,
+                                    strategy: str = "ALL") -> list[tuple[str, dict]]:
+    """Последние limit корзин периода kind ('d' / 'w' / 'm'), от новых к старым."""
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM user_stats WHERE user_id=? AND strategy=?"
+            " AND period > ? AND period < ? ORDER BY period DESC LIMIT ?",
+            (user_id, strategy, kind + ":", kind + ";", limit),
+        ) as cur:
+            rows = await cur.fetchall()
+    return [(r["period"][2:], _strategy_stats(dict(r))) for r in rows]
+
+
+def _stats_periods(ts: float) -> tuple:
+    """Ключи period для сделки, закрытой в ts — как в _stats_triggers_sql."""
+    t = time.gmtime(ts)
+    return ("all", time.strftime("d:%Y-%m-%d", t),
+            time.strftime("w:%Y-%W", t), time.strftime("m:%Y-%m", t))
+
+
+async def _user_stats_rebuild(db, apply: bool = True) -> dict:
+    """
+    Пересчитать user_stats / user_stats_symbols из истории trades на
+    соединении db (вызывающий держит write-доступ). apply=False — только
+    сравнить с текущими таблицами.
+    """
+    want: dict = {}
+    syms: dict = {}
+    n = 0
+    async with db.execute(
+        "SELECT user_id, symbol, direction, breakout_type, result, result_rr,"
+        " closed_at, created_at FROM trades_all"   # вместе с архивом
+        f" WHERE result {_STATS_COUNTED}"
+        " ORDER BY user_id, COALESCE(NULLIF(closed_at, 0), created_at, 0), trade_id"
+    ) as cur:
+        async for uid, sym, direction, bt, res, rr, closed, created in cur:
+            n += 1
+            win = res in ("TP1", "TP2", "TP3")
+            strat = {"SMC": "SMC", "ГЕРЧИК": "GERCHIK"}.get(bt, "LEVELS")
+            for period in _stats_periods(closed or created or 0):
+                for s in ("ALL", strat):
+                    r = want.get((uid, s, period))
+                    if r is None:
+                        r = want[(uid, s, period)] = dict.fromkeys(_STATS_COLS, 0)
+                    r["total"]    += 1
+                    r["wins"]     += win
+                    r["losses"]   += res == "SL"
+                    r["be_cnt"]   += res == "BE"
+                    r["tp1_cnt"]  += res == "TP1"
+                    r["tp2_cnt"]  += res == "TP2"
+                    r["tp3_cnt"]  += res == "TP3"
+                    r["longs"]    += direction == "LONG"
+                    r["longs_w"]  += direction == "LONG" and win
+                    r["shorts"]   += direction == "SHORT"
+                    r["shorts_w"] += direction == "SHORT" and win
+                    r["total_rr"] += rr or 0
+                    r["cur_w"] = r["cur_w"] + 1 if win else 0
+                    r["cur_l"] = 0 if win else r["cur_l"] + 1
+                    r["streak_w"] = max(r["streak_w"], r["cur_w"])
+                    r["streak_l"] = max(r["streak_l"], r["cur_l"])
+            sr = syms.setdefault((uid, sym), [0, 0])
+            sr[0] += 1
+            sr[1] += win
+
+    have: dict = {}
+    async with db.execute(
+        f"SELECT user_id, strategy, period, {', '.join(_STATS_COLS)} FROM user_stats"
+    ) as cur:
+        async for row in cur:
+            have[tuple(row[:3])] = dict(zip(_STATS_COLS, row[3:]))
+    async with db.execute("SELECT user_id, symbol, total, wins FROM user_stats_symbols") as cur:
+        have_syms = {(r[0], r[1]): [r[2], r[3]] async for r in cur}
+
+    def same(a, b):
+        return all(abs((a.get(c) or 0) - (b.get(c) or 0)) < 1e-6 for c in _STATS_COLS)
+
+    empty = dict.fromkeys(_STATS_COLS, 0)
+    mismatched = sorted(
+        k for k in want.keys() | have.keys()
+        if not same(want.get(k, empty), have.get(k, empty))
+    )
+    mismatched += sorted(
+        k for k in syms.keys() | have_syms.keys()
+        if syms.get(k, [0, 0]) != have_syms.get(k, [0, 0])
+    )
+
+    if apply:
+        await db.execute("DELETE FROM user_stats")
+        await db.execute("DELETE FROM user_stats_symbols")
+        await db.executemany(
+            f"INSERT INTO user_stats (user_id, strategy, period, {', '.join(_STATS_COLS)})"
+            f" VALUES (?, ?, ?{', ?' * len(_STATS_COLS)})",
+            [(*k, *(r[c] for c in _STATS_COLS)) for k, r in want.items()],
+        )
+        await db.executemany(
+            "INSERT INTO user_stats_symbols (user_id, symbol, total, wins) VALUES (?, ?, ?, ?)",
+            [(*k, t, w) for k, (t, w) in syms.items()],
+        )
+        await db.commit()
     return {
-        "LEVELS":  _strategy_stats(levels),
-        "SMC":     _strategy_stats(smc),
-        "GERCHIK": _strategy_stats(gerchik),
-        "ALL":     _strategy_stats(trades),
+        "trades": n, "rows": len(want), "symbols": len(syms),
+        "mismatched": len(mismatched), "examples": mismatched[:10],
     }
 
 
+async def db_user_stats_rebuild(verify_only: bool = False) -> dict:
+    """
+    Пересобрать user_stats из истории и сверить со старыми значениями.
+
+    Возвращает {"trades", "rows", "symbols", "mismatched", "examples"} —
+    mismatched > 0 значит, что инкрементальные счётчики разошлись с историей
+    (например, результат закрытой сделки переписали); при verify_only=False
+    таблица уже исправлена.
+    """
+    await flush_writes()   # всё из очереди группового коммита — в trades
+    async with _write() as db:
+        return await _user_stats_rebuild(db, apply=not verify_only)
+
+
+
+async def db_user_stats_check() -> dict:
+    """
+    Дешёвая сверка user_stats с историей: число закрытых сделок и побед
+    в trades_all против сумм строк ('ALL', 'all'). Серии и разбивку по
+    периодам не проверяет — для этого db_user_stats_rebuild(verify_only=True).
+    Возвращает {"trades", "wins", "stats_total", "stats_wins", "ok"}.
+    """
+    await flush_writes()
+    async with _read() as db:
+        async with db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(result IN ('TP1','TP2','TP3')), 0)"
+            f" FROM trades_all WHERE result {_STATS_COUNTED}"
+        ) as cur:
+            trades, wins = await cur.fetchone()
+        async with db.execute(
+            "SELECT COALESCE(SUM(total), 0), COALESCE(SUM(wins), 0) FROM user_stats"
+            " WHERE strategy='ALL' AND period='all'"
+        ) as cur:
+            stats_total, stats_wins = await cur.fetchone()
+    return {
+        "trades": trades, "wins": wins,
+        "stats_total": stats_total, "stats_wins": stats_wins,
+        "ok": (trades, wins) == (stats_total, stats_wins),
+    }
+
 # ── Алиасы для handlers.py ──────────────────────────────────────────────────
 
 async def get_user_stats(user_id: int) -> dict:
@@ -914,10 +1685,9 @@ async def update_signal_tp(signal_id, *, tp1=None, tp2=None, tp3=None):
         return
     set_clause = ", ".join(f"{k}=?" for k in updates)
     vals = list(updates.values()) + [str(signal_id)]
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(f"UPDATE trades SET {set_clause} WHERE trade_id=?", vals)
-            await db.commit()
+    async with _write() as db:
+        await db.execute(f"UPDATE trades SET {set_clause} WHERE trade_id=?", vals)
+        await db.commit()
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -925,7 +1695,7 @@ async def update_signal_tp(signal_id, *, tp1=None, tp2=None, tp3=None):
 # ═══════════════════════════════════════════════════════════════════════════════
 
 async def db_pd_get_user(user_id: int) -> Optional[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM pd_users WHERE user_id=?", (user_id,)
@@ -936,28 +1706,27 @@ async def db_pd_get_user(user_id: int) -> Optional[dict]:
 
 async def db_pd_upsert_user(user_id: int, subscribed: bool = None, threshold: int = None):
     from pump_dump.pd_config import DEFAULT_USER_THRESHOLD
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
+    async with _write() as db:
+        await db.execute(
+            "INSERT INTO pd_users(user_id, pd_threshold) VALUES(?,?) ON CONFLICT(user_id) DO NOTHING",
+            (user_id, DEFAULT_USER_THRESHOLD)
+        )
+        if subscribed is not None:
             await db.execute(
-                "INSERT INTO pd_users(user_id, pd_threshold) VALUES(?,?) ON CONFLICT(user_id) DO NOTHING",
-                (user_id, DEFAULT_USER_THRESHOLD)
+                "UPDATE pd_users SET pd_subscribed=? WHERE user_id=?",
+                (int(subscribed), user_id)
             )
-            if subscribed is not None:
-                await db.execute(
-                    "UPDATE pd_users SET pd_subscribed=? WHERE user_id=?",
-                    (int(subscribed), user_id)
-                )
-            if threshold is not None:
-                await db.execute(
-                    "UPDATE pd_users SET pd_threshold=? WHERE user_id=?",
-                    (threshold, user_id)
-                )
-            await db.commit()
+        if threshold is not None:
+            await db.execute(
+                "UPDATE pd_users SET pd_threshold=? WHERE user_id=?",
+                (threshold, user_id)
+            )
+        await db.commit()
 
 
 async def db_pd_subscribers(min_threshold: int = 0) -> list[int]:
     """Возвращает user_id всех подписанных с threshold <= score."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT user_id FROM pd_users WHERE pd_subscribed=1 AND pd_threshold<=?",
             (min_threshold,)
@@ -966,57 +1735,54 @@ async def db_pd_subscribers(min_threshold: int = 0) -> list[int]:
     return [r[0] for r in rows]
 
 
+async def db_pd_all_users() -> list[tuple]:
+    """(user_id, pd_subscribed, pd_threshold) всех строк — для индекса подписчиков."""
+    async with _read() as db:
+        async with db.execute(
+            "SELECT user_id, pd_subscribed, pd_threshold FROM pd_users"
+        ) as cur:
+            return [tuple(r) for r in await cur.fetchall()]
+
+
 async def db_pd_save_signal(
     symbol: str, direction: str, score: float,
     layers_json: str, features_json: str, price: float
 ) -> int:
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            cur = await db.execute(
-                "INSERT INTO pd_signals(symbol,direction,score,layers_json,features_json,price_signal,ts)"
-                " VALUES(?,?,?,?,?,?,?)",
-                (symbol, direction, score, layers_json, features_json, price, time.time())
-            )
-            await db.commit()
-            return cur.lastrowid
+    return await _grouped(
+        "INSERT INTO pd_signals(symbol,direction,score,layers_json,features_json,price_signal,ts)"
+        " VALUES(?,?,?,?,?,?,?)",
+        (symbol, direction, score, layers_json, features_json, price, time.time()),
+        want_id=True,
+    )
 
 
 async def db_pd_save_outcome(
     signal_id: int, price_signal: float,
     price_15m: float, change_pct: float, correct: bool
 ):
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT INTO pd_outcomes(signal_id,price_signal,price_15m,change_pct,correct,ts)"
-                " VALUES(?,?,?,?,?,?)",
-                (signal_id, price_signal, price_15m, change_pct, int(correct), time.time())
-            )
-            await db.commit()
+    # Аналитика: ждать коммита не нужно
+    _grouped(
+        "INSERT INTO pd_outcomes(signal_id,price_signal,price_15m,change_pct,correct,ts)"
+        " VALUES(?,?,?,?,?,?)",
+        (signal_id, price_signal, price_15m, change_pct, int(correct), time.time()),
+        wait=False,
+    )
 
 
 async def db_pd_save_train(signal_id: int, label: int):
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            # Берём features из pd_signals
-            async with db.execute(
-                "SELECT features_json FROM pd_signals WHERE id=?", (signal_id,)
-            ) as cur:
-                row = await cur.fetchone()
-            if not row:
-                return
-            await db.execute(
-                "INSERT INTO pd_train_data(signal_id,features_json,actual_label,ts)"
-                " VALUES(?,?,?,?)",
-                (signal_id, row[0], label, time.time())
-            )
-            await db.commit()
+    # features берём из pd_signals тем же запросом — нет сигнала, нет строки
+    _grouped(
+        "INSERT INTO pd_train_data(signal_id,features_json,actual_label,ts)"
+        " SELECT id, features_json, ?, ? FROM pd_signals WHERE id=?",
+        (label, time.time(), signal_id),
+        wait=False,
+    )
 
 
 async def db_pd_pending_outcomes() -> list[dict]:
     """Сигналы старше 15 мин без исхода (для fallback трекинга)."""
     cutoff = time.time() - 900
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT s.id, s.symbol, s.direction, s.price_signal "
@@ -1035,7 +1801,7 @@ async def db_pd_stats() -> dict:
     day  = now - 86400
     week = now - 604800
 
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT COUNT(*), SUM(correct) FROM pd_outcomes WHERE ts >= ?", (day,)
         ) as cur:
@@ -1061,50 +1827,35 @@ async def db_pd_stats() -> dict:
 
 
 async def db_pd_recent_signals(limit: int = 10) -> list[dict]:
-    """Последние N сигналов с исходами для истории."""
-    async with aiosqlite.connect(_db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute(
-            """
-            SELECT s.id, s.symbol, s.direction, s.score, s.price_signal AS price,
-                   s.ts AS created_at, o.correct
-            FROM pd_signals s
-            LEFT JOIN pd_outcomes o ON o.signal_id = s.id
-            ORDER BY s.ts DESC
-            LIMIT ?
-            """,
-            (limit,)
-        ) as cur:
-            rows = await cur.fetchall()
-    return [dict(r) for r in rows]
+    """Последние N сигналов с исходами для истории (первая страница db_pd_signals_page)."""
+    rows, _ = await db_pd_signals_page(None, limit)
+    return rows
 
 
 async def poly_watchlist_add(user_id: int, market_id: str, question: str):
     """Добавляет маркет в список наблюдения. Дублирование игнорируется."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT OR IGNORE INTO poly_watchlist(user_id, market_id, question, added_at)"
-                " VALUES(?,?,?,?)",
-                (user_id, market_id, question, time.time())
-            )
-            await db.commit()
-
-
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO poly_watchlist(user_id, market_id, question, added_at)"
+            " VALUES(?,?,?,?)",
+            (user_id, market_id, question, time.time())
+        )
+        await db.commit()
+
+
 async def poly_watchlist_remove(user_id: int, market_id: str):
     """Удаляет маркет из списка наблюдения."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "DELETE FROM poly_watchlist WHERE user_id=? AND market_id=?",
-                (user_id, market_id)
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "DELETE FROM poly_watchlist WHERE user_id=? AND market_id=?",
+            (user_id, market_id)
+        )
+        await db.commit()
 
 
 async def poly_watchlist_get(user_id: int) -> list[dict]:
     """Возвращает список маркетов наблюдения пользователя (новейшие первыми)."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT id, market_id, question, added_at FROM poly_watchlist"
@@ -1117,7 +1868,7 @@ async def poly_watchlist_get(user_id: int) -> list[dict]:
 
 async def poly_watchlist_has(user_id: int, market_id: str) -> bool:
     """Возвращает True если маркет уже в списке наблюдения."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT 1 FROM poly_watchlist WHERE user_id=? AND market_id=?",
             (user_id, market_id)
@@ -1131,31 +1882,29 @@ async def poly_watchlist_has(user_id: int, market_id: str) -> bool:
 
 async def db_promo_create(code: str, created_by: int, duration_hours: int = 2):
     code = code.strip().upper()
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT OR REPLACE INTO promo_codes(code, created_by, created_at, duration_hours)"
-                " VALUES(?, ?, ?, ?)",
-                (code, created_by, time.time(), duration_hours)
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO promo_codes(code, created_by, created_at, duration_hours)"
+            " VALUES(?, ?, ?, ?)",
+            (code, created_by, time.time(), duration_hours)
+        )
+        await db.commit()
 
 
 async def db_promo_delete(code: str) -> bool:
     """Удаляет промокод. Возвращает True если он существовал."""
     code = code.strip().upper()
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            cur = await db.execute(
-                "DELETE FROM promo_codes WHERE code=?", (code,)
-            )
-            await db.commit()
-            return cur.rowcount > 0
+    async with _write() as db:
+        cur = await db.execute(
+            "DELETE FROM promo_codes WHERE code=?", (code,)
+        )
+        await db.commit()
+        return cur.rowcount > 0
 
 
 async def db_promo_list() -> list:
     """Список всех активных промокодов."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT code, created_by, duration_hours, created_at FROM promo_codes ORDER BY created_at DESC"
@@ -1170,28 +1919,27 @@ async def db_promo_validate_and_use(user_id: int, code: str) -> tuple:
     Возвращает (success: bool, message: str, duration_hours: int).
     """
     code = code.strip().upper()
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            # Код существует?
-            async with db.execute(
-                "SELECT duration_hours FROM promo_codes WHERE code=?", (code,)
-            ) as cur:
-                promo_row = await cur.fetchone()
-            if not promo_row:
-                return False, "❌ Промокод не найден или уже удалён", 0
-            # Пользователь уже использовал промокод?
-            async with db.execute(
-                "SELECT user_id FROM promo_uses WHERE user_id=?", (user_id,)
-            ) as cur:
-                used_row = await cur.fetchone()
-            if used_row:
-                return False, "❌ Вы уже использовали промокод ранее", 0
-            hours = promo_row[0]
-            await db.execute(
-                "INSERT INTO promo_uses(user_id, code, used_at) VALUES(?, ?, ?)",
-                (user_id, code, time.time())
-            )
-            await db.commit()
+    async with _write() as db:
+        # Код существует?
+        async with db.execute(
+            "SELECT duration_hours FROM promo_codes WHERE code=?", (code,)
+        ) as cur:
+            promo_row = await cur.fetchone()
+        if not promo_row:
+            return False, "❌ Промокод не найден или уже удалён", 0
+        # Пользователь уже использовал промокод?
+        async with db.execute(
+            "SELECT user_id FROM promo_uses WHERE user_id=?", (user_id,)
+        ) as cur:
+            used_row = await cur.fetchone()
+        if used_row:
+            return False, "❌ Вы уже использовали промокод ранее", 0
+        hours = promo_row[0]
+        await db.execute(
+            "INSERT INTO promo_uses(user_id, code, used_at) VALUES(?, ?, ?)",
+            (user_id, code, time.time())
+        )
+        await db.commit()
     return True, f"✅ Промокод активирован! Доступ на {hours} ч.", hours
 
 
@@ -1204,19 +1952,18 @@ async def db_ref_set(referred_id: int, referrer_id: int) -> bool:
     Записывает реферала. Возвращает True если запись новая
     (чтобы не перезаписывать, если пользователь уже был приглашён кем-то).
     """
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            async with db.execute(
-                "SELECT referred_id FROM referrals WHERE referred_id=?", (referred_id,)
-            ) as cur:
-                exists = await cur.fetchone()
-            if exists:
-                return False
-            await db.execute(
-                "INSERT INTO referrals(referred_id, referrer_id, joined_at) VALUES(?,?,?)",
-                (referred_id, referrer_id, time.time())
-            )
-            await db.commit()
+    async with _write() as db:
+        async with db.execute(
+            "SELECT referred_id FROM referrals WHERE referred_id=?", (referred_id,)
+        ) as cur:
+            exists = await cur.fetchone()
+        if exists:
+            return False
+        await db.execute(
+            "INSERT INTO referrals(referred_id, referrer_id, joined_at) VALUES(?,?,?)",
+            (referred_id, referrer_id, time.time())
+        )
+        await db.commit()
     return True
 
 
@@ -1226,27 +1973,26 @@ async def db_ref_on_purchase(referred_id: int) -> Optional[tuple]:
     Помечает реферал как конвертированный.
     Возвращает (referrer_id, total_conversions) или None если реферала нет.
     """
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            async with db.execute(
-                "SELECT referrer_id, converted FROM referrals WHERE referred_id=?",
-                (referred_id,)
-            ) as cur:
-                row = await cur.fetchone()
-            if not row or row[1]:  # нет реферала или уже отмечен
-                return None
-            referrer_id = row[0]
-            await db.execute(
-                "UPDATE referrals SET converted=1, converted_at=? WHERE referred_id=?",
-                (time.time(), referred_id)
-            )
-            await db.commit()
-            async with db.execute(
-                "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND converted=1",
-                (referrer_id,)
-            ) as cur:
-                cnt_row = await cur.fetchone()
-            total = cnt_row[0] if cnt_row else 0
+    async with _write() as db:
+        async with db.execute(
+            "SELECT referrer_id, converted FROM referrals WHERE referred_id=?",
+            (referred_id,)
+        ) as cur:
+            row = await cur.fetchone()
+        if not row or row[1]:  # нет реферала или уже отмечен
+            return None
+        referrer_id = row[0]
+        await db.execute(
+            "UPDATE referrals SET converted=1, converted_at=? WHERE referred_id=?",
+            (time.time(), referred_id)
+        )
+        await db.commit()
+        async with db.execute(
+            "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND converted=1",
+            (referrer_id,)
+        ) as cur:
+            cnt_row = await cur.fetchone()
+        total = cnt_row[0] if cnt_row else 0
     return referrer_id, total
 
 
@@ -1255,32 +2001,31 @@ async def db_ref_check_and_claim_reward(referrer_id: int) -> bool:
     Проверяет, положена ли реферу награда (каждые 5 конверсий = +30 дней).
     Если да — записывает награду и возвращает True.
     """
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            async with db.execute(
-                "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND converted=1",
-                (referrer_id,)
-            ) as cur:
-                row = await cur.fetchone()
-            conv_count = row[0] if row else 0
-            async with db.execute(
-                "SELECT COUNT(*) FROM ref_rewards WHERE user_id=?", (referrer_id,)
-            ) as cur:
-                row2 = await cur.fetchone()
-            rew_count = row2[0] if row2 else 0
-            if conv_count // 5 > rew_count:
-                await db.execute(
-                    "INSERT INTO ref_rewards(user_id, given_at) VALUES(?, ?)",
-                    (referrer_id, time.time())
-                )
-                await db.commit()
-                return True
+    async with _write() as db:
+        async with db.execute(
+            "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND converted=1",
+            (referrer_id,)
+        ) as cur:
+            row = await cur.fetchone()
+        conv_count = row[0] if row else 0
+        async with db.execute(
+            "SELECT COUNT(*) FROM ref_rewards WHERE user_id=?", (referrer_id,)
+        ) as cur:
+            row2 = await cur.fetchone()
+        rew_count = row2[0] if row2 else 0
+        if conv_count // 5 > rew_count:
+            await db.execute(
+                "INSERT INTO ref_rewards(user_id, given_at) VALUES(?, ?)",
+                (referrer_id, time.time())
+            )
+            await db.commit()
+            return True
     return False
 
 
 async def db_ref_stats(user_id: int) -> dict:
     """Статистика реферальной программы для пользователя."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT COUNT(*), SUM(converted) FROM referrals WHERE referrer_id=?",
             (user_id,)
@@ -1307,14 +2052,14 @@ async def db_ref_stats(user_id: int) -> dict:
 # ── KV-хранилище (общие настройки бота) ──────────────────────────────────
 
 async def db_kv_get(key: str) -> Optional[str]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute("SELECT value FROM kv WHERE key=?", (key,)) as cur:
             row = await cur.fetchone()
             return row[0] if row else None
 
 
 async def db_kv_set(key: str, value: str):
-    async with aiosqlite.connect(_db_path) as db:
+    async with _write() as db:
         await db.execute(
             "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value)
         )
@@ -1327,7 +2072,7 @@ async def db_kv_set(key: str, value: str):
 # ═══════════════════════════════════════════════════════════════════════════════
 
 async def poly_get_settings(user_id: int) -> dict:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM poly_settings WHERE user_id=?", (user_id,)
@@ -1337,46 +2082,41 @@ async def poly_get_settings(user_id: int) -> dict:
 
 
 async def poly_save_settings(user_id: int, default_bet: float):
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT INTO poly_settings(user_id, default_bet, created_at) VALUES(?,?,?) "
-                "ON CONFLICT(user_id) DO UPDATE SET default_bet=excluded.default_bet",
-                (user_id, default_bet, time.time()),
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT INTO poly_settings(user_id, default_bet, created_at) VALUES(?,?,?) "
+            "ON CONFLICT(user_id) DO UPDATE SET default_bet=excluded.default_bet",
+            (user_id, default_bet, time.time()),
+        )
+        await db.commit()
 
 
 async def poly_save_digest(user_id: int, digest_on: int):
     """Сохраняет настройку дайджеста (0 или 1)."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT INTO poly_settings(user_id, default_bet, digest_on, created_at) VALUES(?,5.0,?,?) "
-                "ON CONFLICT(user_id) DO UPDATE SET digest_on=excluded.digest_on",
-                (user_id, digest_on, time.time()),
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT INTO poly_settings(user_id, default_bet, digest_on, created_at) VALUES(?,5.0,?,?) "
+            "ON CONFLICT(user_id) DO UPDATE SET digest_on=excluded.digest_on",
+            (user_id, digest_on, time.time()),
+        )
+        await db.commit()
 
 
 async def poly_save_bet(
     user_id: int, market_id: str, question: str, side: str,
     amount: float, shares: float, price: float, order_id: str,
 ) -> int:
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            cur = await db.execute(
-                "INSERT INTO poly_bets"
-                "(user_id, market_id, question, side, amount_usdc, shares, price, order_id, created_at)"
-                " VALUES(?,?,?,?,?,?,?,?,?)",
-                (user_id, market_id, question, side, amount, shares, price, order_id, time.time()),
-            )
-            await db.commit()
-            return cur.lastrowid
+    return await _grouped(
+        "INSERT INTO poly_bets"
+        "(user_id, market_id, question, side, amount_usdc, shares, price, order_id, created_at)"
+        " VALUES(?,?,?,?,?,?,?,?,?)",
+        (user_id, market_id, question, side, amount, shares, price, order_id, time.time()),
+        want_id=True,
+    )
 
 
 async def poly_get_bets(user_id: int, limit: int = 10) -> list[dict]:
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM poly_bets WHERE user_id=? ORDER BY created_at DESC LIMIT ?",
@@ -1392,7 +2132,7 @@ async def poly_get_bets(user_id: int, limit: int = 10) -> list[dict]:
 
 async def poly_wallet_get(user_id: int) -> Optional[dict]:
     """Возвращает кошелёк пользователя или None если не создан."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM poly_wallets WHERE user_id=?", (user_id,)
@@ -1403,14 +2143,13 @@ async def poly_wallet_get(user_id: int) -> Optional[dict]:
 
 async def poly_wallet_create(user_id: int, address: str, encrypted_key: str):
     """Сохраняет новый кошелёк пользователя."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT OR IGNORE INTO poly_wallets(user_id, address, encrypted_key, created_at)"
-                " VALUES(?,?,?,?)",
-                (user_id, address, encrypted_key, time.time()),
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO poly_wallets(user_id, address, encrypted_key, created_at)"
+            " VALUES(?,?,?,?)",
+            (user_id, address, encrypted_key, time.time()),
+        )
+        await db.commit()
     _request_turso_push()
 
 
@@ -1420,14 +2159,13 @@ async def poly_wallet_restore(user_id: int, address: str, encrypted_key: str):
     Используется для восстановления из Turso после редеплоя.
     В отличие от poly_wallet_create, перезаписывает существующую запись.
     """
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "INSERT OR REPLACE INTO poly_wallets(user_id, address, encrypted_key, created_at)"
-                " VALUES(?,?,?,?)",
-                (user_id, address, encrypted_key, time.time()),
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR REPLACE INTO poly_wallets(user_id, address, encrypted_key, created_at)"
+            " VALUES(?,?,?,?)",
+            (user_id, address, encrypted_key, time.time()),
+        )
+        await db.commit()
     _request_turso_push()
 
 
@@ -1440,20 +2178,19 @@ async def poly_alert_add(
     yes_price: float, threshold: float,
 ) -> int:
     """Создаёт ценовой алерт. Возвращает id."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            cur = await db.execute(
-                "INSERT INTO poly_alerts(user_id, market_id, question, yes_price, threshold, created_at)"
-                " VALUES(?,?,?,?,?,?)",
-                (user_id, market_id, question, yes_price, threshold, time.time()),
-            )
-            await db.commit()
-            return cur.lastrowid
+    async with _write() as db:
+        cur = await db.execute(
+            "INSERT INTO poly_alerts(user_id, market_id, question, yes_price, threshold, created_at)"
+            " VALUES(?,?,?,?,?,?)",
+            (user_id, market_id, question, yes_price, threshold, time.time()),
+        )
+        await db.commit()
+        return cur.lastrowid
 
 
 async def poly_alert_get_user(user_id: int) -> list[dict]:
     """Все активные алерты пользователя."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM poly_alerts WHERE user_id=? AND active=1 ORDER BY created_at DESC",
@@ -1465,17 +2202,16 @@ async def poly_alert_get_user(user_id: int) -> list[dict]:
 
 async def poly_alert_delete(alert_id: int):
     """Деактивирует алерт."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
-            await db.execute(
-                "UPDATE poly_alerts SET active=0 WHERE id=?", (alert_id,)
-            )
-            await db.commit()
+    async with _write() as db:
+        await db.execute(
+            "UPDATE poly_alerts SET active=0 WHERE id=?", (alert_id,)
+        )
+        await db.commit()
 
 
 async def poly_alerts_all_active() -> list[dict]:
     """Все активные алерты всех пользователей (для планировщика)."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         db.row_factory = aiosqlite.Row
         async with db.execute(
             "SELECT * FROM poly_alerts WHERE active=1"
@@ -1490,7 +2226,7 @@ async def poly_alerts_all_active() -> list[dict]:
 
 async def poly_digest_sent_today(user_id: int, date: str) -> bool:
     """Проверяет, был ли дайджест отправлен сегодня."""
-    async with aiosqlite.connect(_db_path) as db:
+    async with _read() as db:
         async with db.execute(
             "SELECT 1 FROM poly_digest_log WHERE user_id=? AND date=?", (user_id, date)
         ) as cur:
@@ -1499,10 +2235,585 @@ async def poly_digest_sent_today(user_id: int, date: str) -> bool:
 
 async def poly_digest_mark_sent(user_id: int, date: str):
     """Помечает дайджест как отправленный."""
-    async with _get_lock():
-        async with aiosqlite.connect(_db_path) as db:
+    async with _write() as db:
+        await db.execute(
+            "INSERT OR IGNORE INTO poly_digest_log(user_id, date) VALUES(?,?)",
+            (user_id, date),
+        )
+        await db.commit()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  ШАРДИРОВАНИЕ — OUTBOX
+# ═══════════════════════════════════════════════════════════════════════════════
+
+async def db_outbox_put(shard: int, chat_id: int, payload: str):
+    """Кладёт сообщение воркера в очередь на отправку."""
+    await _grouped(
+        "INSERT INTO shard_outbox(shard, chat_id, payload, created_at)"
+        " VALUES(?,?,?,?)",
+        (shard, chat_id, payload, time.time()),
+    )
+
+
+async def db_outbox_fetch(limit: int = 50, after: int = 0) -> list[dict]:
+    """Самые старые неотправленные сообщения с id > after (FIFO)."""
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM shard_outbox WHERE id > ? ORDER BY id LIMIT ?", (after, limit)
+        ) as cur:
+            rows = await cur.fetchall()
+            return [dict(r) for r in rows]
+
+
+async def db_outbox_delete(ids: list[int]):
+    if not ids:
+        return
+    marks = ",".join("?" * len(ids))
+    async with _write() as db:
+        await db.execute(f"DELETE FROM shard_outbox WHERE id IN ({marks})", ids)
+        await db.commit()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  РАССЫЛКИ АДМИНА
+# ═══════════════════════════════════════════════════════════════════════════════
+
+async def db_bc_create(admin_id: int, text: str, user_ids: list[int],
+                       progress_chat: int = 0, progress_msg: int = 0) -> int:
+    """Создаёт задание рассылки и строки получателей одной транзакцией."""
+    now = time.time()
+    async with _write() as db:
+        cur = await db.execute(
+            "INSERT INTO broadcast_jobs(admin_id, text, total, progress_chat,"
+            " progress_msg, created_at) VALUES(?,?,?,?,?,?)",
+            (admin_id, text, len(user_ids), progress_chat, progress_msg, now),
+        )
+        job_id = cur.lastrowid
+        await db.executemany(
+            "INSERT OR IGNORE INTO broadcast_recipients(job_id, user_id, updated_at)"
+            " VALUES(?,?,?)",
+            [(job_id, uid, now) for uid in user_ids],
+        )
+        await db.commit()
+    return job_id
+
+
+async def db_bc_get(job_id: int) -> Optional[dict]:
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM broadcast_jobs WHERE id=?", (job_id,)
+        ) as cur:
+            row = await cur.fetchone()
+            return dict(row) if row else None
+
+
+async def db_bc_running() -> list[dict]:
+    """Незавершённые рассылки — для продолжения после рестарта."""
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(
+            "SELECT * FROM broadcast_jobs WHERE status='running' ORDER BY id"
+        ) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+
+async def db_bc_recover(job_id: int) -> int:
+    """
+    Строки 'sending' остались от прерванного запуска: доставлены они или нет,
+    неизвестно. Помечаем 'unknown' и не шлём повторно — без дублей.
+    """
+    async with _write() as db:
+        cur = await db.execute(
+            "UPDATE broadcast_recipients SET status='unknown', updated_at=?"
+            " WHERE job_id=? AND status='sending'",
+            (time.time(), job_id),
+        )
+        await db.commit()
+        return cur.rowcount
+
+
+async def db_bc_claim(job_id: int, limit: int) -> list[int]:
+    """Берёт следующую пачку получателей: pending → sending."""
+    async with _write() as db:
+        async with db.execute(
+            "SELECT user_id FROM broadcast_recipients"
+            " WHERE job_id=? AND status='pending' ORDER BY user_id LIMIT ?",
+            (job_id, limit),
+        ) as cur:
+            ids = [r[0] for r in await cur.fetchall()]
+        if ids:
+            marks = ",".join("?" * len(ids))
             await db.execute(
-                "INSERT OR IGNORE INTO poly_digest_log(user_id, date) VALUES(?,?)",
-                (user_id, date),
+                "UPDATE broadcast_recipients SET status='sending', updated_at=?"
+                f" WHERE job_id=? AND user_id IN ({marks})",
+                (time.time(), job_id, *ids),
             )
             await db.commit()
+    return ids
+
+
+async def db_bc_mark(job_id: int, results: list[tuple]):
+    """
+    results: [(user_id, status, error)]. Заблокированные чаты заодно
+    попадают в blocked_chats.
+    """
+    if not results:
+        return
+    now = time.time()
+    async with _write() as db:
+        await db.executemany(
+            "UPDATE broadcast_recipients SET status=?, error=?, updated_at=?"
+            " WHERE job_id=? AND user_id=?",
+            [(st, err, now, job_id, uid) for uid, st, err in results],
+        )
+        blocked = [(uid, err, now) for uid, st, err in results if st == "blocked"]
+        if blocked:
+            await db.executemany(
+                "INSERT OR REPLACE INTO blocked_chats(user_id, reason, blocked_at)"
+                " VALUES(?,?,?)",
+                blocked,
+            )
+        await db.commit()
+
+
+async def db_bc_counts(job_id: int) -> dict:
+    """{status: count} по получателям рассылки."""
+    async with _read() as db:
+        async with db.execute(
+            "SELECT status, COUNT(*) FROM broadcast_recipients"
+            " WHERE job_id=? GROUP BY status",
+            (job_id,),
+        ) as cur:
+            return {st: n for st, n in await cur.fetchall()}
+
+
+async def db_bc_finish(job_id: int, status: str = "done"):
+    async with _write() as db:
+        await db.execute(
+            "UPDATE broadcast_jobs SET status=?, finished_at=? WHERE id=?",
+            (status, time.time(), job_id),
+        )
+        await db.commit()
+
+
+async def db_blocked_ids() -> set[int]:
+    async with _read() as db:
+        async with db.execute("SELECT user_id FROM blocked_chats") as cur:
+            return {r[0] for r in await cur.fetchall()}
+
+
+async def db_blocked_remove(user_id: int):
+    """Пользователь снова написал боту — чат больше не считается заблокированным."""
+    async with _write() as db:
+        await db.execute("DELETE FROM blocked_chats WHERE user_id=?", (user_id,))
+        await db.commit()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  KEYSET-ПАГИНАЦИЯ И ПОТОКОВЫЙ ЭКСПОРТ
+# ═══════════════════════════════════════════════════════════════════════════════
+# Страницы продолжаются с ключа последней строки, а не OFFSET (см. paging.py).
+# Каждая *_page возвращает (rows, next_cursor); next_cursor=None — конец.
+
+async def _keyset_page(select: str, where: str, params: tuple,
+                       keys: tuple, desc: bool, cursor: Optional[tuple],
+                       limit: int) -> tuple[list[dict], Optional[tuple]]:
+    """
+    select — «SELECT ... FROM ...» без WHERE/ORDER; keys — пары
+    (SQL-выражение, имя колонки в выдаче), последняя — уникальная.
+    """
+    cond = [where] if where else []
+    args = list(params)
+    if cursor is not None and len(cursor) == len(keys):
+        op = "<" if desc else ">"
+        cond.append(f"({', '.join(e for e, _ in keys)}) {op} ({', '.join('?' * len(keys))})")
+        args += list(cursor)
+    order = ", ".join(f"{e} {'DESC' if desc else 'ASC'}" for e, _ in keys)
+    sql = (select + (" WHERE " + " AND ".join(cond) if cond else "")
+           + f" ORDER BY {order} LIMIT ?")
+    args.append(limit + 1)
+    async with _read() as db:
+        db.row_factory = aiosqlite.Row
+        async with db.execute(sql, args) as cur:
+            rows = [dict(r) for r in await cur.fetchall()]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, tuple(rows[-1][name] for _, name in keys)
+
+
+async def db_trades_page(user_id: int, cursor: Optional[tuple] = None,
+                         limit: int = 10) -> tuple[list[dict], Optional[tuple]]:
+    """
+    Закрытые сделки пользователя, от новых к старым. Ключ — (created_at,
+    trade_id): trade_id уникален и в основной БД, и в архиве, rowid — нет.
+    В курсоре trade_id вида «<user_id>_<мс>» хранится числом <мс> — иначе
+    токен не влезает в callback_data.
+    """
+    if cursor is not None and len(cursor) == 2 and isinstance(cursor[1], int):
+        cursor = (cursor[0], f"{user_id}_{cursor[1]}")
+    rows, nxt = await _keyset_page(
+        "SELECT * FROM trades_all",
+        f"user_id=? AND result {_STATS_COUNTED}", (user_id,),
+        (("created_at", "created_at"), ("trade_id", "trade_id")), True, cursor, limit,
+    )
+    if nxt is not None:
+        prefix, tid = f"{user_id}_", str(nxt[1])
+        ms = tid[len(prefix):]
+        if tid.startswith(prefix) and ms.isdigit() and str(int(ms)) == ms:
+            nxt = (nxt[0], int(ms))
+    return rows, nxt
+
+
+# Колонки users для списков и экспорта — без API-ключей
+_USER_LIST_COLS = (
+    "user_id, username, sub_status, sub_expires, created_at, strategy,"
+    " long_active, short_active, smc_long_active, smc_short_active,"
+    " gerchik_active, auto_trade, signals_received"
+)
+
+
+def _users_where(status: Optional[str]) -> tuple[str, tuple]:
+    if status == "paid":   # действующая подписка — как в /export_subs
+        return "sub_status IN ('trial','active') AND sub_expires > ?", (time.time(),)
+    if status:
+        return "sub_status=?", (status,)
+    return "", ()
+
+
+async def db_users_page(cursor: Optional[tuple] = None, limit: int = 20,
+                        status: Optional[str] = None) -> tuple[list[dict], Optional[tuple]]:
+    """Пользователи по возрастанию user_id; status — sub_status или 'paid'."""
+    where, params = _users_where(status)
+    return await _keyset_page(
+        f"SELECT {_USER_LIST_COLS} FROM users", where, params,
+        (("user_id", "user_id"),), False, cursor, limit,
+    )
+
+
+async def db_pd_signals_page(cursor: Optional[tuple] = None,
+                             limit: int = 10) -> tuple[list[dict], Optional[tuple]]:
+    """
+    Памп/дамп сигналы с исходом, от новых к старым. Ключ — (ts, src, id):
+    id в основной БД и в архиве свои и пересекаются, уникальна только пара
+    (src, id) — src у pd_history_all 0 для основной БД, 1 для архива.
+    """
+    return await _keyset_page(
+        "SELECT id, src, symbol, direction, score, price_signal AS price,"
+        " ts AS created_at, correct, change_pct FROM pd_history_all",
+        "", (), (("ts", "created_at"), ("src", "src"), ("id", "id")), True, cursor, limit,
+    )
+
+
+async def poly_bets_page(user_id: int, cursor: Optional[tuple] = None,
+                         limit: int = 10) -> tuple[list[dict], Optional[tuple]]:
+    """Ставки Polymarket пользователя, от новых к старым."""
+    return await _keyset_page(
+        "SELECT * FROM poly_bets", "user_id=?", (user_id,),
+        (("created_at", "created_at"), ("id", "id")), True, cursor, limit,
+    )
+
+
+# kind → (select, where, keys); where может зависеть от времени — функция
+_EXPORTS = {
+    "users":  (f"SELECT {_USER_LIST_COLS} FROM users",
+               lambda: _users_where(None), (("user_id", "user_id"),)),
+    "subs":   (f"SELECT {_USER_LIST_COLS} FROM users",
+               lambda: _users_where("paid"), (("user_id", "user_id"),)),
+    "trades": ("SELECT trade_id, user_id, symbol, direction, entry, sl,"
+               " tp1, tp2, tp3, quality, timeframe, breakout_type, result, result_rr,"
+               " order_id, created_at, closed_at FROM trades_all",
+               lambda: ("", ()), (("trade_id", "trade_id"),)),
+    "pd":     ("SELECT id, src, symbol, direction, score, price_signal, ts,"
+               " price_15m, change_pct, correct FROM pd_history_all",
+               lambda: ("", ()), (("ts", "ts"), ("src", "src"), ("id", "id"))),
+    "bets":   ("SELECT id, user_id, market_id, question, side, amount_usdc, shares,"
+               " price, order_id, status, created_at FROM poly_bets",
+               lambda: ("", ()), (("id", "id"),)),
+}
+EXPORT_KINDS = tuple(_EXPORTS)
+EXPORT_CHUNK = 1000
+
+
+async def db_export(kind: str, path: str, fmt: str = "csv") -> int:
+    """
+    Выгрузить таблицу kind (EXPORT_KINDS) в файл path построчно.
+
+    Читает keyset-страницами по EXPORT_CHUNK и сразу пишет их в файл:
+    память не растёт с размером таблицы, а между страницами read-транзакция
+    не держится (WAL checkpoint не блокируется). fmt: 'csv' | 'json'
+    (JSON-массив, по объекту на строку). Возвращает число строк.
+    """
+    import csv
+    import json
+    select, where_fn, keys = _EXPORTS[kind]
+    where, params = where_fn()
+    n = 0
+    cursor = None
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = None
+        if fmt == "json":
+            f.write("[")
+        while True:
+            rows, cursor = await _keyset_page(select, where, params, keys,
+                                              False, cursor, EXPORT_CHUNK)
+            for r in rows:
+                if fmt == "json":
+                    f.write(("\n" if n == 0 else ",\n")
+                            + json.dumps(r, ensure_ascii=False))
+                else:
+                    if writer is None:
+                        writer = csv.DictWriter(f, fieldnames=list(r))
+                        writer.writeheader()
+                    writer.writerow(r)
+                n += 1
+            if cursor is None:
+                break
+        if fmt == "json":
+            f.write("\n]\n")
+    return n
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+#  ХОЛОДНЫЙ АРХИВ (trades / pd_signals → отдельный SQLite)
+# ═══════════════════════════════════════════════════════════════════════════════
+# Закрытые сделки и памп/дамп сигналы с исходом старше ARCHIVE_AFTER_DAYS
+# переезжают в <db>_archive.db (DB_ARCHIVE_PATH). Основная БД, её бэкапы при
+# старте и Turso-синк перестают расти вместе с историей.
+#
+# Архив подключён к каждому соединению пула как схема arch, поверх обеих
+# схем — TEMP-представления:
+#   trades_all     — колонки trades из обеих БД
+#   pd_history_all — сигнал + исход (signals и outcomes архивируются вместе),
+#                    src = 0 основная БД / 1 архив: id у них пересекаются
+# История, экспорт и пересборка user_stats читают их; горячие запросы по
+# открытым сделкам — по-прежнему main.trades. user_stats не трогается:
+# удаление из trades триггеров не вызывает.
+#
+# Строки опознаются по бизнес-ключу, не по rowid/id: restore из Turso
+# перезаписывает trades и нумерует rowid заново, а потерянная основная БД
+# начинает id памп/дамп сигналов с 1. Ключ сделки — trade_id, сигнала —
+# (symbol, direction, ts), исхода — (сигнал, ts); id в архиве свои.
+#
+# ВАЖНО: архив живёт ТОЛЬКО на локальном диске. В Turso он не уходит
+# (перенесённые сделки CDC удаляет из облака), копия — только ротация
+# bot._backup_db при старте. На хостинге без постоянного диска задайте
+# DB_ARCHIVE_PATH на постоянный том или ARCHIVE_AFTER_DAYS=0.
+
+DB_ARCHIVE_PATH    = os.getenv("DB_ARCHIVE_PATH", "")      # "" → <db>_archive.db
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))   # 0 — не переносить
+ARCHIVE_BATCH      = int(os.getenv("ARCHIVE_BATCH", "500"))
+
+_archive_path: str = ""
+_ARCHIVE_TABLES = ("trades", "pd_signals", "pd_outcomes")
+_arch_cols: dict = {}   # таблица → колонки main (снимок init_db, после миграций)
+
+_ARCHIVE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS arch.idx_arch_trades_user ON trades(user_id, created_at)",
+    "CREATE INDEX IF NOT EXISTS arch.idx_arch_pd_outcomes_signal ON pd_outcomes(signal_id)",
+    "CREATE INDEX IF NOT EXISTS arch.idx_arch_pd_signals_ts ON pd_signals(ts)",   # страницы истории
+    # Бизнес-ключи: по ним INSERT OR IGNORE не дублирует и DELETE сверяется
+    "CREATE UNIQUE INDEX IF NOT EXISTS arch.ux_arch_pd_signals_key"
+    " ON pd_signals(symbol, direction, ts)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS arch.ux_arch_pd_outcomes_key ON pd_outcomes(signal_id, ts)",
+)
+
+_PD_HISTORY_COLS = (
+    "s.id, s.symbol, s.direction, s.score, s.price_signal, s.ts,"
+    " o.price_15m, o.change_pct, o.correct"
+)
+
+
+def _archive_views_sql() -> list[str]:
+    cols = ", ".join(_arch_cols.get("trades") or ["*"])
+    trades = f"SELECT {cols} FROM main.trades"
+    pd = (f"SELECT {_PD_HISTORY_COLS}, 0 AS src FROM main.pd_signals s"
+          " LEFT JOIN main.pd_outcomes o ON o.signal_id = s.id")
+    if _archive_path:
+        trades += f" UNION ALL SELECT {cols} FROM arch.trades"
+        pd += (f" UNION ALL SELECT {_PD_HISTORY_COLS}, 1 AS src FROM arch.pd_signals s"
+               " LEFT JOIN arch.pd_outcomes o ON o.signal_id = s.id")
+    return [
+        f"CREATE TEMP VIEW IF NOT EXISTS trades_all AS {trades}",
+        f"CREATE TEMP VIEW IF NOT EXISTS pd_history_all AS {pd}",
+    ]
+
+
+async def _attach_archive(conn):
+    """Архив + TEMP-представления на новом соединении пула."""
+    if _archive_path:
+        await conn.execute("ATTACH DATABASE ? AS arch", (_archive_path,))
+        await conn.execute("PRAGMA arch.synchronous=NORMAL")
+    for sql in _archive_views_sql():
+        await conn.execute(sql)
+
+
+async def _archive_init(db):
+    """
+    init_db: подключить архив, создать/догнать его схему под текущие
+    колонки main (миграции добавляют колонки только в main) и представления.
+    Архив недоступен (read-only каталог и т.п.) — работаем без него.
+    """
+    global _archive_path
+    infos = {}
+    for t in _ARCHIVE_TABLES:
+        async with db.execute(f"PRAGMA main.table_info({t})") as cur:
+            infos[t] = await cur.fetchall()   # cid, name, type, notnull, dflt, pk
+        _arch_cols[t] = [r[1] for r in infos[t]]
+    _archive_path = archive_file_for(_db_path)
+    try:
+        await db.execute("ATTACH DATABASE ? AS arch", (_archive_path,))
+        try:
+            await db.execute("PRAGMA arch.journal_mode=WAL")
+        except Exception as e:
+            log.debug(f"archive journal_mode: {e}")
+        for t, info in infos.items():
+            # Архивы до перехода на trade_id содержат лишнюю колонку rid
+            # (trade_id там UNIQUE) — представления её не читают
+            defs = [f"{r[1]} {r[2]}" + (" PRIMARY KEY" if r[5] else "") for r in info]
+            await db.execute(f"CREATE TABLE IF NOT EXISTS arch.{t} ({', '.join(defs)})")
+            async with db.execute(f"PRAGMA arch.table_info({t})") as cur:
+                have = {r[1] for r in await cur.fetchall()}
+            for r in info:
+                if r[1] not in have:
+                    await db.execute(f"ALTER TABLE arch.{t} ADD COLUMN {r[1]} {r[2]}")
+        for sql in _ARCHIVE_INDEXES:
+            await db.execute(sql)
+        await db.commit()
+    except Exception as e:
+        log.warning(f"⚠️ Архив {_archive_path} недоступен ({e}) — история только из основной БД")
+        _archive_path = ""
+        try:
+            await db.execute("DETACH DATABASE arch")
+        except Exception:
+            pass
+    for sql in _archive_views_sql():
+        await db.execute(sql)
+
+
+# table → (выбор кандидатов после ключа, копирование, удаление); ? в
+# копировании/удалении — список ключей через json_each, чтобы не собирать
+# SQL с переменным числом плейсхолдеров. Удаление сверяет с архивом
+# собственный ключ строки: что не скопировалось, остаётся в основной БД.
+def _archive_plan(table: str) -> tuple[str, list[str], list[str]]:
+    ids = "(SELECT value FROM json_each(?))"
+    if table == "trades":
+        cols = ", ".join(_arch_cols["trades"])
+        # Открытые сделки не переносим. Повторный перенос того же trade_id
+        # (сбой между копией и удалением) перезаписывает копию в архиве
+        pick = ("SELECT trade_id FROM main.trades WHERE trade_id > ?"
+                " AND result != '' AND COALESCE(NULLIF(closed_at, 0), created_at) < ?"
+                " ORDER BY trade_id LIMIT ?")
+        copy = [f"INSERT OR REPLACE INTO arch.trades ({cols})"
+                f" SELECT {cols} FROM main.trades WHERE trade_id IN {ids}"]
+        drop = [f"DELETE FROM main.trades WHERE trade_id IN {ids} AND EXISTS"
+                " (SELECT 1 FROM arch.trades a WHERE a.trade_id = main.trades.trade_id)"]
+        return pick, copy, drop
+    # id сигнала и исхода в архиве свои: signal_id исхода переводится на
+    # архивный id сигнала через ключ (symbol, direction, ts)
+    s_cols = [c for c in _arch_cols["pd_signals"] if c != "id"]
+    o_cols = [c for c in _arch_cols["pd_outcomes"] if c not in ("id", "signal_id")]
+    s_key = "a.symbol = s.symbol AND a.direction = s.direction AND a.ts = s.ts"
+    # Только сигналы с исходом: без исхода их ещё ждёт db_pd_pending_outcomes
+    pick = ("SELECT s.id FROM main.pd_signals s WHERE s.id > ? AND s.ts < ?"
+            " AND EXISTS (SELECT 1 FROM main.pd_outcomes o WHERE o.signal_id = s.id)"
+            " ORDER BY s.id LIMIT ?")
+    copy = [
+        f"INSERT OR IGNORE INTO arch.pd_signals ({', '.join(s_cols)})"
+        f" SELECT {', '.join(s_cols)} FROM main.pd_signals WHERE id IN {ids}",
+        f"INSERT OR IGNORE INTO arch.pd_outcomes (signal_id, {', '.join(o_cols)})"
+        f" SELECT a.id, {', '.join('o.' + c for c in o_cols)}"
+        " FROM main.pd_outcomes o JOIN main.pd_signals s ON s.id = o.signal_id"
+        f" JOIN arch.pd_signals a ON {s_key} WHERE s.id IN {ids}",
+    ]
+    drop = [
+        f"DELETE FROM main.pd_outcomes WHERE signal_id IN {ids} AND EXISTS"
+        " (SELECT 1 FROM main.pd_signals s"
+        f" JOIN arch.pd_signals a ON {s_key}"
+        " JOIN arch.pd_outcomes ao ON ao.signal_id = a.id AND ao.ts = main.pd_outcomes.ts"
+        " WHERE s.id = main.pd_outcomes.signal_id)",
+        # сигнал уходит, только если ушли все его исходы
+        f"DELETE FROM main.pd_signals WHERE id IN {ids} AND EXISTS"
+        " (SELECT 1 FROM arch.pd_signals a WHERE a.symbol = main.pd_signals.symbol"
+        " AND a.direction = main.pd_signals.direction AND a.ts = main.pd_signals.ts)"
+        " AND NOT EXISTS (SELECT 1 FROM main.pd_outcomes o WHERE o.signal_id = main.pd_signals.id)",
+    ]
+    return pick, copy, drop
+
+
+ARCHIVE_KINDS = ("trades", "pd_signals")
+_ARCHIVE_START = {"trades": "", "pd_signals": 0}   # ключ «до первой строки»
+
+
+async def db_archive_batch(table: str, cutoff: float, after=None,
+                           limit: int = ARCHIVE_BATCH) -> tuple[int, Optional[object]]:
+    """
+    Перенести в архив до limit строк table (ARCHIVE_KINDS) старше cutoff,
+    начиная после ключа after (None — с начала; trade_id у сделок, id у
+    сигналов). Возвращает (перенесено, следующий after); None — кандидаты
+    кончились.
+
+    Копия и удаление — две короткие транзакции под write-lock (между ними
+    групповой коммит продолжает писать). При WAL коммит сразу в две БД не
+    атомарен, поэтому порядок такой: копия в архив → коммит → DELETE
+    только строк, чей ключ уже есть в архиве → коммит. Сбой посередине
+    оставит строку в обеих БД до следующего прохода, но не потеряет её.
+    """
+    if not _archive_path:
+        return 0, None
+    if after is None:
+        after = _ARCHIVE_START[table]
+    pick, copy, drop = _archive_plan(table)
+    async with _read() as db:
+        async with db.execute(pick, (after, cutoff, limit)) as cur:
+            ids = [r[0] for r in await cur.fetchall()]
+    if not ids:
+        return 0, None
+    import json
+    arg = (json.dumps(ids),)
+    async with _write() as db:
+        for sql in copy:
+            await db.execute(sql, arg)
+        await db.commit()
+    moved = 0
+    async with _write() as db:
+        for i, sql in enumerate(drop):
+            cur = await db.execute(sql, arg)
+            if i == len(drop) - 1:
+                moved = cur.rowcount
+        if table == "trades" and moved:
+            await db.execute(
+                "INSERT INTO counters (name, value) VALUES (?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (_ARCHIVED_COUNTER, moved),
+            )
+        await db.commit()
+    return moved, (ids[-1] if len(ids) == limit else None)
+
+
+async def db_archive_counts() -> dict:
+    """{"trades": (в основной БД, в архиве), "pd_signals": (...)} — для /archive."""
+    out = {}
+    async with _read() as db:
+        for t in ARCHIVE_KINDS:
+            async with db.execute(f"SELECT COUNT(*) FROM main.{t}") as cur:
+                live = (await cur.fetchone())[0]
+            cold = 0
+            if _archive_path:
+                async with db.execute(f"SELECT COUNT(*) FROM arch.{t}") as cur:
+                    cold = (await cur.fetchone())[0]
+            out[t] = (live, cold)
+    return out
+
+
+def archive_file_for(db_path: str) -> str:
+    """Файл архива для БД db_path (DB_ARCHIVE_PATH или <db>_archive.db)."""
+    return DB_ARCHIVE_PATH or os.path.splitext(db_path)[0] + "_archive.db"
+
+
+def archive_path() -> str:
+    """Путь к файлу архива ('' — архив не подключён)."""
+    return _archive_path
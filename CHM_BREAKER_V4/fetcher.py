@@ -6,17 +6,36 @@ session переиспользуется через connection pooling.
 
 import asyncio
 import logging
+import os
 import ssl
+import time
+from collections import deque
 import certifi
 import aiohttp
 import pandas as pd
 from typing import Optional
 
+import market_regime
+import tickers
+
 log = logging.getLogger("CHM.Fetcher")
 
-OKX_CANDLES = "https://www.okx.com/api/v5/market/candles"
-OKX_TICKERS = "https://www.okx.com/api/v5/market/tickers"
-OKX_SYMBOLS = "https://www.okx.com/api/v5/public/instruments"
+# OKX_BASE_URL переопределяется для нагрузочных тестов (loadtest/fake_okx.py)
+OKX_BASE    = os.getenv("OKX_BASE_URL", "https://www.okx.com").rstrip("/")
+OKX_CANDLES = OKX_BASE + "/api/v5/market/candles"
+OKX_TICKERS = OKX_BASE + "/api/v5/market/tickers"
+OKX_SYMBOLS = OKX_BASE + "/api/v5/public/instruments"
+OKX_HISTORY = OKX_BASE + "/api/v5/market/history-candles"
+
+# ── Глубокая история (get_history) ─────────────────────────────────────────
+HISTORY_PAGE        = 100      # лимит OKX на страницу history-candles
+HISTORY_CONCURRENCY = 4        # страниц одновременно
+HISTORY_RATE        = 8.0      # запросов/сек (лимит OKX — 20 за 2 с на IP)
+HISTORY_MAX_BARS    = 20_000   # сколько баров держим в снапшоте на диске
+HISTORY_DIR         = os.getenv(
+    "HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "history"),
+)
 
 TIMEFRAME_MAP = {
     "1m":  "1m",  "3m":  "3m",  "5m":  "5m",  "15m": "15m",
@@ -25,6 +44,45 @@ TIMEFRAME_MAP = {
     "1w":  "1W",
 }
 
+# ── Адаптивные таймауты, hedging, circuit breaker ────────────────────────────
+DEFAULT_TIMEOUT    = 15.0   # пока нет статистики по эндпоинту (как прежний фиксированный)
+TIMEOUT_MIN        = 2.0
+TIMEOUT_MAX        = 15.0   # не дольше прежнего фиксированного таймаута
+TIMEOUT_P95_MULT   = 3.0    # таймаут = p95 × 3 в пределах [MIN, MAX]
+LAT_WINDOW         = 200    # последних ответов в статистике
+LAT_MIN_SAMPLES    = 20     # меньше — p50/p95 не считаем
+HEDGE_MIN_DELAY    = 0.25   # дубль не раньше, чем через столько секунд
+HEDGE_BUDGET       = 0.10   # доля запросов, которые можно продублировать
+BREAKER_WINDOW     = 20     # последних исходов для circuit breaker
+BREAKER_FAILS      = 10     # столько 5xx/429/таймаутов в окне — размыкаем
+BREAKER_COOLDOWN   = 30.0   # пауза эндпоинта (сек)
+
+# Длительность бара OKX в секундах (для пагинации и проверки дыр)
+BAR_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1H": 3600, "2H": 7200, "4H": 14400, "6H": 21600, "12H": 43200,
+    "1D": 86400, "1W": 604800,
+}
+
+
+def tf_seconds(tf: str) -> int:
+    """Длительность бара: ключ TIMEFRAME_MAP или код OKX → секунды."""
+    return BAR_SECONDS.get(TIMEFRAME_MAP.get(tf, tf), 3600)
+
+
+def bar_shift(sec: int) -> int:
+    """Сдвиг сетки свечей OKX относительно эпохи. 6H/12H/1D открываются
+    по Гонконгу (UTC+8; для TF ≤ 4H сетка совпадает с UTC), 1W — в
+    понедельник 00:00 HKT (эпоха пришлась на четверг)."""
+    return 288_000 if sec == 604_800 else 28_800
+
+
+def bar_open(tf: str, now: float) -> float:
+    """Открытие текущей свечи TF на сетке OKX (= закрытие последней закрытой)."""
+    sec   = tf_seconds(tf)
+    shift = bar_shift(sec)
+    return (now + shift) // sec * sec - shift
+
 HEADERS = {
     "User-Agent":      "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36",
     "Accept":          "application/json",
@@ -35,10 +93,79 @@ HEADERS = {
 }
 
 
+class _Endpoint:
+    """Статистика одного эндпоинта OKX: задержки, hedging, circuit breaker."""
+
+    def __init__(self, name: str):
+        self.name       = name
+        self.lat        = deque(maxlen=LAT_WINDOW)
+        self.outcomes   = deque(maxlen=BREAKER_WINDOW)   # True — ошибка
+        self.open_until = 0.0
+        self.requests = self.hedges = self.hedge_wins = self.trips = self.rejected = 0
+        self._pcts: Optional[tuple] = None
+
+    def add_latency(self, dt: float):
+        self.lat.append(dt)
+        self._pcts = None
+
+    def pcts(self) -> Optional[tuple]:
+        """(p50, p95) или None, пока мало замеров."""
+        if len(self.lat) < LAT_MIN_SAMPLES:
+            return None
+        if self._pcts is None:
+            xs = sorted(self.lat)
+            self._pcts = (xs[len(xs) // 2], xs[min(len(xs) - 1, int(len(xs) * 0.95))])
+        return self._pcts
+
+    def timeout(self) -> float:
+        p = self.pcts()
+        if p is None:
+            return DEFAULT_TIMEOUT
+        return min(TIMEOUT_MAX, max(TIMEOUT_MIN, p[1] * TIMEOUT_P95_MULT))
+
+    def hedge_delay(self) -> Optional[float]:
+        p = self.pcts()
+        if p is None or self.hedges >= self.requests * HEDGE_BUDGET:
+            return None
+        return max(HEDGE_MIN_DELAY, p[1])
+
+    def allow(self) -> bool:
+        if time.monotonic() < self.open_until:
+            self.rejected += 1
+            return False
+        return True
+
+    def record(self, failed: bool, retry_after: float = 0.0):
+        self.outcomes.append(failed)
+        if failed and sum(self.outcomes) >= BREAKER_FAILS:
+            pause = max(BREAKER_COOLDOWN, retry_after)
+            self.open_until = time.monotonic() + pause
+            self.trips += 1
+            self.outcomes.clear()
+            log.warning(f"OKX {self.name}: много ошибок — пауза {pause:.0f}с")
+
+    def stats(self) -> dict:
+        p = self.pcts()
+        return {
+            "p50_ms":     round(p[0] * 1000) if p else None,
+            "p95_ms":     round(p[1] * 1000) if p else None,
+            "timeout_s":  round(self.timeout(), 2),
+            "requests":   self.requests,
+            "hedges":     self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "breaker_trips": self.trips,
+            "rejected":   self.rejected,
+            "open":       time.monotonic() < self.open_until,
+        }
+
+
 class OKXFetcher:
 
     def __init__(self):
         self._session: Optional[aiohttp.ClientSession] = None
+        self._hist_sem  = asyncio.Semaphore(HISTORY_CONCURRENCY)
+        self._hist_next = 0.0   # loop.time() следующего разрешённого запроса
+        self._eps: dict[str, _Endpoint] = {}
 
     async def _sess(self) -> aiohttp.ClientSession:
         if self._session is None or self._session.closed:
@@ -61,6 +188,87 @@ class OKXFetcher:
         if self._session and not self._session.closed:
             await self._session.close()
 
+    # ── Запрос с адаптивным таймаутом, hedging и circuit breaker ─────────────
+
+    def _ep(self, name: str) -> _Endpoint:
+        ep = self._eps.get(name)
+        if ep is None:
+            ep = self._eps[name] = _Endpoint(name)
+        return ep
+
+    def latency_stats(self) -> dict:
+        return {name: ep.stats() for name, ep in self._eps.items()}
+
+    async def _attempt(self, url: str, params: dict, timeout: float) -> tuple:
+        """Один GET: (status, json, retry_after). status 0 — таймаут/сеть."""
+        try:
+            sess = await self._sess()
+            async with sess.get(
+                url, params=params,
+                timeout=aiohttp.ClientTimeout(total=timeout, connect=min(8.0, timeout)),
+            ) as resp:
+                if resp.status != 200:
+                    try:
+                        retry_after = float(resp.headers.get("Retry-After", 0))
+                    except ValueError:
+                        retry_after = 0.0
+                    return resp.status, None, retry_after
+                return 200, await resp.json(), 0.0
+        except (asyncio.TimeoutError, aiohttp.ClientError, ValueError) as e:
+            log.debug(f"OKX {url}: {type(e).__name__}")
+            return 0, None, 0.0
+
+    async def _get(self, name: str, url: str, params: dict) -> tuple:
+        """
+        GET к эндпоинту name → (status, json, retry_after).
+
+        Таймаут — от p95 эндпоинта. Если ответа нет дольше p95, уходит
+        дубль (в пределах HEDGE_BUDGET); берём первый успешный, второй
+        отменяем. Разомкнутый breaker сразу отдаёт status -1.
+        """
+        ep = self._ep(name)
+        if not ep.allow():
+            return -1, None, 0.0
+        ep.requests += 1
+        loop    = asyncio.get_running_loop()
+        t0      = loop.time()
+        timeout = ep.timeout()
+        primary = asyncio.ensure_future(self._attempt(url, params, timeout))
+        pending = {primary}
+        hedge   = None
+
+        delay = ep.hedge_delay()
+        if delay is not None:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                ep.hedges += 1
+                hedge = asyncio.ensure_future(self._attempt(url, params, timeout))
+                pending.add(hedge)
+
+        result = (0, None, 0.0)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for t in done:
+                    r = t.result()
+                    if r[0] == 200 or result[0] != 200:
+                        result = r
+                    if r[0] == 200 and t is hedge:
+                        ep.hedge_wins += 1
+                if result[0] == 200:
+                    break
+        finally:
+            for t in pending:
+                t.cancel()
+
+        status = result[0]
+        if status:
+            ep.add_latency(loop.time() - t0)
+        ep.record(status == 0 or status == 429 or status >= 500, result[2])
+        return result
+
     @staticmethod
     def _to_okx(symbol: str) -> str:
         symbol = symbol.replace(" ", "")
@@ -68,6 +276,24 @@ class OKXFetcher:
             return f"{symbol[:-4]}-USDT-SWAP"
         return symbol
 
+    @staticmethod
+    def _rows_to_df(rows: list) -> pd.DataFrame:
+        """data[] ответа OKX (новые сверху) → DataFrame по возрастанию open_time."""
+        df = pd.DataFrame(
+            list(reversed(rows)),
+            columns=["open_time","open","high","low","close",
+                     "vol","volCcy","volCcyQuote","confirm"]
+        )
+        df = df[["open_time","open","high","low","close","volCcyQuote"]].copy()
+        df.rename(columns={"volCcyQuote": "volume"}, inplace=True)
+        df[["open","high","low","close","volume"]] = \
+            df[["open","high","low","close","volume"]].astype(float)
+        df["open_time"] = pd.to_datetime(
+            df["open_time"].astype(float), unit="ms"
+        )
+        df.set_index("open_time", inplace=True)
+        return df
+
     async def get_candles(
         self, symbol: str, timeframe: str,
         limit: int = 300, retries: int = 3,
@@ -78,40 +304,24 @@ class OKXFetcher:
 
         for attempt in range(1, retries + 1):
             try:
-                sess = await self._sess()
-                async with sess.get(OKX_CANDLES, params=params) as resp:
-                    if resp.status == 429:
-                        # Rate limit — ждём и повторяем
-                        wait = int(resp.headers.get("Retry-After", 3))
-                        log.warning(f"OKX rate limit, ждём {wait}с")
-                        await asyncio.sleep(wait)
-                        continue
-                    if resp.status != 200:
+                status, data, retry_after = await self._get("candles", OKX_CANDLES, params)
+                if status == -1:
+                    return None   # эндпоинт на паузе (circuit breaker)
+                if status == 429:
+                    # Rate limit — ждём и повторяем
+                    wait = retry_after or 3
+                    log.warning(f"OKX rate limit, ждём {wait:.0f}с")
+                    await asyncio.sleep(wait)
+                    continue
+                if status == 200:
+                    rows = data.get("data", [])
+                    if not rows:
                         return None
-                    data = await resp.json()
-
-                rows = data.get("data", [])
-                if not rows:
+                    df = self._rows_to_df(rows)
+                    return df.iloc[:-1]  # убираем незакрытую свечу
+                if status != 0 and status < 500:
                     return None
-
-                rows = list(reversed(rows))
-                df   = pd.DataFrame(
-                    rows,
-                    columns=["open_time","open","high","low","close",
-                             "vol","volCcy","volCcyQuote","confirm"]
-                )
-                df = df[["open_time","open","high","low","close","volCcyQuote"]].copy()
-                df.rename(columns={"volCcyQuote": "volume"}, inplace=True)
-                df[["open","high","low","close","volume"]] = \
-                    df[["open","high","low","close","volume"]].astype(float)
-                df["open_time"] = pd.to_datetime(
-                    df["open_time"].astype(float), unit="ms"
-                )
-                df.set_index("open_time", inplace=True)
-                return df.iloc[:-1]  # убираем незакрытую свечу
-
-            except asyncio.TimeoutError:
-                log.debug(f"{symbol} timeout (попытка {attempt})")
+                log.debug(f"{symbol} HTTP {status or 'timeout'} (попытка {attempt})")
             except Exception as e:
                 log.debug(f"{symbol} error: {e} (попытка {attempt})")
 
@@ -120,6 +330,175 @@ class OKXFetcher:
 
         return None
 
+    # ── Глубокая история ─────────────────────────────────────────────────────
+
+    async def _hist_slot(self):
+        """Равномерно расходует бюджет history-candles (HISTORY_RATE запросов/сек)."""
+        loop = asyncio.get_running_loop()
+        now  = loop.time()
+        slot = max(now, self._hist_next)
+        self._hist_next = slot + 1.0 / HISTORY_RATE
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _history_page(
+        self, okx_sym: str, bar: str, after_ms: int, retries: int = 3,
+    ) -> Optional[list]:
+        """Одна страница: до HISTORY_PAGE баров строго раньше after_ms.
+        [] — данных нет (раньше листинга), None — страница не загрузилась."""
+        params = {
+            "instId": okx_sym, "bar": bar,
+            "after": str(after_ms), "limit": str(HISTORY_PAGE),
+        }
+        for attempt in range(1, retries + 1):
+            await self._hist_slot()
+            try:
+                async with self._hist_sem:
+                    status, data, retry_after = await self._get("history", OKX_HISTORY, params)
+                if status == 200:
+                    return data.get("data", [])
+                if status == -1:
+                    return None
+                if status == 429:
+                    wait = retry_after or 2
+                    log.warning(f"OKX history rate limit, ждём {wait:.0f}с")
+                    await asyncio.sleep(wait)
+                    continue
+                if status != 0 and status < 500:
+                    return None
+                log.debug(f"{okx_sym} history HTTP {status or 'timeout'} (попытка {attempt})")
+            except Exception as e:
+                log.debug(f"{okx_sym} history error: {e} (попытка {attempt})")
+            if attempt < retries:
+                await asyncio.sleep(1.5 * attempt)
+        return None
+
+    async def _history_range(
+        self, okx_sym: str, bar: str, end_ms: int, start_ms: int,
+    ) -> tuple[list, bool]:
+        """Закрытые бары с open_time в [start_ms, end_ms).
+
+        Курсоры after считаются заранее (бар фиксированной длины), поэтому
+        страницы грузятся параллельно, а не цепочкой. Возвращает строки OKX
+        и признак, что все страницы загрузились."""
+        span    = HISTORY_PAGE * BAR_SECONDS[bar] * 1000
+        cursors = list(range(end_ms, start_ms, -span))
+        pages   = await asyncio.gather(
+            *(self._history_page(okx_sym, bar, c) for c in cursors)
+        )
+        rows = [
+            r for page in pages if page
+            for r in page
+            if int(r[0]) >= start_ms and (len(r) < 9 or r[8] == "1")
+        ]
+        return rows, all(p is not None for p in pages)
+
+    @staticmethod
+    def _find_gaps(df: pd.DataFrame, bar_sec: int) -> list[tuple]:
+        """Дыры в ряду: (последний бар до дыры, первый после, пропущено баров)."""
+        if len(df) < 2:
+            return []
+        step  = pd.Timedelta(seconds=bar_sec)
+        diffs = df.index.to_series().diff()
+        gaps  = []
+        for ts, d in diffs[diffs > step].items():
+            gaps.append((ts - d, ts, int(d / step) - 1))
+        return gaps
+
+    @staticmethod
+    def _snapshot_path(okx_sym: str, bar: str) -> str:
+        return os.path.join(HISTORY_DIR, f"{okx_sym}_{bar}.pkl")
+
+    @staticmethod
+    def _load_snapshot(path: str) -> Optional[pd.DataFrame]:
+        try:
+            if os.path.exists(path):
+                return pd.read_pickle(path)
+        except Exception as e:
+            log.warning(f"Снапшот истории {path} не прочитан: {e}")
+        return None
+
+    @staticmethod
+    def _save_snapshot(path: str, df: pd.DataFrame):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        df.tail(HISTORY_MAX_BARS).to_pickle(tmp)
+        os.replace(tmp, path)
+
+    async def get_history(
+        self, symbol: str, timeframe: str,
+        bars: int = 1000, use_snapshot: bool = True,
+    ) -> Optional[pd.DataFrame]:
+        """
+        Последние `bars` закрытых свечей — больше лимита get_candles (300).
+
+        Пагинация /market/history-candles по курсору after, страницы идут
+        параллельно в пределах HISTORY_RATE. Граничные бары дедуплицируются.
+        Снапшот на диске (HISTORY_DIR) переиспользуется: догружаются только
+        новые бары и недостающий хвост в прошлое.
+
+        Формат как у get_candles. Найденные дыры — в df.attrs["gaps"].
+        """
+        bar = TIMEFRAME_MAP.get(timeframe, timeframe)
+        if bar not in BAR_SECONDS:
+            log.warning(f"get_history: неизвестный таймфрейм {timeframe}")
+            return None
+        bar_ms  = BAR_SECONDS[bar] * 1000
+        okx_sym = self._to_okx(symbol)
+        path    = self._snapshot_path(okx_sym, bar)
+        now_ms  = int(time.time() * 1000)
+
+        snap = await asyncio.to_thread(self._load_snapshot, path) if use_snapshot else None
+        if snap is not None and snap.empty:
+            snap = None
+
+        ranges = []
+        if snap is None:
+            ranges.append((now_ms, now_ms - (bars + 1) * bar_ms))
+        else:
+            first_ms = int(snap.index[0].value // 1_000_000)
+            last_ms  = int(snap.index[-1].value // 1_000_000)
+            ranges.append((now_ms, last_ms + bar_ms))
+            if len(snap) < bars:
+                ranges.append((first_ms, first_ms - (bars - len(snap)) * bar_ms))
+
+        rows, complete = [], True
+        results = await asyncio.gather(
+            *(self._history_range(okx_sym, bar, end, start) for end, start in ranges)
+        )
+        for r, ok in results:
+            rows.extend(r)
+            complete = complete and ok
+
+        frames = [snap] if snap is not None else []
+        if rows:
+            # _rows_to_df ждёт «новые сверху»
+            rows.sort(key=lambda r: int(r[0]), reverse=True)
+            frames.append(self._rows_to_df(rows))
+        if not frames:
+            return None
+
+        df = pd.concat(frames).sort_index()
+        df = df[~df.index.duplicated(keep="last")]
+
+        if use_snapshot and rows and complete:
+            try:
+                await asyncio.to_thread(self._save_snapshot, path, df)
+            except Exception as e:
+                log.warning(f"Снапшот истории {path} не сохранён: {e}")
+
+        df = df.tail(bars)
+        gaps = self._find_gaps(df, BAR_SECONDS[bar])
+        if gaps:
+            missing = sum(g[2] for g in gaps)
+            log.warning(
+                f"{okx_sym} {bar}: {len(gaps)} дыр в истории, пропущено {missing} баров"
+            )
+        if not complete:
+            log.warning(f"{okx_sym} {bar}: часть страниц истории не загрузилась")
+        df.attrs["gaps"] = gaps
+        return df
+
     async def get_all_usdt_pairs(
         self,
         min_volume_usdt: float = 1_000_000,
@@ -128,12 +507,11 @@ class OKXFetcher:
     ) -> list:
         blacklist = blacklist or []
         try:
-            sess = await self._sess()
-
-            async with sess.get(OKX_SYMBOLS, params={"instType": "SWAP"}) as resp:
-                if resp.status != 200:
-                    return []
-                data = await resp.json()
+            status, data, _ = await self._get(
+                "instruments", OKX_SYMBOLS, {"instType": "SWAP"}
+            )
+            if status != 200:
+                return []
 
             all_usdt = {
                 s["instId"] for s in data["data"]
@@ -142,25 +520,15 @@ class OKXFetcher:
                 and s["instId"] not in blacklist
             }
 
-            await asyncio.sleep(0.5)
-
-            async with sess.get(OKX_TICKERS, params={"instType": "SWAP"}) as resp:
-                if resp.status != 200:
-                    return sorted(all_usdt)
-                tdata = await resp.json()
-
-            filtered = []
-            for t in tdata["data"]:
-                sym = t.get("instId", "")
-                if sym not in all_usdt:
-                    continue
-                try:
-                    vol = float(t.get("volCcy24h", 0))
-                except Exception:
-                    vol = 0
-                if vol >= min_volume_usdt:
-                    filtered.append((sym, vol))
+            # Объём — из общего снапшота тикеров (tickers.py), без второго запроса
+            if not await tickers.refresh(self):
+                return sorted(all_usdt)
 
+            filtered = [
+                (sym, t.volume_usdt)
+                for sym, t in tickers.all_tickers().items()
+                if sym in all_usdt and t.volume_usdt >= min_volume_usdt
+            ]
             filtered.sort(key=lambda x: x[1], reverse=True)
             coins = [sym for sym, _ in filtered]
             if max_coins and max_coins > 0:
@@ -171,22 +539,38 @@ class OKXFetcher:
             log.error(f"Ошибка загрузки монет: {e}")
             return []
 
+    async def get_tickers(self) -> list:
+        """Сырые тикеры всех SWAP одним запросом; [] при ошибке."""
+        try:
+            status, d, _ = await self._get(
+                "tickers", OKX_TICKERS, {"instType": "SWAP"}
+            )
+            if status == 200:
+                return d.get("data") or []
+        except Exception as e:
+            log.warning(f"Ошибка загрузки тикеров: {e}")
+        return []
+
     async def get_24h_change(self, symbol: str) -> Optional[dict]:
+        """Изменение и объём за 24ч из снапшота; одиночный запрос — только если
+        символа нет в снапшоте (новый листинг между обновлениями)."""
+        await tickers.refresh(self)
+        t = tickers.get(symbol)
+        if t is not None:
+            return {"change_pct": t.change_pct, "volume_usdt": t.volume_usdt}
         try:
-            sess = await self._sess()
-            async with sess.get(
-                OKX_TICKERS, params={"instId": self._to_okx(symbol)}
-            ) as resp:
-                if resp.status == 200:
-                    d    = await resp.json()
-                    t    = d["data"][0]
-                    last = float(t.get("last", 0))
-                    op   = float(t.get("open24h", last))
-                    chg  = ((last - op) / op * 100) if op else 0
-                    return {
-                        "change_pct":  chg,
-                        "volume_usdt": float(t.get("volCcy24h", 0)),
-                    }
+            status, d, _ = await self._get(
+                "ticker", OKX_TICKERS, {"instId": self._to_okx(symbol)}
+            )
+            if status == 200 and d.get("data"):
+                t    = d["data"][0]
+                last = float(t.get("last", 0))
+                op   = float(t.get("open24h", last))
+                chg  = ((last - op) / op * 100) if op else 0
+                return {
+                    "change_pct":  chg,
+                    "volume_usdt": float(t.get("volCcy24h", 0)) * last,
+                }
         except Exception:
             pass
         return None
@@ -194,32 +578,8 @@ class OKXFetcher:
  
     async def get_global_trend(self) -> dict:
         """
-        Анализирует глобальный тренд по BTC и ETH на таймфреймах H1, H4 и D1.
+        Глобальный тренд BTC и ETH на H1, H4, D1, W1 — из общего рыночного
+        режима (market_regime.py), который пересчитывается раз на бар.
         """
-        result = {}
-        tfs = {"1H": "H1", "4H": "H4", "1D": "D1", "1W": "W1"}
-        
-        for symbol in ["BTC-USDT-SWAP", "ETH-USDT-SWAP"]:
-            name = "BTC" if "BTC" in symbol else "ETH"
-            result[name] = {"trend_text": ""}
-            trend_strs = []
-            
-            for okx_tf, hum_tf in tfs.items():
-                try:
-                    df = await self.get_candles(symbol, okx_tf, limit=60)
-                    if df is None or len(df) < 50: continue
-                    
-                    close = df["close"]
-                    ema50  = close.ewm(span=50, adjust=False).mean().iloc[-1]
-                    price  = close.iloc[-1]
-                    
-                    if price > ema50 * 1.002: trend = "🟢"
-                    elif price < ema50 * 0.998: trend = "🔴"
-                    else: trend = "⚪"
-                    
-                    trend_strs.append(f"{hum_tf}: {trend}")
-                except Exception:
-                    trend_strs.append(f"{hum_tf}: ❓")
-            
-            result[name]["trend_text"] = " | ".join(trend_strs)
-        return result
+        await market_regime.refresh(self)
+        return market_regime.legacy_trend()
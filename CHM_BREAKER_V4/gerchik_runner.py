@@ -18,10 +18,13 @@ from typing import Optional
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup
 
 import cache
 import database as db
+import outbound
+import sharding
+import signal_render
 from fetcher import OKXFetcher
 from user_manager import UserManager, UserSettings
 from gerchik_strategy import GerchikStrategy, GerchikConfig, Level
@@ -40,12 +43,6 @@ MIN_LEVEL_STR   = 2
 MAX_SIGNALS_PER_CYCLE = 3
 
 
-def _tv_url(symbol: str) -> str:
-    """Ссылка TradingView для OKX-символа. BTC-USDT-SWAP → OKX:BTCUSDT.P"""
-    clean = symbol.replace("-SWAP", "").replace("-", "")
-    return "https://www.tradingview.com/chart/?symbol=OKX:" + clean + ".P"
-
-
 def _fmt_price(v: float) -> str:
     """Форматирует цену убирая лишние нули."""
     try:
@@ -103,26 +100,7 @@ def _signal_text(
 
 def _signal_kb(trade_id: str, symbol: str, show_trade_btn: bool = False) -> InlineKeyboardMarkup:
     """Клавиатура под сигналом Герчика."""
-    rows = [
-        [
-            InlineKeyboardButton(text="📈 График",     url=_tv_url(symbol)),
-            InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats"),
-        ],
-        [
-            InlineKeyboardButton(
-                text="📋 Записать результат ▾",
-                callback_data="sig_records_" + trade_id,
-            ),
-        ],
-    ]
-    if show_trade_btn:
-        rows.insert(0, [
-            InlineKeyboardButton(
-                text="✅ Открыть сделку на Bybit",
-                callback_data="exec_trade_" + trade_id,
-            ),
-        ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    return signal_render.signal_keyboard(symbol, trade_id, show_trade_btn)
 
 
 class GerchikScanner:
@@ -349,11 +327,12 @@ class GerchikScanner:
             max_trades = getattr(user, "max_trades_limit", 5)
             open_count = await db.db_count_open_trades(uid)
             if max_trades > 0 and open_count >= max_trades:
-                await self._bot.send_message(
-                    uid,
+                await outbound.send(
+                    self._bot, uid,
                     f"⛔ Авто-трейд отклонён: достигнут лимит открытых сделок "
                     f"({open_count}/{max_trades}).\n"
                     f"Сигнал: {symbol} {sig['direction']}",
+                    prio=outbound.PRIO_TRADE,
                 )
                 auto_trade = False
 
@@ -384,35 +363,30 @@ class GerchikScanner:
                         risk_pct, leverage,
                         tp2=sig["tp2"], tp3=sig["tp2"],
                     )
-                    await self._bot.send_message(uid, trade_msg, parse_mode="HTML")
+                    await outbound.send(
+                        self._bot, uid, trade_msg, parse_mode="HTML",
+                        prio=outbound.PRIO_TRADE,
+                    )
                 except Exception as e:
                     log.error(f"Герчик auto_trade {symbol}: {e}")
                     await db.db_set_trade_result(trade_id, "SKIP", 0.0)
-                    await self._bot.send_message(
-                        uid,
+                    await outbound.send(
+                        self._bot, uid,
                         f"⚠️ Авто-трейд: ошибка открытия {symbol}: {e}",
+                        prio=outbound.PRIO_TRADE,
                     )
             else:
                 show_trade_btn = True
 
-        text = _signal_text(
-            symbol    = symbol,
-            direction = sig["direction"],
-            entry     = sig["entry"],
-            sl        = sig["sl"],
-            tp1       = sig["tp1"],
-            tp2       = sig["tp2"],
-            level     = sig["level"],
-            rr        = sig["rr"],
-        )
-
         try:
-            await self._bot.send_message(
+            await outbound.send(
+                self._bot,
                 uid,
-                text,
+                sig["text"],
                 parse_mode      = "HTML",
                 reply_markup    = _signal_kb(trade_id, symbol, show_trade_btn),
                 protect_content = True,
+                prio            = outbound.PRIO_SIGNAL,
             )
             user.signals_received += 1
             await self._um.save(user)
@@ -454,6 +428,9 @@ class GerchikScanner:
             log.warning("Герчик: монеты не загружены")
             return
 
+        # В шардированном режиме каждый процесс сканирует свою долю монет
+        coins = sharding.mine_symbols(coins)
+
         log.info(f"   Монет для сканирования: {len(coins)}")
 
         # Загружаем свечи пакетами
@@ -486,6 +463,17 @@ class GerchikScanner:
                 continue
 
             signals_found += 1
+            # Текст одинаков для всех получателей — рендерим один раз
+            sig["text"] = _signal_text(
+                symbol    = sym,
+                direction = sig["direction"],
+                entry     = sig["entry"],
+                sl        = sig["sl"],
+                tp1       = sig["tp1"],
+                tp2       = sig["tp2"],
+                level     = sig["level"],
+                rr        = sig["rr"],
+            )
 
             # Рассылаем всем активным пользователям
             for user in active:
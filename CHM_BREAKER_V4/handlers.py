@@ -10,7 +10,7 @@ import time
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-from aiogram.types import BufferedInputFile
+from aiogram.types import BufferedInputFile, FSInputFile
 import asyncio
 import logging
 from dataclasses import fields
@@ -21,8 +21,12 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.exceptions import TelegramRetryAfter, TelegramBadRequest, TelegramForbiddenError
 
+import archive
+import broadcast
 import database as db
+import paging
 import turso_sync as _turso
+import market_regime
 from user_manager import UserManager, UserSettings, TradeCfg, SMCUserCfg
 from keyboards import (
     kb_main, kb_back, kb_back_photo, kb_settings, kb_notify, kb_subscribe,
@@ -275,6 +279,15 @@ def stats_text(user: UserSettings, stats: dict) -> str:
         best += "  • " + s + ": " + str(d["wins"]) + "/" + str(d["total"]) + " (" + str(pct) + "%)" + NL
     if not best:
         best = "  Нужно 2+ сделки по монете" + NL
+    per = stats.get("periods", {})
+    recent = ""
+    for key, label in (("d", "Сегодня"), ("w", "Неделя"), ("m", "Месяц")):
+        p = per.get(key)
+        if p:
+            recent += ("  " + label + ": <b>" + "{:+.2f}".format(p["total_rr"]) + "R</b>"
+                       "  (" + str(p["wins"]) + "/" + str(p["total"]) + ")" + NL)
+    if recent:
+        recent = "━━━━━━━━━━━━━━━━━━━━" + NL + "🗓 <b>Недавно:</b>" + NL + recent
     return (
         "📊 <b>Статистика — " + name + "</b>" + NL + NL +
         "━━━━━━━━━━━━━━━━━━━━" + NL +
@@ -286,7 +299,7 @@ def stats_text(user: UserSettings, stats: dict) -> str:
         "📈 Лонги: <b>" + str(lw) + "/" + str(lt) + "</b> (" + lwr + ")" + NL +
         "📉 Шорты: <b>" + str(sw) + "/" + str(st) + "</b> (" + swr + ")" + NL +
         "━━━━━━━━━━━━━━━━━━━━" + NL +
-        "🏆 <b>Лучшие монеты:</b>" + NL + best
+        "🏆 <b>Лучшие монеты:</b>" + NL + best + recent
     )
 
 
@@ -554,12 +567,13 @@ async def _do_analyze_multitf(symbol: str, fetcher, indicator,
     """
     NL = "\n"
 
-    # Загрузка свечей BTC/ETH для корреляции
+    # Свечи BTC/ETH для корреляции — из общего рыночного режима
     try:
-        df_btc = await fetcher.get_candles("BTC-USDT-SWAP", "1H", limit=100)
-        df_eth = await fetcher.get_candles("ETH-USDT-SWAP", "1H", limit=100)
-    except Exception:
-        df_btc = df_eth = None
+        await market_regime.refresh(fetcher)
+    except Exception as e:
+        log.debug(f"market_regime: {e}")
+    df_btc = market_regime.frame("BTC-USDT-SWAP", "1h")
+    df_eth = market_regime.frame("ETH-USDT-SWAP", "1h")
 
     # Попытка анализа на 3 ТФ
     tf_list = ["1H", "4H", "1D"]
@@ -1326,6 +1340,8 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
     @dp.message(Command("start"))
     async def cmd_start(msg: Message):
         user = await um.get_or_create(msg.from_user.id, msg.from_user.username or "")
+        # Снова написал боту — рассылки его больше не пропускают
+        await db.db_blocked_remove(msg.from_user.id)
         # Обрабатываем реферальную ссылку: /start ref_12345
         args = msg.text.split(maxsplit=1)
         payload = args[1].strip() if len(args) > 1 else ""
@@ -1616,6 +1632,10 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         except Exception as e:
             log.error(f"_do_analyze error {symbol}: {e}")
             result_text = f"❌ Ошибка анализа <b>{symbol}</b>: {e}"
+        else:
+            regime_block = market_regime.text_block()
+            if regime_block:
+                result_text += "\n\n" + regime_block
         try:
             await wait_msg.delete()
         except Exception:
@@ -2193,19 +2213,20 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         await cb.answer()
         user   = await um.get_or_create(cb.from_user.id)
         stats  = await db.db_get_user_stats(user.user_id)
-        trades = await db.db_get_user_trades(user.user_id)
+        # Кривая по дневным корзинам user_stats — не грузим всю историю сделок
+        days   = await db.db_get_user_stats_buckets(user.user_id, "d", limit=365)
         text   = stats_text(user, stats)
         kb_stats = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📊 По стратегиям", callback_data="my_stats_strategy")],
+            [InlineKeyboardButton(text="📊 По стратегиям", callback_data="my_stats_strategy"),
+             InlineKeyboardButton(text="📜 История", callback_data="th:")],
             [InlineKeyboardButton(text="◀️ Назад", callback_data="back_main")],
         ])
-        if not trades or len(trades) < 2:
+        if len(days) < 2:
             await safe_edit(cb, text, kb_stats)
             return
         equity = [0.0]
-        for t in trades:
-            if t["result"] in ("TP1","TP2","TP3","SL"):
-                equity.append(equity[-1] + t["result_rr"])
+        for _day, d in reversed(days):
+            equity.append(equity[-1] + d["total_rr"])
         plt.figure(figsize=(8, 4))
         color = '#00d26a' if equity[-1] >= 0 else '#f6465d'
         plt.plot(equity, color=color, linewidth=2)
@@ -2217,13 +2238,14 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         plt.gca().tick_params(colors='white')
         plt.axhline(0, color='white', linewidth=0.5, alpha=0.5)
         plt.ylabel("Профит (в R)", color='white')
-        plt.xlabel("Количество сделок", color='white')
+        plt.xlabel("Дни с закрытыми сделками", color='white')
         buf = io.BytesIO()
         plt.savefig(buf, format='png', bbox_inches='tight')
         buf.seek(0); plt.close()
         photo = BufferedInputFile(buf.getvalue(), filename="equity.png")
         kb_photo = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="📊 По стратегиям", callback_data="my_stats_strategy")],
+            [InlineKeyboardButton(text="📊 По стратегиям", callback_data="my_stats_strategy"),
+             InlineKeyboardButton(text="📜 История", callback_data="th:")],
             [InlineKeyboardButton(text="◀️ Назад в меню",  callback_data="back_photo_main")],
         ])
         await cb.message.delete()
@@ -2262,6 +2284,42 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         await bot.send_photo(chat_id=cb.message.chat.id, photo=photo,
                              caption=caption, parse_mode="HTML", reply_markup=kb_back_photo())
 
+    @dp.callback_query(F.data.startswith("th:"))
+    async def trade_history(cb: CallbackQuery):
+        """История закрытых сделок страницами по 10 (th:<токен курсора>)."""
+        await cb.answer()
+        NL     = "\n"
+        cursor = paging.unpack(cb.data[3:])
+        trades, nxt = await db.db_trades_page(cb.from_user.id, cursor, limit=10)
+        lines = ["📜 <b>История сделок</b>" + ("" if cursor is None else " — ранее") + NL]
+        if not trades:
+            lines.append("Закрытых сделок пока нет.")
+        for t in trades:
+            ts  = time.strftime("%d.%m %H:%M", time.localtime(t["created_at"] or 0))
+            em  = "✅" if t["result"] in ("TP1", "TP2", "TP3") else ("❌" if t["result"] == "SL" else "♻️")
+            sym = t["symbol"].replace("-USDT-SWAP", "").replace("-USDT", "")
+            lines.append(
+                f"{em} <b>{_html.escape(sym)}</b> {t['direction']}  {t['result']}"
+                f"  <b>{(t['result_rr'] or 0):+.2f}R</b>  <i>{ts}</i>"
+            )
+        nav = []
+        if cursor is not None:
+            nav.append(InlineKeyboardButton(text="⏮ Новые", callback_data="th:"))
+        if nxt:
+            nav.append(InlineKeyboardButton(text="▶️ Раньше", callback_data="th:" + paging.pack(nxt)))
+        rows = [nav] if nav else []
+        rows.append([InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats")])
+        if cb.message.photo:
+            # пришли с фото-экрана статистики — текст на фото не правится
+            try:
+                await cb.message.delete()
+            except (TelegramBadRequest, TelegramForbiddenError):
+                pass
+            await bot.send_message(cb.message.chat.id, NL.join(lines), parse_mode="HTML",
+                                   reply_markup=InlineKeyboardMarkup(inline_keyboard=rows))
+            return
+        await safe_edit(cb, NL.join(lines), InlineKeyboardMarkup(inline_keyboard=rows))
+
     @dp.callback_query(F.data == "my_stats_strategy")
     async def my_stats_strategy(cb: CallbackQuery):
         await cb.answer()
@@ -3931,19 +3989,25 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
     async def cmd_admin(msg: Message):
         if not is_admin(msg.from_user.id): return
         s   = await um.stats_summary()
+        drift = db.counters_check_stats()["drift"]
         prf = scanner.get_perf() if hasattr(scanner, "get_perf") else {}
         cs  = prf.get("cache", {})
         NL  = "\n"
         await msg.answer(
             "👑 <b>Панель администратора</b>" + NL + NL +
             "👥 Всего: <b>" + str(s["total"]) + "</b>  🆓 Триал: <b>" + str(s["trial"]) + "</b>  ✅ Активных: <b>" + str(s["active"]) + "</b>" + NL +
-            "🔄 Сканируют: <b>" + str(s["scanning"]) + "</b>" + NL +
+            "🔄 Сканируют: <b>" + str(s["scanning"]) + "</b>  🚨 PD: <b>" + str(s["pd_subscribers"]) + "</b>  🎲 Ставок Poly: <b>" + str(s["poly_bets"]) + "</b>" + NL +
+            "📈 Сделки: открыто <b>" + str(s["trades_open"]) + "</b>, закрыто <b>" + str(s["trades_closed"]) + "</b>, в архиве <b>" + str(s["trades_archived"]) + "</b>" + NL +
+            (("⚠️ Счётчики расходились при сверке: " + _html.escape(str(drift)) + NL) if drift else "") +
             "━━━━━━━━━━━━━━━━━━━━" + NL +
             "Циклов: <b>" + str(prf.get("cycles",0)) + "</b>  Сигналов: <b>" + str(prf.get("signals",0)) + "</b>  API: <b>" + str(prf.get("api_calls",0)) + "</b>" + NL +
             "Кэш: <b>" + str(cs.get("size",0)) + "</b> ключей | хит <b>" + str(cs.get("ratio",0)) + "%</b>" + NL +
             "━━━━━━━━━━━━━━━━━━━━" + NL +
             "/give [id] [дней]  /revoke [id]  /ban [id]" + NL +
-            "/unban [id]  /userinfo [id]  /broadcast [текст]" + NL +
+            "/unban [id]  /userinfo [id]  /broadcast [текст]  /broadcast_stop [id]" + NL +
+            "/stats_rebuild [check] — пересчёт статистики сделок" + NL +
+            "/archive [run] — холодный архив истории" + NL +
+            "/users [статус]  /export [таблица] [csv|json]" + NL +
             "━━━━━━━━━━━━━━━━━━━━" + NL +
             "🎟 Промокоды:" + NL +
             "/addcode [код] [часов]  — создать промокод (по умолч. 2 ч.)" + NL +
@@ -4105,13 +4169,16 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         text = msg.text.replace("/broadcast", "", 1).strip()
         if not text:
             await msg.answer("Использование: /broadcast [текст]"); return
-        users  = await um.all_users()
-        target = [u for u in users if u.sub_status in ("trial", "active")]
+        users   = await um.all_users()
+        blocked = await db.db_blocked_ids()
+        target  = [u for u in users
+                   if u.sub_status in ("trial", "active") and u.user_id not in blocked]
         await state.update_data(broadcast_text=text)
         await state.set_state(BroadcastState.confirm)
         await msg.answer(
             f"📢 <b>Подтверждение рассылки</b>\n\n"
-            f"Получателей: <b>{len(target)}</b> активных пользователей\n\n"
+            f"Получателей: <b>{len(target)}</b> активных пользователей"
+            + (f" (пропущено заблокировавших бота: {len(blocked)})" if blocked else "") + "\n\n"
             f"Текст сообщения:\n<i>{text}</i>\n\n"
             f"Напишите <code>CONFIRM</code> для отправки или /cancel для отмены.",
             parse_mode="HTML",
@@ -4125,33 +4192,74 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
             data = await state.get_data()
             text = data.get("broadcast_text", "")
             await state.clear()
-            users = await um.all_users()
-            sent = failed = 0
-            _audit.info("BROADCAST by_admin=%s recipients=%d", msg.from_user.id,
-                        sum(1 for u in users if u.sub_status in ("trial", "active")))
-            for u in users:
-                if u.sub_status in ("trial", "active"):
-                    try:
-                        await bot.send_message(u.user_id, f"📢 {text}")
-                        sent += 1
-                        await asyncio.sleep(0.04)
-                    except TelegramForbiddenError:
-                        failed += 1  # пользователь заблокировал бота
-                    except TelegramRetryAfter as e:
-                        await asyncio.sleep(e.retry_after)
-                        try:
-                            await bot.send_message(u.user_id, f"📢 {text}")
-                            sent += 1
-                        except Exception:
-                            failed += 1
-                    except Exception as e:
-                        log.warning("broadcast uid=%s: %s", u.user_id, e)
-                        failed += 1
-            await msg.answer(f"📢 Рассылка завершена: ✅ {sent}  ❌ {failed}")
+            users   = await um.all_users()
+            blocked = await db.db_blocked_ids()
+            target  = [u.user_id for u in users
+                       if u.sub_status in ("trial", "active") and u.user_id not in blocked]
+            # Задание в БД и фоновая отправка: хендлер не ждёт, рестарт не теряет
+            # прогресс; ход рассылки — правкой этого сообщения
+            progress = await msg.answer(f"📢 Рассылка: {len(target)} получателей, запускаем…")
+            job_id = await broadcast.start(
+                bot, msg.from_user.id, progress.chat.id, progress.message_id,
+                text, target,
+            )
+            _audit.info("BROADCAST #%d by_admin=%s recipients=%d",
+                        job_id, msg.from_user.id, len(target))
         else:
             await state.clear()
             await msg.answer("❌ Рассылка отменена.")
 
+    @dp.message(Command("broadcast_stop"))
+    async def cmd_broadcast_stop(msg: Message):
+        if not is_admin(msg.from_user.id): return
+        arg = msg.text.replace("/broadcast_stop", "", 1).strip()
+        if not arg.isdigit():
+            await msg.answer("Использование: /broadcast_stop [id]"); return
+        if await broadcast.cancel(int(arg)):
+            _audit.info("BROADCAST_STOP #%s by_admin=%s", arg, msg.from_user.id)
+            await msg.answer(f"⏹ Рассылка #{arg} остановлена.")
+        else:
+            await msg.answer(f"Рассылка #{arg} не найдена или уже завершена.")
+
+    @dp.message(Command("stats_rebuild"))
+    async def cmd_stats_rebuild(msg: Message):
+        """/stats_rebuild [check] — пересчитать user_stats из истории сделок."""
+        if not is_admin(msg.from_user.id): return
+        check = msg.text.replace("/stats_rebuild", "", 1).strip().lower() == "check"
+        res = await db.db_user_stats_rebuild(verify_only=check)
+        _audit.info("STATS_REBUILD check=%s mismatched=%s by_admin=%s",
+                    check, res["mismatched"], msg.from_user.id)
+        head = "🔎 Сверка user_stats" if check else "📊 user_stats пересобрана"
+        lines = [
+            f"{head}: сделок <b>{res['trades']}</b>, строк <b>{res['rows']}</b>, "
+            f"монет <b>{res['symbols']}</b>",
+            f"Расхождений: <b>{res['mismatched']}</b>"
+            + (" — исправлено" if res["mismatched"] and not check else ""),
+        ]
+        lines += [f"<code>{k}</code>" for k in res["examples"]]
+        await msg.answer("\n".join(lines), parse_mode="HTML")
+
+    @dp.message(Command("archive"))
+    async def cmd_archive(msg: Message):
+        """/archive [run] — состояние холодного архива; run — перенести сейчас."""
+        if not is_admin(msg.from_user.id): return
+        lines = []
+        if msg.text.replace("/archive", "", 1).strip().lower() == "run":
+            moved = await archive.run_once()
+            _audit.info("ARCHIVE_RUN moved=%s by_admin=%s", moved, msg.from_user.id)
+            lines.append("🗄 Перенесено: " + (", ".join(f"{k} {v}" for k, v in moved.items())
+                                             or "архивация выключена"))
+        st = archive.stats()
+        counts = await db.db_archive_counts()
+        lines += [
+            f"🗄 <b>Архив</b>: старше {st['after_days']:g} дн. → <code>{_html.escape(st['path'] or '—')}</code>",
+            *(f"{k}: в БД <b>{live}</b>, в архиве <b>{cold}</b>" for k, (live, cold) in counts.items()),
+            f"Проходов: {st['runs']}, последний {st['last_s']}с, всего перенесено {st['moved']}",
+            "<i>Архив только на локальном диске: в Turso не синхронизируется,"
+            " копия — .bak1/.bak2 при старте</i>",
+        ]
+        await msg.answer("\n".join(lines), parse_mode="HTML")
+
     # ─── ПРОЧЕЕ ───────────────────────────────────────
 
     @dp.callback_query(F.data == "noop")
@@ -4224,6 +4332,46 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         lines.append(NL + "Удалить: /delcode КОД")
         await msg.answer(NL.join(lines), parse_mode="HTML")
 
+    # ─── ПРОФАЙЛЕР СТАДИЙ ИНДИКАТОРА ──────────────────
+
+    @dp.message(Command("profile"))
+    async def cmd_profile(msg: Message):
+        """/profile on|off|reset|dump [tf] — тайминги стадий CHMIndicator без рестарта."""
+        if not is_admin(msg.from_user.id): return
+        import stage_profiler
+        parts = msg.text.split()
+        arg   = parts[1].lower() if len(parts) > 1 else ""
+        NL    = "\n"
+        if arg == "on":
+            stage_profiler.enable()
+            await msg.answer("⏱ Профайлер стадий включён."); return
+        if arg == "off":
+            stage_profiler.disable()
+            await msg.answer("⏱ Профайлер стадий выключен."); return
+        if arg == "reset":
+            stage_profiler.reset()
+            await msg.answer("⏱ Статистика стадий сброшена."); return
+        if arg == "dump":
+            tf = parts[2] if len(parts) > 2 else None
+            text = stage_profiler.dump_text(tf)
+            await msg.answer(
+                "<b>Гистограмма стадий" + (" " + _html.escape(tf) if tf else "") + "</b>" + NL +
+                "<pre>" + _html.escape(text[:3800]) + "</pre>",
+                parse_mode="HTML",
+            )
+            return
+        lines = ["⏱ <b>Стадии индикатора</b> (" +
+                 ("вкл" if stage_profiler.enabled() else "выкл") + ")"]
+        for tf, stages in stage_profiler.stats_by_tf().items():
+            lines.append(NL + "<b>" + _html.escape(tf) + "</b>")
+            for name, st in sorted(stages.items(), key=lambda kv: -kv[1]["total_s"]):
+                lines.append(
+                    f"<code>{name:<22}</code> n={st['n']} "
+                    f"avg {st['avg_ms']}мс max {st['max_ms']}мс"
+                )
+        lines.append(NL + "/profile on|off|reset|dump [tf]")
+        await msg.answer(NL.join(lines), parse_mode="HTML")
+
     # ─── ЭКСПОРТ / ИМПОРТ ПОДПИСОК ────────────────────
     # После редеплоя БД может быть пуста. /export_subs сохраняет
     # список активных подписок в файл и в Telegram.
@@ -4253,21 +4401,102 @@ def register_handlers(dp: Dispatcher, bot: Bot, um: UserManager, scanner, config
         except Exception as e:
             log.warning(f"subs backup write error: {e}")
 
+    async def _send_export(msg: Message, kind: str, fmt: str, caption: str = "") -> int:
+        """Выгрузка db_export во временный файл → документ; файл читается с диска."""
+        import os, tempfile
+        fd, path = tempfile.mkstemp(prefix=f"chm_{kind}_", suffix="." + fmt)
+        os.close(fd)
+        try:
+            n = await db.db_export(kind, path, fmt)
+            if n:
+                stamp = time.strftime("%Y%m%d_%H%M")
+                await msg.answer_document(
+                    FSInputFile(path, filename=f"{kind}_{stamp}.{fmt}"),
+                    caption=(caption or f"📦 {kind}: {n} строк"), parse_mode="HTML",
+                )
+            return n
+        finally:
+            os.unlink(path)
+
     @dp.message(Command("export_subs"))
     async def cmd_export_subs(msg: Message):
         if not is_admin(msg.from_user.id): return
         await _save_subs_backup()
-        users = await um.all_users()
-        active = [u for u in users if u.sub_status in ("active", "trial") and u.sub_expires > time.time()]
-        if not active:
-            await msg.answer("📋 Нет активных подписок."); return
-        lines = ["📋 <b>Активные подписки:</b>", ""]
-        for u in active:
-            left = u.time_left_str()
-            lines.append(f"<code>/give {u.user_id} ___</code>  @{u.username or u.user_id}  осталось: {left}")
-        lines.append("")
-        lines.append(f"<i>Файл: subs_backup.txt — используй /import_subs после редеплоя</i>")
-        await msg.answer("\n".join(lines), parse_mode="HTML")
+        # Список мог не влезть в сообщение — отдаём CSV, собранный построчно
+        n = await _send_export(
+            msg, "subs", "csv",
+            caption="📋 <b>Активные подписки</b>\n"
+                    "<i>Файл subs_backup.txt — используй /import_subs после редеплоя</i>",
+        )
+        if not n:
+            await msg.answer("📋 Нет активных подписок.")
+
+    @dp.message(Command("export"))
+    async def cmd_export(msg: Message):
+        """/export [users|subs|trades|pd|bets] [csv|json] — потоковая выгрузка таблицы."""
+        if not is_admin(msg.from_user.id): return
+        parts = msg.text.split()
+        kind  = parts[1] if len(parts) > 1 else ""
+        fmt   = parts[2] if len(parts) > 2 else "csv"
+        if kind not in db.EXPORT_KINDS or fmt not in ("csv", "json"):
+            await msg.answer("Использование: /export [" + "|".join(db.EXPORT_KINDS) + "] [csv|json]")
+            return
+        _audit.info("EXPORT %s %s by_admin=%s", kind, fmt, msg.from_user.id)
+        if not await _send_export(msg, kind, fmt):
+            await msg.answer(f"📦 {kind}: пусто.")
+
+    # /users [status] — список пользователей по 20, листается вперёд (keyset)
+    _USERS_STATUSES = ("all", "paid", "trial", "active", "expired", "banned")
+
+    async def _users_page_view(status: str, token: str) -> tuple[str, InlineKeyboardMarkup]:
+        NL = "\n"
+        cursor = paging.unpack(token)
+        rows, nxt = await db.db_users_page(cursor, limit=20,
+                                           status=None if status == "all" else status)
+        lines = [f"👥 <b>Пользователи</b> ({status})" + ("" if cursor is None else " — далее") + NL]
+        now = time.time()
+        for r in rows:
+            left = (r["sub_expires"] or 0) - now
+            left_s = f"{left / 86400:.0f}д" if left > 0 else "—"
+            flags = "".join(em for em, on in (
+                ("📈", r["long_active"]), ("📉", r["short_active"]),
+                ("🧠", r["smc_long_active"] or r["smc_short_active"]),
+                ("🎯", r["gerchik_active"]), ("🤖", r["auto_trade"]),
+            ) if on)
+            lines.append(
+                f"<code>{r['user_id']}</code> @{_html.escape(r['username'] or '—')}"
+                f"  {r['sub_status']} {left_s} {flags}"
+            )
+        if not rows:
+            lines.append("Никого.")
+        nav = []
+        if cursor is not None:
+            nav.append(InlineKeyboardButton(text="⏮ В начало", callback_data=f"au:{status}:"))
+        if nxt:
+            nav.append(InlineKeyboardButton(text="▶️ Далее",
+                                            callback_data=f"au:{status}:" + paging.pack(nxt)))
+        return NL.join(lines), InlineKeyboardMarkup(inline_keyboard=[nav] if nav else [])
+
+    @dp.message(Command("users"))
+    async def cmd_users(msg: Message):
+        if not is_admin(msg.from_user.id): return
+        parts  = msg.text.split()
+        status = parts[1] if len(parts) > 1 else "all"
+        if status not in _USERS_STATUSES:
+            await msg.answer("Использование: /users [" + "|".join(_USERS_STATUSES) + "]"); return
+        text, kb = await _users_page_view(status, "")
+        await msg.answer(text, parse_mode="HTML", reply_markup=kb)
+
+    @dp.callback_query(F.data.startswith("au:"))
+    async def cb_users_page(cb: CallbackQuery):
+        if not is_admin(cb.from_user.id):
+            await cb.answer(); return
+        await cb.answer()
+        _, status, token = cb.data.split(":", 2)
+        if status not in _USERS_STATUSES:
+            return
+        text, kb = await _users_page_view(status, token)
+        await safe_edit(cb, text, kb)
 
     @dp.message(Command("import_subs"))
     async def cmd_import_subs(msg: Message):
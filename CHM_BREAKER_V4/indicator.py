@@ -17,12 +17,18 @@ import logging
 import math
 import numpy as np
 import pandas as pd
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import Optional
 from config import Config
+from stage_profiler import stage
 
 log = logging.getLogger("CHM.Indicator")
 
+# Кэш human_explanation: аргументы → текст (см. _build_human_explanation)
+_EXPL_CACHE: OrderedDict = OrderedDict()
+_EXPL_CACHE_MAX = 4096
+
 # Попытка импорта scipy для KDE — без него слой 2 молча пропускается
 try:
     from scipy.stats import gaussian_kde
@@ -144,6 +150,7 @@ class CHMIndicator:
     # СЛОЙ 2 — KDE КЛАСТЕРЫ (gaussian density)
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("kde_levels")
     def _kde_levels(self, pivot_prices: list[float],
                     price_range: tuple[float, float],
                     n_points: int = 500) -> list[float]:
@@ -166,6 +173,7 @@ class CHMIndicator:
     # СЛОЙ 3 — VOLUME PROFILE (HVN/LVN)
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("volume_profile")
     def _volume_profile(self, df: pd.DataFrame,
                         n_bins: int = 100) -> dict:
         """
@@ -206,6 +214,7 @@ class CHMIndicator:
     # СЛОЙ 1+2+3 — МНОГОСЛОЙНАЯ КЛАСТЕРИЗАЦИЯ ЗОН
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("get_zones")
     def _get_zones(self, df: pd.DataFrame, strength: int,
                    atr_now: float) -> tuple[list[dict], list[dict]]:
         """
@@ -308,6 +317,7 @@ class CHMIndicator:
     # МУЛЬТИ-ТАЙМФРЕЙМОВЫЕ УРОВНИ
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("multi_timeframe_levels")
     def _multi_timeframe_levels(self, df_ltf: pd.DataFrame,
                                 df_mtf: Optional[pd.DataFrame],
                                 df_htf: Optional[pd.DataFrame],
@@ -464,6 +474,7 @@ class CHMIndicator:
     # ПАТТЕРНЫ ИНСТИТУЦИОНАЛЬНОГО УРОВНЯ
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("institutional_pattern")
     def _detect_institutional_pattern(self, df: pd.DataFrame,
                                       level: float, direction: str,
                                       vol_ratio: float,
@@ -581,6 +592,7 @@ class CHMIndicator:
     # КАЧЕСТВО ПОДХОДА К УРОВНЮ
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("approach_quality")
     def _assess_approach_quality(self, df: pd.DataFrame, level: float,
                                  zone_buf: float,
                                  vol_ma: pd.Series) -> tuple[bool, str]:
@@ -859,14 +871,25 @@ class CHMIndicator:
         decimals = -math.floor(math.log10(v)) + 3
         return f"{v:.{decimals}f}".rstrip("0").rstrip(".")
 
-    def _build_human_explanation(self, signal: str, s_level: float,
-                                 s_class: int, s_hits: int, s_type: str,
-                                 entry: float, sl: float,
-                                 tp1: float, tp2: float,
-                                 rr1: float, rr2: float,
-                                 risk_pct: float, session: str,
-                                 corr_label: str,
-                                 diverg_label: str) -> str:
+    @stage("human_explanation")
+    def _build_human_explanation(self, *args) -> str:
+        # Результат зависит только от аргументов: один и тот же сигнал у
+        # пользователей с разными настройками объясняется одинаково
+        text = _EXPL_CACHE.get(args)
+        if text is None:
+            text = _EXPL_CACHE[args] = self._render_human_explanation(*args)
+            if len(_EXPL_CACHE) > _EXPL_CACHE_MAX:
+                _EXPL_CACHE.popitem(last=False)
+        return text
+
+    def _render_human_explanation(self, signal: str, s_level: float,
+                                  s_class: int, s_hits: int, s_type: str,
+                                  entry: float, sl: float,
+                                  tp1: float, tp2: float,
+                                  rr1: float, rr2: float,
+                                  risk_pct: float, session: str,
+                                  corr_label: str,
+                                  diverg_label: str) -> str:
         fp = self._fmt_p
         is_long = signal == "LONG"
         cls_names = {1: "Абсолютный", 2: "Сильный", 3: "Рабочий"}
@@ -979,6 +1002,7 @@ class CHMIndicator:
     # ВНУТРЕННИЙ МЕТОД АНАЛИЗА
     # ─────────────────────────────────────────────────────────────────────────
 
+    @stage("total")
     def _do_analyze(self, symbol: str, df: pd.DataFrame,
                     df_htf: Optional[pd.DataFrame],
                     df_btc: Optional[pd.DataFrame],
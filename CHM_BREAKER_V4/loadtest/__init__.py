@@ -0,0 +1 @@
+"""loadtest — офлайн нагрузочные прогоны сканеров (fake OKX + fake Telegram)."""
@@ -0,0 +1,237 @@
+"""
+loadtest/bench.py — микробенчмарки анализаторов на синтетических OHLCV.
+
+Без сети и БД. Данные детерминированные (loadtest/synthetic.py):
+режимы trending / ranging / gappy / low_liquidity × 300 / 1000 / 5000 баров.
+
+Функции:
+  chm.analyze          CHMIndicator.analyze (свежий экземпляр — без cooldown)
+  smc.analyze          SMCAnalyzer.analyze (HTF 4H / MTF 1H / LTF 15m)
+  smc.build_signal     build_smc_signal на готовом анализе
+  gerchik.find_levels  GerchikStrategy.find_levels
+  gerchik.backtest     GerchikStrategy.backtest
+  pd.anomaly           pump_dump.anomaly_detector.detect
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.bench                       # сравнить с baseline
+  python -m loadtest.bench --save-baseline       # записать baseline
+  python -m loadtest.bench --only chm,smc --sizes 300,1000 --json out.json
+
+Сравнение по медиане: если функция медленнее baseline больше чем на
+--threshold (по умолчанию 25%), печатается таблица и код выхода 1;
+нет файла baseline — код выхода 2. В репозитории лежит
+loadtest/bench_baseline.json (машина — в его meta). Baseline зависит
+от машины — для своей пишите его через --save-baseline.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+
+from loadtest.synthetic import KINDS, make_ohlcv, stable_seed
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "bench_baseline.json")
+SIZES         = (300, 1000, 5000)
+MIN_TIME_S    = 0.5    # крутим функцию хотя бы столько…
+MIN_REPS      = 3      # …и хотя бы столько раз
+MAX_REPS      = 50
+SLOW_CALL_S   = 2.0    # если один вызов дольше — одного замера достаточно
+
+
+# ── Подготовка кейсов ────────────────────────────────────────────────────────
+
+def _frames(kind: str, n: int) -> dict:
+    sym = f"BENCH-{kind.upper()}"
+
+    def mk(bar_sec: int, tag: str):
+        return make_ohlcv(n=n, kind=kind, seed=stable_seed(sym, tag, n), bar_sec=bar_sec)
+
+    pd_df = mk(60, "1m")
+    pd_df["buy_vol"] = pd_df["volume"] * 0.55
+    return {
+        "symbol": sym,
+        "h1":  mk(3600, "1H"),
+        "h4":  mk(14400, "4H"),
+        "m15": mk(900, "15m"),
+        "pd":  pd_df,
+    }
+
+
+def _cases(only: set) -> dict:
+    """name → setup(frames) → callable без аргументов."""
+    # scanner_mid тянет config, которому нужен токен — для бенчмарка любой
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:BENCH")
+    from gerchik_strategy import GerchikStrategy
+    from indicator import CHMIndicator
+    from pump_dump.anomaly_detector import detect
+    from scanner_mid import _cfg_to_ind
+    from smc.analyzer import SMCAnalyzer, SMCConfig
+    from smc.signal_builder import build_smc_signal
+    from user_manager import TradeCfg
+
+    ind_cfg = _cfg_to_ind(TradeCfg())
+
+    def chm_analyze(f):
+        return lambda: CHMIndicator(ind_cfg).analyze(f["symbol"], f["h1"])
+
+    def smc_analyze(f):
+        an = SMCAnalyzer(SMCConfig())
+        return lambda: an.analyze(f["symbol"], f["h4"], f["h1"], f["m15"])
+
+    def smc_build(f):
+        cfg = SMCConfig()
+        analysis = SMCAnalyzer(cfg).analyze(f["symbol"], f["h4"], f["h1"], f["m15"])
+        return lambda: build_smc_signal(f["symbol"], analysis, cfg, "4H", "1H", "15m")
+
+    def gerchik_levels(f):
+        strat = GerchikStrategy()
+        return lambda: strat.find_levels(f["h1"])
+
+    def gerchik_backtest(f):
+        return lambda: GerchikStrategy().backtest(f["h1"])
+
+    def pd_anomaly(f):
+        df = f["pd"]
+        buy = float(df["buy_vol"].iloc[-30:].sum())
+        return lambda: detect(df, buy, buy * 0.8)
+
+    cases = {
+        "chm.analyze":         chm_analyze,
+        "smc.analyze":         smc_analyze,
+        "smc.build_signal":    smc_build,
+        "gerchik.find_levels": gerchik_levels,
+        "gerchik.backtest":    gerchik_backtest,
+        "pd.anomaly":          pd_anomaly,
+    }
+    if only:
+        cases = {k: v for k, v in cases.items() if k.split(".")[0] in only or k in only}
+    return cases
+
+
+# ── Замер ────────────────────────────────────────────────────────────────────
+
+def _time_call(fn) -> dict:
+    fn()   # прогрев: ленивые импорты, кэши numpy/pandas
+    times = []
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if times[0] > SLOW_CALL_S:
+            break
+        if len(times) >= MAX_REPS:
+            break
+        if len(times) >= MIN_REPS and time.perf_counter() - start >= MIN_TIME_S:
+            break
+    return {
+        "median_ms": round(statistics.median(times) * 1000, 3),
+        "min_ms":    round(min(times) * 1000, 3),
+        "reps":      len(times),
+    }
+
+
+def run(sizes, kinds, only) -> dict:
+    cases = _cases(only)
+    results = {}
+    for n in sizes:
+        for kind in kinds:
+            frames = _frames(kind, n)
+            for name, setup in cases.items():
+                key = f"{name}/{kind}/{n}"
+                try:
+                    results[key] = _time_call(setup(frames))
+                except Exception as e:
+                    results[key] = {"error": repr(e)}
+                r = results[key]
+                print(f"  {key:<40} " + (
+                    f"{r['median_ms']:>10.3f} ms  (x{r['reps']})"
+                    if "median_ms" in r else r["error"]
+                ), flush=True)
+    import numpy, pandas
+    return {
+        "meta": {
+            "python":   platform.python_version(),
+            "numpy":    numpy.__version__,
+            "pandas":   pandas.__version__,
+            "machine":  platform.machine(),
+            "platform": platform.platform(),
+            "created":  time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+# ── Сравнение с baseline ─────────────────────────────────────────────────────
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Строки регрессий: функция медленнее baseline больше чем на threshold."""
+    regressions = []
+    rows = []
+    for key, cur in sorted(current["results"].items()):
+        base = baseline.get("results", {}).get(key)
+        if not base or "median_ms" not in base or "median_ms" not in cur:
+            continue
+        b, c = base["median_ms"], cur["median_ms"]
+        delta = (c - b) / b if b > 0 else 0.0
+        mark = ""
+        if delta > threshold:
+            mark = "  ← РЕГРЕССИЯ"
+            regressions.append(key)
+        rows.append(f"  {key:<40} {b:>10.3f} → {c:>10.3f} ms  {delta:+7.1%}{mark}")
+    print(f"\nСравнение с baseline ({baseline.get('meta', {}).get('created', '?')}), "
+          f"порог +{threshold:.0%}:")
+    print("\n".join(rows) if rows else "  нет общих ключей")
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="CHM analyzer micro-benchmarks")
+    p.add_argument("--sizes",     default=",".join(map(str, SIZES)))
+    p.add_argument("--kinds",     default=",".join(KINDS))
+    p.add_argument("--only",      default="", help="chm,smc,gerchik,pd или полные имена")
+    p.add_argument("--baseline",  default=BASELINE_PATH)
+    p.add_argument("--threshold", type=float, default=0.25)
+    p.add_argument("--json",      default=None, help="куда сохранить результаты")
+    p.add_argument("--save-baseline", action="store_true")
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=logging.ERROR)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    kinds = [k for k in args.kinds.split(",") if k]
+    only  = {o for o in args.only.split(",") if o}
+    bad = set(kinds) - set(KINDS)
+    if bad:
+        raise SystemExit(f"Неизвестные режимы: {', '.join(sorted(bad))}")
+
+    current = run(sizes, kinds, only)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"\nBaseline записан: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        # Без baseline сравнивать не с чем — гейт не должен молча проходить
+        print(f"\n❌ Baseline не найден ({args.baseline}) — запустите с --save-baseline")
+        sys.exit(2)
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f"\n❌ Регрессии: {len(regressions)}")
+        sys.exit(1)
+    print("\n✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+loadtest/bench_db.py — вставка сделок: коммит на каждую строку vs групповой.
+
+  per-call  — как было: write-lock + INSERT + COMMIT на каждую сделку
+  grouped   — database.db_add_trade через write-behind очередь
+              (DB_GROUP_MS / DB_GROUP_ROWS)
+
+Обе ветки запускают --producers параллельных корутин (как сканеры и
+хендлеры в боте) на временной SQLite в WAL. Без сети и Telegram.
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.bench_db                     # 10k сделок
+  python -m loadtest.bench_db --rows 50000 --producers 200 --json db.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import database as db
+
+
+def _trade(i: int) -> dict:
+    return {
+        "trade_id":      f"bench_{i}",
+        "user_id":       1_000_000 + i % 500,
+        "symbol":        "BTC-USDT-SWAP",
+        "direction":     "LONG" if i % 2 else "SHORT",
+        "entry":         60_000.0 + i,
+        "sl":            59_000.0 + i,
+        "tp1":           61_000.0 + i,
+        "tp2":           62_000.0 + i,
+        "tp3":           63_000.0 + i,
+        "quality":       3,
+        "timeframe":     "1H",
+        "breakout_type": "BENCH",
+        "created_at":    time.time(),
+    }
+
+
+async def _per_call(data: dict):
+    """Старый путь: отдельная транзакция на строку."""
+    cols = ", ".join(data)
+    marks = ", ".join("?" * len(data))
+    async with db._write() as conn:
+        await conn.execute(
+            f"INSERT OR IGNORE INTO trades ({cols}) VALUES ({marks})",
+            list(data.values()),
+        )
+        await conn.commit()
+
+
+async def _run(insert, rows: int, producers: int, offset: int) -> float:
+    async def producer(k: int):
+        for i in range(k, rows, producers):
+            await insert(_trade(offset + i))
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[producer(k) for k in range(producers)])
+    await db.flush_writes()
+    return time.perf_counter() - t0
+
+
+async def _count() -> int:
+    async with db._read() as conn:
+        async with conn.execute(
+            "SELECT COUNT(*) FROM trades WHERE breakout_type='BENCH'"
+        ) as cur:
+            return (await cur.fetchone())[0]
+
+
+async def main_async(args) -> dict:
+    tmp = tempfile.TemporaryDirectory(prefix="chm_bench_db_")
+    try:
+        await db.init_db(os.path.join(tmp.name, "bench.db"))
+        t_old = await _run(_per_call, args.rows, args.producers, 0)
+        t_new = await _run(db.db_add_trade, args.rows, args.producers, args.rows)
+        total = await _count()
+        gc = db.group_commit_stats()
+        pool = db.pool_stats()
+    finally:
+        await db.close_db()
+        tmp.cleanup()
+
+    assert total == 2 * args.rows, f"вставлено {total}, ожидалось {2 * args.rows}"
+    return {
+        "rows": args.rows, "producers": args.producers,
+        "per_call": {"s": round(t_old, 3), "rows_per_s": round(args.rows / t_old)},
+        "grouped":  {"s": round(t_new, 3), "rows_per_s": round(args.rows / t_new)},
+        "speedup":  round(t_old / t_new, 2) if t_new else 0.0,
+        "group_commit": gc,
+        "db_pool": pool,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Per-call commit vs group commit")
+    ap.add_argument("--rows", type=int, default=10_000)
+    ap.add_argument("--producers", type=int, default=50,
+                    help="параллельных писателей")
+    ap.add_argument("--json", help="записать результат в файл")
+    args = ap.parse_args(argv)
+
+    res = asyncio.run(main_async(args))
+    print(f"{'path':<10}{'seconds':>10}{'rows/s':>10}")
+    for name in ("per_call", "grouped"):
+        print(f"{name:<10}{res[name]['s']:>10.3f}{res[name]['rows_per_s']:>10}")
+    gc = res["group_commit"]
+    print(f"speedup ×{res['speedup']}  "
+          f"(пачек {gc['batches']}, в среднем {gc['avg_batch']} строк)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
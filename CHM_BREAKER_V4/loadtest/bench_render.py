@@ -0,0 +1,142 @@
+"""
+loadtest/bench_render.py — рендер сигнала на получателя: до и после.
+
+Один сигнал рассылается N получателям. Сравниваются два пути:
+  old  — на каждого получателя: текст + wm_inject + клавиатура целиком
+  new  — текст один раз (signal_render), на получателя: водяной знак
+         и кнопки с trade_id
+
+Стратегии: mid (signal_text), smc (_signal_text_smc), gerchik (_signal_text).
+Без сети, БД и Telegram.
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.bench_render --recipients 1000
+  python -m loadtest.bench_render --recipients 5000 --json render.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+
+def _cases() -> dict:
+    # scanner_mid тянет config, которому нужен токен — для бенчмарка любой
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:BENCH")
+    import signal_render
+    from gerchik_runner import _signal_text as gerchik_text
+    from gerchik_strategy import Level
+    from indicator import SignalResult
+    from scanner_mid import signal_text
+    from smc.scanner import _signal_text_smc
+    from smc.signal_builder import SMCSignalResult
+    from user_manager import TradeCfg
+    from watermark import wm_inject
+    from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+    fund = "😨 Fear &amp; Greed: 38 (Страх)\n📊 BTC.D: 54.2%"
+    cfg  = TradeCfg()
+    mid = SignalResult(
+        symbol="SOL-USDT-SWAP", direction="LONG", entry=142.35, sl=139.8,
+        tp1=146.2, tp2=149.9, tp3=154.1, risk_pct=1.79, quality=4,
+        reasons=["Пробой уровня 142.0", "Объём ×2.4", "RSI 58", "EMA50 > EMA200"],
+        rsi=58.0, volume_ratio=2.4, trend_local="UP", breakout_type="BREAKOUT",
+        human_explanation="Цена закрепилась над сильным уровнем 142.0 "
+                          "после трёх тестов; объём подтверждает пробой.",
+        level_class=2, btc_corr=0.71, eth_corr=0.64,
+    )
+    smc = SMCSignalResult(
+        symbol="ETH-USDT-SWAP", direction="SHORT", score=4, grade="A",
+        entry_low=3412.0, entry_high=3425.0, entry=3418.5, sl=3461.0,
+        tp1=3370.0, tp2=3322.0, tp3=3260.0, rr=2.3, risk_pct=1.24,
+        confirmations=[("HTF медвежья структура", True), ("Sweep вверх", True),
+                       ("Bearish OB", True), ("FVG", True), ("CHoCH LTF", False)],
+        narrative="Снятие ликвидности над 3440, возврат в OB 4H, "
+                  "незакрытый FVG ниже — цель 3322.",
+        tf_htf="4H", tf_mtf="1H", tf_ltf="15m",
+    )
+    lvl = Level(price=0.5123, level_type="support", strength=5, touch_count=3)
+
+    def old_kb(symbol: str, trade_id: str, records: bool = True):
+        clean = symbol.replace("-SWAP", "").replace("-", "")
+        rows = [[
+            InlineKeyboardButton(text="📈 График",
+                                 url="https://www.tradingview.com/chart/?symbol=OKX:" + clean + ".P"),
+            InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats"),
+        ]]
+        if records:
+            rows.append([InlineKeyboardButton(text="📋 Записать результат ▾",
+                                              callback_data="sig_records_" + trade_id)])
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    def mid_body():
+        return (signal_text(mid, cfg) + "\n━━━━━━━━━━━━━━━━━━━━\n"
+                "📌 <b>Фундаментал рынка:</b>\n" + fund + "\n")
+
+    def gerchik_body():
+        return gerchik_text("XRP-USDT-SWAP", "LONG", 0.5131, 0.5079,
+                            0.5287, 0.5339, lvl, 4.0)
+
+    bodies = {
+        "mid":     (mid.symbol, mid_body, True, True),
+        "smc":     (smc.symbol, lambda: _signal_text_smc(smc, fund), True, False),
+        "gerchik": ("XRP-USDT-SWAP", gerchik_body, False, True),
+    }
+
+    out = {}
+    for name, (symbol, body, watermark, records) in bodies.items():
+        def old(uid, symbol=symbol, body=body, watermark=watermark, records=records):
+            text = body()
+            if watermark:
+                text = wm_inject(text, uid)
+            return text, old_kb(symbol, f"{uid}_1", records)
+
+        def new(uid, name=name, symbol=symbol, body=body, watermark=watermark,
+                records=records):
+            tpl  = signal_render.render((name, "bench"), body)
+            text = tpl.text_for(uid) if watermark else tpl.body
+            return text, signal_render.signal_keyboard(symbol, f"{uid}_1", records=records)
+
+        # Путь new обязан давать тот же текст, что old
+        assert old(777)[0] == new(777)[0], name
+        out[name] = (old, new)
+    return out
+
+
+def _time(fn, recipients: int) -> float:
+    t0 = time.perf_counter()
+    for uid in range(1_000_000, 1_000_000 + recipients):
+        fn(uid)
+    return time.perf_counter() - t0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Render-once vs per-recipient render")
+    ap.add_argument("--recipients", type=int, default=1000)
+    ap.add_argument("--rounds", type=int, default=5, help="берётся лучший раунд")
+    ap.add_argument("--json", help="записать результат в файл")
+    args = ap.parse_args(argv)
+
+    import signal_render
+    results = {}
+    print(f"{'strategy':<10}{'old µs/rcpt':>14}{'new µs/rcpt':>14}{'speedup':>10}")
+    for name, (old, new) in _cases().items():
+        t_old = min(_time(old, args.recipients) for _ in range(args.rounds))
+        t_new = min(_time(new, args.recipients) for _ in range(args.rounds))
+        us_old = t_old / args.recipients * 1e6
+        us_new = t_new / args.recipients * 1e6
+        speed  = t_old / t_new if t_new else 0.0
+        results[name] = {"old_us": round(us_old, 2), "new_us": round(us_new, 2),
+                         "speedup": round(speed, 2)}
+        print(f"{name:<10}{us_old:>14.2f}{us_new:>14.2f}{speed:>9.1f}×")
+
+    results["render_cache"] = signal_render.stats()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"recipients": args.recipients, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+loadtest/check_query_plans.py — регрессия планов горячих запросов.
+
+Создаёт временную БД через database.init_db (та же схема и миграции, что в
+проде), наполняет её синтетикой (--trades сделок, пользователи, памп/дамп,
+Polymarket, рефералы), делает ANALYZE и прогоняет EXPLAIN QUERY PLAN для
+каждого запроса из HOT_QUERIES. Любой «SCAN <таблица>» без индекса —
+ошибка: запрос читает всю таблицу и на живой базе деградирует линейно.
+
+Новый горячий запрос в database.py — добавь его сюда вместе с индексом.
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.check_query_plans              # 100k сделок
+  python -m loadtest.check_query_plans --trades 20000 -v
+Код возврата 1 — есть полный скан.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import database as db
+
+NOW = time.time()
+
+# (имя, SQL или функция → SQL, параметры) — тексты совпадают с database.py.
+# trades_all / pd_history_all — TEMP-представления над основной БД и архивом
+HOT_QUERIES = [
+    ("active_users",
+     """SELECT * FROM users
+        WHERE sub_status IN ('trial','active') AND sub_expires > ?
+        AND (active=1 OR long_active=1 OR short_active=1
+             OR smc_long_active=1 OR smc_short_active=1
+             OR gerchik_active=1)""",
+     (NOW,)),
+    ("users_since",
+     "SELECT * FROM users WHERE updated_at > ?",
+     (NOW - 35,)),
+    ("user_trades",
+     "SELECT * FROM trades_all WHERE user_id=? AND result != '' AND result != 'SKIP' ORDER BY created_at, trade_id",
+     (1_000_007,)),
+    ("open_trades_no_be",
+     "SELECT * FROM trades WHERE user_id=? AND result='' AND be_set=0",
+     (1_000_007,)),
+    ("open_trades",
+     "SELECT * FROM trades WHERE user_id=? AND result=''",
+     (1_000_007,)),
+    ("auto_trades_24h",
+     "SELECT COUNT(*) FROM trades WHERE user_id=? AND result='' AND order_id != '' AND created_at>=?",
+     (1_000_007, NOW - 86400)),
+    ("auto_trade_stats",
+     """SELECT COUNT(CASE WHEN created_at >= ? THEN 1 END),
+               COUNT(CASE WHEN result = 'TP1' THEN 1 END)
+        FROM trades
+        WHERE user_id = ? AND order_id != ''""",
+     (NOW - 86400, 1_000_007)),
+    ("has_open_symbol",
+     "SELECT 1 FROM trades WHERE user_id=? AND symbol=? AND result='' AND order_id != '' LIMIT 1",
+     (1_000_007, "BTC-USDT-SWAP")),
+    ("trade_by_id",
+     "SELECT * FROM trades_all WHERE trade_id=? LIMIT 1",
+     ("plan_42",)),
+    ("pd_pending_outcomes",
+     "SELECT s.id, s.symbol, s.direction, s.price_signal "
+     "FROM pd_signals s "
+     "LEFT JOIN pd_outcomes o ON o.signal_id=s.id "
+     "WHERE s.ts < ? AND o.id IS NULL",
+     (NOW - 900,)),
+    ("pd_outcomes_since",
+     "SELECT COUNT(*), SUM(correct) FROM pd_outcomes WHERE ts >= ?",
+     (NOW - 86400,)),
+    ("pd_signals_page",
+     "SELECT id, src, symbol, direction, score, price_signal AS price,"
+     " ts AS created_at, correct, change_pct FROM pd_history_all"
+     " WHERE (ts, src, id) < (?, ?, ?) ORDER BY ts DESC, src DESC, id DESC LIMIT ?",
+     (NOW - 3600, 0, 5_000, 11)),
+    ("trades_page",
+     "SELECT * FROM trades_all"
+     " WHERE user_id=? AND result NOT IN ('', 'SKIP')"
+     " AND (created_at, trade_id) < (?, ?)"
+     " ORDER BY created_at DESC, trade_id DESC LIMIT ?",
+     (1_000_007, NOW - 86400, "plan_99999", 11)),
+    ("users_page",
+     "SELECT user_id, username FROM users WHERE (user_id) > (?) ORDER BY user_id ASC LIMIT ?",
+     (1_000_100, 21)),
+    ("poly_bets_user",
+     "SELECT * FROM poly_bets WHERE user_id=? ORDER BY created_at DESC LIMIT ?",
+     (1_000_007, 10)),
+    ("poly_bets_page",
+     "SELECT * FROM poly_bets WHERE user_id=? AND (created_at, id) < (?, ?)"
+     " ORDER BY created_at DESC, id DESC LIMIT ?",
+     (1_000_007, NOW - 100, 10**9, 11)),
+    ("poly_alerts_user",
+     "SELECT * FROM poly_alerts WHERE user_id=? AND active=1 ORDER BY created_at DESC",
+     (1_000_007,)),
+    ("poly_alerts_active",
+     "SELECT * FROM poly_alerts WHERE active=1",
+     ()),
+    ("referrals_converted",
+     "SELECT COUNT(*) FROM referrals WHERE referrer_id=? AND converted=1",
+     (1_000_007,)),
+    ("referrals_summary",
+     "SELECT COUNT(*), SUM(converted) FROM referrals WHERE referrer_id=?",
+     (1_000_007,)),
+    ("ref_rewards_user",
+     "SELECT COUNT(*) FROM ref_rewards WHERE user_id=?",
+     (1_000_007,)),
+    ("export_pd",
+     "SELECT id, src, symbol, direction, score, price_signal, ts,"
+     " price_15m, change_pct, correct FROM pd_history_all"
+     " WHERE (ts, src, id) > (?, ?, ?) ORDER BY ts ASC, src ASC, id ASC LIMIT ?",
+     (NOW - 86400, 1, 5_000, 1001)),
+    ("export_trades",
+     "SELECT * FROM trades_all WHERE (trade_id) > (?) ORDER BY trade_id ASC LIMIT ?",
+     ("plan_5000", 1001)),
+    # Кандидаты и удаление архивации — тексты строит database._archive_plan
+    ("archive_pick_trades", lambda: db._archive_plan("trades")[0],
+     (0, NOW - 90 * 86400, 500)),
+    ("archive_drop_trades", lambda: db._archive_plan("trades")[2][0],
+     ("[1,2,3]",)),
+    ("archive_pick_pd", lambda: db._archive_plan("pd_signals")[0],
+     (0, NOW - 90 * 86400, 500)),
+    ("archive_drop_pd_outcomes", lambda: db._archive_plan("pd_signals")[2][0],
+     ("[1,2,3]",)),
+    ("archive_copy_pd_outcomes", lambda: db._archive_plan("pd_signals")[1][1],
+     ("[1,2,3]",)),
+    ("archive_drop_pd_signals", lambda: db._archive_plan("pd_signals")[2][1],
+     ("[1,2,3]",)),
+    ("bc_claim",
+     "SELECT user_id FROM broadcast_recipients"
+     " WHERE job_id=? AND status='pending' ORDER BY user_id LIMIT ?",
+     (1, 25)),
+]
+
+# «SCAN t», «SCAN main.t», «SCAN t AS x» — полный проход по таблице.
+# «SCAN t USING INDEX» (упорядоченный обход индекса под LIMIT) и поиск по
+# индексу — норма.
+_FULL_SCAN = re.compile(r"^SCAN ([\w.]+)(?: AS \w+)?$")
+
+
+async def _seed(trades: int, users: int):
+    rnd = random.Random(42)
+    syms = [f"C{i}-USDT-SWAP" for i in range(150)] + ["BTC-USDT-SWAP"]
+    results = ["", "", "TP1", "TP2", "TP3", "SL", "SKIP"]
+    async with db._write() as conn:
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, sub_status, sub_expires,"
+            " active, created_at, updated_at) VALUES (?,?,?,?,?,?,?)",
+            [(1_000_000 + u, f"u{u}",
+              rnd.choice(["trial", "active", "expired", "expired"]),
+              NOW + rnd.uniform(-30, 30) * 86400, rnd.randint(0, 1),
+              NOW - rnd.uniform(0, 365) * 86400,
+              NOW - rnd.uniform(0, 30) * 86400)
+             for u in range(users)],
+        )
+        await conn.executemany(
+            "INSERT INTO trades (trade_id, user_id, symbol, direction, entry, sl,"
+            " tp1, tp2, tp3, result, result_rr, created_at, be_set, order_id)"
+            " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            [(f"plan_{i}", 1_000_000 + rnd.randrange(users), rnd.choice(syms),
+              rnd.choice(["LONG", "SHORT"]), 100.0, 99.0, 101.0, 102.0, 103.0,
+              rnd.choice(results), rnd.uniform(-1, 3),
+              NOW - rnd.uniform(0, 180) * 86400, rnd.randint(0, 1),
+              rnd.choice(["", "", f"ord{i}"]))
+             for i in range(trades)],
+        )
+        n_sig = max(trades // 5, 1)
+        await conn.executemany(
+            "INSERT INTO pd_signals (id, symbol, direction, score, ts)"
+            " VALUES (?,?,?,?,?)",
+            [(i + 1, rnd.choice(syms), rnd.choice(["PUMP", "DUMP"]),
+              rnd.uniform(40, 100), NOW - rnd.uniform(0, 90) * 86400)
+             for i in range(n_sig)],
+        )
+        await conn.executemany(
+            "INSERT INTO pd_outcomes (signal_id, correct, ts) VALUES (?,?,?)",
+            [(i + 1, rnd.randint(0, 1), NOW - rnd.uniform(0, 90) * 86400)
+             for i in range(n_sig) if rnd.random() < 0.9],
+        )
+        await conn.executemany(
+            "INSERT INTO poly_bets (user_id, market_id, created_at) VALUES (?,?,?)",
+            [(1_000_000 + rnd.randrange(users), f"m{i}", NOW - i)
+             for i in range(trades // 10)],
+        )
+        await conn.executemany(
+            "INSERT INTO poly_alerts (user_id, market_id, question, yes_price,"
+            " threshold, active, created_at) VALUES (?,?,?,?,?,?,?)",
+            [(1_000_000 + rnd.randrange(users), f"m{i}", "q", 0.5, 0.6,
+              int(rnd.random() < 0.05), NOW - i)
+             for i in range(trades // 10)],
+        )
+        await conn.executemany(
+            "INSERT INTO referrals (referred_id, referrer_id, joined_at, converted)"
+            " VALUES (?,?,?,?)",
+            [(2_000_000 + i, 1_000_000 + rnd.randrange(users), NOW, rnd.randint(0, 1))
+             for i in range(users * 2)],
+        )
+        await conn.executemany(
+            "INSERT INTO ref_rewards (user_id, given_at) VALUES (?,?)",
+            [(1_000_000 + rnd.randrange(users), NOW) for _ in range(users)],
+        )
+        await conn.executemany(
+            "INSERT INTO broadcast_jobs (id, admin_id, text, status, total, created_at)"
+            " VALUES (?,?,?,?,?,?)",
+            [(j, 1, "t", "done", users, NOW) for j in range(1, 6)],
+        )
+        await conn.executemany(
+            "INSERT INTO broadcast_recipients (job_id, user_id, status) VALUES (?,?,?)",
+            [(j, 1_000_000 + u, rnd.choice(["sent", "pending"]))
+             for j in range(1, 6) for u in range(users)],
+        )
+        await conn.commit()
+        await conn.execute("ANALYZE")
+        await conn.commit()
+
+
+async def _plans() -> dict:
+    out = {}
+    async with db._read() as conn:
+        for name, sql, params in HOT_QUERIES:
+            if callable(sql):
+                sql = sql()
+            async with conn.execute("EXPLAIN QUERY PLAN " + sql, params) as cur:
+                out[name] = [r[3] for r in await cur.fetchall()]
+    return out
+
+
+async def main_async(args) -> dict:
+    tmp = tempfile.TemporaryDirectory(prefix="chm_plans_")
+    try:
+        await db.init_db(os.path.join(tmp.name, "plans.db"))
+        await _seed(args.trades, args.users)
+        plans = await _plans()
+    finally:
+        await db.close_db()
+        tmp.cleanup()
+    return plans
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="EXPLAIN QUERY PLAN для горячих запросов")
+    ap.add_argument("--trades", type=int, default=100_000)
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("-v", "--verbose", action="store_true", help="печатать планы")
+    args = ap.parse_args(argv)
+
+    plans = asyncio.run(main_async(args))
+    bad = 0
+    for name, steps in plans.items():
+        scans = [s for s in steps if _FULL_SCAN.match(s)]
+        bad += bool(scans)
+        print(f"{'FAIL' if scans else 'ok':<6}{name}")
+        for s in (steps if args.verbose or scans else []):
+            print(f"        {s}")
+    print(f"\n{len(plans) - bad}/{len(plans)} запросов без полного скана")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
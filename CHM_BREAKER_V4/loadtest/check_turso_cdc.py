@@ -0,0 +1,252 @@
+"""
+loadtest/check_turso_cdc.py — инкрементальный пуш в Turso против локального стенда.
+
+Поднимает loadtest.fake_turso (тот же /v2/pipeline поверх sqlite3), создаёт
+временную БД через database.init_db и прогоняет путь turso_sync целиком:
+
+  1. restore из пустого облака → первый пуш полный;
+  2. правки (пользователи, сделки, kv, архивация, смена PK) → CDC-пуш;
+  3. сбой HTTP посреди пуша → журнал не подтверждён, повтор догоняет;
+  4. Turso принял пачку, а подтверждение потерялось → повтор той же
+     пачки даёт то же состояние (идемпотентность);
+  5. restore в чистую БД → следующий пуш не шлёт ничего;
+  6. рестарт: restore в непустую БД не переписывает совпадающие строки,
+     правки в облаке сливаются по PK, user_stats сходятся без пересборки.
+
+После каждого шага SYNC_TABLES локально и в «облаке» сравниваются
+построчно. В конце — сколько stmt ушло полным пушем и сколько CDC.
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.check_turso_cdc
+  python -m loadtest.check_turso_cdc --users 20000 --trades 50000
+Код возврата 1 — расхождение или неверное поведение.
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import database as db
+import turso_sync as ts
+from loadtest.fake_turso import FakeTurso
+
+NOW = time.time()
+
+
+def _local_rows(path: str, table: str) -> list[dict]:
+    with sqlite3.connect(path) as conn:
+        cur = conn.execute(f"SELECT * FROM {table}")
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+def _diff(path: str, fake: FakeTurso) -> list[str]:
+    """Расхождения SYNC_TABLES: локальная БД против облака (по PK)."""
+    out = []
+    for table in ts.SYNC_TABLES:
+        pk = ts._pk_cols.get(table)
+        if not pk:
+            out.append(f"{table}: нет CDC-триггеров")
+            continue
+        local = {tuple(r[c] for c in pk): r for r in _local_rows(path, table)}
+        cloud = {tuple(r[c] for c in pk): r for r in fake.rows(table)}
+        missing = local.keys() - cloud.keys()
+        extra = cloud.keys() - local.keys()
+        changed = [k for k in local.keys() & cloud.keys() if local[k] != cloud[k]]
+        if missing or extra or changed:
+            out.append(f"{table}: нет в облаке {len(missing)}, лишних {len(extra)},"
+                       f" отличаются {len(changed)}")
+    return out
+
+
+async def _seed(users: int, trades: int):
+    rnd = random.Random(7)
+    async with db._write() as conn:
+        await conn.executemany(
+            "INSERT INTO users (user_id, username, sub_status, sub_expires,"
+            " created_at, updated_at) VALUES (?,?,?,?,?,?)",
+            [(1_000_000 + u, f"u{u}", rnd.choice(["trial", "active", "expired"]),
+              NOW + rnd.uniform(-30, 30) * 86400, NOW - 86400, NOW - 86400)
+             for u in range(users)],
+        )
+        await conn.executemany(
+            "INSERT INTO trades (trade_id, user_id, symbol, direction, entry, sl,"
+            " tp1, tp2, tp3, result, result_rr, created_at, closed_at)"
+            " VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)",
+            [(f"cdc_{i}", 1_000_000 + rnd.randrange(users), "BTC-USDT-SWAP",
+              rnd.choice(["LONG", "SHORT"]), 100.0, 99.0, 101.0, 102.0, 103.0,
+              res, rnd.uniform(-1, 3) if res else 0.0,
+              NOW - 200 * 86400 + i, NOW - 199 * 86400 + i if res else 0)
+             for i in range(trades)
+             for res in [rnd.choice(["", "TP1", "SL"])]],
+        )
+        await conn.executemany(
+            "INSERT INTO kv (key, value) VALUES (?,?)",
+            [(f"k{i}", str(i)) for i in range(50)],
+        )
+        await conn.commit()
+
+
+async def _mutate(tag: str, n: int):
+    """Типичная пачка правок бота между пушами."""
+    for u in range(n):
+        await db.db_upsert_user({"user_id": 1_000_000 + u, "username": f"{tag}{u}"})
+    for i in range(n):
+        await db.db_add_trade({
+            "trade_id": f"{tag}_{i}", "user_id": 1_000_000 + i, "symbol": "ETH-USDT-SWAP",
+            "direction": "LONG", "entry": 10.0, "sl": 9.0, "tp1": 11.0, "tp2": 12.0,
+            "tp3": 13.0, "created_at": time.time(),
+        })
+    for i in range(0, n, 2):
+        await db.db_set_trade_result(f"{tag}_{i}", "TP1", 1.5)
+    await db.db_kv_set(f"{tag}_kv", tag)
+    await db.flush_writes()
+
+
+async def _push(path: str, fake: FakeTurso) -> tuple[bool, int]:
+    before = fake.stats["stmts"]
+    ok = await ts.turso_push(path)
+    return ok, fake.stats["stmts"] - before
+
+
+def _acked(path: str):
+    return ts._get_acked(path)
+
+
+def _last(path: str) -> int:
+    with sqlite3.connect(path) as conn:
+        return ts._last_seq(conn)
+
+
+async def scenario(fake: FakeTurso, tmp: str, users: int, trades: int) -> list[str]:
+    """Все шаги; возвращает список проблем (пусто — всё сошлось)."""
+    problems: list[str] = []
+
+    def check(step: str, cond: bool, msg: str = ""):
+        print(f"{'ok' if cond else 'FAIL':<6}{step}{(' — ' + msg) if msg else ''}")
+        if not cond:
+            problems.append(f"{step}: {msg}")
+
+    def same(step: str, path: str):
+        d = _diff(path, fake)
+        check(step, not d, "; ".join(d))
+
+    path = os.path.join(tmp, "main.db")
+    await db.init_db(path)
+    await _seed(users, trades)
+
+    # 1. Пустое облако → полный пуш
+    restored = await ts.restore_from_turso_if_needed(path)
+    check("restore из пустого облака", not restored and _acked(path) is None)
+    ok, n_full = await _push(path, fake)
+    check("первый пуш полный", ok and ts._cdc_stats["full"] == 1, f"{n_full} stmt")
+    check("журнал подтверждён полным пушем", _acked(path) == _last(path))
+    same("облако = локальная БД", path)
+
+    # 2. Правки → CDC
+    await _mutate("a", 40)
+    moved, _ = await db.db_archive_batch("trades", NOW - 150 * 86400, None, 100)
+    async with db._write() as conn:   # смена PK: старый ключ должен уйти DELETE
+        await conn.execute("UPDATE kv SET key='k0_renamed' WHERE key='k0'")
+        await conn.commit()
+    ok, n_cdc = await _push(path, fake)
+    check("CDC-пуш", ok and ts._cdc_stats["incremental"] == 1,
+          f"{n_cdc} stmt, в архив ушло {moved} сделок")
+    check("журнал очищен", _acked(path) == _last(path))
+    same("облако = локальная БД после CDC", path)
+
+    # 3. HTTP-сбой → повтор
+    await _mutate("b", 20)
+    acked = _acked(path)
+    fake.fail_requests = 1
+    ok, _ = await _push(path, fake)
+    check("сбой Turso: пуш неуспешен, seq не сдвинут", not ok and _acked(path) == acked)
+    ok, _ = await _push(path, fake)
+    check("повтор после сбоя", ok and _acked(path) == _last(path))
+    same("облако = локальная БД после повтора", path)
+
+    # 4. Turso применил пачку, подтверждение не записалось → повтор той же пачки
+    await _mutate("c", 20)
+    real_set_acked = ts._set_acked
+
+    def lost_ack(*_a):
+        raise sqlite3.OperationalError("database is locked")
+    ts._set_acked = lost_ack
+    try:
+        ok, n_first = await _push(path, fake)
+    finally:
+        ts._set_acked = real_set_acked
+    check("подтверждение потеряно", not ok and _acked(path) != _last(path))
+    ok, n_again = await _push(path, fake)
+    check("повтор той же пачки идемпотентен", ok and n_again == n_first,
+          f"{n_first} → {n_again} stmt")
+    same("облако = локальная БД после повтора пачки", path)
+
+    # 5. Restore в чистую БД: журнал после восстановления пуст
+    await db.close_db()
+    path2 = os.path.join(tmp, "restored.db")
+    await db.init_db(path2)
+    restored = await ts.restore_from_turso_if_needed(path2)
+    check("restore из облака", restored and _acked(path2) == _last(path2))
+    same("восстановленная БД = облако", path2)
+    check("trades залиты целиком → нужна пересборка", ts.restore_replaced("trades"))
+    ok, n_idle = await _push(path2, fake)
+    check("пуш без правок ничего не шлёт", ok and n_idle == 0, f"{n_idle} stmt")
+    await db.close_db()
+
+    # 6. Рестарт: restore в ту же непустую БД
+    await db.init_db(path2)
+    restored = await ts.restore_from_turso_if_needed(path2)
+    touched = {t: r for t, r in ts._last_restore.items() if r["changed"] or r["deleted"]}
+    check("рестарт: restore ничего не переписал",
+          restored and not touched and not ts.restore_replaced("trades"), str(touched))
+    fake.db.execute("UPDATE trades SET result='SL', result_rr=-1"
+                    " WHERE trade_id=(SELECT MIN(trade_id) FROM trades WHERE result='')")
+    fake.db.execute("UPDATE users SET username='cloud' WHERE user_id=1000001")
+    await db.close_db()
+    await db.init_db(path2)
+    await ts.restore_from_turso_if_needed(path2)
+    r = ts._last_restore
+    check("правки облака слиты по PK",
+          r["trades"]["changed"] == 1 and r["users"]["changed"] == 1
+          and not ts.restore_replaced("trades"), str({t: r[t] for t in ("trades", "users")}))
+    same("восстановленная БД = облако после слияния", path2)
+    stats = await db.db_user_stats_check()
+    full = await db.db_user_stats_rebuild(verify_only=True)
+    check("user_stats сошлись без пересборки", stats["ok"] and not full["mismatched"],
+          f"{stats}, {full['mismatched']} строк расходятся")
+    await db.close_db()
+
+    print(f"\nполный пуш: {n_full} stmt; CDC после ~{40 * 3 + moved} правок: {n_cdc} stmt"
+          f"\nTurso: {dict(fake.stats)}\nCDC: {ts._cdc_stats}")
+    return problems
+
+
+async def main_async(args) -> list[str]:
+    fake = FakeTurso()
+    ts.TURSO_URL = await fake.start()
+    ts.TURSO_TOKEN = "loadtest"
+    tmp = tempfile.TemporaryDirectory(prefix="chm_cdc_")
+    try:
+        return await scenario(fake, tmp.name, args.users, args.trades)
+    finally:
+        await fake.stop()
+        tmp.cleanup()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="CDC-пуш в Turso против fake_turso")
+    ap.add_argument("--users", type=int, default=2_000)
+    ap.add_argument("--trades", type=int, default=5_000)
+    args = ap.parse_args(argv)
+    problems = asyncio.run(main_async(args))
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,226 @@
+"""
+loadtest/fake_okx.py — локальный aiohttp-сервер, имитирующий OKX REST v5.
+
+Эндпоинты (ровно то, что использует OKXFetcher):
+  GET /api/v5/market/candles        instId, bar, limit
+  GET /api/v5/market/history-candles instId, bar, after, before, limit (≤100)
+  GET /api/v5/market/tickers        instType=SWAP | instId
+  GET /api/v5/public/instruments    instType=SWAP
+
+Свечи синтетические (loadtest/synthetic.py), детерминированные по
+(instId, bar), либо записанные: каталог с файлами <instId>_<bar>.json
+в формате ответа OKX ({"data": [...]}).
+
+Сервер считает запросы по эндпоинтам — это и есть «OKX calls» в отчёте.
+
+Инъекция задержек и ошибок (проверка таймаутов, hedging, circuit breaker):
+  latency      — базовая задержка ответа, сек
+  jitter       — случайная добавка 0…jitter, сек
+  slow_ratio   — доля «медленных» ответов (задержка slow_latency)
+  error_ratio  — доля ответов 503
+
+Отдельно (воспроизведение для shadow.py):
+  python -m loadtest.fake_okx --record-dir rec/ --port 8089
+  OKX_BASE_URL=http://127.0.0.1:8089 SHADOW_MODE=1 python3 bot.py
+"""
+
+import argparse
+import asyncio
+
+import json
+import os
+import random
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+from loadtest.synthetic import BAR_SECONDS, kind_for, make_ohlcv, okx_rows, stable_seed
+
+MAX_LIMIT   = 300
+HIST_LIMIT  = 100
+
+
+def symbol_universe(n_coins: int) -> list[str]:
+    """BTC/ETH + синтетические монеты C001…Cnnn."""
+    syms = ["BTC-USDT-SWAP", "ETH-USDT-SWAP"]
+    syms += [f"C{i:03d}-USDT-SWAP" for i in range(1, max(0, n_coins - 2) + 1)]
+    return syms[:max(n_coins, 2)]
+
+
+class FakeOKX:
+
+    def __init__(self, n_coins: int = 100, record_dir: Optional[str] = None,
+                 now: Optional[float] = None, history_bars: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 slow_ratio: float = 0.0, slow_latency: float = 5.0,
+                 error_ratio: float = 0.0, seed: int = 0):
+        self.symbols    = symbol_universe(n_coins)
+        # Длина синтетического ряда: хватает и на candles, и на history-candles
+        self.n_bars     = max(MAX_LIMIT, history_bars) + 1
+        self.record_dir = record_dir
+        self.now        = now or time.time()
+        self.calls: Counter = Counter()
+        self.latency      = latency
+        self.jitter       = jitter
+        self.slow_ratio   = slow_ratio
+        self.slow_latency = slow_latency
+        self.error_ratio  = error_ratio
+        self._rnd = random.Random(seed)
+        self._rows: dict[tuple, list] = {}
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    # ── Данные ───────────────────────────────────────────────────────────
+
+    def _base_price(self, sym: str) -> float:
+        if sym.startswith("BTC"):
+            return 60_000.0
+        if sym.startswith("ETH"):
+            return 3_000.0
+        return 0.01 * (1 + stable_seed(sym) % 50_000)
+
+    def _candle_rows(self, sym: str, bar: str) -> list:
+        key = (sym, bar)
+        rows = self._rows.get(key)
+        if rows is not None:
+            return rows
+        if self.record_dir:
+            path = os.path.join(self.record_dir, f"{sym}_{bar}.json")
+            if os.path.exists(path):
+                with open(path, encoding="utf-8") as f:
+                    rows = json.load(f).get("data", [])
+        if rows is None:
+            df = make_ohlcv(
+                n=self.n_bars, kind=kind_for(sym), seed=stable_seed(sym, bar),
+                bar_sec=BAR_SECONDS.get(bar, 3600), end_ts=self.now,
+                base=self._base_price(sym),
+            )
+            rows = okx_rows(df)
+        self._rows[key] = rows
+        return rows
+
+    def _ticker(self, sym: str) -> dict:
+        rows = self._candle_rows(sym, "1D")
+        last  = float(rows[0][4])
+        open_ = float(rows[1][4]) if len(rows) > 1 else last
+        vol24 = 2_000_000 + stable_seed(sym, "vol") % 500_000_000
+        return {
+            "instId": sym, "last": str(last), "open24h": str(open_),
+            # volCcy24h у SWAP — в базовой монете, как у настоящего OKX
+            "volCcy24h": str(vol24 / max(last, 1e-9)), "vol24h": str(vol24 / max(last, 1e-9)),
+            "bidPx": str(last * 0.9999), "askPx": str(last * 1.0001),
+            "ts": str(int(self.now * 1000)),
+        }
+
+    # ── Хендлеры ─────────────────────────────────────────────────────────
+
+    @web.middleware
+    async def _inject(self, request: web.Request, handler):
+        """Задержки и 503 по настройкам — до обработки запроса."""
+        delay = self.latency
+        if self.jitter:
+            delay += self._rnd.uniform(0, self.jitter)
+        if self.slow_ratio and self._rnd.random() < self.slow_ratio:
+            self.calls["slow"] += 1
+            delay = self.slow_latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_ratio and self._rnd.random() < self.error_ratio:
+            self.calls["errors"] += 1
+            return web.json_response({"code": "50001", "msg": "injected"}, status=503)
+        return await handler(request)
+
+    async def _candles(self, request: web.Request) -> web.Response:
+        self.calls["candles"] += 1
+        sym = request.query.get("instId", "")
+        bar = request.query.get("bar", "1H")
+        limit = min(int(request.query.get("limit", MAX_LIMIT)), MAX_LIMIT)
+        if sym not in self.symbols:
+            return web.json_response({"code": "51001", "msg": "Instrument ID does not exist", "data": []})
+        return web.json_response({"code": "0", "msg": "", "data": self._candle_rows(sym, bar)[:limit]})
+
+    async def _history(self, request: web.Request) -> web.Response:
+        self.calls["history"] += 1
+        sym = request.query.get("instId", "")
+        bar = request.query.get("bar", "1H")
+        limit = min(int(request.query.get("limit", HIST_LIMIT)), HIST_LIMIT)
+        if sym not in self.symbols:
+            return web.json_response({"code": "51001", "msg": "Instrument ID does not exist", "data": []})
+        rows = self._candle_rows(sym, bar)
+        after  = request.query.get("after")
+        before = request.query.get("before")
+        if after:
+            rows = [r for r in rows if int(r[0]) < int(after)]
+        if before:
+            rows = [r for r in rows if int(r[0]) > int(before)]
+        return web.json_response({"code": "0", "msg": "", "data": rows[:limit]})
+
+    async def _tickers(self, request: web.Request) -> web.Response:
+        self.calls["tickers"] += 1
+        sym = request.query.get("instId")
+        syms = [sym] if sym else self.symbols
+        data = [self._ticker(s) for s in syms if s in self.symbols]
+        return web.json_response({"code": "0", "msg": "", "data": data})
+
+    async def _instruments(self, request: web.Request) -> web.Response:
+        self.calls["instruments"] += 1
+        data = [{"instId": s, "state": "live", "instType": "SWAP"} for s in self.symbols]
+        return web.json_response({"code": "0", "msg": "", "data": data})
+
+    # ── Жизненный цикл ───────────────────────────────────────────────────
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self._inject])
+        app.router.add_get("/api/v5/market/candles",     self._candles)
+        app.router.add_get("/api/v5/market/history-candles", self._history)
+        app.router.add_get("/api/v5/market/tickers",     self._tickers)
+        app.router.add_get("/api/v5/public/instruments", self._instruments)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+
+async def _serve(args):
+    fake = FakeOKX(n_coins=args.coins, record_dir=args.record_dir,
+                   history_bars=args.history_bars,
+                   latency=args.latency, jitter=args.jitter,
+                   slow_ratio=args.slow_ratio, slow_latency=args.slow_latency,
+                   error_ratio=args.error_ratio)
+    url = await fake.start(port=args.port)
+    print(f"fake OKX: {url} ({len(fake.symbols)} символов)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.stop()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Fake OKX REST v5")
+    p.add_argument("--coins",      type=int, default=100)
+    p.add_argument("--record-dir", default=None)
+    p.add_argument("--port",       type=int, default=8089)
+    p.add_argument("--history-bars", type=int, default=0,
+                   help="глубина истории для history-candles")
+    p.add_argument("--latency",      type=float, default=0.0)
+    p.add_argument("--jitter",       type=float, default=0.0)
+    p.add_argument("--slow-ratio",   type=float, default=0.0)
+    p.add_argument("--slow-latency", type=float, default=5.0)
+    p.add_argument("--error-ratio",  type=float, default=0.0)
+    asyncio.run(_serve(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+loadtest/fake_telegram.py — локальный Bot API, записывающий исходящие сообщения.
+
+Подключается к aiogram как кастомный сервер:
+  AiohttpSession(api=TelegramAPIServer.from_base(fake.url))
+
+Отвечает на getMe и send*/edit*/answer* ровно настолько правдоподобно,
+чтобы aiogram распарсил результат. Всё отправленное копится в .sent.
+"""
+
+import time
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+
+class FakeTelegram:
+
+    def __init__(self):
+        self.sent:  list[dict] = []
+        self.calls: Counter    = Counter()
+        self._msg_id = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    async def _method(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.calls[method] += 1
+        data = dict(await request.post())
+
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {
+                "id": 123456, "is_bot": True, "first_name": "LoadTest",
+                "username": "loadtest_bot",
+            }})
+
+        if method.startswith("send"):
+            self._msg_id += 1
+            chat_id = int(data.get("chat_id", 0))
+            text = data.get("text") or data.get("caption") or ""
+            self.sent.append({
+                "method": method, "chat_id": chat_id, "text": text,
+                "ts": time.time(),
+            })
+            return web.json_response({"ok": True, "result": {
+                "message_id": self._msg_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "text": text,
+            }})
+
+        return web.json_response({"ok": True, "result": True})
+
+    # ── Жизненный цикл ───────────────────────────────────────────────────
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._method)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
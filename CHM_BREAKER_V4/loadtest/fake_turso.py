@@ -0,0 +1,109 @@
+"""
+loadtest/fake_turso.py — локальный Turso (HTTP API /v2/pipeline) поверх sqlite3.
+
+Подключается к turso_sync через переменные окружения (или атрибуты модуля):
+  TURSO_URL=http://127.0.0.1:<port>  TURSO_TOKEN=<любой>
+
+Понимает ровно то, что шлёт turso_sync: execute (sql + args в формате
+_arg) и close. Ответ — как у Turso: results[i] = ok/execute с cols/rows
+или error с message. Считает запросы, stmt и изменённые строки;
+fail_requests = N — следующие N запросов вернут HTTP 500 (проверка
+повторов пуша).
+"""
+
+import sqlite3
+from collections import Counter
+from typing import Optional
+
+from aiohttp import web
+
+
+def _py(arg: dict):
+    """Turso arg → значение Python (обратное turso_sync._arg)."""
+    t, v = arg.get("type"), arg.get("value")
+    if t == "null" or v is None:
+        return None
+    if t == "integer":
+        return int(v)
+    if t == "float":
+        return float(v)
+    return v
+
+
+def _cell(v) -> dict:
+    if v is None:
+        return {"type": "null", "value": None}
+    if isinstance(v, int):
+        return {"type": "integer", "value": str(v)}
+    if isinstance(v, float):
+        return {"type": "float", "value": v}
+    return {"type": "text", "value": str(v)}
+
+
+class FakeTurso:
+
+    def __init__(self, path: str = ":memory:"):
+        self.db = sqlite3.connect(path, isolation_level=None)   # autocommit, как Turso
+        self.stats: Counter = Counter()
+        self.fail_requests = 0
+        self._runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def pipeline(self, body: dict) -> dict:
+        """Выполнить тело /v2/pipeline; stmt с ошибкой не прерывает остальные."""
+        self.stats["requests"] += 1
+        results = []
+        for req in body.get("requests", []):
+            if req.get("type") == "close":
+                results.append({"type": "ok", "response": {"type": "close"}})
+                continue
+            stmt = req.get("stmt", {})
+            self.stats["stmts"] += 1
+            try:
+                cur = self.db.execute(stmt["sql"], [_py(a) for a in stmt.get("args", [])])
+                rows = cur.fetchall()
+                cols = [d[0] for d in cur.description or ()]
+                self.stats["rows_changed"] += max(cur.rowcount, 0)
+                results.append({"type": "ok", "response": {"type": "execute", "result": {
+                    "cols": [{"name": c} for c in cols],
+                    "rows": [[_cell(v) for v in r] for r in rows],
+                    "affected_row_count": max(cur.rowcount, 0),
+                }}})
+            except sqlite3.Error as e:
+                self.stats["errors"] += 1
+                results.append({"type": "error", "error": {"message": str(e)}})
+        return {"baton": None, "results": results}
+
+    def rows(self, table: str) -> list[dict]:
+        cur = self.db.execute(f"SELECT * FROM {table}")
+        cols = [d[0] for d in cur.description]
+        return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+    # ── HTTP ─────────────────────────────────────────────────────────────
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        self.stats["bytes_in"] += request.content_length or 0
+        if self.fail_requests > 0:
+            self.fail_requests -= 1
+            self.stats["failed"] += 1
+            return web.Response(status=500, text="injected failure")
+        return web.json_response(self.pipeline(await request.json()))
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/v2/pipeline", self._handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._runner = web.AppRunner(self.app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+        self.db.close()
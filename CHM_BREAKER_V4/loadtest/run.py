@@ -0,0 +1,324 @@
+"""
+loadtest/run.py — офлайн нагрузочный прогон сканеров.
+
+Поднимает fake OKX и fake Telegram на localhost, создаёт временную SQLite-базу
+с N синтетическими пользователями и гоняет реальные циклы:
+
+  mid      — MidScanner._cycle() + ожидание очереди заданий
+  gerchik  — GerchikScanner._cycle()
+  smc      — smc.scanner._scan_cycle()
+  pd       — PDRunner._process_event() на синтетических MarketEvent
+
+По каждому компоненту и циклу: время, CPU, пиковый RSS, запросы к OKX по
+эндпоинтам, отправленные сообщения и сообщений/сек. Это baseline для
+любых изменений производительности — сохраняйте --json и сравнивайте.
+
+ЗАПУСК (из CHM_BREAKER_V4):
+  python -m loadtest.run --users 1000 --coins 150 --cycles 2 --json base.json
+  python -m loadtest.run --components mid,pd --users 200
+
+CPU считается по процессу целиком — fake-серверы работают в том же event
+loop, их доля входит в цифры (одинаково для всех прогонов).
+Фундаментальный контекст и REST BingX отключены — прогон полностью офлайн.
+
+Сообщения идут через outbound.py с лимитами Telegram (25 msg/s на бота,
+1 msg/s на чат) — msgs/s показывает реальный темп доставки. Чистая
+пропускная способность сканеров: OUT_GLOBAL_RATE=1e6 OUT_CHAT_RATE=1e6.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from loadtest.fake_okx import FakeOKX
+from loadtest.fake_telegram import FakeTelegram
+from loadtest.synthetic import kind_for, make_ohlcv, stable_seed
+
+log = logging.getLogger("CHM.LoadTest")
+
+COMPONENTS = ("mid", "gerchik", "smc", "pd")
+USER_ID_BASE = 9_000_000
+
+# (tf, interval) — как в меню выбора таймфрейма
+_LEVEL_TFS = (("15m", 900), ("1h", 3600), ("4h", 14400))
+
+
+def _parse_args(argv=None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="CHM offline load test")
+    p.add_argument("--users",      type=int, default=200)
+    p.add_argument("--coins",      type=int, default=100)
+    p.add_argument("--cycles",     type=int, default=1)
+    p.add_argument("--components", default=",".join(COMPONENTS))
+    p.add_argument("--pd-symbols", type=int, default=20,
+                   help="сколько MarketEvent скормить PDRunner за цикл")
+    p.add_argument("--record-dir", default=None,
+                   help="каталог с записанными ответами OKX <instId>_<bar>.json")
+    p.add_argument("--okx-latency",     type=float, default=0.0,
+                   help="базовая задержка fake OKX, сек")
+    p.add_argument("--okx-jitter",      type=float, default=0.0)
+    p.add_argument("--okx-slow-ratio",  type=float, default=0.0,
+                   help="доля медленных ответов fake OKX")
+    p.add_argument("--okx-error-ratio", type=float, default=0.0,
+                   help="доля ответов 503 fake OKX")
+    p.add_argument("--json",       default=None, help="куда сохранить отчёт")
+    p.add_argument("--verbose",    action="store_true")
+    return p.parse_args(argv)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss: Linux — КБ, macOS — байты
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# ── Синтетические пользователи ───────────────────────────────────────────────
+
+def _make_user(i: int, now: float):
+    """60% LEVELS (лонг/шорт на разных TF), 20% SMC, 20% Герчик."""
+    from user_manager import UserSettings
+
+    u = UserSettings(
+        user_id     = USER_ID_BASE + i,
+        username    = f"lt{i}",
+        sub_status  = "active",
+        sub_expires = now + 30 * 86400,
+        min_volume_usdt = 1_000_000,
+    )
+    kind = i % 10
+    if kind < 6:
+        u.strategy     = "LEVELS"
+        u.long_active  = kind != 1
+        u.short_active = kind in (1, 3, 5)
+        u.long_tf,  u.long_interval  = _LEVEL_TFS[i % 3]
+        u.short_tf, u.short_interval = _LEVEL_TFS[(i + 1) % 3]
+    elif kind < 8:
+        u.strategy         = "SMC"
+        u.smc_long_active  = True
+        u.smc_short_active = kind == 7
+    else:
+        u.strategy       = "GERCHIK"
+        u.gerchik_active = True
+    return u
+
+
+async def _seed_db(n_users: int, pd_subs: int):
+    import database as db
+    from pump_dump import subscribers
+
+    now = time.time()
+    for i in range(n_users):
+        await db.db_upsert_user(_make_user(i, now).to_db())
+    for i in range(pd_subs):
+        await subscribers.upsert(USER_ID_BASE + i, subscribed=True, threshold=50)
+
+
+# ── PD: синтетические события ────────────────────────────────────────────────
+
+def _pd_events(symbols: list[str], now: float) -> list:
+    from pump_dump.market_monitor import MarketEvent, OrderBook
+
+    events = []
+    for sym in symbols:
+        df = make_ohlcv(
+            n=200, kind=kind_for(sym), seed=stable_seed(sym, "pd"),
+            bar_sec=60, end_ts=now,
+        ).reset_index()
+        df["ts"] = df.pop("open_time").astype("int64") // 1_000_000
+        df["buy_vol"] = df["volume"] * 0.55
+        last = float(df["close"].iloc[-1])
+        book = OrderBook(
+            symbol=sym,
+            bids=[[last * (1 - 0.0005 * k), 100.0 / k] for k in range(1, 21)],
+            asks=[[last * (1 + 0.0005 * k), 80.0 / k] for k in range(1, 21)],
+        )
+        buy = float(df["buy_vol"].iloc[-30:].sum())
+        events.append(MarketEvent(
+            symbol=sym, candles=df, orderbook=book,
+            trades_buy_vol=buy, trades_sell_vol=buy * 0.8, last_price=last,
+        ))
+    return events
+
+
+# ── Прогон ───────────────────────────────────────────────────────────────────
+
+async def _measure(name: str, cycle: int, fn, okx: FakeOKX, tg: FakeTelegram) -> dict:
+    calls0 = dict(okx.calls)
+    sent0  = len(tg.sent)
+    cpu0   = time.process_time()
+    t0     = time.perf_counter()
+    error  = None
+    try:
+        await fn()
+    except Exception as e:
+        error = repr(e)
+        log.exception(f"{name}: цикл {cycle} упал")
+    wall = time.perf_counter() - t0
+    sent = len(tg.sent) - sent0
+    calls = {k: v - calls0.get(k, 0) for k, v in okx.calls.items() if v - calls0.get(k, 0)}
+    res = {
+        "component": name, "cycle": cycle,
+        "wall_s":    round(wall, 3),
+        "cpu_s":     round(time.process_time() - cpu0, 3),
+        "rss_peak_mb": _peak_rss_mb(),
+        "okx_calls": calls, "okx_total": sum(calls.values()),
+        "messages":  sent,
+        "msgs_per_s": round(sent / wall, 1) if wall > 0 else 0.0,
+    }
+    if error:
+        res["error"] = error
+    log.info(
+        f"{name:8s} #{cycle}: {res['wall_s']:.2f}s wall, {res['cpu_s']:.2f}s cpu, "
+        f"OKX {res['okx_total']}, msgs {sent} ({res['msgs_per_s']}/s), "
+        f"RSS {res['rss_peak_mb']} MB"
+    )
+    return res
+
+
+async def run(args: argparse.Namespace) -> dict:
+    components = [c.strip() for c in args.components.split(",") if c.strip()]
+    unknown = set(components) - set(COMPONENTS)
+    if unknown:
+        raise SystemExit(f"Неизвестные компоненты: {', '.join(sorted(unknown))}")
+
+    okx = FakeOKX(
+        n_coins=args.coins, record_dir=args.record_dir,
+        latency=args.okx_latency, jitter=args.okx_jitter,
+        slow_ratio=args.okx_slow_ratio, error_ratio=args.okx_error_ratio,
+    )
+    tg  = FakeTelegram()
+    await okx.start()
+    await tg.start()
+    tmp = tempfile.TemporaryDirectory(prefix="chm_loadtest_")
+
+    # До импорта config/fetcher: токен обязателен, URL OKX читается при импорте
+    os.environ.setdefault("TELEGRAM_TOKEN", "123456:LOADTEST")
+    os.environ["DB_PATH"]      = os.path.join(tmp.name, "loadtest.db")
+    os.environ["OKX_BASE_URL"] = okx.url
+
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import cache
+    import database
+    import outbound
+    import scanner_mid
+    import smc.scanner as smc_scanner
+    from config import Config
+    from gerchik_runner import GerchikScanner
+    from pump_dump import hidden_signals, subscribers as pd_subscribers
+    from pump_dump.pd_runner import PDRunner
+    from smc.analyzer import SMCAnalyzer, SMCConfig
+    from user_manager import UserManager
+
+    scanner_mid._FUND_OK = False
+    smc_scanner._FUND_OK = False
+    # REST BingX (funding/OI/LS) не трогаем — кэш считается свежим
+    hidden_signals._cache._last_funding_fetch = float("inf")
+    hidden_signals._cache._last_oi_fetch      = float("inf")
+    hidden_signals._cache._last_ls_fetch      = float("inf")
+
+    config = Config()
+    await database.init_db(config.DB_PATH)
+    cache.init_cache(max_symbols=config.CACHE_MAX_SYMBOLS)
+
+    t0 = time.perf_counter()
+    await _seed_db(args.users, pd_subs=args.users // 2)
+    seed_s = round(time.perf_counter() - t0, 2)
+    log.info(f"БД: {args.users} пользователей за {seed_s}s ({config.DB_PATH})")
+
+    bot = Bot(
+        token=config.TELEGRAM_TOKEN,
+        session=AiohttpSession(api=TelegramAPIServer.from_base(tg.url)),
+    )
+    um       = UserManager()
+    scanner  = scanner_mid.MidScanner(config, bot, um)
+    gerchik  = GerchikScanner(bot, um, fetcher=scanner.fetcher)
+    analyzer = SMCAnalyzer(SMCConfig())
+    pd       = PDRunner(bot, config.DB_PATH)
+    events   = _pd_events(okx.symbols[:args.pd_symbols], okx.now)
+
+    async def _mid():
+        scanner._last_scan.clear()   # каждый цикл — полный проход
+        await scanner._cycle()
+        await scanner.join_jobs()
+        await outbound.drain(timeout=600)
+
+    async def _pd():
+        for ev in events:
+            await pd._process_event(ev)
+        await outbound.drain(timeout=600)   # PD ставит алерты в очередь без ожидания
+
+    runners = {
+        "mid":     _mid,
+        "gerchik": gerchik._cycle,
+        "smc":     lambda: smc_scanner._scan_cycle(bot, um, scanner.fetcher, analyzer),
+        "pd":      _pd,
+    }
+
+    results = []
+    okx_latency = {}
+    close_lat   = {}
+    try:
+        for cycle in range(1, args.cycles + 1):
+            for name in components:
+                results.append(await _measure(name, cycle, runners[name], okx, tg))
+        okx_latency = scanner.fetcher.latency_stats()
+        close_lat   = scanner.close_latency()
+        db_pool     = database.pool_stats()
+    finally:
+        for w in scanner._workers:
+            w.cancel()
+        await scanner.fetcher.close()
+        await bot.session.close()
+        await tg.stop()
+        await okx.stop()
+        await database.close_db()
+        tmp.cleanup()
+
+    return {
+        "params": {
+            "users": args.users, "coins": args.coins, "cycles": args.cycles,
+            "components": components, "pd_symbols": args.pd_symbols,
+        },
+        "seed_s":      seed_s,
+        "results":     results,
+        "okx_calls":   dict(okx.calls),
+        "okx_latency": okx_latency,
+        "close_to_send": close_lat,
+        "outbound":    outbound.stats(),
+        "pd_subscribers": pd_subscribers.stats(),
+        "db_pool":     db_pool,
+        "tg_calls":    dict(tg.calls),
+        "messages":    len(tg.sent),
+        "rss_peak_mb": _peak_rss_mb(),
+        "mid_perf":    {k: v for k, v in scanner._perf.items()
+                        if isinstance(v, (int, float))},
+    }
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s | %(name)-20s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    log.setLevel(logging.INFO)
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        log.info(f"Отчёт: {args.json}")
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+loadtest/synthetic.py — детерминированные синтетические OHLCV.
+
+Формат совпадает с OKXFetcher.get_candles: индекс open_time (UTC),
+колонки open/high/low/close/volume (volume — в USDT).
+
+Режимы:
+  trending      — дрейф + шум (геометрическое блуждание)
+  ranging       — возврат к среднему (боковик, частые тесты уровней)
+  gappy         — тренд с редкими гэпами ±3-8% между свечами
+  low_liquidity — маленький объём, много «плоских» свечей o=h=l=c
+"""
+
+import zlib
+
+import numpy as np
+import pandas as pd
+
+KINDS = ("trending", "ranging", "gappy", "low_liquidity")
+
+# Длительность бара OKX в секундах
+BAR_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1H": 3600, "2H": 7200, "4H": 14400, "6H": 21600, "12H": 43200,
+    "1D": 86400, "1W": 604800,
+}
+
+
+def stable_seed(*parts) -> int:
+    """Сид из строк — одинаковый между запусками (в отличие от hash())."""
+    return zlib.crc32("|".join(str(p) for p in parts).encode())
+
+
+def kind_for(symbol: str) -> str:
+    """Закрепляет за символом один режим — рынок получается разнородным."""
+    return KINDS[stable_seed(symbol) % len(KINDS)]
+
+
+def make_ohlcv(
+    n: int = 300,
+    kind: str = "trending",
+    seed: int = 0,
+    bar_sec: int = 3600,
+    end_ts: float = 1_700_000_000,
+    base: float = 100.0,
+) -> pd.DataFrame:
+    """n закрытых свечей; последняя открыта в end_ts (выровненном по бару)."""
+    rng = np.random.default_rng(seed)
+
+    if kind == "ranging":
+        # Ornstein–Uhlenbeck вокруг log(base)
+        x = np.empty(n)
+        x[0] = 0.0
+        for i in range(1, n):
+            x[i] = x[i - 1] * 0.92 + rng.normal(0, 0.006)
+        close = base * np.exp(x)
+    else:
+        drift = rng.choice([-1, 1]) * 0.0008
+        steps = rng.normal(drift, 0.009 if kind != "low_liquidity" else 0.004, n)
+        close = base * np.exp(np.cumsum(steps))
+
+    open_ = np.empty(n)
+    open_[0] = close[0]
+    open_[1:] = close[:-1]
+    if kind == "gappy":
+        gaps = rng.random(n) < 0.03
+        jump = 1 + rng.choice([-1, 1], n) * rng.uniform(0.03, 0.08, n)
+        open_ = np.where(gaps, open_ * jump, open_)
+
+    wick = np.abs(rng.normal(0, 0.004, n))
+    high = np.maximum(open_, close) * (1 + wick)
+    low  = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.004, n)))
+    volume = rng.lognormal(mean=13.0, sigma=0.6, size=n)
+
+    if kind == "low_liquidity":
+        flat = rng.random(n) < 0.25
+        high   = np.where(flat, open_, high)
+        low    = np.where(flat, open_, low)
+        close  = np.where(flat, open_, close)
+        volume = np.where(flat, 0.0, volume / 200)
+
+    end = int(end_ts // bar_sec * bar_sec)
+    idx = pd.to_datetime(
+        np.arange(end - (n - 1) * bar_sec, end + 1, bar_sec), unit="s"
+    )
+    df = pd.DataFrame(
+        {"open": open_, "high": high, "low": low, "close": close, "volume": volume},
+        index=pd.DatetimeIndex(idx, name="open_time"),
+    )
+    return df
+
+
+def okx_rows(df: pd.DataFrame) -> list[list[str]]:
+    """DataFrame → data[] ответа /market/candles (новые сверху, последняя не закрыта)."""
+    rows = []
+    for ts, r in zip(df.index.asi8 // 1_000_000, df.itertuples(index=False)):
+        vol_q = r.volume
+        vol   = vol_q / r.close if r.close else 0.0
+        rows.append([
+            str(int(ts)), str(float(r.open)), str(float(r.high)),
+            str(float(r.low)), str(float(r.close)),
+            str(float(vol)), str(float(vol)), str(float(vol_q)), "1",
+        ])
+    rows.reverse()
+    if rows:
+        rows[0][-1] = "0"
+    return rows
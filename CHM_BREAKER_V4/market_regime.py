@@ -0,0 +1,343 @@
+"""
+market_regime.py — общий рыночный режим, считается один раз на закрытие бара.
+
+Раньше тренд BTC/ETH считал каждый потребитель сам: get_global_trend
+(8 последовательных запросов свечей), MidScanner раз в час, /analyze —
+свои свечи BTC/ETH на каждый вызов. Теперь всё в одном месте:
+
+  trend        BTC/ETH × 1h/4h/1d/1w: up / down / flat (цена vs EMA50 ±0.2%)
+  breadth      доля монет выше EMA50 на 1h (кэш сканера → OKX на промах)
+  adv_ratio    доля растущих за 24ч монет (снапшот tickers.py)
+  vol_regime   low / normal / high: ATR% BTC 1H к медиане ATR% за окно
+  btc_vol_share, btc_vs_alts, eth_btc — прокси доминации BTC
+  label        risk_on / risk_off / mixed — общая метка для всех стратегий
+
+Пересчёт — после закрытия часового бара (regime_loop) или лениво через
+refresh(). Свечи старших TF перезапрашиваются только когда закрылся их бар.
+Потребители читают current() / legacy_trend() / frame() — без сети.
+"""
+
+import asyncio
+import logging
+import statistics
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+import cache
+import fetcher as okx   # модулем: fetcher сам импортирует market_regime
+import tickers
+
+log = logging.getLogger("CHM.Regime")
+
+REF_SYMBOLS   = ("BTC-USDT-SWAP", "ETH-USDT-SWAP")
+# Ключи — как в fetcher.TIMEFRAME_MAP: неизвестный ключ get_candles молча
+# подменяет на 1H, поэтому _load_frames проверяет их явно
+TREND_TFS     = ("1h", "4h", "1d", "1w")
+TREND_LABELS  = {"1h": "H1", "4h": "H4", "1d": "D1", "1w": "W1"}
+REF_LIMIT     = 200      # баров BTC/ETH: хватает на EMA50 и окно волатильности
+REGIME_TF     = "1h"     # режим пересчитывается на закрытии часового бара
+CLOSE_DELAY   = 10       # сек после закрытия — OKX успевает отдать закрытый бар
+HISTORY_LEN   = 720      # 30 дней часовой истории
+BREADTH_COINS = 60       # монет в расчёте breadth (топ по объёму)
+BREADTH_TF    = "1h"     # ключ кэша, как у MidScanner (кэш сканера только читаем)
+BREADTH_LIMIT = 100      # баров на монету, если в кэше сканера нет свежих
+BREADTH_CONC  = 8
+ATR_PERIOD    = 14
+VOL_WINDOW    = 120
+VOL_LOW       = 0.7      # ATR% / медиана ниже — low
+VOL_HIGH      = 1.5      # выше — high
+
+_EMOJI = {"up": "🟢", "down": "🔴", "flat": "⚪"}
+
+
+@dataclass
+class Regime:
+    ts:            float
+    bar_ts:        int
+    trend:         dict = field(default_factory=dict)   # {"BTC": {"1h": "up", ...}}
+    breadth:       Optional[float] = None
+    breadth_n:     int   = 0
+    adv_ratio:     Optional[float] = None
+    vol_regime:    str   = "normal"
+    vol_ratio:     float = 1.0
+    btc_vol_share: Optional[float] = None
+    btc_vs_alts:   Optional[float] = None
+    eth_btc:       str   = "flat"
+    label:         str   = "mixed"
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_current: Optional[Regime] = None
+_history: deque            = deque(maxlen=HISTORY_LEN)
+_frames:  dict             = {}    # (symbol, tf) → (bar_open_ts, df)
+_breadth_frames: dict      = {}    # symbol → (bar_open_ts, df), своё — не кэш сканера
+_lock:    Optional[asyncio.Lock] = None
+_computes = 0
+_requests = 0
+
+
+# ── Чтение (без сети) ────────────────────────────────
+
+def current() -> Optional[Regime]:
+    return _current
+
+
+def history(n: int = 0) -> list:
+    h = list(_history)
+    return h[-n:] if n else h
+
+
+def frame(symbol: str, tf: str) -> Optional[pd.DataFrame]:
+    """Свечи BTC/ETH, загруженные для режима (TREND_TFS: 1h/4h/1d/1w)."""
+    entry = _frames.get((symbol, tf))
+    return entry[1] if entry else None
+
+
+def legacy_trend() -> dict:
+    """Формат get_global_trend: {"BTC": {"trend_text": "H1: 🟢 | ..."}, "ETH": ...}."""
+    if _current is None:
+        return {}
+    out = {}
+    for name, by_tf in _current.trend.items():
+        out[name] = {"trend_text": " | ".join(
+            f"{TREND_LABELS[tf]}: {_EMOJI.get(by_tf.get(tf), '❓')}" for tf in TREND_TFS
+        )}
+    return out
+
+
+def text_block() -> str:
+    """Блок для /analyze (HTML)."""
+    r = _current
+    if r is None:
+        return ""
+    NL = "\n"
+    label = {"risk_on": "🟢 risk-on", "risk_off": "🔴 risk-off"}.get(r.label, "⚪ смешанный")
+    lines = ["🌍 <b>Рынок:</b> " + label]
+    for name, t in legacy_trend().items():
+        lines.append("🪙 " + name + ": " + t["trend_text"])
+    if r.breadth is not None:
+        lines.append(f"📊 Выше EMA50 (1h): {r.breadth:.0%} из {r.breadth_n} монет")
+    vol = {"low": "низкая", "high": "высокая"}.get(r.vol_regime, "обычная")
+    lines.append(f"🌡 Волатильность BTC: {vol} (×{r.vol_ratio:.2f})")
+    if r.btc_vs_alts is not None:
+        lines.append(f"👑 BTC vs альты 24ч: {r.btc_vs_alts:+.2f}%")
+    return NL.join(lines)
+
+
+def stats() -> dict:
+    return {
+        "label":    _current.label if _current else None,
+        "bar_ts":   _current.bar_ts if _current else None,
+        "history":  len(_history),
+        "computes": _computes,
+        "requests": _requests,
+    }
+
+
+# ── Расчёт ───────────────────────────────────────────
+
+def _bar_open(tf: str, now: float) -> int:
+    """Открытие текущего бара tf на сетке OKX (1d/1w — по HKT, не UTC)."""
+    return int(okx.bar_open(tf, now))
+
+
+def _trend(df: pd.DataFrame) -> Optional[str]:
+    if df is None or len(df) < 50:
+        return None
+    close = df["close"]
+    ema50 = close.ewm(span=50, adjust=False).mean().iloc[-1]
+    price = close.iloc[-1]
+    if price > ema50 * 1.002:
+        return "up"
+    if price < ema50 * 0.998:
+        return "down"
+    return "flat"
+
+
+def _atr_pct(df: pd.DataFrame) -> pd.Series:
+    prev = df["close"].shift(1)
+    tr = pd.concat([
+        df["high"] - df["low"],
+        (df["high"] - prev).abs(),
+        (df["low"] - prev).abs(),
+    ], axis=1).max(axis=1)
+    return tr.rolling(ATR_PERIOD).mean() / df["close"]
+
+
+def _vol_regime(df: Optional[pd.DataFrame]) -> tuple:
+    if df is None or len(df) < ATR_PERIOD + 20:
+        return "normal", 1.0
+    atrp = _atr_pct(df).dropna().iloc[-VOL_WINDOW:]
+    med  = float(atrp.median())
+    if med <= 0:
+        return "normal", 1.0
+    ratio = float(atrp.iloc[-1]) / med
+    if ratio < VOL_LOW:
+        return "low", ratio
+    if ratio > VOL_HIGH:
+        return "high", ratio
+    return "normal", ratio
+
+
+async def _load_frames(fetcher, now: float):
+    """Перезапросить только те (символ, TF), у которых закрылся бар."""
+    global _requests
+    unknown = [tf for tf in TREND_TFS if tf not in okx.TIMEFRAME_MAP]
+    if unknown:
+        raise ValueError(f"market_regime: TF {unknown} нет в fetcher.TIMEFRAME_MAP")
+    todo = []
+    for sym in REF_SYMBOLS:
+        for tf in TREND_TFS:
+            entry = _frames.get((sym, tf))
+            if entry is None or entry[0] != _bar_open(tf, now):
+                todo.append((sym, tf))
+    if not todo:
+        return
+    _requests += len(todo)
+    dfs = await asyncio.gather(
+        *[fetcher.get_candles(sym, tf, limit=REF_LIMIT) for sym, tf in todo],
+        return_exceptions=True,
+    )
+    for (sym, tf), df in zip(todo, dfs):
+        if isinstance(df, Exception) or df is None or df.empty:
+            continue
+        _frames[(sym, tf)] = (_bar_open(tf, now), df)
+
+
+async def _breadth(fetcher, now: float) -> tuple:
+    """
+    Доля монет выше EMA50. Свечи сканера берём, если в них есть последний
+    закрытый бар; иначе — свои BREADTH_LIMIT баров в _breadth_frames.
+    В кэш сканера не пишем: короткий df там отключил бы 1h-сигналы
+    (индикатору нужно ≥ max(EMA_SLOW, 100) баров).
+    """
+    coins = await cache.get_coins()
+    if not coins:
+        snap  = tickers.all_tickers()
+        coins = sorted(snap, key=lambda s: snap[s].volume_usdt, reverse=True)
+    coins = [c for c in coins if c.endswith("USDT-SWAP")][:BREADTH_COINS]
+    sem   = asyncio.Semaphore(BREADTH_CONC)
+    bar   = _bar_open(BREADTH_TF, now)
+
+    async def _one(sym: str) -> Optional[bool]:
+        global _requests
+        df = await cache.get_candles(sym, BREADTH_TF)
+        if df is None or df.empty or df.index[-1].timestamp() + okx.tf_seconds(BREADTH_TF) < bar:
+            entry = _breadth_frames.get(sym)
+            if entry is not None and entry[0] == bar:
+                df = entry[1]
+            else:
+                async with sem:
+                    _requests += 1
+                    df = await fetcher.get_candles(sym, BREADTH_TF, limit=BREADTH_LIMIT)
+                if df is not None:
+                    _breadth_frames[sym] = (bar, df)
+        t = _trend(df)
+        return None if t is None else t == "up"
+
+    res = await asyncio.gather(*[_one(s) for s in coins], return_exceptions=True)
+    for sym in set(_breadth_frames) - set(coins):   # выбывшие из топа
+        del _breadth_frames[sym]
+    flags = [r for r in res if isinstance(r, bool)]
+    if not flags:
+        return None, 0
+    return sum(flags) / len(flags), len(flags)
+
+
+def _dominance() -> tuple:
+    """(adv_ratio, btc_vol_share, btc_vs_alts) из снапшота тикеров."""
+    snap = [t for s, t in tickers.all_tickers().items() if s.endswith("USDT-SWAP")]
+    btc  = tickers.get("BTC-USDT-SWAP")
+    if not snap or btc is None:
+        return None, None, None
+    total = sum(t.volume_usdt for t in snap)
+    alts  = [t.change_pct for t in snap if t.symbol not in REF_SYMBOLS]
+    adv   = sum(1 for t in snap if t.change_pct > 0) / len(snap)
+    share = btc.volume_usdt / total if total else None
+    vs    = btc.change_pct - statistics.median(alts) if alts else None
+    return adv, share, vs
+
+
+def _eth_btc() -> str:
+    eth, btc = frame("ETH-USDT-SWAP", "1d"), frame("BTC-USDT-SWAP", "1d")
+    if eth is None or btc is None:
+        return "flat"
+    ratio = (eth["close"] / btc["close"]).dropna()
+    return _trend(ratio.to_frame("close")) or "flat"
+
+
+def _label(r: Regime) -> str:
+    btc = r.trend.get("BTC", {})
+    b   = r.breadth if r.breadth is not None else r.adv_ratio
+    if btc.get("4h") == "up" and b is not None and b >= 0.6:
+        return "risk_on"
+    if btc.get("4h") == "down" and b is not None and b <= 0.4:
+        return "risk_off"
+    return "mixed"
+
+
+async def _compute(fetcher, now: float) -> Regime:
+    await _load_frames(fetcher, now)
+    await tickers.refresh(fetcher)
+    breadth, n = await _breadth(fetcher, now)
+    adv, share, vs = _dominance()
+    vol, ratio = _vol_regime(frame("BTC-USDT-SWAP", "1h"))
+
+    r = Regime(ts=now, bar_ts=_bar_open(REGIME_TF, now))
+    for sym in REF_SYMBOLS:
+        name = sym.split("-")[0]
+        r.trend[name] = {}
+        for tf in TREND_TFS:
+            t = _trend(frame(sym, tf))
+            if t is not None:
+                r.trend[name][tf] = t
+    r.breadth, r.breadth_n = breadth, n
+    r.adv_ratio, r.btc_vol_share, r.btc_vs_alts = adv, share, vs
+    r.vol_regime, r.vol_ratio = vol, round(ratio, 3)
+    r.eth_btc = _eth_btc()
+    r.label   = _label(r)
+    return r
+
+
+async def refresh(fetcher, force: bool = False) -> Optional[Regime]:
+    """Пересчитать режим, если закрылся новый часовой бар. Вызовы
+    из разных мест в пределах бара получают уже готовый результат."""
+    global _current, _lock, _computes
+    if _lock is None:
+        _lock = asyncio.Lock()
+    now = time.time()
+    if not force and _current is not None and _current.bar_ts == _bar_open(REGIME_TF, now):
+        return _current
+    async with _lock:
+        if not force and _current is not None and _current.bar_ts == _bar_open(REGIME_TF, now):
+            return _current
+        t0 = time.perf_counter()
+        r  = await _compute(fetcher, now)
+        _current = r
+        _history.append(r)
+        _computes += 1
+        btc = legacy_trend().get("BTC", {}).get("trend_text", "?")
+        log.info(
+            f"🌍 Режим: {r.label} | BTC {btc} | breadth "
+            f"{'—' if r.breadth is None else f'{r.breadth:.0%}'} | vol {r.vol_regime} "
+            f"| {time.perf_counter() - t0:.1f}s"
+        )
+        return r
+
+
+async def regime_loop(fetcher):
+    """Пересчёт сразу после закрытия каждого часового бара."""
+    while True:
+        try:
+            await refresh(fetcher)
+        except Exception as e:
+            log.warning(f"regime refresh: {e}")
+        now = time.time()
+        await asyncio.sleep(_bar_open(REGIME_TF, now) + okx.tf_seconds(REGIME_TF)
+                            + CLOSE_DELAY - now)
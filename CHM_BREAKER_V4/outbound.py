@@ -0,0 +1,388 @@
+"""
+outbound.py — единая очередь исходящих сообщений Telegram.
+
+Все отправители (MidScanner, SMC, Герчик, PD, Polymarket, рассылка, shard
+outbox) идут через неё вместо своих asyncio.sleep между send_message:
+
+  • приоритеты между чатами: сделки → сигналы → алерты → дайджесты/рассылки
+  • token bucket: глобально OUT_GLOBAL_RATE msg/s (лимит Telegram ~30),
+    на чат OUT_CHAT_RATE msg/s
+  • сообщения одного чата — строго FIFO, в том числе при повторах: у чата
+    своя очередь (_chatq), в расписание (_ready / _delayed) попадает только
+    её голова, следующее сообщение — после доставки или отказа головы.
+    Приоритет выбирает, какой чат обслужить раньше (по приоритету головы),
+    но не переставляет сообщения внутри чата
+  • 429: пауза всей очереди на retry_after и повтор (до OUT_MAX_RETRIES)
+  • ограниченная память: OUT_QUEUE_MAX сообщений; при переполнении
+    вытесняется самое низкоприоритетное, новое с худшим приоритетом — отказ
+
+API:
+  await send(bot, chat_id, text, prio=PRIO_SIGNAL, **kwargs)
+      ждёт доставки; возвращает Message или бросает ошибку Telegram
+      (TelegramForbiddenError и т.п.) — как bot.send_message. Отмена
+      ожидающего send убирает сообщение из очереди (если оно ещё не в полёте)
+  post(bot, chat_id, text, prio=PRIO_ALERT, on_done=None, **kwargs) -> bool
+      без ожидания; on_done(exc | None) — async-колбэк после доставки/ошибки
+  await drain(timeout)  — дождаться пустой очереди (тесты, остановка бота)
+  stats()               — метрики для /perf и loadtest
+
+Заменители бота (OutboxBot воркеров, ShadowBot) лимитов Telegram не имеют —
+для них send_message вызывается напрямую.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+log = logging.getLogger("CHM.Outbound")
+
+OUT_GLOBAL_RATE  = float(os.getenv("OUT_GLOBAL_RATE", "25"))   # msg/s на бота
+OUT_GLOBAL_BURST = 25
+OUT_CHAT_RATE    = float(os.getenv("OUT_CHAT_RATE", "1"))      # msg/s на чат
+OUT_CHAT_BURST   = 1
+OUT_QUEUE_MAX    = int(os.getenv("OUT_QUEUE_MAX", "20000"))
+OUT_INFLIGHT     = 16       # одновременных запросов к Bot API
+OUT_MAX_RETRIES  = 3        # повторов на 429 / 5xx / сетевую ошибку
+OUT_CHAT_BUCKETS = 20_000   # LRU бакетов чатов
+OUT_LAT_WINDOW   = 2000
+
+PRIO_TRADE  = 0   # авто-трейд: результат открытия, отказы
+PRIO_SIGNAL = 1   # торговые сигналы
+PRIO_ALERT  = 2   # PD, алерты Polymarket
+PRIO_DIGEST = 3   # дайджесты, рассылки админа
+
+_PRIO_NAMES = {PRIO_TRADE: "trade", PRIO_SIGNAL: "signal",
+               PRIO_ALERT: "alert", PRIO_DIGEST: "digest"}
+
+OnDone = Callable[[Optional[BaseException]], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    """Очередь заполнена сообщениями с приоритетом не хуже этого."""
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "ts")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate, self.burst = rate, burst
+        self.tokens, self.ts  = burst, now
+
+    def wait(self, now: float) -> float:
+        """0 — токен есть; иначе сколько секунд ждать."""
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class _Msg:
+    __slots__ = ("prio", "seq", "bot", "chat_id", "text", "kwargs",
+                 "fut", "on_done", "enq_at", "attempts")
+
+    def __init__(self, prio, seq, bot, chat_id, text, kwargs, fut, on_done):
+        self.prio, self.seq        = prio, seq
+        self.bot, self.chat_id     = bot, chat_id
+        self.text, self.kwargs     = text, kwargs
+        self.fut, self.on_done     = fut, on_done
+        self.enq_at, self.attempts = time.monotonic(), 0
+
+
+_ready:   list = []            # heap (prio, seq, msg) — головы очередей чатов
+_delayed: list = []            # heap (ready_at, seq, msg) — голова ждёт бакета/повтора
+_chatq:   dict = {}            # chat_id → deque сообщений чата, [0] — голова
+_busy:    set  = set()         # чаты, чья голова в полёте
+_chats:   OrderedDict = OrderedDict()
+_global:  Optional[_Bucket] = None
+_wake:    Optional[asyncio.Event] = None
+_slots:   Optional[asyncio.Semaphore] = None
+_task:    Optional[asyncio.Task] = None
+_seq         = 0
+_count       = 0               # недоставленных сообщений, включая те, что в полёте
+_inflight    = 0
+_pause_until = 0.0
+_m   = Counter()
+_lat = deque(maxlen=OUT_LAT_WINDOW)
+
+
+def _direct(bot) -> bool:
+    return not isinstance(bot, Bot)
+
+
+def _size() -> int:
+    return _count - _inflight
+
+
+def _advance(m: _Msg):
+    """m доставлено или отброшено — убрать из очереди чата, следующее — в расписание."""
+    global _count
+    _count -= 1
+    q = _chatq.get(m.chat_id)
+    if not q:
+        return
+    if q[0] is not m:
+        q.remove(m)   # вытеснено из середины очереди чата
+        return
+    q.popleft()
+    if q:
+        heapq.heappush(_ready, (q[0].prio, q[0].seq, q[0]))
+    else:
+        del _chatq[m.chat_id]
+
+
+def _ensure_started():
+    global _task, _wake, _slots, _global
+    if _task is not None and not _task.done():
+        return
+    _wake   = asyncio.Event()
+    _slots  = asyncio.Semaphore(OUT_INFLIGHT)
+    _global = _Bucket(OUT_GLOBAL_RATE, OUT_GLOBAL_BURST, time.monotonic())
+    _task   = asyncio.create_task(_dispatch())
+
+
+def _chat_bucket(chat_id: int, now: float) -> _Bucket:
+    b = _chats.get(chat_id)
+    if b is None:
+        b = _chats[chat_id] = _Bucket(OUT_CHAT_RATE, OUT_CHAT_BURST, now)
+        if len(_chats) > OUT_CHAT_BUCKETS:
+            _chats.popitem(last=False)
+    else:
+        _chats.move_to_end(chat_id)
+    return b
+
+
+def _evict_for(prio: int) -> bool:
+    """Освободить место: вытеснить самое низкоприоритетное (и самое новое)."""
+    victim = max(
+        (m for chat, q in _chatq.items() for m in q
+         if not (m is q[0] and chat in _busy)),   # в полёте — не трогаем
+        key=lambda m: (m.prio, m.seq), default=None,
+    )
+    if victim is None or victim.prio <= prio:
+        return False
+    if _chatq[victim.chat_id][0] is victim:
+        _unschedule(victim)
+    _m["dropped"] += 1
+    _advance(victim)
+    _resolve(victim, None, QueueFull(f"вытеснено из очереди (prio {victim.prio})"))
+    return True
+
+
+def _cancel(m: _Msg):
+    """Ожидающий send отменён — не отправлять (в полёте — уже не остановить)."""
+    if not m.fut.cancelled():
+        return
+    q = _chatq.get(m.chat_id)
+    if not q or m not in q or (q[0] is m and m.chat_id in _busy):
+        return
+    if q[0] is m:
+        _unschedule(m)
+    _m["cancelled"] += 1
+    _advance(m)
+    _wake.set()
+
+
+def _unschedule(m: _Msg):
+    """Убрать голову чата из _ready / _delayed."""
+    for pool in (_ready, _delayed):
+        for i, e in enumerate(pool):
+            if e[2] is m:
+                pool[i] = pool[-1]
+                pool.pop()
+                heapq.heapify(pool)
+                return
+
+
+def _enqueue(bot, chat_id: int, text: str, prio: int, kwargs: dict,
+             fut: Optional[asyncio.Future], on_done: Optional[OnDone]):
+    global _seq, _count
+    _ensure_started()
+    if _size() >= OUT_QUEUE_MAX and not _evict_for(prio):
+        _m["rejected"] += 1
+        raise QueueFull(f"очередь отправки заполнена ({OUT_QUEUE_MAX})")
+    _seq += 1
+    _count += 1
+    m = _Msg(prio, _seq, bot, chat_id, text, kwargs, fut, on_done)
+    if fut is not None:
+        fut.add_done_callback(lambda _f: _cancel(m))
+    q = _chatq.get(chat_id)
+    if q:
+        q.append(m)   # чат уже в расписании — ждёт своей очереди
+    else:
+        _chatq[chat_id] = deque((m,))
+        heapq.heappush(_ready, (prio, _seq, m))
+    _m["queued"] += 1
+    _m["queued_" + _PRIO_NAMES.get(prio, str(prio))] += 1
+    _wake.set()
+
+
+async def send(bot, chat_id: int, text: str, prio: int = PRIO_SIGNAL, **kwargs):
+    """Отправить и дождаться результата (Message или исключение Telegram)."""
+    if _direct(bot):
+        return await bot.send_message(chat_id, text, **kwargs)
+    fut = asyncio.get_running_loop().create_future()
+    _enqueue(bot, chat_id, text, prio, kwargs, fut, None)
+    return await fut
+
+
+def post(bot, chat_id: int, text: str, prio: int = PRIO_ALERT,
+         on_done: Optional[OnDone] = None, **kwargs) -> bool:
+    """Поставить в очередь без ожидания. False — очередь заполнена."""
+    if _direct(bot):
+        async def _now():
+            exc = None
+            try:
+                await bot.send_message(chat_id, text, **kwargs)
+            except Exception as e:
+                exc = e
+            if on_done is not None:
+                await on_done(exc)
+        asyncio.create_task(_now())
+        return True
+    try:
+        _enqueue(bot, chat_id, text, prio, kwargs, None, on_done)
+        return True
+    except QueueFull:
+        return False
+
+
+def _resolve(m: _Msg, result, exc: Optional[BaseException]):
+    if m.fut is not None and not m.fut.done():
+        if exc is None:
+            m.fut.set_result(result)
+        else:
+            m.fut.set_exception(exc)
+    if m.on_done is not None:
+        asyncio.create_task(_run_on_done(m.on_done, exc))
+    elif exc is not None and m.fut is None and not isinstance(exc, QueueFull):
+        log.debug(f"outbound → {m.chat_id}: {exc}")
+
+
+async def _run_on_done(cb: OnDone, exc: Optional[BaseException]):
+    try:
+        await cb(exc)
+    except Exception as e:
+        log.warning(f"outbound on_done: {e}")
+
+
+async def _deliver(m: _Msg):
+    global _inflight, _pause_until
+    retry_in = None
+    try:
+        res = await m.bot.send_message(m.chat_id, m.text, **m.kwargs)
+    except TelegramRetryAfter as e:
+        _m["429"] += 1
+        # Лимит Bot API — притормаживаем всю очередь, не только этот чат
+        _pause_until = max(_pause_until, time.monotonic() + e.retry_after)
+        if m.attempts < OUT_MAX_RETRIES:
+            retry_in = float(e.retry_after)
+        else:
+            _m["failed"] += 1
+            _resolve(m, None, e)
+    except (TelegramServerError, TelegramNetworkError) as e:
+        if m.attempts < OUT_MAX_RETRIES:
+            retry_in = 1.0 + m.attempts
+        else:
+            _m["failed"] += 1
+            _resolve(m, None, e)
+    except Exception as e:
+        _m["failed"] += 1
+        _resolve(m, None, e)
+    else:
+        _m["sent"] += 1
+        _lat.append(time.monotonic() - m.enq_at)
+        _resolve(m, res, None)
+    finally:
+        _busy.discard(m.chat_id)
+        _inflight -= 1
+        _slots.release()
+        if retry_in is not None and m.fut is not None and m.fut.cancelled():
+            retry_in = None   # отправитель больше не ждёт — повтор не нужен
+        if retry_in is not None:
+            m.attempts += 1
+            _m["retries"] += 1
+            # Остаётся головой чата — следующие сообщения ждут этот повтор
+            heapq.heappush(_delayed, (time.monotonic() + retry_in, m.seq, m))
+        else:
+            _advance(m)
+        _wake.set()
+
+
+async def _dispatch():
+    global _inflight
+    while True:
+        now = time.monotonic()
+        while _delayed and _delayed[0][0] <= now:
+            _, _, m = heapq.heappop(_delayed)
+            heapq.heappush(_ready, (m.prio, m.seq, m))
+
+        if not _ready:
+            _wake.clear()
+            timeout = _delayed[0][0] - now if _delayed else None
+            try:
+                await asyncio.wait_for(_wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        if _pause_until > now:
+            await asyncio.sleep(_pause_until - now)
+            continue
+        wait = _global.wait(now)
+        if wait > 0:
+            await asyncio.sleep(wait)
+            continue
+
+        # В расписании только головы чатов: второе сообщение того же чата
+        # сюда не попадёт, пока голова не доставлена или не отброшена
+        _, _, m = heapq.heappop(_ready)
+        bucket = _chat_bucket(m.chat_id, now)
+        wait = bucket.wait(now)
+        if wait > 0:
+            heapq.heappush(_delayed, (now + wait, m.seq, m))
+            continue
+
+        _busy.add(m.chat_id)   # до ожидания слота — _evict_for его уже не тронет
+        await _slots.acquire()
+        bucket.take()
+        _global.take()
+        _inflight += 1
+        asyncio.create_task(_deliver(m))
+
+
+async def drain(timeout: float = 30.0) -> bool:
+    """Ждать, пока очередь опустеет и всё в полёте доставится."""
+    deadline = time.monotonic() + timeout
+    while _count:
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def stats() -> dict:
+    lat = sorted(_lat)
+
+    def pick(q: float) -> float:
+        return round(lat[min(len(lat) - 1, int(q * len(lat)))], 3) if lat else 0.0
+
+    return {
+        "queued_now": len(_ready),
+        "delayed":    len(_delayed),
+        "waiting":    _size() - len(_ready) - len(_delayed),   # за головами своих чатов
+        "inflight":   _inflight,
+        "paused_s":   round(max(0.0, _pause_until - time.monotonic()), 1),
+        "lat_p50_s":  pick(0.50),
+        "lat_p95_s":  pick(0.95),
+        **dict(_m),
+    }
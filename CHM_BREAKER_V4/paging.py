@@ -0,0 +1,53 @@
+"""
+paging.py — курсоры keyset-пагинации и их упаковка в callback_data.
+
+LIMIT/OFFSET заставляет SQLite пройти и выбросить все предыдущие строки —
+чем дальше страница, тем дольше. Keyset-страница продолжает с ключа
+последней показанной строки:
+
+    WHERE (k1, k2) < (?, ?) ORDER BY k1 DESC, k2 DESC LIMIT n
+
+цена не зависит от номера страницы, а новые строки не сдвигают уже
+показанные. Ключ всегда заканчивается уникальной колонкой (rowid / id /
+user_id) — порядок стабилен при равных created_at.
+
+  database.py: rows, nxt = await db.db_trades_page(uid, cursor, limit)
+  кнопки:      callback_data = "th:" + paging.pack(nxt)
+  хендлер:     cursor = paging.unpack(token)   # None → первая страница
+
+Токен — base64url от JSON-списка ключей: непрозрачен для пользователя,
+переживает рестарт бота и укладывается в 64 байта callback_data.
+"""
+
+import base64
+import binascii
+import json
+from typing import Optional
+
+MAX_TOKEN = 48   # байт; остаток callback_data — под префикс
+
+
+def pack(cursor: Optional[tuple]) -> str:
+    """Курсор → токен ('' — страниц больше нет / первая страница)."""
+    if not cursor:
+        return ""
+    raw = json.dumps(list(cursor), separators=(",", ":")).encode()
+    token = base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+    if len(token) > MAX_TOKEN:
+        raise ValueError(f"cursor too long for callback_data: {cursor!r}")
+    return token
+
+
+def unpack(token: str) -> Optional[tuple]:
+    """Токен → курсор; пустой или испорченный токен — None (первая страница)."""
+    if not token:
+        return None
+    try:
+        vals = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(vals, list) or not vals:
+        return None
+    if not all(isinstance(v, (int, float, str)) for v in vals):
+        return None
+    return tuple(vals)
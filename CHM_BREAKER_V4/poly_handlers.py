@@ -26,6 +26,7 @@ from aiogram.types import (
 )
 
 import database as db
+import paging
 import turso_sync
 import wallet_service
 from polymarket_service import (
@@ -1226,12 +1227,15 @@ def register_poly_handlers(
     # ─── Портфель ─────────────────────────────────────────────────────────
 
     @dp.callback_query(F.data == "pm:portfolio")
+    @dp.callback_query(F.data.startswith("pm:bets:"))
     async def cb_portfolio(cb: CallbackQuery):
         await cb.answer()
         uid = cb.from_user.id
+        # pm:bets:<токен> — следующая страница (keyset по created_at, id)
+        cursor = paging.unpack(cb.data[len("pm:bets:"):]) if cb.data.startswith("pm:bets:") else None
 
         wallet, balance = await _get_user_wallet_balance(uid)
-        bets = await db.poly_get_bets(uid, limit=10)
+        bets, nxt = await db.poly_bets_page(uid, cursor, limit=10)
 
         NL = "\n"
         lines = ["💼 <b>Портфель Polymarket</b>" + NL]
@@ -1243,7 +1247,8 @@ def register_poly_handlers(
             lines.append("📭 Ставок пока нет.")
         else:
             total_in = sum(b.get("amount_usdc", 0) for b in bets)
-            lines.append(f"📊 Последние {len(bets)} ставок (всего вложено: <b>{_fmt_usd(total_in)}</b>)" + NL)
+            title = "Последние" if cursor is None else "Более ранние"
+            lines.append(f"📊 {title} {len(bets)} ставок (вложено: <b>{_fmt_usd(total_in)}</b>)" + NL)
             for i, b in enumerate(bets, 1):
                 q    = _market_short(b.get("question", "—"), 38)
                 side = b.get("side", "—")
@@ -1257,11 +1262,14 @@ def register_poly_handlers(
                              f"   {side}{price_str} | ${amt:.2f} | {dt_str}")
 
         text = NL.join(lines)
-        kb = _ik(
+        rows = []
+        if nxt:
+            rows.append([_btn("▶️ Старее", "pm:bets:" + paging.pack(nxt))])
+        rows += [
             [_btn("🔄 Обновить", "pm:portfolio"), _btn("🔥 Новые маркеты", "pm:trending:0")],
             [_btn("🔙 Polymarket", "pm:menu")],
-        )
-        await _safe_edit(cb, text, kb)
+        ]
+        await _safe_edit(cb, text, _ik(*rows))
 
     # ─── Ценовые алерты ───────────────────────────────────────────────────
 
@@ -18,6 +18,7 @@ from aiogram import Bot
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 import database as db
+import outbound
 from polymarket_service import (
     PolymarketService, _parse_prices, _get_short_key, translate_question,
 )
@@ -119,10 +120,11 @@ async def send_daily_digest(bot: Bot, poly: PolymarketService, um) -> int:
         if await db.poly_digest_sent_today(user.user_id, today):
             continue
         try:
-            await bot.send_message(user.user_id, text, parse_mode="HTML")
+            await outbound.send(
+                bot, user.user_id, text, parse_mode="HTML", prio=outbound.PRIO_DIGEST,
+            )
             await db.poly_digest_mark_sent(user.user_id, today)
             sent += 1
-            await asyncio.sleep(0.05)
         except Exception:
             pass
 
@@ -195,12 +197,12 @@ async def check_price_alerts(bot: Bot, poly: PolymarketService):
                     InlineKeyboardButton(text="🔕 Удалить алерт", callback_data=f"pm:alert_del:{a['id']}"),
                 ]])
                 try:
-                    await bot.send_message(
-                        a["user_id"], text, parse_mode="HTML", reply_markup=kb
+                    await outbound.send(
+                        bot, a["user_id"], text, parse_mode="HTML", reply_markup=kb,
+                        prio=outbound.PRIO_ALERT,
                     )
                     await db.poly_alert_delete(a["id"])
                     notified += 1
-                    await asyncio.sleep(0.05)
                 except Exception:
                     pass
         except Exception as e:
@@ -23,6 +23,8 @@ from aiogram.types import (
 )
 
 import database as db
+import paging
+from pump_dump import subscribers
 from pump_dump.pd_config import DEFAULT_USER_THRESHOLD
 
 if TYPE_CHECKING:
@@ -139,7 +141,7 @@ def register_pd_handlers(dp: Dispatcher, bot: Bot, runner_getter):
     # ── Подписка / отписка ────────────────────────────────────────────────────
     @dp.callback_query(F.data == "pd_subscribe")
     async def cb_pd_subscribe(cb: CallbackQuery):
-        await db.db_pd_upsert_user(cb.from_user.id, subscribed=True)
+        await subscribers.upsert(cb.from_user.id, subscribed=True)
         subscribed, threshold = await _get_sub(cb.from_user.id)
         try:
             await cb.message.edit_text(
@@ -153,7 +155,7 @@ def register_pd_handlers(dp: Dispatcher, bot: Bot, runner_getter):
 
     @dp.callback_query(F.data == "pd_unsubscribe")
     async def cb_pd_unsubscribe(cb: CallbackQuery):
-        await db.db_pd_upsert_user(cb.from_user.id, subscribed=False)
+        await subscribers.upsert(cb.from_user.id, subscribed=False)
         subscribed, threshold = await _get_sub(cb.from_user.id)
         try:
             await cb.message.edit_text(
@@ -188,7 +190,7 @@ def register_pd_handlers(dp: Dispatcher, bot: Bot, runner_getter):
             thr = int(cb.data.split("_")[-1])
         except ValueError:
             await cb.answer(); return
-        await db.db_pd_upsert_user(cb.from_user.id, threshold=thr)
+        await subscribers.upsert(cb.from_user.id, threshold=thr)
         await cb.answer(f"✅ Порог установлен: {thr}%")
         subscribed, _ = await _get_sub(cb.from_user.id)
         try:
@@ -282,14 +284,18 @@ def register_pd_handlers(dp: Dispatcher, bot: Bot, runner_getter):
         await cb.answer()
 
     # ── История сигналов ──────────────────────────────────────────────────────
+    # pd_history — первая страница, pdh:<токен> — следующие (keyset по id)
     @dp.callback_query(F.data == "pd_history")
+    @dp.callback_query(F.data.startswith("pdh:"))
     async def cb_pd_history(cb: CallbackQuery):
-        signals = await db.db_pd_recent_signals(limit=10)
+        cursor = paging.unpack(cb.data[4:]) if cb.data.startswith("pdh:") else None
+        signals, nxt = await db.db_pd_signals_page(cursor, limit=10)
         NL = "\n"
         if not signals:
             text = "📜 <b>История сигналов</b>" + NL + NL + "Сигналов пока нет."
         else:
-            lines = ["📜 <b>Последние 10 сигналов</b>" + NL]
+            head = "Последние 10 сигналов" if cursor is None else "Более ранние сигналы"
+            lines = ["📜 <b>" + head + "</b>" + NL]
             for s in signals:
                 direction_emoji = "📈" if s.get("direction") == "PUMP" else "📉"
                 correct = s.get("correct")
@@ -301,8 +307,17 @@ def register_pd_handlers(dp: Dispatcher, bot: Bot, runner_getter):
                     f"{outcome_emoji}  <i>{ts_str}</i>"
                 )
             text = NL.join(lines)
+        kb = _kb_back_pd()
+        nav = []
+        if cursor is not None:
+            nav.append(InlineKeyboardButton(text="⏮ Новые", callback_data="pd_history"))
+        if nxt:
+            nav.append(InlineKeyboardButton(text="▶️ Раньше",
+                                            callback_data="pdh:" + paging.pack(nxt)))
+        if nav:
+            kb = InlineKeyboardMarkup(inline_keyboard=[nav] + kb.inline_keyboard)
         try:
-            await cb.message.edit_text(text, parse_mode="HTML", reply_markup=_kb_back_pd())
+            await cb.message.edit_text(text, parse_mode="HTML", reply_markup=kb)
         except Exception:
             pass
         await cb.answer()
@@ -14,17 +14,19 @@ from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError
 
 import database as db
+import outbound
+import signal_render
 from pump_dump import (
     anomaly_detector   as anomaly,
     orderbook_analyzer as orderbook,
     hidden_signals,
     indicators,
+    subscribers,
 )
 from pump_dump.market_monitor    import MarketMonitor, MarketEvent
 from pump_dump.ml_model          import get_model, build_feature_vector
 from pump_dump.pd_handlers       import set_current_scores
 from pump_dump.signal_aggregator import format_alert, analyze_levels
-from watermark import wm_inject
 
 log = logging.getLogger("CHM.PD.Runner")
 
@@ -48,6 +50,7 @@ class PDRunner:
     async def run_forever(self):
         self._running = True
         log.info("🚀 PDRunner запускается…")
+        await subscribers.load()
         await asyncio.gather(
             self.monitor.run_forever(),
             self._process_loop(),
@@ -131,7 +134,7 @@ class PDRunner:
         Уровень 2 — наблюдение, получают подписчики с threshold<=60.
         Уровень 3 — финальный сигнал, только пользователи у которых threshold<=score.
 
-        db_pd_subscribers(min_threshold=X) → WHERE pd_threshold <= X
+        Получатели — из индекса в памяти (pump_dump.subscribers), без БД.
         """
         if level == 3:
             threshold = int(score)
@@ -139,23 +142,34 @@ class PDRunner:
             threshold = 60   # пользователи с порогом <= 60% получают уровень 2
         else:
             threshold = 100  # все подписчики получают уровень 1
-        users = await db.db_pd_subscribers(min_threshold=threshold)
+        users = await subscribers.recipients(threshold)
         if not users:
             return
+        tpl = signal_render.SignalTemplate(text)
+        # В очередь без ожидания: сотни алертов не блокируют обработку событий,
+        # темп и 429 — забота outbound
+        dropped = 0
         for uid in users:
-            try:
-                wm_text = wm_inject(text, uid)
-                await self.bot.send_message(
-                    uid, wm_text,
-                    parse_mode="HTML",
-                    protect_content=True,
-                    disable_web_page_preview=True,
-                )
-                await asyncio.sleep(0.05)
-            except TelegramForbiddenError:
-                await db.db_pd_upsert_user(uid, subscribed=False)
-            except Exception as e:
-                log.debug(f"PD broadcast level{level} {uid}: {e}")
+            ok = outbound.post(
+                self.bot, uid, tpl.text_for(uid),
+                prio=outbound.PRIO_ALERT,
+                on_done=self._on_alert_done(uid, level),
+                parse_mode="HTML",
+                protect_content=True,
+                disable_web_page_preview=True,
+            )
+            dropped += not ok
+        if dropped:
+            log.warning(f"PD broadcast level{level}: очередь заполнена, пропущено {dropped}")
+
+    @staticmethod
+    def _on_alert_done(uid: int, level: int):
+        async def _done(exc):
+            if isinstance(exc, TelegramForbiddenError):
+                await subscribers.upsert(uid, subscribed=False)
+            elif exc is not None:
+                log.debug(f"PD broadcast level{level} {uid}: {exc}")
+        return _done
 
     # ── Сохранение сигнала в БД ───────────────────────────────────────────────
 
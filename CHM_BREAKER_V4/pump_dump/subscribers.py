@@ -0,0 +1,90 @@
+"""
+subscribers.py — индекс подписчиков Памп/Дамп в памяти.
+
+Раньше каждый алерт делал SELECT по pd_users и фильтровал в Python —
+пачка алертов превращалась в пачку одинаковых сканов БД. Теперь таблица
+загружается один раз, а запись подписки/порога обновляет и БД, и индекс:
+
+  await recipients(threshold)  — подписчики с pd_threshold <= threshold,
+                                 O(log n + совпадения), без обращения к БД
+  await upsert(uid, subscribed=None, threshold=None)
+                               — вместо db.db_pd_upsert_user
+  await load()                 — (пере)загрузка из БД; вызывается лениво
+
+Индекс живёт в процессе бота, где работают и PDRunner, и хендлеры /pd.
+"""
+
+import asyncio
+import bisect
+import logging
+from typing import Optional
+
+import database as db
+
+log = logging.getLogger("CHM.PD.Subscribers")
+
+_users:  dict[int, tuple[bool, int]] = {}   # uid → (subscribed, threshold)
+_sorted: list[tuple[int, int]]       = []   # (threshold, uid) подписанных
+_loaded  = False
+_lock:   Optional[asyncio.Lock] = None
+_lookups = 0
+
+
+def _index(uid: int, subscribed: bool, threshold: int):
+    old = _users.get(uid)
+    if old is not None and old[0]:
+        i = bisect.bisect_left(_sorted, (old[1], uid))
+        if i < len(_sorted) and _sorted[i] == (old[1], uid):
+            del _sorted[i]
+    _users[uid] = (subscribed, threshold)
+    if subscribed:
+        bisect.insort(_sorted, (threshold, uid))
+
+
+async def load():
+    """Загрузить pd_users целиком и перестроить индекс."""
+    global _users, _sorted, _loaded, _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        rows = await db.db_pd_all_users()
+        _users = {uid: (bool(sub), int(thr)) for uid, sub, thr in rows}
+        _sorted = sorted((thr, uid) for uid, (sub, thr) in _users.items() if sub)
+        _loaded = True
+    log.info(f"📇 PD подписчики: {len(_sorted)} из {len(_users)} в индексе")
+
+
+async def _ensure_loaded():
+    if not _loaded:
+        await load()
+
+
+async def recipients(threshold: int) -> list[int]:
+    """user_id подписанных с pd_threshold <= threshold."""
+    global _lookups
+    await _ensure_loaded()
+    _lookups += 1
+    end = bisect.bisect_right(_sorted, (threshold, float("inf")))
+    return [uid for _, uid in _sorted[:end]]
+
+
+async def upsert(user_id: int, subscribed: bool = None, threshold: int = None):
+    """Записать подписку/порог в БД и сразу отразить в индексе."""
+    from pump_dump.pd_config import DEFAULT_USER_THRESHOLD
+    await _ensure_loaded()
+    await db.db_pd_upsert_user(user_id, subscribed=subscribed, threshold=threshold)
+    old_sub, old_thr = _users.get(user_id, (False, DEFAULT_USER_THRESHOLD))
+    _index(
+        user_id,
+        old_sub if subscribed is None else bool(subscribed),
+        old_thr if threshold is None else int(threshold),
+    )
+
+
+def stats() -> dict:
+    return {
+        "loaded":      _loaded,
+        "users":       len(_users),
+        "subscribed":  len(_sorted),
+        "lookups":     _lookups,
+    }
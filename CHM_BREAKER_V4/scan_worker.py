@@ -0,0 +1,74 @@
+"""
+scan_worker.py — процесс-воркер шардированного сканирования (см. sharding.py).
+
+Запускает MidScanner, сканер Герчика и SMC-сканер только для своей доли
+пользователей/монет. В Telegram не ходит: сообщения уходят в shard_outbox,
+их отправляет bot.py (shard 0).
+
+  SHARD_COUNT=3 SHARD_INDEX=1 python3 scan_worker.py
+"""
+
+import asyncio
+import logging
+
+import cache
+import database
+import sharding
+import tickers
+from config import Config
+from user_manager import UserManager
+from scanner_mid import MidScanner
+from gerchik_runner import GerchikScanner
+from smc.scanner import run_smc_scanner
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(name)-20s | %(levelname)s | %(message)s",
+    datefmt="%H:%M:%S",
+)
+logging.getLogger("aiohttp").setLevel(logging.WARNING)
+
+log = logging.getLogger("CHM.Worker")
+
+
+async def main():
+    if not sharding.enabled() or sharding.is_owner():
+        raise SystemExit(
+            "scan_worker.py: нужен SHARD_COUNT > 1 и SHARD_INDEX >= 1 "
+            "(shard 0 — это bot.py)"
+        )
+    if sharding.SHARD_INDEX >= sharding.SHARD_COUNT:
+        raise SystemExit(
+            f"scan_worker.py: SHARD_INDEX={sharding.SHARD_INDEX} "
+            f"вне диапазона 1..{sharding.SHARD_COUNT - 1}"
+        )
+
+    config = Config()
+    log.info(
+        f"🚀 Scan worker {sharding.SHARD_INDEX}/{sharding.SHARD_COUNT} | "
+        f"SQLite: {config.DB_PATH}"
+    )
+    # Схему создаёт bot.py; init_db идемпотентен и нужен для пути и lock
+    await database.init_db(config.DB_PATH)
+    cache.init_cache(max_symbols=config.CACHE_MAX_SYMBOLS)
+
+    bot     = sharding.OutboxBot()
+    um      = UserManager()
+    scanner = MidScanner(config, bot, um)
+    gerchik = GerchikScanner(bot, um, fetcher=scanner.fetcher)
+
+    try:
+        await asyncio.gather(
+            scanner.run_forever(scan_only=True),
+            gerchik.run_forever(),
+            run_smc_scanner(bot, um, scanner.fetcher),
+            sharding.heartbeat_loop(),
+            tickers.refresh_loop(scanner.fetcher),
+        )
+    finally:
+        await scanner.fetcher.close()
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -12,10 +12,12 @@ scanner_mid.py — мультисканнинг для 50-500 пользоват
 """
 
 import asyncio
+import heapq
+import itertools
 import logging
 import math
 import time
-from collections import defaultdict
+from collections import defaultdict, deque
 from dataclasses import dataclass
 from typing import Optional, Literal
 
@@ -25,13 +27,19 @@ from aiogram.exceptions import TelegramForbiddenError
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
 import cache
+import market_regime
+import outbound
+import signal_render
 import database as db
+import sharding
+import stage_profiler
+import tickers
 from config import Config
+import user_manager
 from user_manager import UserManager, UserSettings, TradeCfg
-from fetcher import OKXFetcher
+from fetcher import OKXFetcher, tf_seconds, bar_open
 from indicator import CHMIndicator, SignalResult
 from keyboards import kb_contact_admin
-from watermark import wm_inject
 try:
     import fundamental as _fund
     _FUND_OK = True
@@ -75,6 +83,30 @@ log = logging.getLogger("CHM.Scanner")
 
 Direction = Literal["LONG", "SHORT", "BOTH"]
 
+# Старший таймфрейм для HTF-фильтра и эталоны для корреляции
+_HTF_TF      = "1D"
+_REF_SYMBOLS = ("BTC-USDT-SWAP", "ETH-USDT-SWAP")
+
+# Сколько последних задержек «закрытие свечи → доставка сигнала» держать
+_CLOSE_LAT_WINDOW = 500
+
+
+# ── Закрытие свечей ──────────────────────────────────
+
+# Сетка свечей OKX (HKT для 1D/1W) — общая с market_regime, см. fetcher.py
+_tf_seconds = tf_seconds
+_bar_close  = bar_open   # закрытие последней закрытой свечи = открытие текущей
+
+
+def _next_close(tf: str, now: float) -> float:
+    return _bar_close(tf, now) + _tf_seconds(tf)
+
+
+def _has_last_bar(df, tf: str, now: float) -> bool:
+    """В df уже есть последняя закрытая свеча (кэш мог лечь в середине бара)."""
+    last_open = df.index[-1].timestamp()
+    return last_open + _tf_seconds(tf) >= _bar_close(tf, now)
+
 
 # ── Задание сканирования ─────────────────────────────
 
@@ -98,6 +130,16 @@ class ScanJob:
         return self.cfg.scan_interval
 
 
+@dataclass
+class _TFPanel:
+    """Свечи одного TF, загруженные циклом, — едут в очереди вместе с заданием."""
+    candles:   dict
+    refs:      dict
+    htf:       dict
+    loaded_at: float
+    bar_close: float   # закрытие свечи, на которой построена панель
+
+
 # ── IndConfig из TradeCfg ─────────────────────────────
 
 @dataclass
@@ -154,36 +196,12 @@ def _cfg_to_ind(cfg: TradeCfg) -> IndConfig:
 
 # ── Telegram ─────────────────────────────────────────
 
-def _tv_url(symbol: str) -> str:
-    """Конвертирует OKX символ в ссылку TradingView.
-    BTC-USDT-SWAP → https://www.tradingview.com/chart/?symbol=OKX:BTCUSDT.P
-    """
-    clean = symbol.replace("-SWAP", "").replace("-", "")
-    return "https://www.tradingview.com/chart/?symbol=OKX:" + clean + ".P"
-
-
 def signal_compact_keyboard(trade_id: str, symbol: str,
                             show_trade_btn: bool = False) -> InlineKeyboardMarkup:
     """Компактная клавиатура под сигналом.
     show_trade_btn=True добавляет кнопку ручного подтверждения входа.
     """
-    rows = [
-        [
-            InlineKeyboardButton(text="📈 График",     url=_tv_url(symbol)),
-            InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats"),
-        ],
-        [
-            InlineKeyboardButton(text="📋 Записать результат ▾", callback_data="sig_records_" + trade_id),
-        ],
-    ]
-    if show_trade_btn:
-        rows.insert(0, [
-            InlineKeyboardButton(
-                text="✅ Открыть сделку на Bybit",
-                callback_data="exec_trade_" + trade_id,
-            )
-        ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    return signal_render.signal_keyboard(symbol, trade_id, show_trade_btn)
 
 
 def trade_records_keyboard(trade_id: str) -> InlineKeyboardMarkup:
@@ -204,6 +222,16 @@ def trade_records_keyboard(trade_id: str) -> InlineKeyboardMarkup:
     ])
 
 
+def _sig_key(sig: SignalResult) -> tuple:
+    """Всё, от чего зависит signal_text: равные ключи — равный текст."""
+    return (
+        sig.symbol, sig.direction, sig.breakout_type, sig.is_counter_trend,
+        sig.quality, sig.level_class, tuple(sig.reasons), sig.human_explanation,
+        sig.entry, sig.sl, sig.risk_pct, sig.tp1, sig.tp2, sig.tp3,
+        sig.trend_local, sig.rsi, sig.volume_ratio, sig.btc_corr, sig.eth_corr,
+    )
+
+
 def signal_text(sig: SignalResult, cfg: TradeCfg) -> str:
     stars  = "⭐" * sig.quality + "☆" * (5 - sig.quality)
     is_long = sig.direction == "LONG"
@@ -282,22 +310,41 @@ class MidScanner:
         self._last_scan: dict[str, float] = {}
 
         self._api_sem = asyncio.Semaphore(config.API_CONCURRENCY)
-        self._queue:   asyncio.Queue = asyncio.Queue()
+
+        # Очереди заданий по TF (куча по due = last_scan + interval) и
+        # постоянные воркеры. Воркер берёт самое просроченное задание среди
+        # TF, у которых есть свободный слот, — задание TF без слота остаётся
+        # в очереди и не занимает воркера.
+        self._tf_queues: dict[str, list] = {}
+        self._tf_busy:   dict[str, int]  = defaultdict(int)
+        self._jobs_ready = asyncio.Event()   # появилось задание или освободился слот
+        self._jobs_done  = asyncio.Event()   # очереди пусты и ничего не выполняется
+        self._jobs_done.set()
+        self._seq      = itertools.count()
+        self._pending: set[str]           = set()
+        self._workers: list[asyncio.Task] = []
 
         self._perf = {
             "cycles": 0, "users": 0,
             "signals": 0, "api_calls": 0,
+            "coalesced": 0, "deferred": 0, "skipped": 0,
+            "queue_lag_last": 0.0, "queue_lag_max": 0.0,
+            "stages_cycle": {},
+            "bar_wakeups": 0,
         }
-
-        # Глобальный тренд
-        self._global_trend:     dict  = {}
-        self._trend_updated_at: float = 0
-
-        self._trend_ttl:        int   = 3600
+        # Закрытие свечи → сигнал доставлен, сек
+        self._close_lat: deque = deque(maxlen=_CLOSE_LAT_WINDOW)
+        # TF активных заданий — к их закрытию просыпается планировщик
+        self._sched_tfs: set[str] = set()
 
         # Фундаментальный контекст (обновляется раз в цикл)
         self._fund_block: str = ""
 
+        # Дневные свечи для HTF-фильтра (symbol → df), общие на все задания
+        self._htf_panel:     dict      = {}
+        self._htf_coins:     frozenset = frozenset()
+        self._htf_loaded_at: float     = 0
+
     # ── Индикатор ────────────────────────────────────
 
     def _indicator(self, job: ScanJob) -> CHMIndicator:
@@ -310,21 +357,14 @@ class MidScanner:
     # ── Глобальный тренд ─────────────────────────────
 
     async def _update_trend_if_needed(self):
-        if time.time() - self._trend_updated_at > self._trend_ttl:
-            try:
-                self._global_trend     = await self.fetcher.get_global_trend()
-                self._trend_updated_at = time.time()
-                btc = self._global_trend.get("BTC", {})
-                eth = self._global_trend.get("ETH", {})
-                log.info(
-                    "🌍 Тренд: BTC=" + btc.get("trend_text", "?") +
-                    " ETH=" + eth.get("trend_text", "?")
-                )
-            except Exception as e:
-                log.warning("Тренд: " + str(e))
+        # Режим общий на процесс и пересчитывается раз на часовой бар
+        try:
+            await market_regime.refresh(self.fetcher)
+        except Exception as e:
+            log.warning("Режим рынка: " + str(e))
 
     def get_trend(self) -> dict:
-        return self._global_trend
+        return market_regime.legacy_trend()
 
     # ── Монеты ───────────────────────────────────────
 
@@ -346,11 +386,11 @@ class MidScanner:
 
     async def _fetch(self, symbol: str, tf: str):
         df = await cache.get_candles(symbol, tf)
-        if df is not None:
+        if df is not None and _has_last_bar(df, tf, time.time()):
             return df
         async with self._api_sem:
             df = await cache.get_candles(symbol, tf)
-            if df is not None:
+            if df is not None and _has_last_bar(df, tf, time.time()):
                 return df
             self._perf["api_calls"] += 1
             df = await self.fetcher.get_candles(symbol, tf, limit=300)
@@ -360,7 +400,7 @@ class MidScanner:
 
     # ── Загрузка свечей для TF ────────────────────────
 
-    async def _load_tf_candles(self, tf: str, coins: list) -> dict:
+    async def _load_tf_candles(self, tf: str, coins: list, min_bars: int = 60) -> dict:
         result   = {}
         chunk_sz = self.cfg.CHUNK_SIZE
         for i in range(0, len(coins), chunk_sz):
@@ -370,27 +410,48 @@ class MidScanner:
                 return_exceptions=True,
             )
             for sym, df in zip(batch, dfs):
-                if isinstance(df, Exception) or df is None or len(df) < 60:
+                if isinstance(df, Exception) or df is None or len(df) < min_bars:
                     continue
                 result[sym] = df
             await asyncio.sleep(self.cfg.CHUNK_SLEEP)
         return result
 
+    async def _load_htf(self, coins: list) -> dict:
+        """
+        Дневная панель для HTF-фильтра. Держится в сканере целиком и
+        перезагружается только по истечении TTL или при смене списка монет —
+        1D-ключи не дёргаются в LRU-кэше на каждой монете каждого задания.
+        """
+        ttl = self.cfg.CACHE_TTL.get(_HTF_TF, 85000)
+        fresh = time.time() - self._htf_loaded_at < ttl
+        if fresh and self._htf_coins == frozenset(coins):
+            return self._htf_panel
+        self._htf_panel     = await self._load_tf_candles(_HTF_TF, coins, min_bars=1)
+        self._htf_coins     = frozenset(coins)
+        self._htf_loaded_at = time.time()
+        return self._htf_panel
+
     # ── Анализ одного задания ─────────────────────────
 
-    async def _run_job(self, job: ScanJob, candles: dict):
+    async def _run_job(self, job: ScanJob, candles: dict, refs: dict, htf: dict,
+                       bar_close: float = 0.0):
+        """
+        Анализ одного задания по заранее загруженным свечам.
+        candles — свечи TF задания, refs — BTC/ETH этого TF для корреляции,
+        htf — дневные свечи (пустой dict если HTF-фильтр никому не нужен).
+        Сетевых запросов внутри цикла по монетам нет.
+        """
         ind     = self._indicator(job)
         user    = job.user
         cfg     = job.cfg
         signals = 0
 
-        # Загружаем BTC и ETH для корреляции один раз на всё задание
         btc_df = candles.get("BTC-USDT-SWAP")
         if btc_df is None:
-            btc_df = await self._fetch("BTC-USDT-SWAP", job.tf)
+            btc_df = refs.get("BTC-USDT-SWAP")
         eth_df = candles.get("ETH-USDT-SWAP")
         if eth_df is None:
-            eth_df = await self._fetch("ETH-USDT-SWAP", job.tf)
+            eth_df = refs.get("ETH-USDT-SWAP")
 
         # Фильтр выбранной монеты
         watch = getattr(user, "watch_coin", "").strip().upper()
@@ -398,7 +459,7 @@ class MidScanner:
         for sym, df in candles.items():
             if watch and sym.upper() != watch:
                 continue
-            df_htf = await self._fetch(sym, "1D") if cfg.use_htf else None
+            df_htf = htf.get(sym) if cfg.use_htf else None
             try:
                 sig = ind.analyze(sym, df, df_htf)
             except Exception as e:
@@ -422,7 +483,7 @@ class MidScanner:
                     sig.eth_corr = _compute_correlation(df, eth_df)
 
             if user.notify_signal:
-                await self._send(user, sig, cfg)
+                await self._send(user, sig, cfg, bar_close)
             signals += 1
 
         self._perf["users"] += 1
@@ -430,7 +491,8 @@ class MidScanner:
 
     # ── Отправка сигнала ──────────────────────────────
 
-    async def _send(self, user: UserSettings, sig: SignalResult, cfg: TradeCfg):
+    async def _send(self, user: UserSettings, sig: SignalResult, cfg: TradeCfg,
+                    bar_close: float = 0.0):
         trade_id = str(user.user_id) + "_" + str(int(time.time() * 1000))
         risk     = abs(sig.entry - sig.sl)
         sign     = 1 if sig.direction == "LONG" else -1
@@ -479,11 +541,12 @@ class MidScanner:
             open_count = await db.db_count_open_trades(user.user_id)
             # max_trades=0 означает «без лимита»
             if max_trades > 0 and open_count >= max_trades:
-                await self.bot.send_message(
-                    user.user_id,
+                await outbound.send(
+                    self.bot, user.user_id,
                     f"⛔ Авто-трейд отклонён: достигнут лимит открытых сделок "
                     f"({open_count}/{max_trades}).\n"
-                    f"Сигнал: {sig.symbol} {sig.direction}"
+                    f"Сигнал: {sig.symbol} {sig.direction}",
+                    prio=outbound.PRIO_TRADE,
                 )
                 show_trade_btn = False
                 auto_trade = False  # пропускаем блок ниже
@@ -519,37 +582,47 @@ class MidScanner:
                         sig.entry, sig.sl, tp1, risk_pct, leverage,
                         tp2=tp2, tp3=tp3,
                     )
-                    await self.bot.send_message(
-                        user.user_id, trade_msg, parse_mode="HTML"
+                    await outbound.send(
+                        self.bot, user.user_id, trade_msg, parse_mode="HTML",
+                        prio=outbound.PRIO_TRADE,
                     )
                 except Exception as e:
                     log.error(f"auto_trade {sig.symbol}: {e}")
                     await db.db_set_trade_result(trade_id, "SKIP", 0.0)
-                    await self.bot.send_message(
-                        user.user_id,
-                        f"⚠️ Авто-трейд: ошибка открытия {sig.symbol}: {e}"
+                    await outbound.send(
+                        self.bot, user.user_id,
+                        f"⚠️ Авто-трейд: ошибка открытия {sig.symbol}: {e}",
+                        prio=outbound.PRIO_TRADE,
                     )
             else:
                 # Режим подтверждения — показать кнопку
                 show_trade_btn = True
 
-        try:
-            _base_text = signal_text(sig, cfg)
+        def _render() -> str:
+            text = signal_text(sig, cfg)
             if self._fund_block:
-                _base_text += (
+                text += (
                     "\n━━━━━━━━━━━━━━━━━━━━\n"
                     "📌 <b>Фундаментал рынка:</b>\n" +
                     self._fund_block + "\n"
                 )
-            await self.bot.send_message(
-                user.user_id,
-                wm_inject(_base_text, user.user_id),
+            return text
+
+        try:
+            # Один сигнал у многих пользователей — тело рендерится один раз
+            tpl = signal_render.render(("mid", _sig_key(sig), self._fund_block), _render)
+            await outbound.send(
+                self.bot, user.user_id,
+                tpl.text_for(user.user_id),
                 parse_mode="HTML",
                 reply_markup=signal_compact_keyboard(
                     trade_id, sig.symbol, show_trade_btn=show_trade_btn
                 ),
                 protect_content=True,
+                prio=outbound.PRIO_SIGNAL,
             )
+            if bar_close:
+                self._close_lat.append(time.time() - bar_close)
             user.signals_received += 1
             await self.um.save(user)
             self._perf["signals"] += 1
@@ -568,21 +641,83 @@ class MidScanner:
 
     # ── Воркер ───────────────────────────────────────
 
-    async def _worker(self, wid: int, candles_by_tf: dict):
+    def _tf_cap(self) -> int:
+        """Лимит одновременных заданий одного TF — медленные 4h не забивают всех воркеров."""
+        return max(1, min(self.cfg.SCAN_TF_CONCURRENCY, self.cfg.SCAN_WORKERS))
+
+    def _queued(self) -> int:
+        return sum(len(q) for q in self._tf_queues.values())
+
+    def _put_job(self, due: float, job: ScanJob, panel: "_TFPanel"):
+        self._pending.add(job.job_key)
+        heapq.heappush(self._tf_queues.setdefault(job.tf, []),
+                       (due, next(self._seq), job, panel))
+        self._jobs_done.clear()
+        self._jobs_ready.set()
+
+    def _take_job(self) -> Optional[tuple]:
+        """Самое просроченное задание среди TF со свободным слотом (слот занимается)."""
+        cap  = self._tf_cap()
+        best = None
+        for tf, q in self._tf_queues.items():
+            if q and self._tf_busy[tf] < cap and (best is None or q[0] < best[0]):
+                best = (q[0], tf)
+        if best is None:
+            return None
+        tf = best[1]
+        self._tf_busy[tf] += 1
+        return heapq.heappop(self._tf_queues[tf])
+
+    def _finish_job(self, job: ScanJob):
+        self._pending.discard(job.job_key)
+        self._tf_busy[job.tf] -= 1
+        if any(self._tf_queues.values()):
+            self._jobs_ready.set()   # слот TF свободен — его задания снова доступны
+        elif not any(self._tf_busy.values()):
+            self._jobs_done.set()
+
+    async def join_jobs(self):
+        """Дождаться, пока очереди опустеют и воркеры закончат (нагрузочные тесты)."""
+        await self._jobs_done.wait()
+
+    async def _worker(self, wid: int):
+        """Постоянный воркер: берёт самое просроченное задание из доступных TF."""
         while True:
+            item = self._take_job()
+            if item is None:
+                self._jobs_ready.clear()
+                await self._jobs_ready.wait()
+                continue
+            due, _, job, panel = item
             try:
-                job: ScanJob = await asyncio.wait_for(
-                    self._queue.get(), timeout=5.0
+                now = time.time()
+                lag = max(0.0, now - due)
+                # Задание простояло в очереди дольше своего интервала —
+                # свечи устарели. Пропускаем; следующий цикл поставит его
+                # заново со свежими данными и тем же (самым ранним) due.
+                if now - panel.loaded_at >= job.interval:
+                    self._perf["skipped"] += 1
+                    continue
+                self._last_scan[job.job_key] = now
+                self._perf["queue_lag_last"] = round(lag, 2)
+                self._perf["queue_lag_max"]  = round(
+                    max(self._perf["queue_lag_max"], lag), 2
+                )
+                await self._run_job(
+                    job, panel.candles, panel.refs, panel.htf, panel.bar_close
                 )
-            except asyncio.TimeoutError:
-                break
-            try:
-                candles = candles_by_tf.get(job.tf, {})
-                await self._run_job(job, candles)
             except Exception as e:
                 log.error("Воркер " + str(wid) + " ошибка: " + str(e))
             finally:
-                self._queue.task_done()
+                self._finish_job(job)
+
+    def _start_workers(self):
+        if self._workers:
+            return
+        self._workers = [
+            asyncio.create_task(self._worker(i))
+            for i in range(self.cfg.SCAN_WORKERS)
+        ]
 
     # ── Уведомление об истечении ──────────────────────
 
@@ -613,9 +748,10 @@ class MidScanner:
                 "✅ После оплаты отправь скриншот + свой Telegram ID администратору:\n\n"
                 "🆔 <b>Твой ID:</b> <code>" + str(user.user_id) + "</code>"
             )
-            await self.bot.send_message(
-                user.user_id, text,
+            await outbound.send(
+                self.bot, user.user_id, text,
                 parse_mode="HTML", reply_markup=kb_contact_admin(),
+                prio=outbound.PRIO_ALERT,
             )
         except Exception:
             pass
@@ -644,40 +780,66 @@ class MidScanner:
     # ── Построить список заданий для пользователя ─────
 
     @staticmethod
-    def _build_jobs(user: UserSettings, now: float, last_scan: dict) -> list[ScanJob]:
+    def _build_jobs(user: UserSettings, now: float, last_scan: dict,
+                    bar_mode: bool = False) -> list[ScanJob]:
         """
         Возвращает список ScanJob для всех активных направлений пользователя.
-        Задание включается если прошёл нужный интервал.
+        Задание включается если прошёл нужный интервал. В bar_mode допуск —
+        полсвечи TF: скан на прошлом закрытии мог начаться с лагом очереди.
         """
         jobs = []
 
+        def _due(key: str, cfg: TradeCfg) -> bool:
+            need = cfg.scan_interval
+            if bar_mode:
+                need -= _tf_seconds(cfg.timeframe) / 2
+            return now - last_scan.get(key, 0) >= need
+
         # ЛОНГ сканер
         if user.long_active:
             cfg = user.get_long_cfg()
             key = str(user.user_id) + "_LONG"
-            if now - last_scan.get(key, 0) >= cfg.scan_interval:
+            if _due(key, cfg):
                 jobs.append(ScanJob(user=user, direction="LONG", cfg=cfg))
 
         # ШОРТ сканер
         if user.short_active:
             cfg = user.get_short_cfg()
             key = str(user.user_id) + "_SHORT"
-            if now - last_scan.get(key, 0) >= cfg.scan_interval:
+            if _due(key, cfg):
                 jobs.append(ScanJob(user=user, direction="SHORT", cfg=cfg))
 
         # Режим ОБА (legacy / совместимость)
         if user.active and user.scan_mode == "both":
             cfg = user.shared_cfg()
             key = str(user.user_id) + "_BOTH"
-            if now - last_scan.get(key, 0) >= cfg.scan_interval:
+            if _due(key, cfg):
                 jobs.append(ScanJob(user=user, direction="BOTH", cfg=cfg))
 
         return jobs
 
+    @staticmethod
+    def _job_tfs(user: UserSettings) -> set[str]:
+        """TF всех включённых направлений, due или нет — прямо из полей, без конфигов."""
+        tfs = set()
+        if user.long_active:
+            tfs.add(user.long_tf)
+        if user.short_active:
+            tfs.add(user.short_tf)
+        if user.active and user.scan_mode == "both":
+            tfs.add(user.timeframe)
+        return tfs
+
     # ── Главный цикл ──────────────────────────────────
 
-    async def _cycle(self):
+    async def _cycle(self, closed_at: Optional[float] = None):
+        """
+        closed_at=None — все задания с истёкшим интервалом (опрос, первый проход);
+        closed_at=t    — только задания TF, чья свеча закрылась в момент t.
+        """
         start = time.time()
+        # Тайминги стадий индикатора за прошедший цикл (пусто, если профайлер выключен)
+        self._perf["stages_cycle"] = stage_profiler.rotate()
         await self._update_trend_if_needed()
 
         # Обновляем фундаментальный контекст один раз на цикл
@@ -687,14 +849,16 @@ class MidScanner:
             except Exception as _fe:
                 log.debug("fundamental: " + str(_fe))
 
-        users = await self.um.get_active_users()
+        users = sharding.mine(await self.um.get_active_users())
         if not users:
             return
 
         now = time.time()
 
         # Строим все задания
+        bar_mode = closed_at is not None
         all_jobs: list[ScanJob] = []
+        sched_tfs: set[str] = set()
         for u in users:
             has, _ = u.check_access()
             if not has:
@@ -702,8 +866,22 @@ class MidScanner:
                 continue
             if u.strategy == "SMC":
                 continue  # SMC-пользователи обрабатываются smc/scanner.py
-            jobs = self._build_jobs(u, now, self._last_scan)
+            sched_tfs.update(self._job_tfs(u))
+            jobs = self._build_jobs(u, now, self._last_scan, bar_mode)
+            if bar_mode:
+                jobs = [j for j in jobs if _bar_close(j.tf, now) == closed_at]
             all_jobs.extend(jobs)
+        self._sched_tfs = sched_tfs
+
+        # Задание уже в очереди или выполняется — не дублируем (coalesce)
+        fresh = [j for j in all_jobs if j.job_key not in self._pending]
+        self._perf["coalesced"] += len(all_jobs) - len(fresh)
+
+        # Backpressure: самые просроченные — первыми, остальные ждут
+        fresh.sort(key=lambda j: self._due(j, now))
+        room     = max(0, self.cfg.SCAN_QUEUE_MAX - len(self._pending))
+        all_jobs = fresh[:room]
+        self._perf["deferred"] += len(fresh) - len(all_jobs)
 
         if not all_jobs:
             return
@@ -722,31 +900,42 @@ class MidScanner:
         min_vol = min(j.cfg.min_volume_usdt for j in all_jobs)
         coins   = await self._load_coins(min_vol)
 
-        # Загружаем свечи один раз для каждого TF
-        candles_by_tf: dict[str, dict] = {}
-        for tf, tf_jobs in tf_groups.items():
+        # Загружаем свечи один раз для каждого TF — все TF и HTF параллельно
+        tfs = list(tf_groups)
+        for tf in tfs:
             log.info(
                 "  📥 TF=" + tf + ": " + str(len(coins)) +
-                " монет для " + str(len(tf_jobs)) + " заданий"
+                " монет для " + str(len(tf_groups[tf])) + " заданий"
+            )
+        need_htf = any(j.cfg.use_htf for j in all_jobs)
+        if need_htf:
+            log.info("  📥 HTF=" + _HTF_TF + ": " + str(len(coins)) + " монет")
+        loads = [self._load_tf_candles(tf, coins) for tf in tfs]
+        if need_htf:
+            loads.append(self._load_htf(coins))
+        loaded = await asyncio.gather(*loads)
+        candles_by_tf: dict[str, dict] = dict(zip(tfs, loaded))
+        htf: dict = loaded[-1] if need_htf else {}
+
+        # BTC/ETH для корреляции — если не прошли фильтр объёма
+        refs_by_tf: dict[str, dict] = {}
+        for tf in tfs:
+            missing = [s for s in _REF_SYMBOLS if s not in candles_by_tf[tf]]
+            refs_by_tf[tf] = (
+                await self._load_tf_candles(tf, missing, min_bars=1)
+                if missing else {}
             )
-            candles_by_tf[tf] = await self._load_tf_candles(tf, coins)
 
-        # Ставим в очередь и обновляем last_scan
+        # Ставим в очередь по due; воркеры постоянные, цикл их не ждёт
+        self._start_workers()
+        loaded_at = time.time()
+        panels = {
+            tf: _TFPanel(candles_by_tf[tf], refs_by_tf[tf], htf, loaded_at,
+                         _bar_close(tf, loaded_at))
+            for tf in tfs
+        }
         for job in all_jobs:
-            self._last_scan[job.job_key] = now
-            await self._queue.put(job)
-
-        # Запускаем воркеров
-        n = min(self.cfg.SCAN_WORKERS, self._queue.qsize())
-        if n == 0:
-            return
-        workers = [
-            asyncio.create_task(self._worker(i, candles_by_tf))
-            for i in range(n)
-        ]
-        await self._queue.join()
-        for w in workers:
-            w.cancel()
+            self._put_job(self._due(job, now), job, panels[job.tf])
 
         elapsed = time.time() - start
         cs      = cache.cache_stats()
@@ -756,16 +945,53 @@ class MidScanner:
             "Сигналов: " + str(self._perf["signals"]) + " | " +
             "API: " + str(self._perf["api_calls"]) + " | " +
             "Кэш: " + str(cs.get("size", 0)) + " ключей, " +
-            str(cs.get("ratio", 0)) + "% хит"
+            str(cs.get("ratio", 0)) + "% хит | " +
+            "Очередь: " + str(self._queued()) + ", лаг " +
+            str(self._perf["queue_lag_last"]) + "с (макс " +
+            str(self._perf["queue_lag_max"]) + "с)"
         )
 
+    def _due(self, job: ScanJob, now: float) -> float:
+        """Когда задание должно было запуститься: последний скан + интервал.
+        Новое задание (ещё ни разу не сканировалось) считается due сейчас."""
+        last = self._last_scan.get(job.job_key)
+        return now if last is None else last + job.interval
+
     async def _scan_loop(self):
+        if self.cfg.SCAN_SCHEDULE == "poll":
+            while True:
+                try:
+                    await self._cycle()
+                except Exception as e:
+                    log.error("Ошибка цикла: " + str(e), exc_info=True)
+                await asyncio.sleep(self.cfg.SCAN_LOOP_SLEEP)
+
+        # Первый проход — всё, что просрочено; дальше — только по закрытию свечей
+        try:
+            await self._cycle()
+        except Exception as e:
+            log.error("Ошибка цикла: " + str(e), exc_info=True)
         while True:
+            now       = time.time()
+            tfs       = self._sched_tfs | {self.cfg.SCAN_IDLE_TF}
+            closed_at = min(_next_close(tf, now) for tf in tfs)
+            await asyncio.sleep(max(0.0, closed_at + self.cfg.SCAN_CLOSE_GRACE - time.time()))
+            self._perf["bar_wakeups"] += 1
             try:
-                await self._cycle()
+                await self._cycle(closed_at)
             except Exception as e:
                 log.error("Ошибка цикла: " + str(e), exc_info=True)
-            await asyncio.sleep(self.cfg.SCAN_LOOP_SLEEP)
+
+    def close_latency(self) -> dict:
+        """Закрытие свечи → доставка сигнала, сек (последние _CLOSE_LAT_WINDOW)."""
+        lat = sorted(self._close_lat)
+        if not lat:
+            return {"n": 0}
+
+        def pick(q: float) -> float:
+            return round(lat[min(len(lat) - 1, int(q * len(lat)))], 2)
+
+        return {"n": len(lat), "p50": pick(0.50), "p95": pick(0.95), "max": round(lat[-1], 2)}
 
     # ── Мониторинг безубытка (BE) ─────────────────────────
 
@@ -925,14 +1151,15 @@ class MidScanner:
                     except Exception:
                         pass
                     try:
-                        await self.bot.send_message(
-                            user.user_id,
+                        await outbound.send(
+                            self.bot, user.user_id,
                             f"{emoji} <b>Сделка закрыта: {result_str}</b>{rr_text}\n\n"
                             f"💎 {sym_label}  |  {direction}\n"
                             f"💰 Вход: <code>{entry}</code>\n"
                             f"📤 Выход: {exit_display}"
                             f"{balance_line}",
                             parse_mode="HTML",
+                            prio=outbound.PRIO_TRADE,
                         )
                     except Exception:
                         pass
@@ -967,23 +1194,33 @@ class MidScanner:
                     await db.db_set_trade_be(trade["trade_id"])
                     sym_label = trade["symbol"].replace("-USDT-SWAP", "").replace("-USDT", "")
                     try:
-                        await self.bot.send_message(
-                            user.user_id,
+                        await outbound.send(
+                            self.bot, user.user_id,
                             f"♻️ <b>Безубыток выставлен</b>\n\n"
                             f"💎 {sym_label}  |  TP1 достигнут\n"
                             f"🛑 Стоп перенесён на вход: <code>{entry}</code>",
                             parse_mode="HTML",
+                            prio=outbound.PRIO_TRADE,
                         )
                     except Exception:
                         pass
                 else:
                     log.warning(f"BE set failed {bb_sym}: {result.get('error')}")
 
-    async def run_forever(self):
+    async def run_forever(self, scan_only: bool = False):
+        """
+        scan_only=True — только сканирование (scan_worker.py): проверка подписок
+        и BE-монитор работают в одном процессе — владельце Telegram.
+        """
         log.info(
             "🚀 MidScanner v4 | Воркеров: " + str(self.cfg.SCAN_WORKERS) +
-            " | API: " + str(self.cfg.API_CONCURRENCY)
+            " | API: " + str(self.cfg.API_CONCURRENCY) +
+            (" | Шард: " + str(sharding.SHARD_INDEX) + "/" + str(sharding.SHARD_COUNT)
+             if sharding.enabled() else "")
         )
+        if scan_only:
+            await self._scan_loop()
+            return
         await asyncio.gather(
             self._scan_loop(),
             self._sub_check_loop(),
@@ -992,7 +1229,22 @@ class MidScanner:
 
     def get_perf(self) -> dict:
         cs = cache.cache_stats()
-        return {**self._perf, "cache": cs}
+        return {
+            **self._perf, "cache": cs,
+            "queued": {tf: len(q) for tf, q in self._tf_queues.items() if q},
+            "profiling": stage_profiler.enabled(),
+            "stages_by_tf": stage_profiler.stats_by_tf(),
+            "okx": self.fetcher.latency_stats(),
+            "tickers": tickers.stats(),
+            "regime": market_regime.stats(),
+            "schedule": self.cfg.SCAN_SCHEDULE,
+            "close_to_send": self.close_latency(),
+            "outbound": outbound.stats(),
+            "render": signal_render.stats(),
+            "db_pool": db.pool_stats(),
+            "group_commit": db.group_commit_stats(),
+            "user_cache": user_manager.cache_stats(),
+        }
 
     # ── Анализ монеты по запросу пользователя ────────────
 
@@ -0,0 +1,277 @@
+"""
+shadow.py — теневой (dry-run) режим сканеров.
+
+Сканеры проходят полный конвейер на живых (OKX) или воспроизведённых данных
+(OKX_BASE_URL → loadtest/fake_okx.py --record-dir …), но наружу ничего не
+уходит. Побочные эффекты подменяются записью в память:
+
+  bot.send_message            → ShadowBot (сообщения не отправляются)
+  db.db_add_trade и др. записи сделок, UserManager.save → запись в рекордер
+  bybit_trader.place_trade    → {"ok": False, "error": "shadow"}
+  MidScanner._send, GerchikScanner._send_signal — оборачиваются таймером
+
+Тайминги стадий и «несостоявшиеся» сигналы периодически пишутся в отчёт
+SHADOW_REPORT (JSON). Так можно сравнить новую версию индикатора или
+конфиг на боевых данных параллельно с работающим ботом — пользователи
+ничего не получают, сделки не открываются, БД только читается.
+
+ЗАПУСК:
+  SHADOW_MODE=1 python3 bot.py      (bot.py передаёт управление сюда)
+  python3 shadow.py                 (то же самое)
+"""
+
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+
+log = logging.getLogger("CHM.Shadow")
+
+SHADOW_MODE       = os.getenv("SHADOW_MODE", "0").lower() in ("1", "true", "yes", "on")
+SHADOW_REPORT     = os.getenv("SHADOW_REPORT", "shadow_report.json")
+SHADOW_REPORT_SEC = int(os.getenv("SHADOW_REPORT_SEC", "300"))
+SHADOW_KEEP       = 1000   # сколько последних сигналов/сообщений держать в отчёте
+
+# Записи в БД, которые делает путь отправки сигнала
+_DB_WRITES = (
+    "db_add_trade", "db_set_trade_result", "db_set_trade_be",
+    "db_update_trade_bybit", "db_update_trade_pos_idx",
+)
+
+
+class _Stage:
+    __slots__ = ("n", "total", "max")
+
+    def __init__(self):
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, dt: float):
+        self.n += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+
+    def as_dict(self) -> dict:
+        return {
+            "n":        self.n,
+            "total_s":  round(self.total, 3),
+            "avg_ms":   round(self.total / self.n * 1000, 2) if self.n else 0.0,
+            "max_ms":   round(self.max * 1000, 2),
+        }
+
+
+class ShadowRecorder:
+    """Всё, что сканеры сделали бы снаружи, плюс тайминги стадий."""
+
+    def __init__(self):
+        self.started  = time.time()
+        self.signals  = deque(maxlen=SHADOW_KEEP)
+        self.messages = deque(maxlen=SHADOW_KEEP)
+        self.orders   = deque(maxlen=SHADOW_KEEP)
+        self.counts: Counter = Counter()
+        self.by_source: Counter = Counter()
+        self.stages: dict[str, _Stage] = defaultdict(_Stage)
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name].add(time.perf_counter() - t0)
+
+    def timed(self, owner, attr: str, name: str):
+        """Оборачивает метод/функцию owner.attr таймером стадии name."""
+        fn = getattr(owner, attr)
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*a, **kw):
+                with self.stage(name):
+                    return await fn(*a, **kw)
+        else:
+            @functools.wraps(fn)
+            def wrapper(*a, **kw):
+                with self.stage(name):
+                    return fn(*a, **kw)
+        setattr(owner, attr, wrapper)
+
+    def report(self) -> dict:
+        return {
+            "started_at": self.started,
+            "uptime_s":   round(time.time() - self.started, 1),
+            "counts":     dict(self.counts),
+            "signals_by_source": dict(self.by_source),
+            "stages":     {k: v.as_dict() for k, v in sorted(self.stages.items())},
+            "signals":    list(self.signals),
+            "messages":   list(self.messages),
+            "orders":     list(self.orders),
+        }
+
+
+recorder = ShadowRecorder()
+
+
+class ShadowBot:
+    """Заменитель aiogram.Bot: любые вызовы записываются, ничего не отправляется."""
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        recorder.counts["messages"] += 1
+        recorder.messages.append({
+            "ts": time.time(), "chat_id": chat_id, "len": len(text),
+            "text": text[:200],
+        })
+
+    def __getattr__(self, name: str):
+        async def _call(*args, **kwargs):
+            recorder.counts["bot." + name] += 1
+        return _call
+
+
+def _source_of(data: dict) -> str:
+    kind = data.get("breakout_type")
+    if kind == "SMC":
+        return "smc"
+    if kind == "ГЕРЧИК":
+        return "gerchik"
+    return "mid"
+
+
+async def _record_trade(data: dict):
+    recorder.counts["signals"] += 1
+    source = _source_of(data)
+    recorder.by_source[source] += 1
+    recorder.signals.append({
+        "ts":        time.time(),
+        "source":    source,
+        "user_id":   data.get("user_id"),
+        "symbol":    data.get("symbol"),
+        "direction": data.get("direction"),
+        "quality":   data.get("quality"),
+        "entry":     data.get("entry"),
+        "sl":        data.get("sl"),
+        "timeframe": data.get("timeframe"),
+    })
+
+
+def _db_noop(name: str):
+    async def _noop(*args, **kwargs):
+        recorder.counts["db." + name] += 1
+    return _noop
+
+
+async def _place_trade(api_key, api_secret, symbol, direction, entry, sl, tp1,
+                       risk_pct, leverage=10, tp2=0.0, tp3=0.0) -> dict:
+    recorder.counts["orders"] += 1
+    recorder.orders.append({
+        "ts": time.time(), "symbol": symbol, "direction": direction,
+        "entry": entry, "sl": sl, "tp1": tp1, "tp2": tp2, "tp3": tp3,
+        "risk_pct": risk_pct, "leverage": leverage,
+    })
+    return {"ok": False, "error": "shadow mode"}
+
+
+def install():
+    """Подменяет побочные эффекты и вешает таймеры. Вызывать до запуска сканеров."""
+    import bybit_trader
+    import database
+    import smc.scanner as smc_scanner
+    from gerchik_runner import GerchikScanner
+    from scanner_mid import MidScanner
+    from smc.analyzer import SMCAnalyzer
+    from user_manager import UserManager
+
+    for name in _DB_WRITES:
+        setattr(database, name, _record_trade if name == "db_add_trade" else _db_noop(name))
+    bybit_trader.place_trade = _place_trade
+    UserManager.save = _db_noop("users.save")
+
+    r = recorder
+    r.timed(MidScanner,      "_cycle",           "mid.cycle")
+    r.timed(MidScanner,      "_load_tf_candles", "mid.load_tf")
+    r.timed(MidScanner,      "_load_htf",        "mid.load_htf")
+    r.timed(MidScanner,      "_run_job",         "mid.job")
+    r.timed(MidScanner,      "_send",            "mid.send")
+    r.timed(GerchikScanner,  "_cycle",           "gerchik.cycle")
+    r.timed(GerchikScanner,  "_fetch",           "gerchik.fetch")
+    r.timed(GerchikScanner,  "_check_signal",    "gerchik.check")
+    r.timed(GerchikScanner,  "_send_signal",     "gerchik.send")
+    r.timed(smc_scanner,     "_scan_cycle",      "smc.cycle")
+    r.timed(smc_scanner,     "build_smc_signal", "smc.build")
+    r.timed(SMCAnalyzer,     "analyze",          "smc.analyze")
+    log.info("👻 SHADOW_MODE: отправка, сделки и записи в БД отключены")
+
+
+def write_report(path: str = SHADOW_REPORT, extra: dict = None):
+    data = recorder.report()
+    if extra:
+        data.update(extra)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+async def report_loop(scanner=None):
+    while True:
+        await asyncio.sleep(SHADOW_REPORT_SEC)
+        try:
+            write_report(extra={"mid_perf": scanner.get_perf()} if scanner else None)
+            log.info(
+                f"👻 Отчёт {SHADOW_REPORT}: сигналов {recorder.counts['signals']}, "
+                f"сообщений {recorder.counts['messages']}"
+            )
+        except Exception as e:
+            log.warning(f"shadow report: {e}")
+
+
+async def main():
+    """Сканеры в теневом режиме: без Telegram, без сделок, БД только на чтение."""
+    import cache
+    import database
+    import tickers
+    from config import Config
+    from gerchik_runner import GerchikScanner
+    from scanner_mid import MidScanner
+    from smc.scanner import run_smc_scanner
+    from user_manager import UserManager
+
+    install()
+    config = Config()
+    log.info(f"👻 Shadow run | SQLite: {config.DB_PATH} | отчёт: {SHADOW_REPORT}")
+    await database.init_db(config.DB_PATH)
+    cache.init_cache(max_symbols=config.CACHE_MAX_SYMBOLS)
+
+    bot     = ShadowBot()
+    um      = UserManager()
+    scanner = MidScanner(config, bot, um)
+    gerchik = GerchikScanner(bot, um, fetcher=scanner.fetcher)
+
+    try:
+        await asyncio.gather(
+            scanner.run_forever(scan_only=True),
+            gerchik.run_forever(),
+            run_smc_scanner(bot, um, scanner.fetcher),
+            report_loop(scanner),
+            tickers.refresh_loop(scanner.fetcher),
+        )
+    finally:
+        write_report(extra={"mid_perf": scanner.get_perf()})
+        await scanner.fetcher.close()
+        await database.close_db()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(name)-20s | %(levelname)s | %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    logging.getLogger("aiohttp").setLevel(logging.WARNING)
+    asyncio.run(main())
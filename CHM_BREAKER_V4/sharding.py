@@ -0,0 +1,236 @@
+"""
+sharding.py — горизонтальное шардирование сканеров по процессам.
+
+Один bot.py упирается в одно ядро: MidScanner, Герчик и SMC-сканер считают
+индикаторы в том же event loop, что и polling Telegram. В шардированном
+режиме работа делится между N процессами консистентным хэшированием:
+
+  MidScanner       — по пользователям (индикатор свой у каждого задания)
+  Герчик, SMC      — по монетам (анализ монеты общий для всех пользователей)
+
+  shard 0   — bot.py: Telegram (polling), PD, Polymarket, BE-монитор,
+              доставка сообщений воркеров + сканеры для своей доли
+  shard 1…N — scan_worker.py: только сканеры для своей доли
+
+Воркеры не ходят в Telegram. Вместо aiogram.Bot они получают OutboxBot,
+который складывает сообщения в таблицу shard_outbox общей SQLite-базы.
+Процесс-владелец Telegram забирает их outbox_loop() и отправляет.
+Токен бота один, getUpdates вызывает только shard 0.
+
+ЗАПУСК (все процессы на одном хосте, одна БД):
+  SHARD_COUNT=3                python3 bot.py
+  SHARD_COUNT=3 SHARD_INDEX=1  python3 scan_worker.py
+  SHARD_COUNT=3 SHARD_INDEX=2  python3 scan_worker.py
+
+При SHARD_COUNT=1 (по умолчанию) модуль ничего не меняет.
+"""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+import database as db
+import outbound
+
+log = logging.getLogger("CHM.Shard")
+
+SHARD_COUNT = max(1, int(os.getenv("SHARD_COUNT", "1")))
+SHARD_INDEX = int(os.getenv("SHARD_INDEX", "0"))
+
+OUTBOX_POLL_SEC  = 1.0    # как часто владелец Telegram проверяет outbox
+OUTBOX_BATCH     = 50     # сообщений за один проход
+OUTBOX_INFLIGHT  = 500    # строк outbox, отданных outbound и ещё не доставленных
+HEARTBEAT_SEC    = 30     # воркер пишет shard_hb:<index> в kv
+_VNODES          = 64     # виртуальных узлов на шард
+
+
+def _h(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Консистентное хэширование с виртуальными узлами.
+    При изменении числа шардов переезжает ~1/N пользователей,
+    а не все (как при user_id % N).
+    """
+
+    def __init__(self, shards: int, vnodes: int = _VNODES):
+        points = sorted(
+            (_h(f"shard-{s}-{v}"), s)
+            for s in range(shards) for v in range(vnodes)
+        )
+        self._keys   = [p for p, _ in points]
+        self._shards = [s for _, s in points]
+
+    def shard_for(self, key) -> int:
+        i = bisect.bisect(self._keys, _h(str(key)))
+        return self._shards[i % len(self._shards)]
+
+
+_ring = HashRing(SHARD_COUNT)
+
+
+def enabled() -> bool:
+    return SHARD_COUNT > 1
+
+
+def is_owner() -> bool:
+    """Процесс, который держит Telegram и фоновые задачи без шардирования."""
+    return SHARD_INDEX == 0
+
+
+def owns(key) -> bool:
+    """Принадлежит ли ключ (user_id или символ) текущему шарду."""
+    if SHARD_COUNT == 1:
+        return True
+    return _ring.shard_for(key) == SHARD_INDEX
+
+
+def mine(users: list) -> list:
+    """Отфильтровать пользователей, которых обслуживает текущий шард."""
+    if SHARD_COUNT == 1:
+        return users
+    return [u for u in users if owns(u.user_id)]
+
+
+def mine_symbols(coins: list) -> list:
+    """Отфильтровать монеты, которые сканирует текущий шард."""
+    if SHARD_COUNT == 1:
+        return coins
+    return [c for c in coins if owns(c)]
+
+
+# ── Outbox: сообщения воркеров → процесс с Telegram ──────────────────────────
+
+class OutboxBot:
+    """
+    Заменитель aiogram.Bot для scan_worker.py.
+    Поддерживает только send_message — сканерам больше ничего не нужно.
+    """
+
+    def __init__(self, shard: int = SHARD_INDEX):
+        self.shard = shard
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        markup = kwargs.pop("reply_markup", None)
+        payload = {
+            "text":   text,
+            "kwargs": {k: v for k, v in kwargs.items() if v is not None},
+        }
+        if markup is not None:
+            payload["reply_markup"] = markup.model_dump_json(exclude_none=True)
+        await db.db_outbox_put(self.shard, chat_id, json.dumps(payload))
+
+
+_outbox_pending: set = set()   # id строк, отданных outbound; удаляются в on_done
+
+
+def _outbox_message(row: dict) -> tuple[str, dict]:
+    from aiogram.types import InlineKeyboardMarkup
+
+    payload = json.loads(row["payload"])
+    kwargs  = payload.get("kwargs", {})
+    if payload.get("reply_markup"):
+        kwargs["reply_markup"] = InlineKeyboardMarkup.model_validate_json(
+            payload["reply_markup"]
+        )
+    return payload["text"], kwargs
+
+
+async def _outbox_done(um, row: dict, exc: Optional[BaseException]):
+    """on_done outbound: разобрать ошибку Telegram и удалить строку."""
+    from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+    try:
+        if isinstance(exc, TelegramForbiddenError):
+            # Как в сканерах: пользователь заблокировал бота — гасим сканеры
+            user = await um.get(row["chat_id"])
+            if user:
+                user.long_active = user.short_active = user.active = False
+                user.smc_long_active = user.smc_short_active = False
+                await um.save(user)
+        elif isinstance(exc, TelegramBadRequest):
+            # Битый текст/разметка или чат не найден — повтор не поможет
+            log.warning(f"outbox #{row['id']} → {row['chat_id']}: {exc}")
+        elif exc is not None:
+            log.warning(f"outbox #{row['id']} → {row['chat_id']}: {exc}")
+    finally:
+        _outbox_pending.discard(row["id"])
+        await db.db_outbox_delete([row["id"]])
+
+
+async def _post(bot, um, row: dict) -> bool:
+    """Отдать строку outbound без ожидания доставки. False — очередь полна."""
+    try:
+        text, kwargs = _outbox_message(row)
+    except (ValueError, KeyError, TypeError) as e:   # JSON / разметка не разбираются
+        log.warning(f"outbox #{row['id']}: битый payload ({e})")
+        await db.db_outbox_delete([row["id"]])
+        return True
+
+    async def done(exc: Optional[BaseException]):
+        await _outbox_done(um, row, exc)
+
+    _outbox_pending.add(row["id"])
+    # 429, темп и порядок внутри чата — забота outbound
+    if outbound.post(bot, row["chat_id"], text, prio=outbound.PRIO_SIGNAL,
+                     on_done=done, **kwargs):
+        return True
+    _outbox_pending.discard(row["id"])
+    return False
+
+
+async def outbox_loop(bot, um):
+    """
+    Фоновая задача shard 0: доставка сообщений, сложенных воркерами.
+
+    Строки отдаются outbound.post и удаляются в его on_done — медленный
+    чат (бакет ~1 msg/s) не задерживает сообщения остальных чатов.
+    last_id — последняя отданная строка: отданные, но не удалённые строки
+    повторно не выбираются. После рестарта (last_id = 0) недоставленное
+    уйдёт ещё раз — как и раньше, доставка «не меньше одного раза».
+    """
+    log.info(f"📮 Shard outbox запущен ({SHARD_COUNT} шардов)")
+    last_id = 0
+    while True:
+        try:
+            room = min(OUTBOX_BATCH, OUTBOX_INFLIGHT - len(_outbox_pending))
+            rows = await db.db_outbox_fetch(room, after=last_id) if room > 0 else []
+            posted = 0
+            for row in rows:
+                if not await _post(bot, um, row):
+                    break   # очередь outbound заполнена — подождём
+                last_id = row["id"]
+                posted += 1
+            if posted == OUTBOX_BATCH:
+                continue
+        except Exception as e:
+            log.error(f"outbox_loop: {e}")
+        await asyncio.sleep(OUTBOX_POLL_SEC)
+
+
+# ── Heartbeat воркеров ───────────────────────────────────────────────────────
+
+async def heartbeat_loop():
+    while True:
+        try:
+            await db.db_kv_set(f"shard_hb:{SHARD_INDEX}", str(time.time()))
+        except Exception as e:
+            log.debug(f"heartbeat: {e}")
+        await asyncio.sleep(HEARTBEAT_SEC)
+
+
+async def shard_status() -> dict[int, Optional[float]]:
+    """Возраст последнего heartbeat каждого воркера (сек) — для логов/админки."""
+    now = time.time()
+    status: dict[int, Optional[float]] = {}
+    for s in range(1, SHARD_COUNT):
+        raw = await db.db_kv_get(f"shard_hb:{s}")
+        status[s] = round(now - float(raw), 1) if raw else None
+    return status
@@ -0,0 +1,111 @@
+"""
+signal_render.py — сигнал рендерится один раз, получателю — только доводка.
+
+Текст одного сигнала (цены, факторы, объяснение, фундаментал) одинаков для
+всех получателей; отличаются только невидимый водяной знак и trade_id в
+кнопках. Поэтому:
+
+  render(key, fn)      — тело по ключу сигнала; fn() вызывается один раз,
+                         дальше — из LRU (RENDER_CACHE_MAX ключей)
+  SignalTemplate       — готовое тело; text_for(user_id) вставляет водяной
+                         знак (тот же результат, что wm_inject)
+  signal_keyboard(...) — кнопки: общий ряд «График / Статистика» кэшируется
+                         по символу, на получателя строятся только кнопки
+                         с trade_id
+
+Замер: python -m loadtest.bench_render --recipients 1000
+"""
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Hashable
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from watermark import wm_encode
+
+RENDER_CACHE_MAX = 2048
+
+_cache: OrderedDict = OrderedDict()
+_hits   = 0
+_misses = 0
+
+
+class SignalTemplate:
+    """Тело сигнала, отрисованное один раз."""
+    __slots__ = ("body", "_head", "_tail")
+
+    def __init__(self, body: str):
+        self.body = body
+        # Водяной знак — после первого символа (см. watermark.wm_inject)
+        if len(body) < 2:
+            self._head, self._tail = body, ""
+        else:
+            self._head, self._tail = body[:1], body[1:]
+
+    def text_for(self, user_id: int) -> str:
+        return self._head + wm_encode(user_id) + self._tail
+
+
+def render(key: Hashable, fn: Callable[[], str]) -> SignalTemplate:
+    global _hits, _misses
+    tpl = _cache.get(key)
+    if tpl is not None:
+        _cache.move_to_end(key)
+        _hits += 1
+        return tpl
+    _misses += 1
+    tpl = _cache[key] = SignalTemplate(fn())
+    if len(_cache) > RENDER_CACHE_MAX:
+        _cache.popitem(last=False)
+    return tpl
+
+
+def tv_url(symbol: str) -> str:
+    """BTC-USDT-SWAP → https://www.tradingview.com/chart/?symbol=OKX:BTCUSDT.P"""
+    clean = symbol.replace("-SWAP", "").replace("-", "")
+    return "https://www.tradingview.com/chart/?symbol=OKX:" + clean + ".P"
+
+
+@lru_cache(maxsize=1024)
+def static_row(symbol: str) -> tuple:
+    """Общий для всех получателей ряд кнопок (без trade_id)."""
+    return (
+        InlineKeyboardButton(text="📈 График",     url=tv_url(symbol)),
+        InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats"),
+    )
+
+
+def signal_keyboard(symbol: str, trade_id: str = "", show_trade_btn: bool = False,
+                    records: bool = True) -> InlineKeyboardMarkup:
+    """
+    Клавиатура под сигналом.
+    records=True — кнопка «Записать результат» (LEVELS, Герчик);
+    show_trade_btn=True — кнопка ручного подтверждения входа на Bybit.
+    """
+    rows = [list(static_row(symbol))]
+    if records and trade_id:
+        rows.append([
+            InlineKeyboardButton(
+                text="📋 Записать результат ▾",
+                callback_data="sig_records_" + trade_id,
+            ),
+        ])
+    if show_trade_btn and trade_id:
+        rows.insert(0, [
+            InlineKeyboardButton(
+                text="✅ Открыть сделку на Bybit",
+                callback_data="exec_trade_" + trade_id,
+            ),
+        ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def stats() -> dict:
+    total = _hits + _misses
+    return {
+        "size":   len(_cache),
+        "hits":   _hits,
+        "misses": _misses,
+        "ratio":  round(_hits / total * 100, 1) if total else 0.0,
+    }
@@ -14,7 +14,7 @@ from typing import Optional
 
 from aiogram import Bot
 from aiogram.exceptions import TelegramForbiddenError
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.types import InlineKeyboardMarkup
 
 from .analyzer      import SMCAnalyzer, SMCConfig
 from .signal_builder import build_smc_signal, SMCSignalResult
@@ -22,7 +22,9 @@ from .signal_builder import build_smc_signal, SMCSignalResult
 # database лежит в родительском каталоге (CHM_BREAKER_V4/)
 sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 import database as db
-from watermark import wm_inject
+import outbound
+import sharding
+import signal_render
 try:
     import fundamental as _fund
     _FUND_OK = True
@@ -98,20 +100,7 @@ def _signal_text_smc(sig: SMCSignalResult, fund_block: str = "") -> str:
 
 
 def _smc_keyboard(symbol: str, trade_id: str = "", show_trade_btn: bool = False) -> InlineKeyboardMarkup:
-    clean = symbol.replace("-SWAP", "").replace("-", "")
-    tv_url = "https://www.tradingview.com/chart/?symbol=OKX:" + clean + ".P"
-    rows = [[
-        InlineKeyboardButton(text="📈 График",     url=tv_url),
-        InlineKeyboardButton(text="📊 Статистика", callback_data="my_stats"),
-    ]]
-    if show_trade_btn and trade_id:
-        rows.insert(0, [
-            InlineKeyboardButton(
-                text="✅ Открыть сделку на Bybit",
-                callback_data="exec_trade_" + trade_id,
-            )
-        ])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+    return signal_render.signal_keyboard(symbol, trade_id, show_trade_btn, records=False)
 
 
 async def run_smc_scanner(
@@ -140,15 +129,8 @@ async def run_smc_scanner(
 
 
 async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
-    users = await um.get_active_users()
-    # SMC users: strategy==SMC AND at least one direction is active
-    smc_users = [
-        u for u in users
-        if u.strategy == "SMC" and (
-            getattr(u, "smc_long_active",  False) or
-            getattr(u, "smc_short_active", False)
-        )
-    ]
+    # SMC users: strategy==SMC AND at least one direction is active (индекс кэша)
+    smc_users = await um.get_smc_users()
     if not smc_users:
         return
 
@@ -175,7 +157,8 @@ async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
         log.warning(f"SMC: не удалось загрузить монеты: {e}")
         return
 
-    coins = coins[:50]
+    # В шардированном режиме каждый процесс анализирует свою долю из топ-50
+    coins = sharding.mine_symbols(coins[:50])
 
     # Группируем пользователей по их предпочтительному tf_key
     tf_groups: dict[str, list] = defaultdict(list)
@@ -210,6 +193,11 @@ async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
                 log.warning(f"SMC {symbol}: ошибка анализа: {e}")
                 continue
 
+            # Пользователи с одинаковыми SMC-настройками получают один и тот же
+            # сигнал — строим его и текст один раз на символ
+            built: dict[tuple, Optional[SMCSignalResult]] = {}
+            texts: dict[tuple, signal_render.SignalTemplate] = {}
+
             # Отправляем каждому пользователю группы согласно его персональным фильтрам
             for user in group_users:
                 # Фильтр выбранной монеты
@@ -233,12 +221,21 @@ async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
                 cfg_obj.OB_MAX_AGE_CANDLES   = ucfg.ob_max_age
                 cfg_obj.SWEEP_CLOSE_REQUIRED = ucfg.sweep_close_req
 
-                try:
-                    sig = build_smc_signal(symbol, analysis, cfg_obj,
-                                           tf_htf=tf_htf, tf_mtf=tf_mtf, tf_ltf=tf_ltf)
-                except Exception as e:
-                    log.warning(f"SMC {symbol} build {user.user_id}: {e}")
-                    continue
+                cfg_key = (
+                    cfg_obj.MIN_CONFIRMATIONS, cfg_obj.MIN_RR, cfg_obj.SL_BUFFER_PCT,
+                    cfg_obj.FVG_ENABLED, cfg_obj.CHOCH_ENABLED, cfg_obj.OB_USE_BREAKER,
+                    cfg_obj.OB_MAX_AGE_CANDLES, cfg_obj.SWEEP_CLOSE_REQUIRED,
+                )
+                if cfg_key in built:
+                    sig = built[cfg_key]
+                else:
+                    try:
+                        sig = build_smc_signal(symbol, analysis, cfg_obj,
+                                               tf_htf=tf_htf, tf_mtf=tf_mtf, tf_ltf=tf_ltf)
+                    except Exception as e:
+                        log.warning(f"SMC {symbol} build {user.user_id}: {e}")
+                        continue
+                    built[cfg_key] = sig
 
                 if sig is None:
                     continue
@@ -301,12 +298,13 @@ async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
                     open_count = await db.db_count_open_trades(user.user_id)
                     # max_trades=0 означает без лимита
                     if max_trades > 0 and open_count >= max_trades:
-                        await bot.send_message(
-                            user.user_id,
+                        await outbound.send(
+                            bot, user.user_id,
                             f"⛔ Авто-трейд отклонён: достигнут лимит открытых сделок "
                             f"({open_count}/{max_trades}).\n"
                             f"Сигнал: {sig.symbol} {sig.direction}",
                             protect_content=True,
+                            prio=outbound.PRIO_TRADE,
                         )
                         auto_trade = False
 
@@ -336,26 +334,35 @@ async def _scan_cycle(bot, um, fetcher, analyzer) -> None:
                                 sig.entry, sig.sl, sig.tp1, risk_pct, leverage,
                                 tp2=sig.tp2, tp3=sig.tp3,
                             )
-                            await bot.send_message(user.user_id, trade_msg,
-                                                   parse_mode="HTML", protect_content=True)
+                            await outbound.send(
+                                bot, user.user_id, trade_msg,
+                                parse_mode="HTML", protect_content=True,
+                                prio=outbound.PRIO_TRADE,
+                            )
                         except Exception as e:
                             log.error(f"SMC auto_trade {sig.symbol}: {e}")
                             await db.db_set_trade_result(trade_id, "SKIP", 0.0)
-                            await bot.send_message(
-                                user.user_id,
+                            await outbound.send(
+                                bot, user.user_id,
                                 f"⚠️ Авто-трейд: ошибка открытия {sig.symbol}: {e}",
                                 protect_content=True,
+                                prio=outbound.PRIO_TRADE,
                             )
                     else:
                         show_trade_btn = True
 
-                text = wm_inject(_signal_text_smc(sig, _fund_block), user.user_id)
+                tpl = texts.get(cfg_key)
+                if tpl is None:
+                    tpl = texts[cfg_key] = signal_render.SignalTemplate(
+                        _signal_text_smc(sig, _fund_block))
+                text = tpl.text_for(user.user_id)
                 try:
-                    await bot.send_message(
-                        user.user_id, text,
+                    await outbound.send(
+                        bot, user.user_id, text,
                         parse_mode="HTML",
                         reply_markup=_smc_keyboard(sig.symbol, trade_id, show_trade_btn),
                         protect_content=True,
+                        prio=outbound.PRIO_SIGNAL,
                     )
                     log.info(f"SMC ✅ {symbol} {sig.direction} {sig.grade} → @{user.username or user.user_id}")
                 except TelegramForbiddenError:
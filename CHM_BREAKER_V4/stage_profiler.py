@@ -0,0 +1,148 @@
+"""
+stage_profiler.py — тайминги стадий CHMIndicator._do_analyze.
+
+Методы индикатора помечены декоратором @stage("имя"). Пока профайлер
+выключен, обёртка — одна проверка флага. Включённый — два perf_counter()
+и инкремент счётчиков: на фоне миллисекунд pandas/numpy внутри стадий
+это доли процента.
+
+Время стадий инклюзивное: _kde_levels и _volume_profile вызываются изнутри
+_get_zones и входят в его время. Стадия "total" — весь _do_analyze.
+
+Агрегация:
+  по TF     — накопительно с момента включения/сброса (stats_by_tf)
+  по циклу  — MidScanner._cycle() забирает rotate() в _perf["stages_cycle"]
+
+Переключается без рестарта: enable()/disable() или /profile on|off у админа.
+При старте — переменная окружения STAGE_PROFILE=1.
+"""
+
+import bisect
+import functools
+import os
+from time import perf_counter
+
+# Верхние границы корзин гистограммы, мс (последняя корзина — всё, что больше)
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_enabled = os.getenv("STAGE_PROFILE", "0").lower() in ("1", "true", "yes", "on")
+
+
+class StageStats:
+    __slots__ = ("n", "total", "max", "hist")
+
+    def __init__(self):
+        self.n     = 0
+        self.total = 0.0
+        self.max   = 0.0
+        self.hist  = [0] * (len(BUCKETS_MS) + 1)
+
+    def add(self, dt: float):
+        self.n     += 1
+        self.total += dt
+        if dt > self.max:
+            self.max = dt
+        self.hist[bisect.bisect_left(BUCKETS_MS, dt * 1000)] += 1
+
+    def summary(self) -> dict:
+        return {
+            "n":       self.n,
+            "total_s": round(self.total, 3),
+            "avg_ms":  round(self.total / self.n * 1000, 3) if self.n else 0.0,
+            "max_ms":  round(self.max * 1000, 2),
+        }
+
+
+# (tf, stage) → накопительная статистика; stage → статистика текущего цикла
+_by_tf:    dict[tuple, StageStats] = {}
+_by_cycle: dict[str, StageStats]   = {}
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    _by_tf.clear()
+    _by_cycle.clear()
+
+
+def _record(tf: str, name: str, dt: float):
+    key = (tf, name)
+    st = _by_tf.get(key)
+    if st is None:
+        st = _by_tf[key] = StageStats()
+    st.add(dt)
+    st = _by_cycle.get(name)
+    if st is None:
+        st = _by_cycle[name] = StageStats()
+    st.add(dt)
+
+
+def stage(name: str):
+    """Декоратор метода CHMIndicator: TF берётся из self.cfg.TIMEFRAME."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            if not _enabled:
+                return fn(self, *args, **kwargs)
+            t0 = perf_counter()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                _record(getattr(self.cfg, "TIMEFRAME", "?"), name, perf_counter() - t0)
+        return wrapper
+    return deco
+
+
+def rotate() -> dict:
+    """Сводка стадий за прошедший цикл; счётчики цикла обнуляются."""
+    out = {k: v.summary() for k, v in sorted(_by_cycle.items())}
+    _by_cycle.clear()
+    return out
+
+
+def stats_by_tf() -> dict:
+    """{tf: {stage: summary}} — накопительно."""
+    out: dict[str, dict] = {}
+    for (tf, name), st in sorted(_by_tf.items()):
+        out.setdefault(tf, {})[name] = st.summary()
+    return out
+
+
+def histogram(tf: str = None) -> dict:
+    """{stage: {"<=0.1ms": n, …, ">1000ms": n}}; tf=None — по всем TF."""
+    merged: dict[str, list] = {}
+    for (t, name), st in _by_tf.items():
+        if tf is not None and t != tf:
+            continue
+        acc = merged.setdefault(name, [0] * len(st.hist))
+        for i, c in enumerate(st.hist):
+            acc[i] += c
+    labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+    return {
+        name: {lbl: c for lbl, c in zip(labels, hist) if c}
+        for name, hist in sorted(merged.items())
+    }
+
+
+def dump_text(tf: str = None, width: int = 20) -> str:
+    """Гистограмма текстом (моноширинно) — для логов и /profile dump."""
+    lines = []
+    for name, buckets in histogram(tf).items():
+        total = sum(buckets.values()) or 1
+        lines.append(f"{name} (n={total})")
+        for lbl, c in buckets.items():
+            bar = "█" * max(1, round(c / total * width))
+            lines.append(f"  {lbl:>9} {bar} {c}")
+    return "\n".join(lines) if lines else "нет данных"
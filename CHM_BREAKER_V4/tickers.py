@@ -0,0 +1,132 @@
+"""
+tickers.py — общий снапшот тикеров OKX SWAP.
+
+Один запрос /market/tickers?instType=SWAP раз в TICKERS_TTL секунд даёт
+цену, изменение за 24ч, объём и bid/ask по всем инструментам. Снапшот
+общий на процесс: им пользуются OKXFetcher.get_24h_change и
+get_all_usdt_pairs (ранжирование по объёму), хендлеры и сканеры.
+Чтение — O(1) по словарю, без сети.
+
+Обновление:
+  refresh_loop(fetcher)   — фоновая задача в bot.py / scan_worker.py
+  await refresh(fetcher)  — ленивое обновление, если снапшот устарел;
+                            параллельные вызовы ждут один общий запрос
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+log = logging.getLogger("CHM.Tickers")
+
+TICKERS_TTL = 15   # сек — снапшот старше считается устаревшим
+
+
+@dataclass(slots=True)
+class Ticker:
+    symbol:      str
+    last:        float
+    open24h:     float
+    change_pct:  float
+    volume_usdt: float   # volCcy24h (в базовой монете) × last
+    bid:         float
+    ask:         float
+    ts:          float
+
+
+_snap:       dict[str, Ticker] = {}
+_updated_at: float             = 0.0
+_lock:       Optional[asyncio.Lock] = None
+_refreshes = 0
+_failures  = 0
+
+
+def _f(v, default: float = 0.0) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return default
+
+
+def _parse(row: dict, now: float) -> Optional[Ticker]:
+    sym = row.get("instId")
+    if not sym:
+        return None
+    last = _f(row.get("last"))
+    op   = _f(row.get("open24h"), last)
+    return Ticker(
+        symbol      = sym,
+        last        = last,
+        open24h     = op,
+        change_pct  = (last - op) / op * 100 if op else 0.0,
+        volume_usdt = _f(row.get("volCcy24h")) * last,
+        bid         = _f(row.get("bidPx")),
+        ask         = _f(row.get("askPx")),
+        ts          = now,
+    )
+
+
+def _norm(symbol: str) -> str:
+    symbol = symbol.replace(" ", "").upper()
+    if symbol.endswith("USDT") and "-" not in symbol:
+        return symbol[:-4] + "-USDT-SWAP"
+    return symbol
+
+
+def get(symbol: str) -> Optional[Ticker]:
+    """Тикер из снапшота; символ в любом виде: BTC-USDT-SWAP или BTCUSDT."""
+    return _snap.get(_norm(symbol))
+
+
+def all_tickers() -> dict[str, Ticker]:
+    return _snap
+
+
+def age() -> float:
+    return time.time() - _updated_at if _updated_at else float("inf")
+
+
+async def refresh(fetcher, max_age: float = TICKERS_TTL) -> bool:
+    """Обновить снапшот, если он старше max_age. True — снапшот есть."""
+    global _snap, _updated_at, _lock, _refreshes, _failures
+    if age() < max_age:
+        return True
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        if age() < max_age:   # обновил параллельный вызов
+            return True
+        rows = await fetcher.get_tickers()
+        if not rows:
+            _failures += 1
+            return bool(_snap)
+        now  = time.time()
+        snap = {}
+        for row in rows:
+            t = _parse(row, now)
+            if t is not None:
+                snap[t.symbol] = t
+        _snap, _updated_at = snap, now
+        _refreshes += 1
+        return True
+
+
+async def refresh_loop(fetcher, interval: float = TICKERS_TTL):
+    log.info(f"📈 Снапшот тикеров: обновление каждые {interval:.0f}с")
+    while True:
+        try:
+            await refresh(fetcher, max_age=interval * 0.9)
+        except Exception as e:
+            log.warning(f"tickers refresh: {e}")
+        await asyncio.sleep(interval)
+
+
+def stats() -> dict:
+    return {
+        "symbols":   len(_snap),
+        "age_s":     round(age(), 1) if _updated_at else None,
+        "refreshes": _refreshes,
+        "failures":  _failures,
+    }
@@ -25,10 +25,24 @@ turso_sync.py — резервное копирование SQLite в Turso че
   - SYNC_TABLES расширен: добавлены trades, poly_wallets, poly_settings
   - restore не создаёт таблицы с типом TEXT — init_db запускается раньше
   - подробное логирование: количество строк по таблицам
+
+ИНКРЕМЕНТАЛЬНЫЙ ПУШ (CDC):
+  Полный пуш (DELETE + все строки SYNC_TABLES) стоил пропорционально
+  размеру БД каждые SYNC_INTERVAL секунд. Теперь триггеры на SYNC_TABLES
+  пишут изменённые PK в sync_changelog (seq растёт монотонно), а пуш
+  отправляет только строки с seq > подтверждённого (sync_state):
+  строка есть локально → INSERT OR REPLACE, нет → DELETE по PK.
+  Пуш отправляет текущее состояние строки, а не дельту, поэтому повтор
+  после сбоя безопасен: seq подтверждается только после ответа Turso
+  без ошибок. Полный пуш остаётся: первый запуск, облако оказалось
+  пустым, раз в TURSO_FULL_SYNC_HOURS — страховка от расхождений.
+  Локальный стенд Turso для проверки: loadtest/fake_turso.py.
 """
 
 import asyncio
+import json
 import logging
+import time
 from typing import Optional
 import os
 import sqlite3
@@ -59,6 +73,15 @@ _restore_attempted: bool = False
 # Event для немедленного пуша: request_push() → sync_loop реагирует без ожидания
 _push_requested: asyncio.Event = asyncio.Event()
 
+# CDC: ключей журнала на один pipeline-запрос и период полного пуша
+CDC_BATCH       = int(os.getenv("TURSO_CDC_BATCH", "200"))
+FULL_SYNC_HOURS = float(os.getenv("TURSO_FULL_SYNC_HOURS", "24"))   # 0 — только по необходимости
+
+_push_lock: Optional[asyncio.Lock] = None
+_last_full_push = time.monotonic()   # отсчёт периода полного пуша — от старта
+_schema_ready   = False              # _ensure_turso_schema уже прошёл в этом процессе
+_cdc_stats = {"full": 0, "incremental": 0, "upserts": 0, "deletes": 0, "acked": 0}
+
 
 def request_push() -> None:
     """
@@ -80,11 +103,11 @@ def _is_configured() -> bool:
 
 
 def _http_url() -> str:
-    """Конвертирует libsql:// → https:// для HTTP API."""
+    """Конвертирует libsql:// → https:// для HTTP API (http://127.0.0.1 — локальный стенд)."""
     url = TURSO_URL
     if url.startswith("libsql://"):
         url = "https://" + url[len("libsql://"):]
-    elif url.startswith("http://"):
+    elif url.startswith("http://") and not url.startswith(("http://127.0.0.1", "http://localhost")):
         url = "https://" + url[len("http://"):]
     return url.rstrip("/")
 
@@ -109,10 +132,13 @@ def _arg(v) -> dict:
     return {"type": "text", "value": str(v)}
 
 
-async def _pipeline(session: aiohttp.ClientSession, stmts: list[dict]) -> list:
+async def _pipeline(session: aiohttp.ClientSession, stmts: list[dict],
+                    strict: bool = False) -> list:
     """
     Отправляет список SQL-запросов в Turso через pipeline API.
     Возвращает список результирующих строк (list[list[dict]]) — по одному на stmt.
+    strict=True — ошибка любого stmt поднимает RuntimeError (CDC не
+    подтверждает пачку, пока Turso не принял её целиком).
     """
     if not stmts:
         return []
@@ -139,6 +165,8 @@ async def _pipeline(session: aiohttp.ClientSession, stmts: list[dict]) -> list:
     for item in data.get("results", []):
         if item.get("type") == "error":
             msg = item.get("error", {}).get("message", "")
+            if strict:
+                raise RuntimeError(f"Turso stmt error: {msg[:300]}")
             if "no such table" not in msg.lower():
                 log.debug(f"Turso stmt error: {msg}")
             results.append([])
@@ -260,6 +288,7 @@ _TURSO_ALTER_MIGRATIONS = [
     "ALTER TABLE trades ADD COLUMN be_set INTEGER DEFAULT 0",
     "ALTER TABLE trades ADD COLUMN pos_idx INTEGER DEFAULT 0",
     "ALTER TABLE trades ADD COLUMN order_id TEXT DEFAULT ''",
+    "ALTER TABLE trades ADD COLUMN closed_at REAL DEFAULT 0",
 ]
 
 
@@ -295,10 +324,96 @@ async def _ensure_turso_schema(session: aiohttp.ClientSession, db_path: str):
             await _pipeline(session, [{"sql": sql}])
         except Exception:
             pass  # колонка уже существует — норм
+    global _schema_ready
+    _schema_ready = True
 
 
 # ── Восстановление при старте ──────────────────────────────────────────────
 
+# Итог последнего restore: таблица → {"changed", "deleted", "replaced"}
+_last_restore: dict[str, dict] = {}
+
+
+def restore_replaced(table: str) -> bool:
+    """
+    Последний restore залил table целиком (локально было пусто или слияние
+    по PK не удалось). Только в этом случае агрегаты поверх неё, которые
+    ведут триггеры (user_stats по trades), нужно пересобрать.
+    """
+    return bool(_last_restore.get(table, {}).get("replaced"))
+
+
+def _restore_table(conn: sqlite3.Connection, table: str, rows: list[dict]) -> dict:
+    """
+    Привести локальную table к облачным rows, трогая только отличающиеся строки.
+
+    Непустая таблица сливается по PK: облачные строки — во временную
+    таблицу, затем INSERT ... ON CONFLICT DO UPDATE только там, где
+    значения отличаются, и DELETE локальных строк, которых нет в облаке.
+    Совпадающие строки не переписываются, поэтому триггеры (user_stats,
+    counters, CDC) срабатывают лишь на реальные изменения и при обычном
+    рестарте restore ничего не меняет. Пустая таблица или таблица без PK
+    заливается целиком — replaced=True.
+    """
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    if not info:
+        # Таблицы нет (restore до init_db) — создаём временно с TEXT-типами;
+        # init_db потом мигрирует.
+        col_defs = ", ".join(f"{c} TEXT" for c in rows[0])
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({col_defs})")
+        local_cols = set(rows[0])
+    else:
+        local_cols = {r[1] for r in info}
+    cols = [c for c in rows[0] if c in local_cols]   # облачная схема может отставать
+    col_names    = ", ".join(cols)
+    placeholders = ", ".join("?" for _ in cols)
+    values = [[row.get(c) for c in cols] for row in rows]
+
+    pk = _table_pk(conn, table)
+    has_rows = conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None
+    if has_rows and pk and set(pk) <= set(cols):
+        conn.execute("SAVEPOINT restore_merge")
+        try:
+            conn.execute("DROP TABLE IF EXISTS temp._restore")
+            # CREATE AS SELECT переносит affinity колонок — облачные значения
+            # приводятся к тем же типам, что и локальные, и сравниваются честно
+            conn.execute(f"CREATE TEMP TABLE _restore AS SELECT {col_names} FROM main.{table} WHERE 0")
+            conn.executemany(f"INSERT INTO temp._restore ({col_names}) VALUES ({placeholders})", values)
+            same_key = " AND ".join(f"r.{c} IS {table}.{c}" for c in pk)
+            deleted = conn.execute(
+                f"DELETE FROM main.{table} WHERE NOT EXISTS"
+                f" (SELECT 1 FROM temp._restore r WHERE {same_key})"
+            ).rowcount
+            rest = [c for c in cols if c not in pk]
+            if rest:
+                differs = " OR ".join(f"{table}.{c} IS NOT excluded.{c}" for c in rest)
+                on_conflict = ("DO UPDATE SET " + ", ".join(f"{c} = excluded.{c}" for c in rest)
+                               + f" WHERE {differs}")
+            else:
+                on_conflict = "DO NOTHING"
+            changed = conn.execute(
+                f"INSERT INTO main.{table} ({col_names}) SELECT {col_names} FROM temp._restore"
+                f" WHERE 1 ON CONFLICT({', '.join(pk)}) {on_conflict}"
+            ).rowcount
+            conn.execute("DROP TABLE temp._restore")
+            conn.execute("RELEASE restore_merge")
+            return {"changed": changed, "deleted": deleted, "replaced": False}
+        except sqlite3.IntegrityError as e:
+            # Конфликт по другому UNIQUE (адрес кошелька, промокод) — сливать
+            # по PK нельзя, заливаем целиком, как раньше
+            conn.execute("ROLLBACK TO restore_merge")
+            conn.execute("RELEASE restore_merge")
+            conn.execute("DROP TABLE IF EXISTS temp._restore")
+            log.warning(f"⬇️  Turso: {table} не слилась по PK ({e}) — заливаем целиком")
+
+    # Turso является источником правды: локальные строки заменяются облачными
+    deleted = conn.execute(f"DELETE FROM {table}").rowcount
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {table} ({col_names}) VALUES ({placeholders})", values
+    )
+    return {"changed": len(values), "deleted": max(deleted, 0), "replaced": True}
+
+
 async def restore_from_turso_if_needed(db_path: str) -> bool:
     """
     Восстанавливает локальный SQLite из Turso если облако непустое.
@@ -313,6 +428,15 @@ async def restore_from_turso_if_needed(db_path: str) -> bool:
     global _restore_attempted
     _restore_attempted = True  # выставляем сразу — даже если вернём False
 
+    loop = asyncio.get_event_loop()
+    try:
+        if is_configured():
+            await loop.run_in_executor(None, _install_cdc, db_path)
+        else:
+            await loop.run_in_executor(None, _drop_cdc, db_path)
+    except Exception as e:
+        log.warning(f"Turso CDC: триггеры не установлены ({e}) — только полный пуш")
+
     if not is_configured():
         log.warning(
             "⚠️  Turso не настроен (TURSO_URL/TURSO_TOKEN не заданы) — "
@@ -332,6 +456,9 @@ async def restore_from_turso_if_needed(db_path: str) -> bool:
         total = sum(len(r) for r in results)
         if total == 0:
             log.info("⬇️  Turso: облако пустое, начинаем с локальной БД")
+            # Журнал относится к облаку, которого больше нет — нужен полный пуш
+            if _pk_cols:
+                await loop.run_in_executor(None, _set_acked, db_path, None)
             return False
 
         # Подробная статистика по таблицам
@@ -346,34 +473,23 @@ async def restore_from_turso_if_needed(db_path: str) -> bool:
             with sqlite3.connect(db_path, timeout=30) as conn:
                 # WAL совместим с aiosqlite который запустится позже
                 conn.execute("PRAGMA journal_mode=WAL")
+                _last_restore.clear()
                 for table, rows in zip(SYNC_TABLES, results):
-                    if not rows:
-                        continue
-                    cols         = list(rows[0].keys())
-                    col_names    = ", ".join(cols)
-                    placeholders = ", ".join("?" for _ in cols)
-
-                    # Если таблица не существует (restore до init_db),
-                    # создаём временно с TEXT-типами; init_db потом мигрирует.
-                    col_defs = ", ".join(f"{c} TEXT" for c in cols)
-                    conn.execute(
-                        f"CREATE TABLE IF NOT EXISTS {table} ({col_defs})"
-                    )
-                    # Очищаем локальные данные — Turso является источником правды
-                    conn.execute(f"DELETE FROM {table}")
-                    for row in rows:
-                        vals = [row[c] for c in cols]
-                        conn.execute(
-                            f"INSERT OR REPLACE INTO {table} ({col_names}) "
-                            f"VALUES ({placeholders})",
-                            vals,
-                        )
+                    if rows:
+                        _last_restore[table] = _restore_table(conn, table, rows)
                 conn.commit()
+                # Восстановленное уже лежит в Turso — журнал до этой точки не пушим
+                if _pk_cols:
+                    _ack(conn, _last_seq(conn))
 
-        loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, _write_locally)
 
-        log.info(f"✅ Turso: восстановлено {total} строк из облака")
+        changed = ", ".join(
+            f"{t}:+{r['changed']}/-{r['deleted']}{' (заново)' if r['replaced'] else ''}"
+            for t, r in _last_restore.items() if r["changed"] or r["deleted"]
+        )
+        log.info(f"✅ Turso: восстановлено {total} строк из облака"
+                 f" (изменено: {changed or 'ничего'})")
         return True
 
     except Exception as exc:
@@ -414,18 +530,156 @@ async def turso_pull(db_path: str) -> bool:
     return await restore_from_turso_if_needed(db_path)
 
 
+# ── CDC: журнал изменений ─────────────────────────────────────────────────
+# Синхронные функции — вызывать в executor (блокирующий I/O), как и
+# остальные локальные чтения этого модуля.
+
+_CDC_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_changelog (
+    seq  INTEGER PRIMARY KEY AUTOINCREMENT,   -- не переиспользуется после очистки
+    tbl  TEXT    NOT NULL,
+    pk   TEXT    NOT NULL,                    -- json_array(значения PK)
+    op   TEXT    NOT NULL                     -- I / U / D
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name   TEXT PRIMARY KEY,
+    value  INTEGER
+);
+"""
+
+_pk_cols: dict[str, list[str]] = {}   # таблица → колонки PK (для DELETE / выборки)
+
+
+def _table_pk(conn: sqlite3.Connection, table: str) -> list[str]:
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return [r[1] for r in sorted((r for r in info if r[5]), key=lambda r: r[5])]
+
+
+def _install_cdc(db_path: str):
+    """Журнал + триггеры на SYNC_TABLES (идемпотентно, при каждом старте)."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.executescript(_CDC_SCHEMA)
+        for table in SYNC_TABLES:
+            pk = _table_pk(conn, table)
+            if not pk:
+                log.warning(f"Turso CDC: у {table} нет PRIMARY KEY — только полный пуш")
+                continue
+            _pk_cols[table] = pk
+
+            def key(x):
+                return "json_array(" + ", ".join(f"{x}.{c}" for c in pk) + ")"
+
+            log_row = "INSERT INTO sync_changelog (tbl, pk, op) "
+            conn.executescript(
+                f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{table}_ins AFTER INSERT ON {table}\n"
+                f"BEGIN {log_row}VALUES ('{table}', {key('NEW')}, 'I'); END;\n"
+                f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{table}_upd AFTER UPDATE ON {table}\n"
+                f"BEGIN {log_row}SELECT '{table}', {key('OLD')}, 'D'"
+                f" WHERE {key('OLD')} IS NOT {key('NEW')};\n"
+                f"  {log_row}VALUES ('{table}', {key('NEW')}, 'U'); END;\n"
+                f"CREATE TRIGGER IF NOT EXISTS trg_cdc_{table}_del AFTER DELETE ON {table}\n"
+                f"BEGIN {log_row}VALUES ('{table}', {key('OLD')}, 'D'); END;\n"
+            )
+
+
+def _drop_cdc(db_path: str):
+    """Turso выключен — журнал не нужен и не должен расти."""
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        for table in SYNC_TABLES:
+            for kind in ("ins", "upd", "del"):
+                conn.execute(f"DROP TRIGGER IF EXISTS trg_cdc_{table}_{kind}")
+        for table in ("sync_changelog", "sync_state"):
+            try:
+                conn.execute(f"DELETE FROM {table}")
+            except sqlite3.OperationalError:
+                pass   # журнала ещё не было
+
+
+def _last_seq(conn: sqlite3.Connection) -> int:
+    """Последний выданный seq (sqlite_sequence помнит его и после очистки журнала)."""
+    row = conn.execute(
+        "SELECT seq FROM sqlite_sequence WHERE name='sync_changelog'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _ack(conn: sqlite3.Connection, seq: Optional[int]):
+    """Turso принял всё до seq включительно; None — подтверждений нет (нужен полный пуш)."""
+    if seq is None:
+        conn.execute("DELETE FROM sync_state WHERE name='turso_acked'")
+    else:
+        conn.execute(
+            "INSERT INTO sync_state (name, value) VALUES ('turso_acked', ?)"
+            " ON CONFLICT(name) DO UPDATE SET value=excluded.value", (seq,),
+        )
+        conn.execute("DELETE FROM sync_changelog WHERE seq <= ?", (seq,))
+        _cdc_stats["acked"] = seq
+    conn.commit()
+
+
+def _set_acked(db_path: str, seq: Optional[int]):
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        _ack(conn, seq)
+
+
+def _get_acked(db_path: str) -> Optional[int]:
+    """Подтверждённый seq; None — CDC не установлен или полный пуш ещё не прошёл."""
+    try:
+        with sqlite3.connect(db_path, timeout=30) as conn:
+            row = conn.execute(
+                "SELECT value FROM sync_state WHERE name='turso_acked'"
+            ).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def _read_changes(db_path: str, after: int) -> tuple[Optional[int], list[dict], int, int]:
+    """
+    Следующая пачка журнала после after: (upto, stmts, upserts, deletes).
+    upto — seq, до которого пачка покрывает журнал (None — изменений нет).
+    Для каждого ключа берётся ТЕКУЩАЯ строка: несколько правок одного PK
+    схлопываются в один INSERT OR REPLACE / DELETE.
+    """
+    with sqlite3.connect(db_path, timeout=30) as conn:
+        conn.row_factory = sqlite3.Row
+        upto = conn.execute(
+            "SELECT MAX(seq) FROM (SELECT seq FROM sync_changelog"
+            " WHERE seq > ? ORDER BY seq LIMIT ?)", (after, CDC_BATCH),
+        ).fetchone()[0]
+        if upto is None:
+            return None, [], 0, 0
+        keys = conn.execute(
+            "SELECT tbl, pk FROM sync_changelog WHERE seq > ? AND seq <= ?"
+            " GROUP BY tbl, pk ORDER BY MIN(seq)", (after, upto),
+        ).fetchall()
+        stmts: list[dict] = []
+        n_up = n_del = 0
+        for tbl, pk in keys:
+            cols = _pk_cols.get(tbl)
+            if not cols:
+                continue   # таблицу убрали из SYNC_TABLES
+            vals = json.loads(pk)
+            where = " AND ".join(f"{c}=?" for c in cols)
+            row = conn.execute(f"SELECT * FROM {tbl} WHERE {where}", vals).fetchone()
+            if row is not None:
+                _append_inserts(stmts, tbl, [dict(row)])
+                n_up += 1
+            else:
+                stmts.append({"sql": f"DELETE FROM {tbl} WHERE {where}",
+                              "args": [_arg(v) for v in vals]})
+                n_del += 1
+    return upto, stmts, n_up, n_del
+
+
 # ── Push ───────────────────────────────────────────────────────────────────
 
 async def turso_push(db_path: str) -> bool:
     """
-    Пушит все SYNC_TABLES из локального SQLite в Turso.
-
-    Исправления v2:
-    - Сначала создаёт таблицы в Turso (_ensure_turso_schema) если их нет.
-      Ранее DELETE/INSERT молча падали с "no such table" — данные не сохранялись.
-    - Логирует количество строк по каждой таблице.
-    - Батчи по 50 строк: DELETE+первые_50 в первом, остальные отдельно.
+    Синхронизирует SYNC_TABLES с Turso: обычно — только изменения из
+    sync_changelog (_push_incremental), при необходимости — полный пуш.
     """
+    global _push_lock
     if not is_configured():
         return False
 
@@ -436,10 +690,73 @@ async def turso_push(db_path: str) -> bool:
         )
         return False
 
+    if _push_lock is None:
+        _push_lock = asyncio.Lock()
+    async with _push_lock:   # старт, цикл и остановка не пушат одновременно
+        loop = asyncio.get_event_loop()
+        acked = await loop.run_in_executor(None, _get_acked, db_path)
+        full_due = (FULL_SYNC_HOURS > 0
+                    and time.monotonic() - _last_full_push > FULL_SYNC_HOURS * 3600)
+        # Таблица без триггеров (нет PK) уходит только полным пушем
+        uncovered = any(t not in _pk_cols for t in SYNC_TABLES)
+        if acked is None or full_due or uncovered:
+            return await _push_full(db_path)
+        return await _push_incremental(db_path, acked)
+
+
+async def _push_incremental(db_path: str, acked: int) -> bool:
+    """
+    Отправляет журнал пачками по CDC_BATCH ключей. Каждая пачка
+    подтверждается (sync_state) только после ответа Turso без ошибок;
+    при сбое следующий пуш повторит её с того же seq — INSERT OR REPLACE
+    и DELETE по PK дают тот же результат при повторе.
+    """
+    loop = asyncio.get_event_loop()
+    n_up = n_del = 0
+    try:
+        async with aiohttp.ClientSession() as session:
+            if not _schema_ready:
+                await _ensure_turso_schema(session, db_path)
+            while True:
+                upto, stmts, up, dl = await loop.run_in_executor(
+                    None, _read_changes, db_path, acked)
+                if upto is None:
+                    break
+                await _pipeline(session, stmts, strict=True)
+                await loop.run_in_executor(None, _set_acked, db_path, upto)
+                acked = upto
+                n_up += up
+                n_del += dl
+    except Exception as exc:
+        log.warning(f"Turso CDC push error (повтор с seq {acked}): {exc}")
+        return False
+    finally:
+        _cdc_stats["upserts"] += n_up
+        _cdc_stats["deletes"] += n_del
+    _cdc_stats["incremental"] += 1
+    if n_up or n_del:
+        log.info(f"☁️  Turso CDC: {n_up} upsert, {n_del} delete (seq {acked})")
+    return True
+
+
+async def _push_full(db_path: str) -> bool:
+    """
+    Пушит все SYNC_TABLES из локального SQLite в Turso.
+
+    Исправления v2:
+    - Сначала создаёт таблицы в Turso (_ensure_turso_schema) если их нет.
+      Ранее DELETE/INSERT молча падали с "no such table" — данные не сохранялись.
+    - Логирует количество строк по каждой таблице.
+    - Батчи по 50 строк: DELETE+первые_50 в первом, остальные отдельно.
+    CDC: seq журнала запоминается ДО чтения таблиц и подтверждается, только
+    если все батчи прошли; правки во время пуша уйдут следующим CDC-пушем.
+    """
+    global _last_full_push
     try:
-        def _read_locally() -> dict[str, list[dict]]:
+        def _read_locally() -> tuple[int, dict[str, list[dict]]]:
             data: dict[str, list[dict]] = {}
             with sqlite3.connect(db_path, timeout=30) as conn:
+                seq = _last_seq(conn) if _pk_cols else None   # None — CDC не установлен
                 conn.row_factory = sqlite3.Row
                 for table in SYNC_TABLES:
                     try:
@@ -448,12 +765,13 @@ async def turso_push(db_path: str) -> bool:
                         ]
                     except Exception:
                         data[table] = []
-            return data
+            return seq, data
 
         loop = asyncio.get_event_loop()
-        tables_data: dict[str, list[dict]] = await loop.run_in_executor(None, _read_locally)
+        seq, tables_data = await loop.run_in_executor(None, _read_locally)
 
         total_local = sum(len(v) for v in tables_data.values())
+        ok = True
 
         async with aiohttp.ClientSession() as session:
             # ─── КРИТИЧНО: создаём таблицы в Turso если их нет ──────────────
@@ -477,10 +795,11 @@ async def turso_push(db_path: str) -> bool:
                 batch: list[dict] = [{"sql": f"DELETE FROM {table}"}]
                 _append_inserts(batch, table, rows[:50])
                 try:
-                    await _pipeline(session, batch)
+                    await _pipeline(session, batch, strict=True)
                     total_pushed += min(n, 50)
                 except Exception as e:
                     log.warning(f"Turso push {table} batch-0: {e}")
+                    ok = False
                     continue
 
                 # Последующие батчи: только INSERT (DELETE уже был)
@@ -489,16 +808,21 @@ async def turso_push(db_path: str) -> bool:
                     batch = []
                     _append_inserts(batch, table, chunk)
                     try:
-                        await _pipeline(session, batch)
+                        await _pipeline(session, batch, strict=True)
                         total_pushed += len(chunk)
                     except Exception as e:
                         log.warning(f"Turso push {table} batch-{offset}: {e}")
+                        ok = False
 
         log.info(
             f"☁️  Turso sync: сохранено {total_pushed}/{total_local} строк "
             f"({', '.join(f'{t}:{len(v)}' for t,v in tables_data.items() if v)})"
         )
-        return True
+        _last_full_push = time.monotonic()
+        _cdc_stats["full"] += 1
+        if ok and seq is not None:
+            await loop.run_in_executor(None, _set_acked, db_path, seq)
+        return ok
 
     except Exception as exc:
         log.warning(f"Turso push error: {exc}")
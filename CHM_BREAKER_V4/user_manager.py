@@ -10,7 +10,10 @@ user_manager.py — управление пользователями через
 Эффективный конфиг = shared + override из direction cfg.
 """
 
+import asyncio
+import copy
 import json
+import os
 import time
 import logging
 from dataclasses import dataclass, field, fields, asdict
@@ -121,6 +124,13 @@ class SMCUserCfg:
             return cls()
 
 
+# Поля UserSettings, от которых зависят shared/long/short/SMC конфиги
+_CFG_INPUTS = frozenset(f.name for f in fields(TradeCfg)) | {
+    "long_cfg", "short_cfg", "smc_cfg",
+    "long_tf", "long_interval", "short_tf", "short_interval",
+}
+
+
 @dataclass
 class UserSettings:
     user_id:          int
@@ -213,9 +223,28 @@ class UserSettings:
     max_trades_limit:     int   = 5           # макс. одновременных открытых сделок
 
     # ── Хелперы конфигов ─────────────────────────
+    # Разобранные конфиги запоминаются в self._parsed (не поле dataclass):
+    # сканер спрашивает их на каждое задание, а json.loads + merged_with
+    # дороже самого вызова. Запись любого поля из _CFG_INPUTS сбрасывает
+    # память; наружу отдаётся копия — хендлеры правят cfg и сохраняют.
+
+    def __setattr__(self, name, value):
+        if name in _CFG_INPUTS:
+            self.__dict__.pop("_parsed", None)
+        object.__setattr__(self, name, value)
+
+    def _memo(self, key: str, build):
+        parsed = self.__dict__.setdefault("_parsed", {})
+        cfg = parsed.get(key)
+        if cfg is None:
+            cfg = parsed[key] = build()
+        return copy.copy(cfg)
 
     def shared_cfg(self) -> TradeCfg:
         """Общие настройки как TradeCfg."""
+        return self._memo("shared", self._build_shared_cfg)
+
+    def _build_shared_cfg(self) -> TradeCfg:
         return TradeCfg(
             timeframe=self.timeframe, scan_interval=self.scan_interval,
             pivot_strength=self.pivot_strength, max_level_age=self.max_level_age,
@@ -238,6 +267,9 @@ class UserSettings:
 
     def get_long_cfg(self) -> TradeCfg:
         """Эффективный конфиг для лонг сканера."""
+        return self._memo("long", self._build_long_cfg)
+
+    def _build_long_cfg(self) -> TradeCfg:
         override = TradeCfg.from_json(self.long_cfg)
         base = self.shared_cfg()
         merged = base.merged_with(override)
@@ -248,6 +280,9 @@ class UserSettings:
 
     def get_short_cfg(self) -> TradeCfg:
         """Эффективный конфиг для шорт сканера."""
+        return self._memo("short", self._build_short_cfg)
+
+    def _build_short_cfg(self) -> TradeCfg:
         override = TradeCfg.from_json(self.short_cfg)
         base = self.shared_cfg()
         merged = base.merged_with(override)
@@ -262,7 +297,7 @@ class UserSettings:
         self.short_cfg = cfg.to_json()
 
     def get_smc_cfg(self) -> "SMCUserCfg":
-        return SMCUserCfg.from_json(self.smc_cfg)
+        return self._memo("smc", lambda: SMCUserCfg.from_json(self.smc_cfg))
 
     def set_smc_cfg(self, cfg: "SMCUserCfg"):
         self.smc_cfg = cfg.to_json()
@@ -328,48 +363,197 @@ def _from_db(row: dict) -> UserSettings:
             if f.name == "strategy" and v not in ("LEVELS", "SMC", "GERCHIK"):
                 v = "LEVELS"
             setattr(u, f.name, bool(v) if f.name in bool_fields else v)
+    u.__dict__["_saved"] = u.to_db()   # снимок строки БД — save() пишет только отличия
     return u
 
 
+# ── Кэш пользователей ────────────────────────────────
+# Все UserSettings процесса живут здесь: циклы сканеров берут списки из
+# памяти без запросов к SQLite. UserManager.save обновляет запись и индексы
+# сразу после записи в БД. Правки из других процессов (scan_worker, shadow,
+# прямые db_upsert_user) подтягиваются дельтой по users.updated_at не чаще
+# раза в USER_CACHE_SYNC секунд.
+#
+# Списки (get_active_users и т.п.) отдают общие объекты — сканеры меняют
+# их только перед save(). get / get_or_create отдают копию: хендлер может
+# править её и не сохранить.
+#
+# Объект мог пролежать в кэше до USER_CACHE_SYNC секунд, поэтому save()
+# пишет не всю строку, а только колонки, изменённые относительно снимка
+# (_saved), с которым объект был загружен: иначе scan_worker со старой
+# копией затирал бы подписку и настройки, записанные ботом.
+
+USER_CACHE_SYNC = float(os.getenv("USER_CACHE_SYNC", "30"))
+_SYNC_OVERLAP   = 5.0   # updated_at ставится до группового коммита — окно с запасом
+
+_users: dict[int, UserSettings] = {}
+_scanning:   set[int] = set()             # включён хотя бы один сканер
+_by_tf:      dict[str, set[int]] = {}     # TF → включённые LEVELS-сканеры на нём
+_auto_trade: set[int] = set()             # авто-трейдинг + API-ключ
+_smc:        set[int] = set()             # strategy=SMC и включено направление
+_db_path:    Optional[str] = None         # для какой БД загружен кэш
+_synced_at   = 0.0                        # time.time() начала последней синхронизации
+_lock: Optional[asyncio.Lock] = None
+_stats = {"loads": 0, "syncs": 0, "synced_rows": 0, "hits": 0, "misses": 0}
+
+
+def _unindex(uid: int):
+    _scanning.discard(uid)
+    _auto_trade.discard(uid)
+    _smc.discard(uid)
+    for tf in [tf for tf, ids in _by_tf.items() if uid in ids]:
+        _by_tf[tf].discard(uid)
+        if not _by_tf[tf]:
+            del _by_tf[tf]
+
+
+def _put(u: UserSettings):
+    uid = u.user_id
+    _unindex(uid)
+    _users[uid] = u
+    if (u.active or u.long_active or u.short_active or u.smc_long_active
+            or u.smc_short_active or u.gerchik_active):
+        _scanning.add(uid)
+    if u.strategy != "SMC":
+        tfs = set()
+        if u.long_active:
+            tfs.add(u.long_tf)
+        if u.short_active:
+            tfs.add(u.short_tf)
+        if u.active and u.scan_mode == "both":
+            tfs.add(u.timeframe)
+        for tf in tfs:
+            _by_tf.setdefault(tf, set()).add(uid)
+    elif u.smc_long_active or u.smc_short_active:
+        _smc.add(uid)
+    if u.auto_trade and u.bybit_api_key:
+        _auto_trade.add(uid)
+
+
+def _has_sub(u: UserSettings, now: float) -> bool:
+    """Та же проверка подписки, что в db_get_active_users."""
+    return u.sub_status in ("trial", "active") and u.sub_expires > now
+
+
+async def _ensure_fresh():
+    """Полная загрузка при первом обращении (или смене БД), затем дельты."""
+    global _lock, _db_path, _synced_at
+    if _db_path == db._db_path and time.time() - _synced_at < USER_CACHE_SYNC:
+        return
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        started = time.time()
+        if _db_path != db._db_path:
+            rows = await db.db_get_users_since(None)
+            _users.clear(); _scanning.clear(); _by_tf.clear()
+            _auto_trade.clear(); _smc.clear()
+            _stats["loads"] += 1
+        elif started - _synced_at >= USER_CACHE_SYNC:
+            rows = await db.db_get_users_since(_synced_at - _SYNC_OVERLAP)
+            _stats["syncs"] += 1
+            _stats["synced_rows"] += len(rows)
+        else:
+            return   # пока ждали lock, синхронизировал другой
+        for r in rows:
+            _put(_from_db(r))
+        _db_path   = db._db_path
+        _synced_at = started
+
+
+def cache_stats() -> dict:
+    return {
+        **_stats,
+        "users":      len(_users),
+        "scanning":   len(_scanning),
+        "tfs":        {tf: len(ids) for tf, ids in _by_tf.items()},
+        "auto_trade": len(_auto_trade),
+        "smc":        len(_smc),
+        "age_s":      round(time.time() - _synced_at, 1) if _synced_at else None,
+    }
+
+
 class UserManager:
 
     async def get(self, user_id: int) -> Optional[UserSettings]:
-        row = await db.db_get_user(user_id)
-        return _from_db(row) if row else None
+        await _ensure_fresh()
+        u = _users.get(user_id)
+        if u is None:
+            # создан другим процессом после последней синхронизации?
+            _stats["misses"] += 1
+            row = await db.db_get_user(user_id)
+            if not row:
+                return None
+            u = _from_db(row)
+            _put(u)
+        else:
+            _stats["hits"] += 1
+        return copy.copy(u)
 
     async def get_or_create(self, user_id: int, username: str = "") -> UserSettings:
-        row = await db.db_get_user(user_id)
-        if row:
-            return _from_db(row)
+        user = await self.get(user_id)
+        if user is not None:
+            return user
         # Новый пользователь — без триала, сразу expired (нужна подписка)
         user = UserSettings(
             user_id=user_id, username=username,
             sub_status="expired", sub_expires=0, trial_used=True,
         )
         log.info("Новый пользователь: @" + username + " (" + str(user_id) + ")")
-        await db.db_upsert_user(user.to_db())
+        await self.save(user)
         return user
 
     async def save(self, user: UserSettings):
-        await db.db_upsert_user(user.to_db())
+        """Записать изменённые поля (новый пользователь — строку целиком)."""
+        data = user.to_db()
+        saved = user.__dict__.get("_saved")
+        if saved is None:
+            changed = data
+        else:
+            changed = {k: v for k, v in data.items() if saved.get(k) != v}
+            if not changed:
+                return
+        await db.db_upsert_user({**changed, "user_id": user.user_id})
+        user.__dict__["_saved"] = data
+        if _db_path == db._db_path:
+            # Изменения — поверх записи кэша: она может быть свежее user
+            cur = _users.get(user.user_id)
+            if saved is None or cur is None:
+                fresh = copy.copy(user)
+            else:
+                fresh = copy.copy(cur)
+                for k in changed:
+                    setattr(fresh, k, getattr(user, k))
+                fresh.__dict__["_saved"] = fresh.to_db()
+            _put(fresh)
 
     async def get_active_users(self) -> list[UserSettings]:
-        rows = await db.db_get_active_users()
-        return [_from_db(r) for r in rows]
+        await _ensure_fresh()
+        now = time.time()
+        return [u for u in map(_users.__getitem__, _scanning) if _has_sub(u, now)]
+
+    async def get_active_users_by_tf(self, tf: str) -> list[UserSettings]:
+        """Пользователи с включённым LEVELS-сканером (лонг/шорт/оба) на TF."""
+        await _ensure_fresh()
+        now = time.time()
+        return [u for u in map(_users.__getitem__, _by_tf.get(tf, ())) if _has_sub(u, now)]
+
+    async def get_smc_users(self) -> list[UserSettings]:
+        """strategy=SMC и включено хотя бы одно SMC-направление."""
+        await _ensure_fresh()
+        now = time.time()
+        return [u for u in map(_users.__getitem__, _smc) if _has_sub(u, now)]
 
     async def all_users(self) -> list[UserSettings]:
-        rows = await db.db_get_all_users()
-        return [_from_db(r) for r in rows]
+        await _ensure_fresh()
+        return list(_users.values())
 
     async def get_active_auto_trade_users(self) -> list[UserSettings]:
         """Пользователи у которых включён авто-трейдинг и есть API-ключи."""
-        rows = await db.db_get_active_users()
-        result = []
-        for r in rows:
-            u = _from_db(r)
-            if getattr(u, "auto_trade", False) and getattr(u, "bybit_api_key", ""):
-                result.append(u)
-        return result
+        await _ensure_fresh()
+        now = time.time()
+        return [u for u in map(_users.__getitem__, _auto_trade & _scanning)
+                if _has_sub(u, now)]
 
     async def stats_summary(self) -> dict:
         return await db.db_stats_summary()
@@ -15,11 +15,14 @@
   - Не ломает HTML parse_mode (вставляется вне тегов).
 """
 
+from functools import lru_cache
+
 _ZW0  = '\u200B'   # бит 0
 _ZW1  = '\u200C'   # бит 1
 _BITS = 40          # до 1_099_511_627_776 — достаточно для Telegram user_id
 
 
+@lru_cache(maxsize=20_000)
 def wm_encode(user_id: int) -> str:
     """Кодирует user_id в строку из 40 zero-width символов."""
     return ''.join(_ZW1 if (user_id >> i) & 1 else _ZW0 for i in range(_BITS))